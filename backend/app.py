@@ -13,13 +13,16 @@ from flask_sock import Sock
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # 导入配置
-from config import SECRET_KEY, DEBUG, HOST, PORT
+from config import SECRET_KEY, DEBUG, HOST, PORT, OCR_WARMUP
 
 # 导入路由蓝图
 from routes import auth_bp, ssh_bp, serial_bp, test_cases_bp, files_bp, logs_bp, screen_bp, settings_bp, reports_bp
 
 # 导入触摸屏监控
 from utils.touch_monitor_ssh import TouchMonitor
+from utils.log_stream import LogTailer
+from services.config_service import config_service
+from utils.http_cache import init_http_cache
 
 # 设置日志文件路径
 LOG_DIR = os.path.join(os.path.dirname(__file__), 'data')
@@ -54,6 +57,9 @@ def create_app(config=None):
     
     # 配置CORS，允许前端访问
     CORS(app, resources={r"/api/*": {"origins": "*", "supports_credentials": True}})
+
+    # ETag、条件请求和压缩（在CORS之后注册，304响应也会带上CORS头）
+    init_http_cache(app)
     
     # 注册蓝图
     app.register_blueprint(auth_bp)
@@ -86,31 +92,20 @@ def create_app(config=None):
                         
                         # 获取项目的监听模式
                         try:
-                            settings_path = os.path.join(os.path.dirname(__file__), 'data', 'settings.json')
-                            if os.path.exists(settings_path):
-                                with open(settings_path, 'r', encoding='utf-8') as f:
-                                    settings = json.load(f)
-                                
-                                # 查找匹配的项目配置
-                                monitor_mode = 'evtest'  # 默认值
-                                for project in settings.get('projects', []):
-                                    if str(project.get('id')) == str(project_id):
-                                        monitor_mode = project.get('monitorMode', 'evtest')
-                                        logger.info(f"项目 {project_id} 的监听模式为: {monitor_mode}")
-                                        break
-                                
-                                # 根据监听模式调用不同的方法
-                                if monitor_mode == 'evtest':
-                                    logger.info("使用evtest模式进行监控")
-                                    touch_monitor.start_monitoring(ws)
-                                elif monitor_mode == 'no_evtest':
-                                    logger.info("使用680kbd模式进行监控")
-                                    touch_monitor.start_keyboard_mouse_monitoring(ws)
-                                else:
-                                    logger.warning(f"未知的监听模式: {monitor_mode}，使用默认的evtest模式")
-                                    touch_monitor.start_monitoring(ws)
+                            project = config_service.get_project(project_id)
+                            monitor_mode = project.get('monitorMode', 'evtest') if project else 'evtest'  # 默认值
+                            if project:
+                                logger.info(f"项目 {project_id} 的监听模式为: {monitor_mode}")
+                            
+                            # 根据监听模式调用不同的方法
+                            if monitor_mode == 'evtest':
+                                logger.info("使用evtest模式进行监控")
+                                touch_monitor.start_monitoring(ws)
+                            elif monitor_mode == 'no_evtest':
+                                logger.info("使用680kbd模式进行监控")
+                                touch_monitor.start_keyboard_mouse_monitoring(ws)
                             else:
-                                logger.warning(f"配置文件 {settings_path} 不存在，使用默认的evtest模式")
+                                logger.warning(f"未知的监听模式: {monitor_mode}，使用默认的evtest模式")
                                 touch_monitor.start_monitoring(ws)
                         except Exception as e:
                             logger.error(f"获取项目监听模式时出错: {str(e)}，使用默认的evtest模式")
@@ -155,27 +150,20 @@ def create_app(config=None):
         logger.info("新的日志WebSocket连接已建立")
         import os
         import time
-        import hashlib
         
         # 设置日志文件路径
         log_file_path = os.path.join(os.path.dirname(__file__), 'data', 'logs', 'VP_180.log')
         logger.info(f"监听日志文件: {log_file_path}")
         
-        last_size = 0  # 记录上次读取的文件大小
-        last_mtime = 0  # 记录上次读取的文件修改时间
-        file_position = 0  # 当前文件读取位置
         test_completed = False  # 标记测试是否已完成
-        last_content_hash = None  # 记录上次读取内容的哈希值，用于检测重复内容
         duplicate_detection_threshold = 2  # 重复检测阈值（秒）
         last_send_time = 0  # 记录上次发送日志的时间
         
         try:
-            # 初始检查文件是否存在
+            # 初始检查文件是否存在，从文件末尾开始监听
+            tailer = LogTailer(log_file_path)
             if os.path.exists(log_file_path):
-                last_size = os.path.getsize(log_file_path)
-                last_mtime = os.path.getmtime(log_file_path)
-                file_position = last_size
-                logger.info(f"初始文件大小: {last_size} 字节")
+                logger.info(f"初始文件大小: {tailer.last_size} 字节")
             else:
                 logger.warning(f"日志文件不存在: {log_file_path}")
             
@@ -190,9 +178,7 @@ def create_app(config=None):
                             break
                         elif command.get('action') == 'reset':
                             logger.info("重置日志读取位置并清空日志文件")
-                            file_position = 0  # 重置读取位置到文件开头
                             test_completed = False  # 重置测试完成标记
-                            last_content_hash = None  # 重置内容哈希
                             last_send_time = 0  # 重置发送时间
                             
                             if os.path.exists(log_file_path):
@@ -202,9 +188,7 @@ def create_app(config=None):
                                         file.write('')  # 清空文件内容
                                     
                                     # 更新读取位置和修改时间
-                                    file_position = 0
-                                    last_size = 0
-                                    last_mtime = os.path.getmtime(log_file_path)
+                                    tailer.reset()
                                     
                                     logger.info(f"已清空日志文件: {log_file_path}")
                                     
@@ -233,11 +217,7 @@ def create_app(config=None):
                                     with open(log_file_path, 'w', encoding='utf-8') as file:
                                         file.write('')  # 创建空文件
                                     
-                                    file_position = 0
-                                    last_size = 0
-                                    last_mtime = os.path.getmtime(log_file_path)
-                                    last_content_hash = None  # 重置内容哈希
-                                    last_send_time = 0  # 重置发送时间
+                                    tailer.reset()
                                     
                                     ws.send(json.dumps({
                                         'type': 'logs',
@@ -263,106 +243,46 @@ def create_app(config=None):
                     logger.info("测试已完成，停止监听文件变化")
                     break
                 
-                # 检查日志文件是否存在且是否有变化
-                if os.path.exists(log_file_path):
-                    current_size = os.path.getsize(log_file_path)
-                    current_mtime = os.path.getmtime(log_file_path)
+                # 检查日志文件是否存在且是否有变化，只有当文件大小或修改时间变化时才读取
+                current = tailer.stat()
+                if current is not None and tailer.has_changed(current):
+                    # 检查是否在短时间内重复发送
+                    current_time = time.time()
+                    if current_time - last_send_time < duplicate_detection_threshold:
+                        # 更新文件大小和修改时间，避免重复检测
+                        tailer.mark_seen(current)
+                        continue
                     
-                    # 只有当文件大小或修改时间变化时才读取
-                    if current_size != last_size or current_mtime != last_mtime:
-                        # logger.info(f"检测到文件变化: 大小 {last_size} -> {current_size}, 修改时间 {last_mtime} -> {current_mtime}")
+                    try:
+                        parsed_logs = tailer.read_new(current)
                         
-                        # 检查是否在短时间内重复发送
-                        current_time = time.time()
-                        if current_time - last_send_time < duplicate_detection_threshold:
-                            # 更新文件大小和修改时间，避免重复检测
-                            last_size = current_size
-                            last_mtime = current_mtime
+                        # 检查是否与上次内容相同
+                        if parsed_logs is None:
+                            logger.info("检测到重复内容，跳过发送")
                             continue
                         
-                        try:
-                            with open(log_file_path, 'r', encoding='utf-8') as file:
-                                # 如果文件大小变小了，可能是文件被清空或重写，从头开始读取
-                                if current_size < file_position:
-                                    logger.info(f"文件大小变小，可能是文件被清空或重写，重置读取位置")
-                                    file_position = 0
-                                
-                                # 移动到上次读取的位置
-                                file.seek(file_position)
-                                
-                                # 读取新增内容
-                                new_content = file.read()
-                                
-                                # 计算新内容的哈希值
-                                content_hash = hashlib.md5(new_content.encode('utf-8')).hexdigest()
-                                
-                                # 检查是否与上次内容相同
-                                if content_hash == last_content_hash and new_content:
-                                    logger.info("检测到重复内容，跳过发送")
-                                    # 更新文件位置和大小，但跳过发送
-                                    file_position = file.tell()
-                                    last_size = current_size
-                                    last_mtime = current_mtime
-                                    continue
-                                
-                                # 更新读取位置和修改时间
-                                file_position = file.tell()
-                                last_size = current_size
-                                last_mtime = current_mtime
-                                last_content_hash = content_hash
-                                
-                                logger.info(f"读取新增内容，长度: {len(new_content)} 字符")
-                                
-                                # 如果有新内容，发送到客户端
-                                if new_content:
-                                    # 处理日志行，解析日期、级别等信息
-                                    parsed_logs = []
-                                    for line in new_content.split('\n'):
-                                        line = line.strip()
-                                        if not line:
-                                            continue
-                                        
-                                        # 尝试解析日志格式
-                                        parts = line.split(' - ', 3)
-                                        if len(parts) >= 4:
-                                            timestamp, level, source, message = parts
-                                            parsed_logs.append({
-                                                'timestamp': timestamp,
-                                                'level': level,
-                                                'source': source,
-                                                'message': message
-                                            })
-                                        else:
-                                            # 如果格式不匹配，直接将整行作为消息
-                                            parsed_logs.append({
-                                                'timestamp': '',
-                                                'level': 'UNKNOWN',
-                                                'source': '',
-                                                'message': line
-                                            })
-                                    
-                                    # 如果有新日志，发送到客户端
-                                    if parsed_logs:
-                                        # 更新发送时间
-                                        last_send_time = current_time
-                                        logger.info(f"发送 {len(parsed_logs)} 条新日志到客户端")
-                                        ws.send(json.dumps({
-                                            'type': 'logs',
-                                            'data': parsed_logs
-                                        }))
-                                        
-                                        # 检查是否包含测试完成标记
-                                        for log in parsed_logs:
-                                            if '测试执行已完成' in log['message'] or '所有测试用例执行完成' in log['message']:
-                                                logger.info("检测到测试完成标记，停止日志监控")
-                                                test_completed = True
-                                                ws.send(json.dumps({
-                                                    'type': 'status',
-                                                    'message': '测试执行已完成'
-                                                }))
-                                                # 不立即返回，而是等待下一次循环检查test_completed标记
-                        except Exception as e:
-                            logger.error(f"读取日志文件时出错: {str(e)}")
+                        # 如果有新日志，发送到客户端
+                        if parsed_logs:
+                            # 更新发送时间
+                            last_send_time = current_time
+                            logger.info(f"发送 {len(parsed_logs)} 条新日志到客户端")
+                            ws.send(json.dumps({
+                                'type': 'logs',
+                                'data': parsed_logs
+                            }))
+                            
+                            # 检查是否包含测试完成标记
+                            for log in parsed_logs:
+                                if '测试执行已完成' in log['message'] or '所有测试用例执行完成' in log['message']:
+                                    logger.info("检测到测试完成标记，停止日志监控")
+                                    test_completed = True
+                                    ws.send(json.dumps({
+                                        'type': 'status',
+                                        'message': '测试执行已完成'
+                                    }))
+                                    # 不立即返回，而是等待下一次循环检查test_completed标记
+                    except Exception as e:
+                        logger.error(f"读取日志文件时出错: {str(e)}")
                 
                 # 短暂休眠，避免过度占用CPU
                 time.sleep(0.5)
@@ -390,6 +310,11 @@ app = create_app()
 
 if __name__ == '__main__':
     try:
+        # 预热OCR引擎（调试模式下只在重载器启动的子进程中预热）
+        if OCR_WARMUP and (not DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+            from utils.ocr import ocr_service
+            ocr_service.warmup(wait=False)
+        
         # 启动应用
         app.run(host=HOST, debug=DEBUG, port=PORT)
     except Exception as e:
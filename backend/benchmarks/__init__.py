@@ -0,0 +1,13 @@
+"""
+性能基准测试包
+
+该包提供可重复运行的性能基准测试，覆盖以下方面：
+1. ImageComparator 各比较方法（1024x600 与 1920x1080）
+2. TestCase 测试用例存储的加载和保存（1k~10k 条用例）
+3. /api/logs/vp180 接口与 /ws/logs 日志增量读取
+4. TestCaseExecutor 在模拟设备上的单步执行开销
+
+结果以JSON格式保存在 benchmarks/results 目录下，可与历史结果对比以发现性能回退。
+运行方式（在backend目录下）：
+    python -m benchmarks.run_benchmarks --quick
+"""
@@ -0,0 +1,104 @@
+"""
+执行历史查询基准测试
+
+生成一年（快速模式90天）的每日执行数据：每天每个测试用例执行一次，每次4个操作步骤和2个验证步骤，
+约5%的执行失败。写入临时数据库后测量常用的看板查询：分页执行列表、通过率趋势、最慢步骤和失败聚类。
+"""
+
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+from benchmarks.common import measure
+
+DAYS = 365
+QUICK_DAYS = 90
+CASES = 100
+PROJECTS = ('5604442429', '9493089662')
+OPERATION_KEYS = ('获取操作界面', '点击按钮', '等待时间', '点击按钮')
+VERIFICATION_KEYS = ('截图精准匹配', '文本识别验证')
+
+
+def make_day_runs(day, rng):
+    """生成某一天所有测试用例的执行数据"""
+    runs = []
+    for case_id in range(1, CASES + 1):
+        started = day + timedelta(hours=2, seconds=case_id * 30)
+        failed_position = 1 if rng.random() < 0.05 else None
+        steps = [
+            {'phase': 'operation', 'position': position, 'step_key': key, 'step_id': position + 1,
+             'success': True, 'duration_ms': rng.uniform(5, 50) * (10 if key == '等待时间' else 1), 'message': ''}
+            for position, key in enumerate(OPERATION_KEYS)
+        ] + [
+            {'phase': 'verification', 'position': position, 'step_key': key, 'step_id': position + 1,
+             'success': position != failed_position,
+             'duration_ms': rng.uniform(20, 200),
+             'message': '' if position != failed_position else f'识别结果不包含期望文本，置信度 {rng.random():.3f}'}
+            for position, key in enumerate(VERIFICATION_KEYS)
+        ]
+        runs.append({
+            'run_id': f"{started.strftime('%Y%m%d_%H%M%S_%f')}_{case_id}",
+            'test_case_id': case_id,
+            'project_id': PROJECTS[case_id % len(PROJECTS)],
+            'title': f'测试用例 {case_id}',
+            'started_at': started.isoformat(),
+            'finished_at': (started + timedelta(seconds=10)).isoformat(),
+            'success': failed_position is None,
+            'steps': steps,
+        })
+    return runs
+
+
+def run(quick=False):
+    """
+    运行执行历史查询基准测试
+
+    Args:
+        quick: 快速模式，只生成90天数据并减少重复次数
+
+    Returns:
+        dict: 测试项名称 -> 耗时统计
+    """
+    from models.execution_history import ExecutionHistory
+
+    days = QUICK_DAYS if quick else DAYS
+    repeat = 3 if quick else 5
+    results = {}
+    rng = random.Random(0)
+
+    temp_dir = tempfile.mkdtemp(prefix='vp180_bench_history_')
+    history = ExecutionHistory('sqlite:///' + os.path.join(temp_dir, 'history.db'))
+    try:
+        first_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+        batches = [make_day_runs(first_day + timedelta(days=offset), rng) for offset in range(days)]
+        results[f'history.record_runs.{CASES}'] = measure(
+            lambda: history.record_runs(batches.pop()), repeat=min(repeat, len(batches)), warmup=0)
+        for batch in batches:
+            history.record_runs(batch)
+
+        since = first_day.strftime('%Y-%m-%d')
+        label = f'{days}d'
+        first_page = history.list_runs(limit=50)
+        results[f'history.list_runs.first_page.{label}'] = measure(lambda: history.list_runs(limit=50), repeat=repeat)
+        results[f'history.list_runs.next_page.{label}'] = measure(
+            lambda: history.list_runs(limit=50, cursor=first_page['next_cursor']), repeat=repeat)
+        results[f'history.list_runs.case.{label}'] = measure(
+            lambda: history.list_runs(test_case_id=CASES // 2, limit=50), repeat=repeat)
+        results[f'history.trend.project_day.{label}'] = measure(
+            lambda: history.pass_rate_trend(project_id=PROJECTS[0], since=since), repeat=repeat)
+        results[f'history.trend.all_week.{label}'] = measure(
+            lambda: history.pass_rate_trend(bucket='week', since=since), repeat=repeat)
+        results[f'history.slowest_steps.{label}'] = measure(
+            lambda: history.slowest_steps(since=since), repeat=repeat)
+        results[f'history.failure_clusters.30d.{label}'] = measure(history.failure_clusters, repeat=repeat)
+        results[f'history.failure_clusters.all.{label}'] = measure(
+            lambda: history.failure_clusters(since=since), repeat=repeat)
+        run_id = first_page['runs'][0]['run_id']
+        results[f'history.get_run.{label}'] = measure(lambda: history.get_run(run_id), repeat=repeat)
+    finally:
+        history.dispose()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return results
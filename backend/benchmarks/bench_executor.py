@@ -0,0 +1,139 @@
+"""
+TestCaseExecutor 单步开销基准测试
+
+使用模拟设备（FakeSSHClient，所有命令立即返回）执行测试用例，
+测量执行器自身在每个操作步骤和验证步骤上的开销，不包含网络和设备耗时。
+步骤间隔 operation_interval 设置为0。验证步骤分别测量清空比较结果缓存后和缓存命中时的耗时。
+"""
+
+import os
+import json
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import cv2
+
+from benchmarks.common import measure, fake_device
+from benchmarks.bench_image_comparator import make_screen
+
+CLICK_STEPS = 50
+REFERENCE_NAME = 'bench_reference.png'
+
+
+@contextmanager
+def temp_workspace(reference_image):
+    """
+    创建临时的 backend/frontend 目录结构并切换工作目录
+
+    执行器按相对路径查找 data/img/operation_img 和 ../frontend/public/... 下的文件，
+    因此在临时的backend目录下运行，参考截图放在临时的frontend/public/screenshot/upload中；
+    执行记录、执行历史和采集图像索引也写入临时backend目录。
+    """
+    temp_dir = tempfile.mkdtemp(prefix='vp180_bench_executor_')
+    backend_dir = os.path.join(temp_dir, 'backend')
+    upload_dir = os.path.join(temp_dir, 'frontend', 'public', 'screenshot', 'upload')
+    os.makedirs(os.path.join(backend_dir, 'data', 'img', 'operation_img'))
+    os.makedirs(upload_dir)
+    cv2.imwrite(os.path.join(upload_dir, REFERENCE_NAME), reference_image)
+
+    # 执行记录和执行历史写入临时目录
+    import utils.run_records as run_records
+    import utils.test_case_executor as executor_module
+    from models.execution_history import ExecutionHistory
+    from utils.artifact_store import ArtifactStore
+    original_runs_dir = run_records.RUNS_DIR
+    original_history = executor_module.execution_history
+    original_artifacts = executor_module.artifact_store
+    run_records.RUNS_DIR = os.path.join(backend_dir, 'data', 'runs')
+    executor_module.execution_history = ExecutionHistory('sqlite:///' + os.path.join(backend_dir, 'data', 'app.db'))
+    executor_module.artifact_store = ArtifactStore(
+        root=os.path.join(backend_dir, 'data', 'artifacts'),
+        uri='sqlite:///' + os.path.join(backend_dir, 'data', 'app.db'),
+        data_dir=os.path.join(backend_dir, 'data'), capture_dirs=(), prune_interval=0)
+    # 执行记录的验证图像保存在同一个存储中
+    run_records.artifact_store = executor_module.artifact_store
+
+    original_cwd = os.getcwd()
+    os.chdir(backend_dir)
+    try:
+        yield backend_dir
+    finally:
+        os.chdir(original_cwd)
+        executor_module.execution_history.dispose()
+        executor_module.execution_history = original_history
+        executor_module.artifact_store.close()
+        executor_module.artifact_store = original_artifacts
+        run_records.artifact_store = original_artifacts
+        run_records.RUNS_DIR = original_runs_dir
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def make_click_case(step_count):
+    """生成包含step_count个点击步骤、没有验证步骤的测试用例"""
+    steps = [
+        {'id': i, 'operation_key': '点击按钮', 'button_name': '', 'x1': 100 + i, 'y1': 200, 'x2': 0, 'y2': 0}
+        for i in range(1, step_count + 1)
+    ]
+    return {
+        'id': 1,
+        'title': '基准测试用例',
+        # 需要项目ID才会创建ButtonClicker；项目不存在时使用默认分辨率
+        'project_id': 'benchmark',
+        'script_content': json.dumps({'repeatCount': 1, 'operationSteps': steps, 'verificationSteps': []}, ensure_ascii=False),
+    }
+
+
+def run(quick=False):
+    """
+    运行执行器基准测试
+
+    Args:
+        quick: 快速模式，减少重复次数
+
+    Returns:
+        dict: 测试项名称 -> 耗时统计（单步耗时）
+    """
+    from utils.test_case_executor import TestCaseExecutor
+    from utils.comparison_cache import comparison_cache
+
+    repeat = 3 if quick else 10
+    results = {}
+
+    reference = make_screen(1024, 600, seed=1)
+    capture = make_screen(1024, 600, seed=1, noise=4)
+
+    with fake_device(), temp_workspace(reference):
+        executor = TestCaseExecutor()
+        executor.set_operation_interval(0)
+
+        # 操作步骤：整条用例的耗时除以步骤数
+        click_case = make_click_case(CLICK_STEPS)
+        stats = measure(lambda: executor.execute_test_case(click_case), repeat=repeat)
+        results['executor.operation_step.click'] = {
+            key: (round(value / CLICK_STEPS, 4) if key.endswith('_ms') else value)
+            for key, value in stats.items()
+        }
+
+        wait_step = {'id': 1, 'operation_key': '等待时间', 'waitTimeMs': 0}
+        results['executor.operation_step.wait_0ms'] = measure(
+            lambda: executor._execute_operation_step(wait_step, '基准测试用例', 1), repeat=repeat * 10)
+
+        # 验证步骤：截图精准匹配，操作界面截图来自内存中的操作步骤数据
+        operation_data = {'1': {'image': capture}}
+        exact_step = {
+            'id': 1,
+            'verification_key': '截图精准匹配',
+            'reference_screenshot': REFERENCE_NAME,
+            'operation_screenshot': '1',
+            'threshold': 0.9,
+        }
+        # 比较结果缓存会命中重复的比较，未缓存的测试项每次运行前清空缓存，测量实际的比较开销；
+        # cached 测试项测量缓存命中时的开销
+        results['executor.verification_step.exact_match_1024x600'] = measure(
+            lambda _: executor._execute_verification_step(exact_step, operation_data),
+            repeat=repeat, setup=comparison_cache.clear)
+        results['executor.verification_step.exact_match_1024x600.cached'] = measure(
+            lambda: executor._execute_verification_step(exact_step, operation_data), repeat=repeat)
+
+    return results
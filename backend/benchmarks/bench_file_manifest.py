@@ -0,0 +1,79 @@
+"""
+文件列表基准测试
+
+在临时截图目录中生成10万（快速模式2万）个空图像文件，比较原先每次请求列出目录并读取每个文件信息的做法
+（listdir_stat）与文件清单（utils/file_manifest）的首次同步、目录未变化时的同步检查和分页查询的耗时。
+"""
+
+import os
+import shutil
+import tempfile
+
+from benchmarks.common import measure
+
+FILES = 100000
+QUICK_FILES = 20000
+CASES = 200
+PAGE_SIZE = 50
+
+
+def listdir_stat(directory):
+    """原先的列表做法：列出目录并读取每个图像文件的大小和修改时间"""
+    details = []
+    for name in os.listdir(directory):
+        if name.lower().endswith('.png'):
+            stat = os.stat(os.path.join(directory, name))
+            details.append((name, stat.st_size, stat.st_mtime))
+    return details
+
+
+def run(quick=False):
+    """
+    运行文件列表基准测试
+
+    Args:
+        quick: 快速模式，只生成2万个文件并减少重复次数
+
+    Returns:
+        dict: 测试项名称 -> 耗时统计
+    """
+    from utils.file_manifest import FileManifest
+
+    count = QUICK_FILES if quick else FILES
+    repeat = 3 if quick else 5
+    label = f'{count // 1000}k'
+    results = {}
+
+    temp_dir = tempfile.mkdtemp(prefix='vp180_bench_files_')
+    screenshots_dir = os.path.join(temp_dir, 'screenshots')
+    os.makedirs(screenshots_dir)
+    for index in range(count):
+        path = os.path.join(screenshots_dir, f'id_{index % CASES}_screenshot_{index:06d}.png')
+        open(path, 'wb').close()
+        os.utime(path, (1700000000 + index, 1700000000 + index))
+    manifest = FileManifest('sqlite:///' + os.path.join(temp_dir, 'app.db'), {'screenshots': screenshots_dir})
+    kinds = ['screenshots']
+    try:
+        results[f'files.listdir_stat.{label}'] = measure(lambda: listdir_stat(screenshots_dir), repeat=repeat)
+        results[f'files.manifest.initial_sync.{label}'] = measure(
+            lambda: manifest.sync(kinds), repeat=1, warmup=0)
+        results[f'files.manifest.sync_unchanged.{label}'] = measure(lambda: manifest.sync(kinds), repeat=repeat)
+        first_page = manifest.query(kinds, limit=PAGE_SIZE)
+        results[f'files.manifest.first_page.{label}'] = measure(
+            lambda: manifest.query(kinds, limit=PAGE_SIZE), repeat=repeat)
+        results[f'files.manifest.next_page.{label}'] = measure(
+            lambda: manifest.query(kinds, limit=PAGE_SIZE, cursor=first_page['next_cursor']), repeat=repeat)
+        results[f'files.manifest.case_page.{label}'] = measure(
+            lambda: manifest.query(kinds, test_case_id=CASES // 2, limit=PAGE_SIZE), repeat=repeat)
+        new_path = os.path.join(screenshots_dir, 'id_1_screenshot_new.png')
+
+        def record():
+            open(new_path, 'wb').close()
+            manifest.record(new_path)
+
+        results[f'files.manifest.record.{label}'] = measure(record, repeat=repeat)
+    finally:
+        manifest.dispose()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return results
@@ -0,0 +1,128 @@
+"""
+ImageComparator 基准测试
+
+在 1024x600 和 1920x1080 两种分辨率下，测量 ImageComparator 各比较方法的耗时。
+测试图像为合成的界面图：色块、文字和轻微噪声，尽量接近设备操作界面截图。
+"""
+
+import numpy as np
+import cv2
+
+from benchmarks.common import measure
+
+RESOLUTIONS = {
+    '1024x600': (1024, 600),
+    '1920x1080': (1920, 1080),
+}
+# 批量比较使用的候选参考图数量
+BATCH_REFERENCES = 8
+# 额外记录峰值内存的方法，与比较工作区的结果对照
+TRACE_MEMORY = ('is_ssim', 'color_difference', 'edge_detection_comparison', 'contrast_comparison')
+
+
+def make_screen(width, height, seed=0, noise=0):
+    """
+    生成合成的界面截图
+
+    Args:
+        width: 图像宽度
+        height: 图像高度
+        seed: 随机种子，相同种子生成相同布局
+        noise: 叠加的高斯噪声标准差
+
+    Returns:
+        numpy.ndarray: BGR图像
+    """
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 30, dtype=np.uint8)
+    for _ in range(40):
+        x1, y1 = int(rng.integers(0, width - 20)), int(rng.integers(0, height - 20))
+        x2 = min(width - 1, x1 + int(rng.integers(20, width // 4)))
+        y2 = min(height - 1, y1 + int(rng.integers(20, height // 4)))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, -1)
+    for i in range(12):
+        org = (int(rng.integers(0, width - 200)), int(rng.integers(30, height - 10)))
+        cv2.putText(image, f"VP180 {i:02d}", org, cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+    if noise:
+        jitter = rng.normal(0, noise, image.shape)
+        image = np.clip(image.astype(np.float32) + jitter, 0, 255).astype(np.uint8)
+    return image
+
+
+def run(quick=False):
+    """
+    运行ImageComparator基准测试
+
+    Args:
+        quick: 快速模式，减少重复次数
+
+    Returns:
+        dict: 测试项名称 -> 耗时统计
+    """
+    from utils.image_comparator import ImageComparator
+    from utils.reference_cache import ReferenceVariant
+    from utils.batch_comparator import BatchComparator
+    from utils.comparator_workspace import get_workspace
+
+    repeat = 3 if quick else 10
+    results = {}
+
+    for label, (width, height) in RESOLUTIONS.items():
+        reference = make_screen(width, height, seed=1)
+        capture = make_screen(width, height, seed=1, noise=4)
+        # 模板取界面中间的一块区域，模拟截图包含匹配中的参考内容
+        template = capture[height // 3:height // 3 + height // 5, width // 3:width // 3 + width // 5].copy()
+
+        cases = {
+            'is_ssim': lambda: ImageComparator.is_ssim(capture, reference),
+            'is_orb': lambda: ImageComparator.is_orb(capture, reference),
+            'histogram_comparison': lambda: ImageComparator.histogram_comparison(capture, reference),
+            'color_difference': lambda: ImageComparator.color_difference(capture, reference),
+            'template_matching': lambda: ImageComparator.template_matching(capture, template),
+            'edge_detection_comparison': lambda: ImageComparator.edge_detection_comparison(capture, reference),
+            'brightness_difference': lambda: ImageComparator.brightness_difference(capture, reference),
+            'contrast_comparison': lambda: ImageComparator.contrast_comparison(capture, reference),
+            'texture_comparison': lambda: ImageComparator.texture_comparison(capture, reference),
+        }
+        # 金字塔模板匹配：大模板和小图标
+        icon = capture[height - height // 5:height - height // 5 + 48, width - width // 5:width - width // 5 + 48].copy()
+        cases['template_matching_pyramid'] = lambda: ImageComparator.template_matching_pyramid(capture, template)
+        cases['template_matching_icon'] = lambda: ImageComparator.template_matching(capture, icon)
+        cases['template_matching_pyramid_icon'] = lambda: ImageComparator.template_matching_pyramid(capture, icon)
+        # 金字塔SSIM：相同图像（低分辨率层之后仍需原始分辨率确认）、明显不同（提前拒绝）
+        different = make_screen(width, height, seed=2)
+        cases['ssim_pyramid_clear_pass'] = lambda: ImageComparator.ssim_pyramid(reference, reference, threshold=0.9)
+        cases['ssim_pyramid_clear_fail'] = lambda: ImageComparator.ssim_pyramid(capture, different, threshold=0.9)
+
+        # 参考图统计量已缓存时的SSIM：只计算截图一侧
+        reference_variant = ReferenceVariant(reference)
+        reference_variant.compute_ssim_stats()
+        cases['is_ssim_reference'] = lambda: ImageComparator.is_ssim_reference(capture, reference_variant)
+
+        # 一张截图对比多张候选参考图：逐张调用 is_ssim 与批量比较
+        candidates = [make_screen(width, height, seed=seed) for seed in range(1, BATCH_REFERENCES + 1)]
+        cases[f'is_ssim_loop_{BATCH_REFERENCES}refs'] = lambda: [ImageComparator.is_ssim(capture, c) for c in candidates]
+        cases[f'batch_ssim_{BATCH_REFERENCES}refs'] = lambda: BatchComparator(capture).compare(candidates, method='ssim')
+
+        # 综合分析：一次计算六项指标，与逐项调用六个方法对比
+        separate_methods = ('histogram_comparison', 'color_difference', 'brightness_difference',
+                            'contrast_comparison', 'texture_comparison', 'edge_detection_comparison')
+        cases['six_metrics_separate'] = lambda: [getattr(ImageComparator, m)(capture, reference) for m in separate_methods]
+        cases['analyze_six_metrics'] = lambda: ImageComparator.analyze(capture, reference)
+
+        for method, func in cases.items():
+            results[f'comparator.{method}.{label}'] = measure(func, repeat=repeat, trace_memory=method in TRACE_MEMORY)
+
+        # 预分配缓冲区的比较工作区，与上面对应的 ImageComparator 方法对比耗时和峰值内存
+        workspace = get_workspace(width, height)
+        workspace_cases = {
+            'workspace.ssim': lambda: workspace.ssim(capture, reference),
+            'workspace.color_difference': lambda: workspace.color_difference(capture, reference),
+            'workspace.edge_similarity': lambda: workspace.edge_similarity(capture, reference),
+            'workspace.contrast_similarity': lambda: workspace.contrast_similarity(capture, reference),
+        }
+        for method, func in workspace_cases.items():
+            results[f'comparator.{method}.{label}'] = measure(func, repeat=repeat, trace_memory=True)
+
+    return results
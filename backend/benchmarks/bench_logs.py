@@ -0,0 +1,110 @@
+"""
+日志接口基准测试
+
+1. /api/logs/vp180：读取并解析一个约10MB的VP_180.log，以及gzip压缩后的响应和文件未变化时的304响应
+2. /ws/logs 的增量读取循环：每轮追加一批日志后调用 LogTailer 读取并解析，
+   同时测量文件无变化时的空轮询开销
+日志文件写在临时目录，不影响 data/logs/VP_180.log。
+"""
+
+import os
+import shutil
+import tempfile
+
+from benchmarks.common import measure
+
+LOG_SIZE_BYTES = 10 * 1024 * 1024
+QUICK_LOG_SIZE_BYTES = 2 * 1024 * 1024
+APPEND_LINES = 200
+
+LEVELS = ('INFO', 'DEBUG', 'WARNING', 'ERROR')
+
+
+def make_log_line(index):
+    """生成一行与setup_logger格式一致的日志"""
+    level = LEVELS[index % len(LEVELS)]
+    return f"2025-04-23 16:55:{index % 60:02d},123 - {level} - utils.test_case_executor - 当前执行步骤：点击按钮 (ID: {index})\n"
+
+
+def write_log(path, size_bytes):
+    """写入指定大小的日志文件"""
+    written = 0
+    index = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < size_bytes:
+            chunk = ''.join(make_log_line(index + i) for i in range(1000))
+            f.write(chunk)
+            written += len(chunk.encode('utf-8'))
+            index += 1000
+
+
+def run(quick=False):
+    """
+    运行日志接口基准测试
+
+    Args:
+        quick: 快速模式，使用2MB日志并减少重复次数
+
+    Returns:
+        dict: 测试项名称 -> 耗时统计
+    """
+    from flask import Flask
+    from routes.logs import logs_bp
+    from utils.log_stream import LogTailer
+    from utils.http_cache import init_http_cache
+
+    repeat = 3 if quick else 5
+    size_bytes = QUICK_LOG_SIZE_BYTES if quick else LOG_SIZE_BYTES
+    size_label = f'{size_bytes // (1024 * 1024)}mb'
+    results = {}
+
+    temp_dir = tempfile.mkdtemp(prefix='vp180_bench_logs_')
+    try:
+        log_dir = os.path.join(temp_dir, 'logs')
+        os.makedirs(log_dir)
+        log_path = os.path.join(log_dir, 'VP_180.log')
+        write_log(log_path, size_bytes)
+
+        # /api/logs/vp180
+        app = Flask(__name__)
+        app.config['DATA_DIR'] = temp_dir
+        app.register_blueprint(logs_bp)
+        init_http_cache(app)
+        client = app.test_client()
+
+        def fetch_log(headers=None, status=200):
+            response = client.get('/api/logs/vp180', headers=headers)
+            assert response.status_code == status
+            return response.get_data()
+
+        results[f'logs.api_vp180.{size_label}'] = measure(fetch_log, repeat=repeat)
+        results[f'logs.api_vp180_gzip.{size_label}'] = measure(
+            lambda: fetch_log({'Accept-Encoding': 'gzip'}), repeat=repeat)
+        etag = client.get('/api/logs/vp180').headers['ETag']
+        results[f'logs.api_vp180_not_modified.{size_label}'] = measure(
+            lambda: fetch_log({'If-None-Match': etag}, status=304), repeat=repeat * 4)
+
+        # /ws/logs 增量读取：每轮追加APPEND_LINES行后读取
+        tailer = LogTailer(log_path)
+        counter = {'index': 0}
+
+        def append_lines():
+            start = counter['index']
+            with open(log_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(make_log_line(start + i) for i in range(APPEND_LINES)))
+            counter['index'] += APPEND_LINES
+            return tailer.stat()
+
+        def poll(current):
+            if tailer.has_changed(current):
+                tailer.read_new(current)
+
+        results[f'logs.ws_tail_poll.{APPEND_LINES}_lines'] = measure(poll, repeat=repeat * 4, setup=append_lines)
+
+        # 文件无变化时的空轮询
+        tailer.mark_seen()
+        results['logs.ws_tail_poll.idle'] = measure(lambda: poll(tailer.stat()), repeat=repeat * 20)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return results
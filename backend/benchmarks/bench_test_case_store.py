@@ -0,0 +1,118 @@
+"""
+TestCase 存储基准测试
+
+在 1k/5k/10k 条测试用例规模下，分别测量 JSON 存储（TestCase.load/save，load 分为命中内存缓存和
+重新读取文件两种情况）和 SQLite 存储
+（导入、get_all）的耗时，以及两种存储下常用的 get_by_id、update_status 和列表分页查询的耗时。
+测试数据写入临时目录，不影响 data/test_cases.json 和 data/app.db。
+"""
+
+import os
+import json
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from benchmarks.common import measure
+
+SIZES = (1000, 5000, 10000)
+QUICK_SIZES = (1000,)
+# 列表页的典型查询：按项目过滤、按创建时间倒序、每页50条、不返回 script_content
+LIST_PAGE_QUERY = {'project_id': '5604442429', 'sort': 'create_time', 'descending': True, 'limit': 50,
+                   'fields': ['title', 'type', 'status', 'create_time', 'last_execution_time']}
+
+
+def make_test_cases(count):
+    """生成指定数量的测试用例数据，结构与前端保存的测试用例一致"""
+    cases = []
+    for case_id in range(1, count + 1):
+        script = {
+            'repeatCount': 1,
+            'operationSteps': [
+                {'id': 1, 'operation_key': '获取操作界面', 'button_name': '', 'x1': 0, 'y1': 0, 'x2': 0, 'y2': 0, 'stepType': 'test-case'},
+                {'id': 2, 'operation_key': '点击按钮', 'button_name': '', 'x1': 100, 'y1': 200, 'x2': 0, 'y2': 0, 'stepType': 'test-case'},
+            ],
+            'verificationSteps': [
+                {'id': 1, 'verification_key': '截图精准匹配', 'reference_screenshot': f'screen_capture_{case_id}.png', 'operation_screenshot': '1'},
+            ],
+        }
+        cases.append({
+            'id': case_id,
+            'title': f'测试用例 {case_id}',
+            'type': '功能测试',
+            'status': '未运行',
+            'create_time': '2025-06-26 16:40',
+            'last_execution_time': '',
+            'description': '',
+            'script_content': json.dumps(script, ensure_ascii=False),
+            'serial_connect': False,
+            'project_name': 'VP-180',
+            'project_id': '5604442429',
+        })
+    return cases
+
+
+@contextmanager
+def temp_store(backend='json'):
+    """把TestCase的数据文件和数据库临时指向临时目录，并使用指定的存储（json 或 sqlite）"""
+    import models.test_case as test_case_module
+    from models.test_case_db import SQLiteTestCaseStore
+
+    temp_dir = tempfile.mkdtemp(prefix='vp180_bench_store_')
+    original_file = test_case_module.TEST_CASES_FILE
+    original_store = test_case_module.TestCase._store
+    test_case_module.TEST_CASES_FILE = os.path.join(temp_dir, 'test_cases.json')
+    if backend == 'sqlite':
+        store = SQLiteTestCaseStore(uri='sqlite:///' + os.path.join(temp_dir, 'app.db'),
+                                    json_file=test_case_module.TEST_CASES_FILE)
+    else:
+        store = test_case_module.JSONTestCaseStore()
+    test_case_module.TestCase._store = store
+    test_case_module.TestCase.invalidate_cache()
+    try:
+        yield test_case_module.TestCase
+    finally:
+        if backend == 'sqlite':
+            store.dispose()
+        test_case_module.TestCase.close_journal()
+        test_case_module.TEST_CASES_FILE = original_file
+        test_case_module.TestCase._store = original_store
+        test_case_module.TestCase.invalidate_cache()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def run(quick=False):
+    """
+    运行TestCase存储基准测试
+
+    Args:
+        quick: 快速模式，只测试1k规模并减少重复次数
+
+    Returns:
+        dict: 测试项名称 -> 耗时统计
+    """
+    repeat = 3 if quick else 5
+    results = {}
+
+    for size in (QUICK_SIZES if quick else SIZES):
+        cases = make_test_cases(size)
+        middle_id = size // 2
+        with temp_store('json') as TestCase:
+            results[f'store.save.{size}'] = measure(lambda: TestCase.save(cases), repeat=repeat)
+            results[f'store.load.{size}'] = measure(TestCase.load, repeat=repeat)
+            results[f'store.load_uncached.{size}'] = measure(
+                lambda: (TestCase.invalidate_cache(), TestCase.load()), repeat=repeat)
+            results[f'store.get_by_id.{size}'] = measure(lambda: TestCase.get_by_id(middle_id), repeat=repeat)
+            results[f'store.update_status.{size}'] = measure(lambda: TestCase.update_status(middle_id, '通过'), repeat=repeat)
+            results[f'store.query.list_page.{size}'] = measure(lambda: TestCase.query(**LIST_PAGE_QUERY), repeat=repeat)
+
+        with temp_store('sqlite') as TestCase:
+            TestCase.save(cases)
+            store = TestCase.store()
+            results[f'store.sqlite.import.{size}'] = measure(store.import_json, repeat=repeat, warmup=0)
+            results[f'store.sqlite.get_all.{size}'] = measure(TestCase.get_all, repeat=repeat)
+            results[f'store.sqlite.get_by_id.{size}'] = measure(lambda: TestCase.get_by_id(middle_id), repeat=repeat)
+            results[f'store.sqlite.update_status.{size}'] = measure(lambda: TestCase.update_status(middle_id, '通过'), repeat=repeat)
+            results[f'store.sqlite.query.list_page.{size}'] = measure(lambda: TestCase.query(**LIST_PAGE_QUERY), repeat=repeat)
+
+    return results
@@ -0,0 +1,254 @@
+"""
+基准测试公共工具
+
+该模块提供各基准测试共用的功能。主要功能包括：
+1. 计时并统计多次运行的耗时，可选记录峰值内存
+2. 模拟设备的SSH客户端（不连接真实设备）
+3. 结果的保存、加载与回退对比
+4. 降低被测模块的日志级别，避免日志输出影响计时
+
+主要函数：
+- measure: 多次运行函数并返回耗时统计
+- fake_device: 临时把SSHManager替换为模拟设备的上下文管理器
+- compare_results: 对比两次结果，找出变慢的项目
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import statistics
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# 添加backend目录到Python路径，保证 `from config import ...` 等导入可用
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def quiet_loggers(level=logging.WARNING):
+    """
+    屏蔽低于指定级别的日志，避免INFO日志写入VP_180.log并影响计时
+
+    setup_logger 在模块导入时会把日志级别重新设为INFO，
+    因此这里使用 logging.disable 全局屏蔽，而不是逐个修改日志记录器的级别。
+    """
+    logging.disable(level - 1)
+
+
+def measure(func: Callable, repeat: int = 5, warmup: int = 1, setup: Optional[Callable] = None,
+            trace_memory: bool = False) -> Dict:
+    """
+    多次运行函数并统计耗时
+
+    Args:
+        func: 被测函数，无参数；如果提供了setup，则接收setup的返回值
+        repeat: 计时运行次数
+        warmup: 预热运行次数（不计时）
+        setup: 每次运行前调用的准备函数（不计时）
+        trace_memory: 是否额外运行一次并用tracemalloc记录峰值内存（NumPy数组的分配会被统计，
+                      OpenCV内部的分配不会）
+
+    Returns:
+        dict: 包含 runs/min_ms/median_ms/mean_ms/max_ms 的统计结果，trace_memory为True时另有 peak_kb
+    """
+    def run_once():
+        if setup is not None:
+            arg = setup()
+            start = time.perf_counter()
+            func(arg)
+        else:
+            start = time.perf_counter()
+            func()
+        return (time.perf_counter() - start) * 1000.0
+
+    for _ in range(warmup):
+        run_once()
+
+    timings = [run_once() for _ in range(max(1, repeat))]
+    stats = {
+        'runs': len(timings),
+        'min_ms': round(min(timings), 4),
+        'median_ms': round(statistics.median(timings), 4),
+        'mean_ms': round(statistics.mean(timings), 4),
+        'max_ms': round(max(timings), 4),
+    }
+    if trace_memory:
+        # 单独运行一次记录峰值内存，tracemalloc本身会拖慢运行，不计入耗时统计
+        tracemalloc.start()
+        try:
+            run_once()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        stats['peak_kb'] = round(peak / 1024.0, 1)
+    return stats
+
+
+class _FakeStream:
+    """模拟paramiko的ChannelFile，只返回预设的输出"""
+
+    def __init__(self, data=b''):
+        self._data = data
+
+    def read(self, *args):
+        return self._data
+
+    def readline(self, *args):
+        return self._data.decode()
+
+
+class FakeSSHClient:
+    """
+    模拟设备的SSH客户端
+
+    所有命令立即成功返回，用于测量执行器自身的开销（不包含网络和设备耗时）。
+    """
+
+    def __init__(self, outputs: Optional[Dict[str, bytes]] = None):
+        self.outputs = outputs or {}
+        self.commands: List[str] = []
+
+    def exec_command(self, command, timeout=None, **kwargs):
+        self.commands.append(command)
+        output = b''
+        for prefix, data in self.outputs.items():
+            if command.startswith(prefix):
+                output = data
+                break
+        return _FakeStream(), _FakeStream(output), _FakeStream()
+
+    def get_transport(self):
+        return None
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def fake_device(client: Optional[FakeSSHClient] = None):
+    """
+    临时把SSHManager的连接替换为模拟设备
+
+    Args:
+        client: 模拟SSH客户端，默认新建一个FakeSSHClient
+
+    Yields:
+        FakeSSHClient: 正在使用的模拟客户端
+    """
+    from utils.ssh_manager import SSHManager
+
+    client = client or FakeSSHClient()
+
+    class _FakeManager:
+        _ssh_client = client
+
+        def connect(self):
+            return client
+
+        def execute_command(self, command, timeout=None):
+            client.exec_command(command, timeout=timeout)
+            return ''
+
+    original_get_instance = SSHManager.__dict__['get_instance']
+    original_get_client = SSHManager.__dict__['get_client']
+    fake_manager = _FakeManager()
+    SSHManager.get_instance = classmethod(lambda cls: fake_manager)
+    SSHManager.get_client = classmethod(lambda cls: client)
+    try:
+        yield client
+    finally:
+        SSHManager.get_instance = original_get_instance
+        SSHManager.get_client = original_get_client
+
+
+def environment_info() -> Dict:
+    """收集运行环境信息，便于解释不同机器之间的差异"""
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+    try:
+        import numpy
+        info['numpy'] = numpy.__version__
+    except ImportError:
+        pass
+    try:
+        import cv2
+        info['opencv'] = cv2.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def save_results(results: Dict, output_path: Optional[str] = None) -> str:
+    """
+    保存基准测试结果为JSON
+
+    Args:
+        results: 各测试项的统计结果
+        output_path: 输出文件路径，默认保存到results目录并以时间命名
+
+    Returns:
+        str: 实际保存的文件路径
+    """
+    if not output_path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+
+    payload = {
+        'generated_at': datetime.now().isoformat(),
+        'environment': environment_info(),
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    return output_path
+
+
+def load_results(path: str) -> Dict:
+    """加载之前保存的基准测试结果，返回 results 部分"""
+    with open(path, 'r', encoding='utf-8') as f:
+        payload = json.load(f)
+    return payload.get('results', payload)
+
+
+def compare_results(current: Dict, baseline: Dict, tolerance: float = 0.25, metric: str = 'median_ms') -> List[Dict]:
+    """
+    对比当前结果与基线结果
+
+    Args:
+        current: 当前结果
+        baseline: 基线结果
+        tolerance: 允许的变慢比例，0.25表示慢25%以内不算回退
+        metric: 对比的统计指标
+
+    Returns:
+        list: 所有测试项的对比记录，regression为True表示超出容忍范围
+    """
+    comparisons = []
+    for name, stats in sorted(current.items()):
+        base = baseline.get(name)
+        if not base or metric not in base or metric not in stats:
+            continue
+        base_value = base[metric]
+        value = stats[metric]
+        ratio = value / base_value if base_value else 1.0
+        comparisons.append({
+            'name': name,
+            'baseline': base_value,
+            'current': value,
+            'ratio': round(ratio, 3),
+            'regression': ratio > 1.0 + tolerance,
+        })
+    return comparisons
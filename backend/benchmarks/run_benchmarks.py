@@ -0,0 +1,99 @@
+"""
+基准测试入口
+
+运行全部或部分基准测试，把结果保存为JSON，并可与基线结果对比。
+
+用法（在backend目录下）：
+    python -m benchmarks.run_benchmarks                       # 运行全部
+    python -m benchmarks.run_benchmarks --suite comparator    # 只运行图像比较
+    python -m benchmarks.run_benchmarks --quick --baseline benchmarks/results/baseline.json
+
+存在超出容忍范围的回退时，以退出码1结束，便于在部署前的检查脚本中使用。
+"""
+
+import os
+import sys
+import argparse
+
+if __package__ in (None, ''):
+    # 允许直接以脚本方式运行: python benchmarks/run_benchmarks.py
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import quiet_loggers, save_results, load_results, compare_results
+
+SUITES = {
+    'comparator': 'benchmarks.bench_image_comparator',
+    'store': 'benchmarks.bench_test_case_store',
+    'logs': 'benchmarks.bench_logs',
+    'executor': 'benchmarks.bench_executor',
+    'history': 'benchmarks.bench_execution_history',
+    'files': 'benchmarks.bench_file_manifest',
+}
+
+
+def run_suites(names, quick=False):
+    """
+    依次运行指定的基准测试
+
+    Args:
+        names: 基准测试名称列表
+        quick: 是否使用快速模式
+
+    Returns:
+        dict: 所有测试项的结果
+    """
+    import importlib
+
+    quiet_loggers()
+    results = {}
+    for name in names:
+        module = importlib.import_module(SUITES[name])
+        print(f"运行基准测试: {name} ...", flush=True)
+        suite_results = module.run(quick=quick)
+        for key, stats in suite_results.items():
+            memory = f", peak {stats['peak_kb']:.1f} KB" if 'peak_kb' in stats else ''
+            print(f"  {key:<60} median {stats['median_ms']:>10.3f} ms  (min {stats['min_ms']:.3f}, runs {stats['runs']}{memory})")
+        results.update(suite_results)
+    return results
+
+
+def main():
+    """主函数，处理命令行参数并运行基准测试"""
+    parser = argparse.ArgumentParser(description='VP180 后端性能基准测试')
+    parser.add_argument('-s', '--suite', action='append', choices=sorted(SUITES),
+                        help='要运行的基准测试，可重复指定 (默认: 全部)')
+    parser.add_argument('-q', '--quick', action='store_true',
+                        help='快速模式：减小数据规模和重复次数')
+    parser.add_argument('-o', '--output',
+                        help='结果输出文件 (默认: benchmarks/results/bench_<时间>.json)')
+    parser.add_argument('-b', '--baseline',
+                        help='用于对比的基线结果文件')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.25,
+                        help='允许的变慢比例 (默认: 0.25，即慢25%%以内不算回退)')
+
+    args = parser.parse_args()
+    names = args.suite or list(SUITES)
+
+    results = run_suites(names, quick=args.quick)
+    output_path = save_results(results, args.output)
+    print(f"结果已保存到: {output_path}")
+
+    if not args.baseline:
+        return 0
+
+    comparisons = compare_results(results, load_results(args.baseline), tolerance=args.tolerance)
+    regressions = [c for c in comparisons if c['regression']]
+    print(f"与基线对比: {args.baseline} (容忍度 {args.tolerance:.0%})")
+    for c in comparisons:
+        flag = '回退' if c['regression'] else '正常'
+        print(f"  [{flag}] {c['name']:<60} {c['baseline']:>10.3f} -> {c['current']:>10.3f} ms  (x{c['ratio']})")
+
+    if regressions:
+        print(f"发现 {len(regressions)} 项性能回退")
+        return 1
+    print("未发现性能回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -53,6 +53,55 @@ for directory in (DATA_DIR, LOGS_DIR, IMAGES_DIR, SCREENSHOTS_DIR, OPERATION_IMA
 
 # 默认数据库配置
 DATABASE_URI = os.getenv('DATABASE_URI', 'sqlite:///' + os.path.join(DATA_DIR, 'app.db'))
+# 测试用例存储：sqlite（保存在 DATABASE_URI，首次使用时从 TEST_CASES_FILE 导入）或 json（直接读写 TEST_CASES_FILE）
+TEST_CASE_STORE = os.getenv('TEST_CASE_STORE', 'sqlite').lower()
+# JSON存储的状态更新日志：状态更新先追加到日志文件，每隔 FSYNC_INTERVAL 秒统一fsync一次，
+# 累计 COMPACT_ENTRIES 条或距上次合并超过 COMPACT_INTERVAL 秒后在后台合并回 TEST_CASES_FILE
+STATUS_JOURNAL_FSYNC_INTERVAL = float(os.getenv('STATUS_JOURNAL_FSYNC_INTERVAL', 0.2))
+STATUS_JOURNAL_COMPACT_ENTRIES = int(os.getenv('STATUS_JOURNAL_COMPACT_ENTRIES', 200))
+STATUS_JOURNAL_COMPACT_INTERVAL = float(os.getenv('STATUS_JOURNAL_COMPACT_INTERVAL', 30))
+
+# 参考图像缓存上限（MB），按缓存中图像和SSIM统计量实际占用的内存计算
+REFERENCE_CACHE_MAX_MB = int(os.getenv('REFERENCE_CACHE_MAX_MB', 256))
+
+# 图像比较结果缓存的最大条目数；设置 COMPARISON_CACHE_FILE 后缓存会持久化到该JSON文件
+COMPARISON_CACHE_MAX_ENTRIES = int(os.getenv('COMPARISON_CACHE_MAX_ENTRIES', 4096))
+COMPARISON_CACHE_FILE = os.getenv('COMPARISON_CACHE_FILE', '')
+
+# 执行记录目录：每次执行的验证原始得分和截图保存在这里，用于离线重新验证
+RUNS_DIR = os.path.join(DATA_DIR, 'runs')
+# 采集图像的内容寻址存储：operation_img、display_img、screenshots 中的图像按内容哈希保存在 ARTIFACTS_DIR，
+# 原文件名为指向同一份内容的硬链接；执行记录（RUNS_DIR）的验证图像也保存在这里。
+# 后台每隔 ARTIFACT_PRUNE_INTERVAL 秒（0表示不在后台清理）按保留规则清理：
+# 每个测试用例保留最近 ARTIFACT_KEEP_RUNS 次执行的图像和执行记录，失败执行至少保留 ARTIFACT_KEEP_FAILED_DAYS 天，
+# 总大小超过 ARTIFACT_QUOTA_MB（0表示不限制）时从最旧的通过执行开始删除
+ARTIFACTS_DIR = os.path.join(DATA_DIR, 'artifacts')
+ARTIFACT_KEEP_RUNS = int(os.getenv('ARTIFACT_KEEP_RUNS', 20))
+ARTIFACT_KEEP_FAILED_DAYS = float(os.getenv('ARTIFACT_KEEP_FAILED_DAYS', 30))
+ARTIFACT_QUOTA_MB = int(os.getenv('ARTIFACT_QUOTA_MB', 2048))
+ARTIFACT_PRUNE_INTERVAL = float(os.getenv('ARTIFACT_PRUNE_INTERVAL', 600))
+# 图像缩略图：文件服务接口带 w（宽度）/fmt（webp、jpeg、png）参数时返回缩小的图像，由 THUMBNAIL_WORKERS 个
+# 后台线程生成，按源图像内容哈希缓存在 THUMBNAILS_DIR，总大小超过 THUMBNAIL_CACHE_MB 时删除最早生成的缩略图
+THUMBNAILS_DIR = os.path.join(DATA_DIR, 'thumbnails')
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+THUMBNAIL_CACHE_MB = int(os.getenv('THUMBNAIL_CACHE_MB', 512))
+# 离线重新验证使用的进程数上限，0表示使用CPU核数；请求中的 workers 不能超过该值。
+# 超过 REVERIFY_SYNC_MAX_RUNS 次执行（或未限制数量）的重新验证在后台任务中运行，接口立即返回任务ID
+REVERIFY_WORKERS = int(os.getenv('REVERIFY_WORKERS', 0))
+REVERIFY_SYNC_MAX_RUNS = int(os.getenv('REVERIFY_SYNC_MAX_RUNS', 20))
+
+# OCR服务：常驻PaddleOCR引擎的工作进程数（0表示在当前进程中加载一个引擎）；
+# OCR_WARMUP 为true时服务启动后立即在后台加载引擎，否则在首次识别时加载
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', 1))
+OCR_LANG = os.getenv('OCR_LANG', 'ch')
+OCR_WARMUP = os.getenv('OCR_WARMUP', 'false').lower() in ('true', '1', 't')
+
+# 字形模板快速识别：字形集保存目录，识别置信度低于 GLYPH_MIN_CONFIDENCE 时退回PaddleOCR
+GLYPHS_DIR = os.path.join(DATA_DIR, 'glyphs')
+GLYPH_MIN_CONFIDENCE = float(os.getenv('GLYPH_MIN_CONFIDENCE', 0.8))
+
+# JSON等文本响应超过该大小（字节）时按 Accept-Encoding 压缩（安装 brotli 包后优先使用brotli，否则gzip）
+HTTP_COMPRESS_MIN_BYTES = int(os.getenv('HTTP_COMPRESS_MIN_BYTES', 1024))
 
 # 日志配置
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -0,0 +1,484 @@
+"""
+执行历史数据库 - 保存每次测试用例执行及其各步骤的耗时和结果，支持趋势和统计查询
+
+/api/reports/save 只覆盖保存一份 report.json，执行记录（utils/run_records）只保存验证步骤的图像和得分。
+该模块把每次执行写入数据库（与测试用例同一个 DATABASE_URI，WAL模式）：
+- executions: 每次执行一行，按 (test_case_id, started_at)、(project_id, started_at)、started_at 建有索引
+- execution_steps: 每个操作/验证/清理步骤一行，包含耗时、结果、消息和失败特征（消息中的数字替换为#）
+- execution_daily / project_daily: 按天、测试用例（或项目）汇总的执行数、通过数和耗时
+- step_daily / step_monthly: 按天、按月汇总的步骤执行数、失败数和耗时
+汇总表在写入执行时同步累加。
+
+通过率趋势和最慢步骤只读取汇总表（跨度长的最慢步骤查询中整月的部分读取按月汇总表）；
+执行列表按 (started_at, run_id) 游标分页，失败聚类使用只包含失败步骤的部分索引。
+
+主要类：
+- ExecutionHistory: 执行历史，全局实例为 execution_history
+"""
+import logging
+import re
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    Boolean, Column, Float, Index, Integer, MetaData, String, Table, Text, and_, delete, func, or_, select, union_all
+)
+from sqlalchemy.dialects.sqlite import insert
+
+from config import DATABASE_URI
+from models.test_case_db import create_sqlite_engine
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+executions_table = Table(
+    'executions', metadata,
+    Column('run_id', String, primary_key=True),
+    Column('test_case_id', Integer),
+    Column('project_id', String, nullable=False, default=''),
+    Column('title', String, nullable=False, default=''),
+    Column('run_index', Integer, nullable=False, default=0),
+    Column('started_at', String, nullable=False),
+    Column('finished_at', String, nullable=False, default=''),
+    Column('duration_ms', Float, nullable=False, default=0),
+    Column('success', Boolean, nullable=False),
+    Index('ix_executions_started_at', 'started_at'),
+    Index('ix_executions_case_started', 'test_case_id', 'started_at'),
+    Index('ix_executions_project_started', 'project_id', 'started_at'),
+)
+
+steps_table = Table(
+    'execution_steps', metadata,
+    Column('run_id', String, primary_key=True),
+    # operation / verification / cleanup
+    Column('phase', String, primary_key=True),
+    Column('position', Integer, primary_key=True),
+    Column('step_key', String, nullable=False, default=''),
+    Column('step_id', String, nullable=False, default=''),
+    Column('success', Boolean, nullable=False),
+    Column('duration_ms', Float, nullable=False, default=0),
+    Column('message', Text, nullable=False, default=''),
+    Column('failure_signature', String, nullable=False, default=''),
+)
+Index('ix_execution_steps_failed', steps_table.c.step_key, steps_table.c.failure_signature,
+      sqlite_where=steps_table.c.success == False)  # noqa: E712
+
+execution_daily_table = Table(
+    'execution_daily', metadata,
+    Column('day', String, primary_key=True),
+    Column('test_case_id', Integer, primary_key=True),
+    Column('project_id', String, primary_key=True),
+    Column('total', Integer, nullable=False, default=0),
+    Column('passed', Integer, nullable=False, default=0),
+    Column('duration_ms', Float, nullable=False, default=0),
+    Index('ix_execution_daily_case_day', 'test_case_id', 'day'),
+)
+
+project_daily_table = Table(
+    'project_daily', metadata,
+    Column('day', String, primary_key=True),
+    Column('project_id', String, primary_key=True),
+    Column('total', Integer, nullable=False, default=0),
+    Column('passed', Integer, nullable=False, default=0),
+    Column('duration_ms', Float, nullable=False, default=0),
+)
+
+
+def _step_rollup_table(name, period):
+    return Table(
+        name, metadata,
+        Column(period, String, primary_key=True),
+        Column('test_case_id', Integer, primary_key=True),
+        Column('phase', String, primary_key=True),
+        Column('position', Integer, primary_key=True),
+        Column('project_id', String, nullable=False, default=''),
+        Column('step_key', String, nullable=False, default=''),
+        Column('count', Integer, nullable=False, default=0),
+        Column('failures', Integer, nullable=False, default=0),
+        Column('total_ms', Float, nullable=False, default=0),
+        Column('max_ms', Float, nullable=False, default=0),
+        Index(f'ix_{name}_case_{period}', 'test_case_id', period),
+    )
+
+
+step_daily_table = _step_rollup_table('step_daily', 'day')
+# 按月汇总：跨度较长的最慢步骤查询中整月的部分读取该表
+step_monthly_table = _step_rollup_table('step_monthly', 'month')
+
+ROLLUP_TABLES = (execution_daily_table, project_daily_table, step_daily_table, step_monthly_table)
+# 汇总表中累加的列（其余非主键列取最新值，max_ms 取最大值）
+SUM_COLUMNS = ('total', 'passed', 'duration_ms', 'count', 'failures', 'total_ms')
+
+# 执行列表每页的默认和最大条数
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# 统计查询默认的时间范围（天）
+DEFAULT_STATS_DAYS = 30
+# 步骤消息保存的最大长度
+MAX_MESSAGE_LENGTH = 500
+# 趋势的时间粒度 -> 由 day（YYYY-MM-DD）计算分组键的表达式
+TREND_BUCKETS = {
+    'day': lambda day: day,
+    'week': lambda day: func.strftime('%Y-W%W', day),
+    'month': lambda day: func.substr(day, 1, 7),
+}
+
+_NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+
+def failure_signature(message):
+    """失败特征：消息中的数字替换为#，相同原因、不同数值的失败归为一类"""
+    return _NUMBER_PATTERN.sub('#', message or '')[:200]
+
+
+def _split_months(since, until):
+    """
+    把日期范围 [since, until) 拆分为按天读取的范围和按月读取的范围（整月部分）
+
+    返回:
+        (按天范围列表 [(开始日, 结束日或None)], 按月范围 (开始月, 结束月或None) 或 None)
+    """
+    year, month = int(since[:4]), int(since[5:7])
+    if since[8:10] != '01':
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    first_full = f'{year:04d}-{month:02d}-01'
+    last_full = f'{until[:7]}-01' if until else None
+    if last_full is not None and first_full >= last_full:
+        return [(since, until)], None
+    day_ranges = [(since, first_full)] if since < first_full else []
+    if last_full is not None and last_full < until:
+        day_ranges.append((last_full, until))
+    return day_ranges, (first_full[:7], last_full[:7] if last_full else None)
+
+
+def _default_since():
+    return (datetime.now() - timedelta(days=DEFAULT_STATS_DAYS)).strftime('%Y-%m-%d')
+
+
+class ExecutionHistory:
+    """测试用例执行历史的数据库存储和查询"""
+
+    def __init__(self, uri=DATABASE_URI):
+        self.uri = uri
+        self._engine = None
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        """数据库引擎，首次访问时建表"""
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    engine = create_sqlite_engine(self.uri)
+                    metadata.create_all(engine)
+                    self._engine = engine
+        return self._engine
+
+    # ---------- 写入 ----------
+
+    @staticmethod
+    def _rows(run):
+        """把一次执行拆分为执行行、步骤行和各汇总表的行"""
+        started_at = run['started_at']
+        day = started_at[:10]
+        test_case_id = run.get('test_case_id')
+        project_id = str(run.get('project_id') or '')
+        # 汇总表主键不能为NULL，没有测试用例ID的执行汇总到0
+        daily_case_id = test_case_id if test_case_id is not None else 0
+        steps = run.get('steps', [])
+        duration_ms = run.get('duration_ms')
+        if duration_ms is None:
+            duration_ms = sum(step.get('duration_ms') or 0 for step in steps)
+        execution = {
+            'run_id': run['run_id'],
+            'test_case_id': test_case_id,
+            'project_id': project_id,
+            'title': run.get('title') or '',
+            'run_index': run.get('run_index', 0),
+            'started_at': started_at,
+            'finished_at': run.get('finished_at') or '',
+            'duration_ms': duration_ms,
+            'success': bool(run.get('success')),
+        }
+        step_rows = []
+        rollups = {table: [] for table in ROLLUP_TABLES}
+        for step in steps:
+            message = str(step.get('message') or '')[:MAX_MESSAGE_LENGTH]
+            success = bool(step.get('success'))
+            step_duration = float(step.get('duration_ms') or 0)
+            step_rows.append({
+                'run_id': run['run_id'],
+                'phase': step['phase'],
+                'position': step['position'],
+                'step_key': step.get('step_key') or '',
+                'step_id': str(step.get('step_id') or ''),
+                'success': success,
+                'duration_ms': step_duration,
+                'message': message,
+                'failure_signature': '' if success else failure_signature(message),
+            })
+            step_rollup = {
+                'test_case_id': daily_case_id, 'phase': step['phase'], 'position': step['position'],
+                'project_id': project_id, 'step_key': step.get('step_key') or '',
+                'count': 1, 'failures': 0 if success else 1, 'total_ms': step_duration, 'max_ms': step_duration,
+            }
+            rollups[step_daily_table].append(dict(step_rollup, day=day))
+            rollups[step_monthly_table].append(dict(step_rollup, month=day[:7]))
+        execution_rollup = {'total': 1, 'passed': 1 if execution['success'] else 0, 'duration_ms': duration_ms}
+        rollups[execution_daily_table].append(
+            dict(execution_rollup, day=day, test_case_id=daily_case_id, project_id=project_id))
+        rollups[project_daily_table].append(dict(execution_rollup, day=day, project_id=project_id))
+        return execution, step_rows, rollups
+
+    def record_runs(self, runs):
+        """
+        在一个事务中写入多次执行（同一 run_id 已存在时跳过）
+
+        参数:
+            runs: 执行字典列表，包含 run_id、test_case_id、project_id、title、run_index、started_at、finished_at、
+                  success、duration_ms（可选，默认为步骤耗时之和）和 steps；
+                  每个步骤包含 phase、position、step_key、step_id、success、duration_ms、message
+
+        返回:
+            int: 实际写入的执行数
+        """
+        with self.engine.begin() as connection:
+            run_ids = [run['run_id'] for run in runs]
+            existing = set()
+            for start in range(0, len(run_ids), 500):
+                existing.update(connection.execute(select(executions_table.c.run_id).where(
+                    executions_table.c.run_id.in_(run_ids[start:start + 500]))).scalars())
+            executions, step_rows = [], []
+            rollups = {table: [] for table in ROLLUP_TABLES}
+            for run in runs:
+                if run['run_id'] in existing:
+                    continue
+                existing.add(run['run_id'])
+                execution, steps, run_rollups = self._rows(run)
+                executions.append(execution)
+                step_rows.extend(steps)
+                for table, rows in run_rollups.items():
+                    rollups[table].extend(rows)
+            if not executions:
+                return 0
+            connection.execute(insert(executions_table), executions)
+            if step_rows:
+                connection.execute(insert(steps_table), step_rows)
+            for table, rows in rollups.items():
+                if rows:
+                    self._accumulate(connection, table, rows)
+        return len(executions)
+
+    @staticmethod
+    def _accumulate(connection, table, rows):
+        """把行累加到汇总表：主键已存在时累加计数和耗时"""
+        statement = insert(table)
+        keys = [column.name for column in table.primary_key.columns]
+        values = {}
+        for column in table.columns:
+            if column.name in keys:
+                continue
+            if column.name in SUM_COLUMNS:
+                values[column.name] = column + statement.excluded[column.name]
+            elif column.name == 'max_ms':
+                values[column.name] = func.max(column, statement.excluded[column.name])
+            else:
+                values[column.name] = statement.excluded[column.name]
+        connection.execute(statement.on_conflict_do_update(index_elements=keys, set_=values), rows)
+
+    def record_run(self, run):
+        """写入一次执行，返回是否写入（run_id 已存在时不重复写入）"""
+        return self.record_runs([run]) > 0
+
+    def prune(self, before_day):
+        """
+        删除 before_day（YYYY-MM-DD）之前的执行、步骤和汇总数据（按月汇总只删除之前的整月）
+
+        返回:
+            int: 删除的执行数
+        """
+        with self.engine.begin() as connection:
+            old_runs = select(executions_table.c.run_id).where(executions_table.c.started_at < before_day)
+            connection.execute(delete(steps_table).where(steps_table.c.run_id.in_(old_runs)))
+            result = connection.execute(delete(executions_table).where(executions_table.c.started_at < before_day))
+            for table in (execution_daily_table, project_daily_table, step_daily_table):
+                connection.execute(delete(table).where(table.c.day < before_day))
+            # 按月汇总只删除 before_day 所在月之前的整月
+            connection.execute(delete(step_monthly_table).where(step_monthly_table.c.month < before_day[:7]))
+        logger.info(f"已删除 {before_day} 之前的 {result.rowcount} 条执行历史")
+        return result.rowcount
+
+    # ---------- 查询 ----------
+
+    @staticmethod
+    def _filters(table, test_case_id=None, project_id=None):
+        conditions = []
+        if test_case_id is not None and 'test_case_id' in table.c:
+            conditions.append(table.c.test_case_id == test_case_id)
+        if project_id:
+            conditions.append(table.c.project_id == str(project_id))
+        return conditions
+
+    def list_runs(self, test_case_id=None, project_id=None, success=None, since=None, until=None,
+                  limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """
+        分页列出执行，按开始时间从新到旧
+
+        参数:
+            since / until: 开始时间范围（ISO格式字符串，可以只有日期），until 不含
+            limit: 每页条数
+            cursor: 上一页返回的 next_cursor
+
+        返回:
+            dict: {'runs': [...], 'next_cursor': 下一页游标，没有更多时为None}
+        """
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        conditions = self._filters(executions_table, test_case_id, project_id)
+        if success is not None:
+            conditions.append(executions_table.c.success == bool(success))
+        if since:
+            conditions.append(executions_table.c.started_at >= since)
+        if until:
+            conditions.append(executions_table.c.started_at < until)
+        if cursor:
+            started_at, _, run_id = cursor.partition('|')
+            if not run_id:
+                raise ValueError(f"无效的游标: {cursor}")
+            conditions.append(or_(executions_table.c.started_at < started_at,
+                                  and_(executions_table.c.started_at == started_at,
+                                       executions_table.c.run_id < run_id)))
+        query = (select(executions_table).where(*conditions)
+                 .order_by(executions_table.c.started_at.desc(), executions_table.c.run_id.desc())
+                 .limit(limit + 1))
+        with self.engine.connect() as connection:
+            runs = [dict(row) for row in connection.execute(query).mappings()]
+        next_cursor = None
+        if len(runs) > limit:
+            runs = runs[:limit]
+            next_cursor = f"{runs[-1]['started_at']}|{runs[-1]['run_id']}"
+        return {'runs': runs, 'next_cursor': next_cursor}
+
+    def get_run(self, run_id):
+        """获取一次执行及其全部步骤，不存在时返回None"""
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(executions_table).where(executions_table.c.run_id == run_id)).mappings().first()
+            if row is None:
+                return None
+            run = dict(row)
+            run['steps'] = [dict(step) for step in connection.execute(
+                select(steps_table).where(steps_table.c.run_id == run_id)
+                .order_by(steps_table.c.phase, steps_table.c.position)).mappings()]
+        return run
+
+    def pass_rate_trend(self, test_case_id=None, project_id=None, bucket='day', since=None, until=None):
+        """
+        通过率趋势
+
+        参数:
+            bucket: 时间粒度 day / week / month
+            since / until: 日期范围（YYYY-MM-DD），until 不含；since 默认为最近30天
+
+        返回:
+            list: [{'period', 'total', 'passed', 'pass_rate', 'avg_duration_ms'}]，按时间排列
+        """
+        if bucket not in TREND_BUCKETS:
+            raise ValueError(f"不支持的时间粒度: {bucket}，可选: {', '.join(TREND_BUCKETS)}")
+        # 不按测试用例过滤时读取按项目汇总的表，每天只有项目数行
+        table = execution_daily_table if test_case_id is not None else project_daily_table
+        period = TREND_BUCKETS[bucket](table.c.day).label('period')
+        conditions = self._filters(table, test_case_id, project_id)
+        conditions.append(table.c.day >= (since or _default_since())[:10])
+        if until:
+            conditions.append(table.c.day < until[:10])
+        query = (select(period, func.sum(table.c.total).label('total'), func.sum(table.c.passed).label('passed'),
+                        func.sum(table.c.duration_ms).label('duration_ms'))
+                 .where(*conditions).group_by(period).order_by(period))
+        with self.engine.connect() as connection:
+            rows = connection.execute(query).mappings().all()
+        return [{
+            'period': row['period'],
+            'total': row['total'],
+            'passed': row['passed'],
+            'pass_rate': round(row['passed'] / row['total'], 4) if row['total'] else 0,
+            'avg_duration_ms': round(row['duration_ms'] / row['total'], 1) if row['total'] else 0,
+        } for row in rows]
+
+    def slowest_steps(self, test_case_id=None, project_id=None, phase=None, since=None, until=None, limit=20):
+        """
+        平均耗时最长的步骤（按测试用例中的步骤位置区分）
+
+        since 到 until 之间的整月读取按月汇总表，首尾不足一个月的部分读取按天汇总表
+
+        返回:
+            list: [{'test_case_id', 'phase', 'position', 'step_key', 'count', 'failures',
+                    'avg_ms', 'max_ms'}]，按平均耗时从高到低
+        """
+        since = (since or _default_since())[:10]
+        until = until[:10] if until else None
+        day_ranges, month_range = _split_months(since, until)
+        parts = []
+        for table, period, ranges in ((step_daily_table, 'day', day_ranges),
+                                      (step_monthly_table, 'month', [month_range] if month_range else [])):
+            if not ranges:
+                continue
+            conditions = self._filters(table, test_case_id, project_id)
+            if phase:
+                conditions.append(table.c.phase == phase)
+            conditions.append(or_(*[and_(table.c[period] >= start, *([table.c[period] < end] if end else []))
+                                    for start, end in ranges]))
+            parts.append(select(table.c.test_case_id, table.c.phase, table.c.position, table.c.step_key,
+                                table.c.count, table.c.failures, table.c.total_ms, table.c.max_ms)
+                         .where(*conditions))
+        rows_query = union_all(*parts).subquery() if len(parts) > 1 else parts[0].subquery()
+        count = func.sum(rows_query.c.count)
+        avg_ms = (func.sum(rows_query.c.total_ms) / count).label('avg_ms')
+        query = (select(rows_query.c.test_case_id, rows_query.c.phase, rows_query.c.position,
+                        func.max(rows_query.c.step_key).label('step_key'), count.label('count'),
+                        func.sum(rows_query.c.failures).label('failures'), avg_ms,
+                        func.max(rows_query.c.max_ms).label('max_ms'))
+                 .group_by(rows_query.c.test_case_id, rows_query.c.phase, rows_query.c.position)
+                 .order_by(avg_ms.desc())
+                 .limit(max(1, min(int(limit or 20), MAX_PAGE_SIZE))))
+        with self.engine.connect() as connection:
+            rows = connection.execute(query).mappings().all()
+        return [dict(row, avg_ms=round(row['avg_ms'] or 0, 1), max_ms=round(row['max_ms'] or 0, 1)) for row in rows]
+
+    def failure_clusters(self, test_case_id=None, project_id=None, since=None, until=None, limit=20):
+        """
+        按步骤类型和失败特征聚类失败步骤
+
+        返回:
+            list: [{'step_key', 'failure_signature', 'failures', 'cases', 'first_seen', 'last_seen',
+                    'example_message', 'example_run_id'}]，按失败次数从多到少
+        """
+        conditions = [steps_table.c.success == False]  # noqa: E712
+        conditions += self._filters(executions_table, test_case_id, project_id)
+        conditions.append(executions_table.c.started_at >= (since or _default_since()))
+        if until:
+            conditions.append(executions_table.c.started_at < until)
+        failures = func.count().label('failures')
+        query = (select(steps_table.c.step_key, steps_table.c.failure_signature, failures,
+                        func.count(func.distinct(executions_table.c.test_case_id)).label('cases'),
+                        func.min(executions_table.c.started_at).label('first_seen'),
+                        func.max(executions_table.c.started_at).label('last_seen'),
+                        func.max(steps_table.c.message).label('example_message'),
+                        func.max(steps_table.c.run_id).label('example_run_id'))
+                 .select_from(steps_table.join(executions_table, steps_table.c.run_id == executions_table.c.run_id))
+                 .where(*conditions)
+                 .group_by(steps_table.c.step_key, steps_table.c.failure_signature)
+                 .order_by(failures.desc())
+                 .limit(max(1, min(int(limit or 20), MAX_PAGE_SIZE))))
+        with self.engine.connect() as connection:
+            return [dict(row) for row in connection.execute(query).mappings()]
+
+    def dispose(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+                self._engine = None
+
+
+execution_history = ExecutionHistory()
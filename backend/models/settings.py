@@ -1,10 +1,12 @@
 """
 设置模型 - 负责设置数据的加载和保存
+
+读取和写入都经过 services.config_service 的内存缓存，只在 settings.json 变化时重新读取文件
 """
-import json
-import os
+import copy
 import logging
-from config import SETTINGS_FILE, DEFAULT_SSH_CONFIG, DEFAULT_SERIAL_CONFIG
+from config import DEFAULT_SSH_CONFIG, DEFAULT_SERIAL_CONFIG
+from services.config_service import config_service
 
 logger = logging.getLogger(__name__)
 
@@ -13,46 +15,18 @@ class Settings:
     
     @staticmethod
     def load():
-        """加载设置数据"""
-        try:
-            if os.path.exists(SETTINGS_FILE):
-                with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    if content:
-                        return json.loads(content)
-            logger.info(f"设置文件不存在或为空，使用默认设置")
-            return {
-                **DEFAULT_SSH_CONFIG,
-                **DEFAULT_SERIAL_CONFIG
-            }
-        except Exception as e:
-            logger.error(f"加载设置数据出错: {e}")
-            return {
-                **DEFAULT_SSH_CONFIG,
-                **DEFAULT_SERIAL_CONFIG
-            }
+        """加载设置数据，返回副本，可以修改后传给 save"""
+        return copy.deepcopy(config_service.get())
     
     @staticmethod
     def save(settings):
-        """保存设置数据"""
-        try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(SETTINGS_FILE), exist_ok=True)
-            
-            # 保存数据
-            with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, ensure_ascii=False, indent=2)
-                
-            logger.info(f"成功保存设置到文件")
-            return True
-        except Exception as e:
-            logger.error(f"保存设置数据出错: {e}")
-            return False
+        """保存设置数据，同时更新配置服务的缓存并通知订阅者"""
+        return config_service.save(settings)
     
     @staticmethod
     def get_ssh_settings():
         """获取SSH设置"""
-        settings = Settings.load()
+        settings = config_service.get()
         ssh_settings = {
             "host": settings.get("sshHost", DEFAULT_SSH_CONFIG["sshHost"]),
             "port": settings.get("sshPort", DEFAULT_SSH_CONFIG["sshPort"]),
@@ -83,7 +57,7 @@ class Settings:
     @staticmethod
     def get_serial_settings():
         """获取串口设置"""
-        settings = Settings.load()
+        settings = config_service.get()
         serial_settings = {
             "serialPort": settings.get("serialPort", DEFAULT_SERIAL_CONFIG["serialPort"]),
             "serialBaudRate": settings.get("serialBaudRate", DEFAULT_SERIAL_CONFIG["serialBaudRate"])
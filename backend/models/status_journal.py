@@ -0,0 +1,119 @@
+"""
+测试用例状态日志 - JSON存储下状态更新的追加写日志
+
+每次状态更新只追加一行 {"id", "status", "last_execution_time"} 到日志文件，不再重写整个测试用例文件。
+- fsync 批量执行：追加时只写入系统缓冲区，后台线程每隔 fsync_interval 秒统一fsync一次
+- 后台合并：日志累计 compact_entries 条或距上次合并超过 compact_interval 秒后调用 on_compact，
+  由调用方把当前状态写回测试用例文件（临时文件+替换）后清空日志
+- 读取时跳过进程崩溃时可能写了一半的最后一行
+
+主要类：
+- StatusJournal: 状态日志
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StatusJournal:
+    """测试用例状态的追加写日志"""
+
+    def __init__(self, path, fsync_interval=0.2, compact_entries=200, compact_interval=30.0, on_compact=None):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.compact_entries = compact_entries
+        self.compact_interval = compact_interval
+        self.on_compact = on_compact
+        self._lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+        self._entries = len(self.read())
+        self._last_compact = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return self._entries
+
+    def append(self, case_id, status, execution_time):
+        """追加一条状态更新（写入系统缓冲区，由后台线程批量fsync）"""
+        line = json.dumps({'id': case_id, 'status': status, 'last_execution_time': execution_time},
+                          ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line + '\n')
+            self._file.flush()
+            self._unsynced += 1
+            self._entries += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._background, name='status-journal', daemon=True)
+                self._thread.start()
+
+    def read(self):
+        """读取日志中的全部状态更新，按写入顺序返回"""
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"跳过状态日志中不完整的记录: {self.path}")
+                    continue
+                if isinstance(entry, dict) and 'id' in entry:
+                    entries.append(entry)
+        return entries
+
+    def sync(self):
+        """立即fsync尚未落盘的状态更新"""
+        with self._lock:
+            if self._file is not None and self._unsynced:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+    def clear(self):
+        """清空日志（状态已写回测试用例文件后调用）"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._unsynced = 0
+            self._entries = 0
+            self._last_compact = time.monotonic()
+
+    def _due_for_compact(self):
+        if not self._entries or self.on_compact is None:
+            return False
+        return (self._entries >= self.compact_entries
+                or time.monotonic() - self._last_compact >= self.compact_interval)
+
+    def _background(self):
+        """后台线程：批量fsync，按条数或时间触发合并"""
+        while not self._stop.wait(self.fsync_interval):
+            try:
+                self.sync()
+                if self._due_for_compact():
+                    self._last_compact = time.monotonic()
+                    self.on_compact()
+            except Exception as e:
+                logger.error(f"状态日志后台处理出错: {e}")
+
+    def close(self):
+        """停止后台线程，fsync并关闭日志文件"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=max(self.fsync_interval * 2, 1))
+        self.sync()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -1,77 +1,237 @@
 """
 测试用例模型 - 负责测试用例数据的加载和保存
+
+测试用例保存在哪里由 TEST_CASE_STORE 决定：
+- sqlite（默认）: SQLiteTestCaseStore，见 models/test_case_db.py，首次使用时从 test_cases.json 导入
+- json: JSONTestCaseStore，读取使用内存缓存（按文件修改时间和大小校验），写入时重写 test_cases.json；
+  状态更新只追加到状态日志（models/status_journal.py），由后台线程定期合并回 test_cases.json
 """
 import json
 import os
 import logging
+import threading
+import atexit
 from datetime import datetime
-from config import TEST_CASES_FILE, DEFAULT_TEST_CASE
+from config import (
+    TEST_CASES_FILE, DEFAULT_TEST_CASE, TEST_CASE_STORE, STATUS_JOURNAL_FSYNC_INTERVAL, STATUS_JOURNAL_COMPACT_ENTRIES,
+    STATUS_JOURNAL_COMPACT_INTERVAL
+)
+from models.status_journal import StatusJournal
+from models.test_case_db import SQLiteTestCaseStore, check_sort, decode_cursor, encode_cursor, project_fields
 
 logger = logging.getLogger(__name__)
 
 class TestCase:
     """测试用例模型类，管理测试用例数据"""
     
-    _test_cases = None  # 缓存测试用例列表
+    _test_cases = None  # 缓存测试用例列表（已转换字段名）
+    _cases_by_id = {}  # 测试用例ID -> 缓存中的测试用例
+    _file_signature = None  # 缓存对应的文件 (修改时间, 大小)，文件被其他进程修改后缓存失效
+    _cache_lock = threading.RLock()
+    _journal = None  # JSON存储的状态日志，见 journal()
+    _store = None  # 测试用例存储，见 store()
     
     @classmethod
-    def load(cls):
-        """加载测试用例数据"""
+    def store(cls):
+        """返回 TEST_CASE_STORE 配置的测试用例存储"""
+        if cls._store is None:
+            cls._store = SQLiteTestCaseStore() if TEST_CASE_STORE == 'sqlite' else JSONTestCaseStore()
+        return cls._store
+    
+    @staticmethod
+    def _read_signature():
+        """返回测试用例文件的 (修改时间, 大小)，文件不存在时返回None"""
         try:
-            if os.path.exists(TEST_CASES_FILE):
-                with open(TEST_CASES_FILE, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
+            stat = os.stat(TEST_CASES_FILE)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    @classmethod
+    def _set_cache(cls, test_cases, signature):
+        cls._test_cases = test_cases
+        cls._cases_by_id = {case.get('id'): case for case in test_cases}
+        cls._file_signature = signature
+    
+    @classmethod
+    def invalidate_cache(cls):
+        """清空内存缓存，下次访问时重新读取文件"""
+        with cls._cache_lock:
+            cls._test_cases = None
+            cls._cases_by_id = {}
+            cls._file_signature = None
+    
+    @classmethod
+    def _cached(cls):
+        """
+        返回缓存的测试用例列表（调用方不得修改）
+
+        文件的修改时间和大小与缓存时一致则直接使用缓存，否则重新读取并转换字段名
+        """
+        with cls._cache_lock:
+            signature = cls._read_signature()
+            if cls._test_cases is not None and signature is not None and signature == cls._file_signature:
+                return cls._test_cases
+            try:
+                if signature is not None:
+                    with open(TEST_CASES_FILE, 'r', encoding='utf-8') as f:
+                        content = f.read().strip()
                     if content:  # 如果文件不为空
                         data = json.loads(content)
-                        # 转换字段名
-                        converted_data = []
-                        for test_case in data:
-                            converted_case = cls._convert_keys(test_case)
-                            # 确保所有必需的字段都存在
-                            converted_case = cls._ensure_fields(converted_case)
-                            converted_data.append(converted_case)
+                        # 转换字段名并确保所有必需的字段都存在
+                        converted_data = [cls._ensure_fields(cls._convert_keys(test_case)) for test_case in data]
+                        cls._set_cache(converted_data, signature)
+                        cls._apply_journal()
                         logger.info(f"成功从文件加载测试用例: {TEST_CASES_FILE}")
-                        cls._test_cases = converted_data
                         return converted_data
-            
-            logger.info(f"测试用例文件不存在或为空，使用默认数据")
-            # 使用默认数据
-            default_data = [dict(DEFAULT_TEST_CASE)]
-            default_data[0]['create_time'] = datetime.now().strftime('%Y-%m-%d %H:%M')
-            cls._test_cases = default_data
-            return default_data
-            
-        except Exception as e:
-            logger.error(f"加载测试用例数据出错: {e}")
+                logger.info(f"测试用例文件不存在或为空，使用默认数据")
+            except Exception as e:
+                logger.error(f"加载测试用例数据出错: {e}")
+            # 使用默认数据（不缓存，文件写入后再读取）
             default_data = [dict(DEFAULT_TEST_CASE)]
             default_data[0]['create_time'] = datetime.now().strftime('%Y-%m-%d %H:%M')
-            cls._test_cases = default_data
+            cls._set_cache(default_data, None)
             return default_data
     
+    @classmethod
+    def load(cls):
+        """加载测试用例数据，返回列表和其中的测试用例都是副本，可以修改后传给 save"""
+        return [dict(case) for case in cls._cached()]
+    
+    @classmethod
+    def find(cls, case_id):
+        """根据ID从缓存中查找测试用例，返回副本，不存在时返回None"""
+        with cls._cache_lock:
+            cls._cached()
+            case = cls._cases_by_id.get(case_id)
+        return dict(case) if case is not None else None
+    
     @classmethod
     def save(cls, test_cases):
         """保存测试用例数据"""
         try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(TEST_CASES_FILE), exist_ok=True)
-            
-            # 转换字段名并确保所有字段都存在
-            converted_test_cases = [
-                cls._ensure_fields(cls._convert_keys(test_case)) 
-                for test_case in test_cases
-            ]
-            
-            # 保存数据
-            with open(TEST_CASES_FILE, 'w', encoding='utf-8') as f:
-                json.dump(converted_test_cases, f, ensure_ascii=False, indent=2)
+            with cls._cache_lock:
+                # 转换字段名并确保所有字段都存在；script_content 与缓存中相同的用例已经转换过，不再重复解析
+                converted_test_cases = []
+                for test_case in test_cases:
+                    cached = cls._cases_by_id.get(test_case.get('id'))
+                    if cached is not None and cached.get('script_content') == test_case.get('script_content'):
+                        converted_test_cases.append(cls._ensure_fields(dict(test_case)))
+                    else:
+                        converted_test_cases.append(cls._ensure_fields(cls._convert_keys(test_case)))
                 
+                cls._write_snapshot(converted_test_cases)
             logger.info(f"成功保存测试用例到文件: {TEST_CASES_FILE}")
-            cls._test_cases = converted_test_cases
             return True
         except Exception as e:
             logger.error(f"保存测试用例数据出错: {e}")
+            cls.invalidate_cache()
             return False
     
+    @classmethod
+    def _write_snapshot(cls, test_cases):
+        """
+        写入完整的测试用例文件：先写临时文件并fsync，再替换原文件，写入中途崩溃不会留下不完整的文件。
+        写入的内容已包含状态日志中的全部状态，写入后清空状态日志，并直接作为内存缓存
+        """
+        os.makedirs(os.path.dirname(TEST_CASES_FILE), exist_ok=True)
+        temp_path = f"{TEST_CASES_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(test_cases, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, TEST_CASES_FILE)
+        if cls._journal is not None and cls._journal.path == cls._journal_path():
+            cls._journal.clear()
+        cls._set_cache(test_cases, cls._read_signature())
+    
+    # ---------- 状态日志 ----------
+    
+    @staticmethod
+    def _journal_path():
+        return os.path.splitext(TEST_CASES_FILE)[0] + '.status.jsonl'
+    
+    @classmethod
+    def journal(cls):
+        """返回当前测试用例文件对应的状态日志"""
+        with cls._cache_lock:
+            path = cls._journal_path()
+            if cls._journal is None or cls._journal.path != path:
+                if cls._journal is not None:
+                    # 测试用例文件路径已改变，旧日志保留在磁盘上，下次读取旧文件时再应用
+                    threading.Thread(target=cls._journal.close, daemon=True).start()
+                cls._journal = StatusJournal(path, fsync_interval=STATUS_JOURNAL_FSYNC_INTERVAL,
+                                             compact_entries=STATUS_JOURNAL_COMPACT_ENTRIES,
+                                             compact_interval=STATUS_JOURNAL_COMPACT_INTERVAL,
+                                             on_compact=cls.compact)
+            return cls._journal
+    
+    @classmethod
+    def _apply_journal(cls):
+        """把状态日志中的状态更新应用到刚从文件读取的缓存上"""
+        for entry in cls.journal().read():
+            case = cls._cases_by_id.get(entry['id'])
+            if case is not None:
+                case['status'] = entry.get('status', case.get('status'))
+                case['last_execution_time'] = entry.get('last_execution_time', case.get('last_execution_time'))
+    
+    @classmethod
+    def record_status(cls, case_id, status, execution_time):
+        """
+        更新状态和最新执行时间：追加到状态日志并更新内存缓存，不重写测试用例文件
+
+        返回:
+            bool: 测试用例是否存在
+        """
+        with cls._cache_lock:
+            cls._cached()
+            case = cls._cases_by_id.get(case_id)
+            if case is None:
+                return False
+            case['status'] = status
+            case['last_execution_time'] = execution_time
+            if cls._file_signature is None:
+                # 测试用例文件还不存在（使用默认数据），直接写入完整文件
+                cls._write_snapshot(cls._test_cases)
+            else:
+                cls.journal().append(case_id, status, execution_time)
+        return True
+    
+    @classmethod
+    def compact(cls):
+        """把状态日志合并回测试用例文件并清空日志"""
+        with cls._cache_lock:
+            if cls._journal is None or not len(cls._journal):
+                return
+            test_cases = cls._cached()
+            if cls._file_signature is None:
+                return
+            cls._write_snapshot(test_cases)
+        logger.info(f"已将状态日志合并到测试用例文件: {TEST_CASES_FILE}")
+    
+    @classmethod
+    def journal_signature(cls):
+        """
+        返回 (测试用例文件的 (修改时间, 大小), 状态日志的条数)；文件不存在（使用默认数据）时前者为None
+        """
+        with cls._cache_lock:
+            cls._cached()
+            return cls._file_signature, len(cls._journal) if cls._journal is not None else 0
+    
+    @classmethod
+    def close_journal(cls):
+        """合并并关闭状态日志（进程退出时调用）"""
+        with cls._cache_lock:
+            if cls._journal is None:
+                return
+            try:
+                cls.compact()
+            except Exception as e:
+                logger.error(f"合并状态日志出错: {e}")
+            journal, cls._journal = cls._journal, None
+        # 在锁外关闭，后台线程可能正在等待该锁
+        journal.close()
+    
     @staticmethod
     def _convert_keys(test_case):
         """转换测试用例字段名，保持一致性"""
@@ -141,30 +301,23 @@ class TestCase:
         for field, default_value in required_fields.items():
             if field not in test_case:
                 test_case[field] = default_value
-                logger.info(f"为测试用例 {test_case.get('id', 'unknown')} 添加缺失的{field}字段")
+                logger.debug(f"为测试用例 {test_case.get('id', 'unknown')} 添加缺失的{field}字段")
         
         return test_case
     
     @classmethod
     def get_all(cls):
         """获取所有测试用例"""
-        # 不使用缓存，每次都重新加载最新数据
-        return cls.load()
+        return cls.store().get_all()
     
     @classmethod
     def get_by_id(cls, case_id):
         """根据ID获取测试用例"""
-        test_cases = cls.get_all()
-        return next((case for case in test_cases if case['id'] == case_id), None)
+        return cls.store().get(case_id)
     
     @classmethod
     def create(cls, test_case_data):
         """创建新测试用例"""
-        test_cases = cls.get_all()
-        
-        # 生成新ID
-        new_id = max([case['id'] for case in test_cases]) + 1 if test_cases else 1
-        
         # 确定serial_connect值
         serial_connect = test_case_data.get('serial_connect', False)
         
@@ -187,9 +340,9 @@ class TestCase:
             except json.JSONDecodeError:
                 logger.warning("无法解析script_content")
         
-        # 创建新测试用例
+        # 创建新测试用例（ID由存储分配）
         new_case = {
-            'id': new_id,
+            'id': None,
             'title': test_case_data.get('title', ''),
             'type': test_case_data.get('type', '功能测试'),
             'status': '未运行',
@@ -202,17 +355,13 @@ class TestCase:
             'project_id': test_case_data.get('project_id', '')
         }
         
-        # 添加到列表并保存
-        test_cases.append(new_case)
-        if cls.save(test_cases):
-            return new_case
-        return None
+        # 保存
+        return cls.store().insert(new_case)
     
     @classmethod
     def update(cls, case_id, test_case_data):
         """更新测试用例"""
         try:
-            test_cases = cls.get_all()
             case = cls.get_by_id(case_id)
             
             if not case:
@@ -250,16 +399,11 @@ class TestCase:
             # 记录更新后的数据
             logger.info(f"更新后的数据: {case}")
             
-            # 在列表中更新测试用例
-            for i, tc in enumerate(test_cases):
-                if tc['id'] == case_id:
-                    test_cases[i] = case
-                    break
-            
             # 保存更新
-            if cls.save(test_cases):
+            updated_case = cls.store().put(case)
+            if updated_case:
                 logger.info(f"测试用例 {case_id} 更新成功")
-                return case
+                return updated_case
             else:
                 logger.error(f"测试用例 {case_id} 保存失败")
                 return None
@@ -271,28 +415,107 @@ class TestCase:
     @classmethod
     def delete(cls, case_id):
         """删除测试用例"""
-        test_cases = cls.get_all()
-        case = cls.get_by_id(case_id)
-        
-        if not case:
-            return False
-        
-        # 从列表中移除
-        test_cases.remove(case)
-        return cls.save(test_cases)
+        return cls.store().delete(case_id)
+    
+    @classmethod
+    def query(cls, **kwargs):
+        """按条件查询测试用例（过滤、排序、游标分页、字段投影），参数见 SQLiteTestCaseStore.query"""
+        return cls.store().query(**kwargs)
+    
+    @classmethod
+    def version(cls):
+        """测试用例数据版本，数据变化后改变，用于列表的ETag"""
+        return cls.store().version()
     
     @classmethod
     def update_status(cls, case_id, status):
-        """更新测试用例状态"""
-        test_cases = cls.get_all()
-        case = cls.get_by_id(case_id)
-        
-        if not case:
+        """更新测试用例状态和最新执行时间"""
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return cls.store().update_status(case_id, status, current_time)
+
+
+class JSONTestCaseStore:
+    """
+    测试用例的JSON文件存储
+
+    读取使用 TestCase 的内存缓存（文件修改时间或大小变化后重新读取），写入时重写整个 TEST_CASES_FILE，
+    接口与 SQLiteTestCaseStore 相同。
+    """
+    
+    def get_all(self):
+        """获取所有测试用例"""
+        return TestCase.load()
+    
+    def get(self, case_id):
+        """根据ID获取测试用例，不存在时返回None"""
+        return TestCase.find(case_id)
+    
+    def insert(self, case):
+        """插入新测试用例，ID为当前最大ID加1"""
+        test_cases = TestCase.load()
+        case = dict(case, id=max([tc['id'] for tc in test_cases]) + 1 if test_cases else 1)
+        test_cases.append(case)
+        return case if TestCase.save(test_cases) else None
+    
+    def put(self, case):
+        """替换已有测试用例，不存在或保存失败时返回None"""
+        test_cases = TestCase.load()
+        for i, tc in enumerate(test_cases):
+            if tc['id'] == case['id']:
+                test_cases[i] = case
+                return case if TestCase.save(test_cases) else None
+        return None
+    
+    def delete(self, case_id):
+        """删除测试用例"""
+        test_cases = TestCase.load()
+        remaining = [case for case in test_cases if case['id'] != case_id]
+        if len(remaining) == len(test_cases):
             return False
+        return TestCase.save(remaining)
+    
+    def update_status(self, case_id, status, execution_time):
+        """更新状态和最新执行时间（追加到状态日志，后台合并回文件）"""
+        return TestCase.record_status(case_id, status, execution_time)
+    
+    def version(self):
+        """数据版本：测试用例文件的修改时间、大小和状态日志的条数"""
+        signature, journal_entries = TestCase.journal_signature()
+        if signature is None:
+            return "json:default"
+        return f"json:{signature[0]}-{signature[1]}-{journal_entries}"
+    
+    def query(self, project_id=None, status=None, case_type=None, search=None, sort='id', descending=False,
+              limit=None, cursor=None, fields=None):
+        """按条件查询测试用例，在内存缓存上过滤和排序，参数和返回值与 SQLiteTestCaseStore.query 相同"""
+        check_sort(sort)
+        search = search.lower() if search else None
+        matched = [
+            case for case in TestCase._cached()
+            if (not project_id or str(case.get('project_id', '')) == str(project_id))
+            and (not status or case.get('status') == status)
+            and (not case_type or case.get('type') == case_type)
+            and (not search or search in str(case.get('title', '')).lower())
+        ]
         
-        # 更新状态和最新执行时间
-        case['status'] = status
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        case['last_execution_time'] = current_time  # 更新最新执行时间
+        # 与数据库存储一致：文本字段按字符串排序，缺失值视为空字符串
+        def sort_key(case):
+            value = case.get(sort)
+            return (value if sort == 'id' else ('' if value is None else str(value))), case['id']
         
-        return cls.save(test_cases) 
\ No newline at end of file
+        matched.sort(key=sort_key, reverse=bool(descending))
+        total = len(matched)
+        if cursor:
+            last_key = tuple(decode_cursor(cursor, sort, descending))
+            matched = [case for case in matched
+                       if (sort_key(case) < last_key if descending else sort_key(case) > last_key)]
+        next_cursor = None
+        page = matched[:limit] if limit else matched
+        if limit and len(matched) > limit:
+            next_cursor = encode_cursor(sort, descending, sort_key(page[-1])[0], page[-1]['id'])
+        items = [dict(project_fields(case, fields)) for case in page]
+        return {'items': items, 'total': total, 'next_cursor': next_cursor}
+
+
+
+atexit.register(TestCase.close_journal)
@@ -0,0 +1,488 @@
+"""
+测试用例SQLite存储 - 以数据库表保存测试用例，单条读写不再整体读写JSON文件
+
+表结构：
+- projects: 项目ID和名称
+- test_cases: 测试用例的基本字段，project_id、status 建有索引
+- test_case_steps: 操作步骤和验证步骤，每个步骤一行，按 (case_id, kind, position) 排序
+- store_meta: 存储自身的状态（如是否已从JSON文件导入）
+
+script_content 在写入时按 TestCase._convert_keys 统一字段名后拆分为步骤行，读取时再组装回JSON字符串，
+对外的测试用例字典与JSON存储完全一致。数据库使用WAL模式，读操作不会被写操作阻塞。
+
+首次使用时如果数据库中还没有测试用例，会自动从 TEST_CASES_FILE 导入一次；
+也可以手动重新导入：python -m models.test_case_db import [JSON文件路径]
+"""
+import base64
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime
+
+from sqlalchemy import (
+    Boolean, Column, Index, Integer, MetaData, String, Table, Text, and_, create_engine, delete, event, func, insert, or_,
+    select, update
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config import DATABASE_URI, TEST_CASES_FILE, DEFAULT_TEST_CASE
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+projects_table = Table(
+    'projects', metadata,
+    Column('id', String, primary_key=True),
+    Column('name', String, nullable=False, default=''),
+)
+
+test_cases_table = Table(
+    'test_cases', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('title', String, nullable=False, default=''),
+    Column('type', String, nullable=False, default=''),
+    Column('status', String, nullable=False, default='未运行', index=True),
+    Column('create_time', String, nullable=False, default=''),
+    Column('last_execution_time', String, nullable=False, default=''),
+    Column('description', Text, nullable=False, default=''),
+    Column('serial_connect', Boolean, nullable=False, default=False),
+    Column('project_id', String, nullable=False, default='', index=True),
+    Column('project_name', String, nullable=False, default=''),
+    # script_content 中步骤以外的内容（JSON，步骤位置以null占位）；script_content 不是JSON对象时保存原文
+    Column('script_meta', Text, nullable=False, default=''),
+    Column('script_is_raw', Boolean, nullable=False, default=False),
+    # 以上字段以外的其他字段（JSON）
+    Column('extra', Text, nullable=False, default='{}'),
+    # 列表页按创建时间排序（可按项目过滤）
+    Index('ix_test_cases_create_time', 'create_time'),
+    Index('ix_test_cases_project_create_time', 'project_id', 'create_time'),
+)
+
+steps_table = Table(
+    'test_case_steps', metadata,
+    Column('case_id', Integer, primary_key=True),
+    Column('kind', String, primary_key=True),
+    Column('position', Integer, primary_key=True),
+    # operation_key / verification_key，便于按步骤类型查询
+    Column('step_key', String, nullable=False, default='', index=True),
+    Column('data', Text, nullable=False),
+)
+
+store_meta_table = Table(
+    'store_meta', metadata,
+    Column('key', String, primary_key=True),
+    Column('value', Text, nullable=False),
+)
+
+# 步骤类型 -> script_content 中的字段名和步骤关键字字段名
+STEP_KINDS = {
+    'operation': ('operationSteps', 'operation_key'),
+    'verification': ('verificationSteps', 'verification_key'),
+}
+CASE_COLUMNS = ('id', 'title', 'type', 'status', 'create_time', 'last_execution_time', 'description',
+                'serial_connect', 'project_id', 'project_name')
+IMPORTED_META_KEY = 'imported_from_json'
+# 每次写入测试用例时加1，列表查询的ETag由它计算
+VERSION_META_KEY = 'version'
+# 列表查询可以排序的字段
+SORT_FIELDS = ('id', 'title', 'type', 'status', 'create_time', 'last_execution_time', 'project_id')
+
+
+def encode_cursor(sort, descending, value, case_id):
+    """列表查询的分页游标：排序字段、方向、上一页最后一个测试用例的排序值和ID"""
+    raw = json.dumps([sort, bool(descending), value, case_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, sort, descending):
+    """解析分页游标，返回 (排序值, 测试用例ID)；游标无效或与排序方式不一致时抛出 ValueError"""
+    try:
+        cursor_sort, cursor_descending, value, case_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError(f"无效的游标: {cursor}")
+    if cursor_sort != sort or cursor_descending != bool(descending):
+        raise ValueError("游标与当前排序方式不一致")
+    return value, case_id
+
+
+def check_sort(sort):
+    """检查排序字段，不支持时抛出 ValueError"""
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"不支持的排序字段: {sort}，可选: {', '.join(SORT_FIELDS)}")
+    return sort
+
+
+def project_fields(case, fields):
+    """只保留指定字段（总是包含id）；fields 为None时返回原测试用例"""
+    if fields is None:
+        return case
+    return {key: case[key] for key in ('id', *fields) if key in case}
+
+
+def _enable_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
+def create_sqlite_engine(uri):
+    """创建WAL模式的数据库引擎，数据库文件所在目录不存在时自动创建"""
+    if uri.startswith('sqlite:///'):
+        os.makedirs(os.path.dirname(os.path.abspath(uri[len('sqlite:///'):])), exist_ok=True)
+    engine = create_engine(uri, connect_args={'check_same_thread': False})
+    event.listen(engine, 'connect', _enable_wal)
+    return engine
+
+
+class SQLiteTestCaseStore:
+    """
+    测试用例的SQLite存储
+
+    所有方法接收和返回与 JSON 存储相同格式的测试用例字典（script_content 为JSON字符串）。
+    """
+
+    def __init__(self, uri=DATABASE_URI, json_file=TEST_CASES_FILE):
+        self.uri = uri
+        self.json_file = json_file
+        self._engine = None
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        """数据库引擎，首次访问时建表并按需从JSON文件导入"""
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    engine = create_sqlite_engine(self.uri)
+                    metadata.create_all(engine)
+                    # create_all 不会为已存在的表补建索引，新增的索引在这里补建
+                    for index in test_cases_table.indexes:
+                        index.create(engine, checkfirst=True)
+                    self._import_once(engine)
+                    self._engine = engine
+        return self._engine
+
+    # ---------- 行与测试用例字典之间的转换 ----------
+
+    @staticmethod
+    def _split(case):
+        """将测试用例字典拆分为 test_cases 行、步骤行和项目行"""
+        from models.test_case import TestCase
+
+        case = TestCase._ensure_fields(TestCase._convert_keys(case))
+        row = {column: case.get(column) for column in CASE_COLUMNS}
+        for column in ('title', 'type', 'status', 'create_time', 'last_execution_time', 'description',
+                       'project_id', 'project_name'):
+            row[column] = '' if row[column] is None else str(row[column])
+        row['status'] = row['status'] or '未运行'
+        row['serial_connect'] = bool(row['serial_connect'])
+        row['extra'] = json.dumps({key: value for key, value in case.items()
+                                   if key not in CASE_COLUMNS and key != 'script_content'}, ensure_ascii=False)
+
+        step_rows = []
+        content = case.get('script_content', '')
+        try:
+            script = json.loads(content) if isinstance(content, str) and content else content
+        except json.JSONDecodeError:
+            script = None
+        if isinstance(script, dict):
+            meta = dict(script)
+            for kind, (field, key_field) in STEP_KINDS.items():
+                if isinstance(meta.get(field), list):
+                    for position, step in enumerate(meta[field]):
+                        step_rows.append({
+                            'case_id': row['id'],
+                            'kind': kind,
+                            'position': position,
+                            'step_key': str(step.get(key_field, '')) if isinstance(step, dict) else '',
+                            'data': json.dumps(step, ensure_ascii=False),
+                        })
+                    meta[field] = None
+            row['script_meta'] = json.dumps(meta, ensure_ascii=False)
+            row['script_is_raw'] = False
+        else:
+            row['script_meta'] = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+            row['script_is_raw'] = True
+
+        project = {'id': row['project_id'], 'name': row['project_name']} if row['project_id'] else None
+        return row, step_rows, project
+
+    @staticmethod
+    def _assemble(row, step_rows, with_script=True):
+        """由 test_cases 行和该用例的步骤行组装测试用例字典；with_script 为False时不组装 script_content"""
+        case = {column: row[column] for column in CASE_COLUMNS}
+        case['serial_connect'] = bool(case['serial_connect'])
+        if with_script and row['script_is_raw']:
+            case['script_content'] = row['script_meta']
+        elif with_script:
+            script = json.loads(row['script_meta'])
+            steps = {kind: [] for kind in STEP_KINDS}
+            for step_row in step_rows:
+                steps[step_row['kind']].append(json.loads(step_row['data']))
+            for kind, (field, _) in STEP_KINDS.items():
+                if field in script:
+                    script[field] = steps[kind]
+            case['script_content'] = json.dumps(script, ensure_ascii=False)
+        case.update(json.loads(row['extra'] or '{}'))
+        return case
+
+    def _write_case(self, connection, case):
+        row, step_rows, project = self._split(case)
+        connection.execute(delete(steps_table).where(steps_table.c.case_id == row['id']))
+        connection.execute(delete(test_cases_table).where(test_cases_table.c.id == row['id']))
+        connection.execute(insert(test_cases_table), [row])
+        if step_rows:
+            connection.execute(insert(steps_table), step_rows)
+        if project:
+            self._upsert_project(connection, project)
+
+    def _bulk_insert(self, connection, cases):
+        """批量写入测试用例（表中已清空时使用），每张表只执行一次批量插入"""
+        rows, all_step_rows, projects = {}, [], {}
+        for case in cases:
+            row, step_rows, project = self._split(case)
+            if row['id'] in rows:
+                # 与JSON存储一致：ID重复时以后出现的为准
+                all_step_rows = [step for step in all_step_rows if step['case_id'] != row['id']]
+            rows[row['id']] = row
+            all_step_rows.extend(step_rows)
+            if project and (project['id'] not in projects or project['name']):
+                projects[project['id']] = project
+        if rows:
+            connection.execute(insert(test_cases_table), list(rows.values()))
+        if all_step_rows:
+            connection.execute(insert(steps_table), all_step_rows)
+        for project in projects.values():
+            self._upsert_project(connection, project)
+
+    @staticmethod
+    def _bump_version(connection):
+        statement = sqlite_insert(store_meta_table).values(key=VERSION_META_KEY, value='1')
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=['key'], set_={'value': func.cast(store_meta_table.c.value, Integer) + 1}))
+
+    @staticmethod
+    def _upsert_project(connection, project):
+        existing = connection.execute(
+            select(projects_table.c.name).where(projects_table.c.id == project['id'])).first()
+        if existing is None:
+            connection.execute(insert(projects_table), [project])
+        elif project['name'] and existing.name != project['name']:
+            connection.execute(update(projects_table).where(projects_table.c.id == project['id'])
+                               .values(name=project['name']))
+
+    def _select_cases(self, connection, case_id=None):
+        case_query = select(test_cases_table).order_by(test_cases_table.c.id)
+        step_query = select(steps_table).order_by(steps_table.c.case_id, steps_table.c.kind, steps_table.c.position)
+        if case_id is not None:
+            case_query = case_query.where(test_cases_table.c.id == case_id)
+            step_query = step_query.where(steps_table.c.case_id == case_id)
+        steps_by_case = {}
+        for step_row in connection.execute(step_query).mappings():
+            steps_by_case.setdefault(step_row['case_id'], []).append(step_row)
+        return [self._assemble(row, steps_by_case.get(row['id'], []))
+                for row in connection.execute(case_query).mappings()]
+
+    # ---------- 导入 ----------
+
+    def _import_once(self, engine):
+        """数据库中还没有测试用例且未导入过时，从JSON文件导入；没有JSON文件时写入默认测试用例"""
+        with engine.begin() as connection:
+            imported = connection.execute(
+                select(store_meta_table.c.value).where(store_meta_table.c.key == IMPORTED_META_KEY)).first()
+            count = connection.execute(select(func.count()).select_from(test_cases_table)).scalar()
+            if imported is not None or count:
+                return
+            cases = self._read_json(self.json_file)
+            if cases is None:
+                default_case = dict(DEFAULT_TEST_CASE)
+                default_case['create_time'] = datetime.now().strftime('%Y-%m-%d %H:%M')
+                cases = [default_case]
+                logger.info("测试用例文件不存在或为空，数据库中写入默认测试用例")
+            self._bulk_insert(connection, cases)
+            connection.execute(insert(store_meta_table), [{
+                'key': IMPORTED_META_KEY,
+                'value': json.dumps({'file': self.json_file, 'count': len(cases),
+                                     'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, ensure_ascii=False),
+            }])
+        logger.info(f"已从 {self.json_file} 导入 {len(cases)} 个测试用例到数据库")
+
+    @staticmethod
+    def _read_json(path):
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read().strip()
+        return json.loads(content) if content else None
+
+    def import_json(self, path=None):
+        """
+        从JSON文件重新导入测试用例，替换数据库中现有的全部测试用例
+
+        返回:
+            int: 导入的测试用例数量
+        """
+        path = path or self.json_file
+        cases = self._read_json(path)
+        if cases is None:
+            raise FileNotFoundError(f"测试用例文件不存在或为空: {path}")
+        with self.engine.begin() as connection:
+            connection.execute(delete(steps_table))
+            connection.execute(delete(test_cases_table))
+            self._bulk_insert(connection, cases)
+            self._bump_version(connection)
+            connection.execute(delete(store_meta_table).where(store_meta_table.c.key == IMPORTED_META_KEY))
+            connection.execute(insert(store_meta_table), [{
+                'key': IMPORTED_META_KEY,
+                'value': json.dumps({'file': path, 'count': len(cases),
+                                     'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, ensure_ascii=False),
+            }])
+        logger.info(f"已从 {path} 重新导入 {len(cases)} 个测试用例到数据库")
+        return len(cases)
+
+    # ---------- 存储接口（与 JSON 存储相同） ----------
+
+    def get_all(self):
+        """获取所有测试用例，按ID排序"""
+        with self.engine.connect() as connection:
+            return self._select_cases(connection)
+
+    def get(self, case_id):
+        """根据ID获取测试用例，不存在时返回None"""
+        with self.engine.connect() as connection:
+            cases = self._select_cases(connection, case_id)
+        return cases[0] if cases else None
+
+    def insert(self, case):
+        """插入新测试用例，ID为当前最大ID加1；返回写入后的测试用例"""
+        with self.engine.begin() as connection:
+            max_id = connection.execute(select(func.max(test_cases_table.c.id))).scalar()
+            case = dict(case, id=(max_id or 0) + 1)
+            self._write_case(connection, case)
+            self._bump_version(connection)
+            return self._select_cases(connection, case['id'])[0]
+
+    def put(self, case):
+        """替换已有测试用例（含全部步骤）；返回写入后的测试用例，不存在时返回None"""
+        with self.engine.begin() as connection:
+            exists = connection.execute(
+                select(test_cases_table.c.id).where(test_cases_table.c.id == case['id'])).first()
+            if exists is None:
+                return None
+            self._write_case(connection, case)
+            self._bump_version(connection)
+            return self._select_cases(connection, case['id'])[0]
+
+    def delete(self, case_id):
+        """删除测试用例，返回是否存在"""
+        with self.engine.begin() as connection:
+            connection.execute(delete(steps_table).where(steps_table.c.case_id == case_id))
+            result = connection.execute(delete(test_cases_table).where(test_cases_table.c.id == case_id))
+            # 测试用例不存在时数据没有变化，不改变版本，列表的ETag保持有效
+            if result.rowcount:
+                self._bump_version(connection)
+        return result.rowcount > 0
+
+    def update_status(self, case_id, status, execution_time):
+        """只更新状态和最新执行时间，返回测试用例是否存在"""
+        with self.engine.begin() as connection:
+            result = connection.execute(update(test_cases_table).where(test_cases_table.c.id == case_id)
+                                        .values(status=status, last_execution_time=execution_time))
+            if result.rowcount:
+                self._bump_version(connection)
+        return result.rowcount > 0
+
+    def version(self):
+        """数据版本，每次写入测试用例后改变"""
+        with self.engine.connect() as connection:
+            value = connection.execute(
+                select(store_meta_table.c.value).where(store_meta_table.c.key == VERSION_META_KEY)).scalar()
+        return f"sqlite:{value or 0}"
+
+    def query(self, project_id=None, status=None, case_type=None, search=None, sort='id', descending=False,
+              limit=None, cursor=None, fields=None):
+        """
+        按条件查询测试用例，支持排序、游标分页和字段投影
+
+        参数:
+            project_id / status / case_type: 精确匹配
+            search: 标题包含的文本（不区分大小写）
+            sort / descending: 排序字段（见 SORT_FIELDS）和方向，相同值按ID排序
+            limit: 每页数量，None表示不分页
+            cursor: 上一页返回的 next_cursor
+            fields: 返回的字段列表，None表示全部字段；不包含 script_content 时不读取步骤
+
+        返回:
+            dict: {'items': [...], 'total': 符合条件的总数, 'next_cursor': 下一页游标或None}
+        """
+        column = test_cases_table.c[check_sort(sort)]
+        id_column = test_cases_table.c.id
+        conditions = []
+        if project_id:
+            conditions.append(test_cases_table.c.project_id == str(project_id))
+        if status:
+            conditions.append(test_cases_table.c.status == status)
+        if case_type:
+            conditions.append(test_cases_table.c.type == case_type)
+        if search:
+            escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append(test_cases_table.c.title.ilike(f'%{escaped}%', escape='\\'))
+        page_conditions = list(conditions)
+        if cursor:
+            value, last_id = decode_cursor(cursor, sort, descending)
+            if descending:
+                page_conditions.append(or_(column < value, and_(column == value, id_column < last_id)))
+            else:
+                page_conditions.append(or_(column > value, and_(column == value, id_column > last_id)))
+        order = (column.desc(), id_column.desc()) if descending else (column, id_column)
+        case_query = select(test_cases_table).where(*page_conditions).order_by(*order)
+        if limit:
+            case_query = case_query.limit(limit + 1)
+        with_script = fields is None or 'script_content' in fields
+        with self.engine.connect() as connection:
+            total = connection.execute(
+                select(func.count()).select_from(test_cases_table).where(*conditions)).scalar()
+            rows = connection.execute(case_query).mappings().all()
+            next_cursor = None
+            if limit and len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(sort, descending, rows[-1][sort], rows[-1]['id'])
+            steps_by_case = {}
+            if with_script and rows:
+                case_ids = [row['id'] for row in rows]
+                for start in range(0, len(case_ids), 500):
+                    for step_row in connection.execute(
+                            select(steps_table).where(steps_table.c.case_id.in_(case_ids[start:start + 500]))
+                            .order_by(steps_table.c.case_id, steps_table.c.kind, steps_table.c.position)).mappings():
+                        steps_by_case.setdefault(step_row['case_id'], []).append(step_row)
+        items = [project_fields(self._assemble(row, steps_by_case.get(row['id'], []), with_script), fields)
+                 for row in rows]
+        return {'items': items, 'total': total, 'next_cursor': next_cursor}
+
+    def get_projects(self):
+        """获取测试用例涉及的所有项目 [{'id', 'name'}]"""
+        with self.engine.connect() as connection:
+            return [dict(row) for row in connection.execute(
+                select(projects_table).order_by(projects_table.c.id)).mappings()]
+
+    def dispose(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+                self._engine = None
+
+
+if __name__ == '__main__':
+    # 手动重新导入：python -m models.test_case_db import [JSON文件路径]
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) >= 2 and sys.argv[1] == 'import':
+        count = SQLiteTestCaseStore().import_json(sys.argv[2] if len(sys.argv) > 2 else None)
+        print(f"已导入 {count} 个测试用例")
+    else:
+        print("用法: python -m models.test_case_db import [JSON文件路径]")
@@ -3,10 +3,20 @@
 """
 import os
 import shutil
+import cv2
 import logging
-from flask import send_from_directory, jsonify, request
-from werkzeug.utils import secure_filename
+from flask import send_from_directory, jsonify, request, redirect, url_for, abort
+from werkzeug.utils import secure_filename, safe_join
 from config import IMAGES_DIR, SCREENSHOTS_DIR, OPERATION_IMAGES_DIR, DISPLAY_IMAGES_DIR
+from utils.feature_sidecar import schedule_features, remove_features
+from utils.screen_index import screen_index, REFERENCE_DIRS
+from utils.ignore_mask import load_regions, save_regions, remove_regions
+from utils.Config import ROI_REGIONS
+from utils.glyph_ocr import learn_glyphs, load_glyph_set, list_glyph_sets, remove_glyph_set
+from utils.artifact_store import artifact_store
+from utils.file_manifest import file_manifest
+from utils.thumbnails import thumbnail_cache, parse_variant, EXTENSION_FORMATS, THUMBNAIL_FORMATS
+from utils.http_cache import version_etag, not_modified
 
 # 设置日志
 logger = logging.getLogger(__name__)
@@ -14,94 +24,155 @@ logger = logging.getLogger(__name__)
 # 从__init__.py导入蓝图
 from . import files_bp
 
+# 缩略图的浏览器缓存时间（秒）：缩略图地址包含内容哈希，内容不会变化
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+
+
+def _serve_file(directory, filename):
+    """
+    提供目录中的文件；带 w 或 fmt 参数时重定向到该图像的缩略图
+
+    缩略图地址包含源图像的内容哈希，可被浏览器长期缓存；重定向本身不缓存，源图像被替换后指向新的缩略图
+    """
+    if 'w' not in request.args and 'fmt' not in request.args:
+        return send_from_directory(directory, filename)
+    try:
+        width, fmt = parse_variant(request.args.get('w'), request.args.get('fmt'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    source = safe_join(directory, filename)
+    if source is None or not os.path.isfile(source):
+        abort(404)
+    name = thumbnail_cache.get(source, width, fmt)
+    if name is None:
+        # 生成失败或超时时返回原图
+        return send_from_directory(directory, filename)
+    response = redirect(url_for('files.serve_thumbnail', name=name))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@files_bp.route('/thumbnails/<name>')
+def serve_thumbnail(name):
+    """提供缩略图文件服务（地址包含内容哈希，长期缓存）"""
+    extension = name.rsplit('.', 1)[-1]
+    if extension not in EXTENSION_FORMATS:
+        abort(404)
+    response = send_from_directory(os.path.dirname(thumbnail_cache.path(name)), name,
+                                   mimetype=THUMBNAIL_FORMATS[EXTENSION_FORMATS[extension]][1],
+                                   max_age=THUMBNAIL_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @files_bp.route('/images/<path:filename>')
 def serve_image(filename):
     """提供图片文件服务"""
-    return send_from_directory(IMAGES_DIR, filename)
+    return _serve_file(IMAGES_DIR, filename)
 
 @files_bp.route('/operation_img/<path:filename>')
 def serve_operation_image(filename):
     """提供操作图片文件服务"""
-    return send_from_directory(OPERATION_IMAGES_DIR, filename)
+    return _serve_file(OPERATION_IMAGES_DIR, filename)
 
 @files_bp.route('/display_img/<path:filename>')
 def serve_display_image(filename):
     """提供显示图片文件服务"""
-    return send_from_directory(DISPLAY_IMAGES_DIR, filename)
+    return _serve_file(DISPLAY_IMAGES_DIR, filename)
 
 @files_bp.route('/screenshots/<path:filename>')
 def serve_screenshot(filename):
     """提供截图文件服务"""
-    return send_from_directory(SCREENSHOTS_DIR, filename)
+    return _serve_file(SCREENSHOTS_DIR, filename)
 
 @files_bp.route('/upload/<path:filename>')
 def serve_upload_file(filename):
     """提供前端上传目录的文件服务"""
     # 前端upload目录路径
     upload_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'frontend', 'public', 'img', 'upload')
-    return send_from_directory(upload_dir, filename)
+    return _serve_file(upload_dir, filename)
 
-@files_bp.route('/images/list')
-def list_images():
-    """获取图片文件列表"""
-    try:
-        test_case_id = request.args.get('testCaseId')
+# 文件列表每页的最大数量
+MAX_LIST_LIMIT = 1000
 
-        # 定义要扫描的目录
-        dirs_to_scan = [
-            ('operation_img', OPERATION_IMAGES_DIR),
-            ('display_img', DISPLAY_IMAGES_DIR)
-        ]
 
-        all_files = []
+def _list_files(kinds, build):
+    """
+    文件列表接口的公共处理：从文件清单分页查询，响应带ETag，清单和查询参数都没有变化时返回304
 
-        for subdir_name, dir_path in dirs_to_scan:
-            if not os.path.exists(dir_path):
-                continue
+    查询参数: testCaseId、since / until（修改时间，ISO格式的日期或时间）、limit、cursor（上一页返回的 nextCursor），
+    不带 limit 时返回全部文件
 
-            try:
-                files = os.listdir(dir_path)
-                # 只保留图像文件
-                image_files = [f for f in files if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.tiff', '.tif'))]
-
-                # 如果指定了测试用例ID，过滤匹配的文件
-                if test_case_id:
-                    image_files = [f for f in image_files if f.startswith(f'id_{test_case_id}_') or f.startswith(f'{test_case_id}_')]
-
-                # 构建文件详情
-                for filename in image_files:
-                    file_path = os.path.join(dir_path, filename)
-                    try:
-                        stat = os.stat(file_path)
-
-                        # 构建API路径
-                        if subdir_name == 'root':
-                            api_path = f'/api/files/images/{filename}'
-                        elif subdir_name == 'operation_img':
-                            api_path = f'/api/files/operation_img/{filename}'
-                        elif subdir_name == 'display_img':
-                            api_path = f'/api/files/display_img/{filename}'
-
-                        all_files.append({
-                            'name': filename,
-                            'path': api_path,
-                            'size': stat.st_size,
-                            'lastModified': stat.st_mtime,
-                            'subDir': subdir_name
-                        })
-                    except OSError:
-                        continue
-
-            except OSError:
-                continue
+    参数:
+        kinds: 要列出的目录类型
+        build: 根据查询结果构建响应字典的函数
+    """
+    file_manifest.sync(kinds)
+    etag = version_etag(file_manifest.version(kinds))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
 
+    test_case_id = request.args.get('testCaseId')
+    try:
+        limit = request.args.get('limit', type=int)
+        if limit is not None and not 1 <= limit <= MAX_LIST_LIMIT:
+            raise ValueError(f"limit 必须在 1 到 {MAX_LIST_LIMIT} 之间")
+        result = file_manifest.query(
+            kinds,
+            test_case_id=test_case_id or None,
+            since=request.args.get('since') or None,
+            until=request.args.get('until') or None,
+            limit=limit,
+            cursor=request.args.get('cursor') or None
+        )
+    except ValueError as e:
         return jsonify({
-            'success': True,
-            'images': [f['name'] for f in all_files],
-            'imageDetails': all_files,
-            'testCaseId': test_case_id,
-            'timestamp': None
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    response = jsonify({
+        'success': True,
+        **build(result['items']),
+        'testCaseId': test_case_id,
+        'total': result['total'],
+        'nextCursor': result['next_cursor'],
+        'timestamp': None
+    })
+    response.set_etag(etag)
+    return response
+
+@files_bp.route('/images/list')
+def list_images():
+    """
+    获取图片文件列表（operation_img 和 display_img），按修改时间从新到旧
+
+    查询参数见 _list_files，另可用 kind（operation_img、display_img，逗号分隔）只列出其中的目录
+    """
+    try:
+        kind = request.args.get('kind')
+        kinds = [k.strip() for k in kind.split(',') if k.strip()] if kind else ['operation_img', 'display_img']
+        invalid = [k for k in kinds if k not in ('operation_img', 'display_img')]
+        if invalid:
+            return jsonify({
+                'success': False,
+                'error': f"不支持的目录: {', '.join(invalid)}"
+            }), 400
+
+        def build(items):
+            details = [{
+                'name': item['name'],
+                'path': f"/api/files/{item['kind']}/{item['name']}",
+                'size': item['size'],
+                'lastModified': item['mtime'],
+                'subDir': item['kind']
+            } for item in items]
+            return {'images': [item['name'] for item in details], 'imageDetails': details}
+
+        return _list_files(kinds, build)
 
     except Exception as e:
         return jsonify({
@@ -113,59 +184,18 @@ def list_images():
 
 @files_bp.route('/screenshots/list')
 def list_screenshots():
-    """获取截图文件列表"""
+    """获取截图文件列表，按修改时间从新到旧，查询参数见 _list_files"""
     try:
-        test_case_id = request.args.get('testCaseId')
+        def build(items):
+            details = [{
+                'name': item['name'],
+                'path': f"/api/files/screenshots/{item['name']}",
+                'size': item['size'],
+                'lastModified': item['mtime']
+            } for item in items]
+            return {'screenshots': [item['name'] for item in details], 'screenshotDetails': details}
 
-        if not os.path.exists(SCREENSHOTS_DIR):
-            return jsonify({
-                'success': True,
-                'screenshots': [],
-                'screenshotDetails': [],
-                'testCaseId': test_case_id,
-                'timestamp': None
-            })
-
-        try:
-            files = os.listdir(SCREENSHOTS_DIR)
-            # 只保留图像文件
-            screenshot_files = [f for f in files if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.tiff', '.tif'))]
-
-            # 如果指定了测试用例ID，过滤匹配的文件
-            if test_case_id:
-                screenshot_files = [f for f in files if f.startswith(f'id_{test_case_id}_') or f.startswith(f'{test_case_id}_')]
-
-            # 构建文件详情
-            screenshot_details = []
-            for filename in screenshot_files:
-                file_path = os.path.join(SCREENSHOTS_DIR, filename)
-                try:
-                    stat = os.stat(file_path)
-                    screenshot_details.append({
-                        'name': filename,
-                        'path': f'/api/files/screenshots/{filename}',
-                        'size': stat.st_size,
-                        'lastModified': stat.st_mtime
-                    })
-                except OSError:
-                    continue
-
-            return jsonify({
-                'success': True,
-                'screenshots': screenshot_files,
-                'screenshotDetails': screenshot_details,
-                'testCaseId': test_case_id,
-                'timestamp': None
-            })
-
-        except OSError:
-            return jsonify({
-                'success': True,
-                'screenshots': [],
-                'screenshotDetails': [],
-                'testCaseId': test_case_id,
-                'timestamp': None
-            })
+        return _list_files(['screenshots'], build)
 
     except Exception as e:
         return jsonify({
@@ -177,40 +207,9 @@ def list_screenshots():
 
 @files_bp.route('/upload/list')
 def list_upload_files():
-    """获取前端upload目录的文件列表"""
+    """获取前端upload目录的文件列表，按修改时间从新到旧，查询参数见 _list_files"""
     try:
-        # 前端upload目录路径
-        upload_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'frontend', 'public', 'img', 'upload')
-
-        if not os.path.exists(upload_dir):
-            logger.warning(f"Upload目录不存在: {upload_dir}")
-            return jsonify({
-                'success': True,
-                'files': [],
-                'message': 'Upload目录不存在'
-            })
-
-        try:
-            files = os.listdir(upload_dir)
-            # 过滤图片文件
-            image_files = [f for f in files if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.tiff', '.tif', '.webp'))]
-
-            # 按修改时间排序（最新的在前）
-            image_files.sort(key=lambda x: os.path.getmtime(os.path.join(upload_dir, x)), reverse=True)
-
-            logger.info(f"在upload目录找到 {len(image_files)} 个图片文件")
-
-            return jsonify({
-                'success': True,
-                'files': image_files
-            })
-
-        except Exception as e:
-            logger.error(f"扫描upload目录时出错: {str(e)}")
-            return jsonify({
-                'success': False,
-                'error': f'扫描upload目录时出错: {str(e)}'
-            }), 500
+        return _list_files(['upload'], lambda items: {'files': [item['name'] for item in items]})
 
     except Exception as e:
         logger.error(f"获取upload文件列表时出错: {str(e)}")
@@ -266,6 +265,12 @@ def clear_images():
                 errors.append(error_msg)
                 logger.error(error_msg)
 
+        # 删除采集图像存储中已不再被引用的内容
+        try:
+            artifact_store.prune()
+        except Exception as e:
+            logger.warning(f"清理采集图像存储失败: {str(e)}")
+
         # 构建响应消息
         if errors:
             message = f"部分清空完成。成功: {'; '.join(cleared_dirs)}。错误: {'; '.join(errors)}"
@@ -296,6 +301,25 @@ def clear_images():
             'errors': [error_msg]
         }), 500
 
+@files_bp.route('/artifacts', methods=['GET'])
+def artifact_stats():
+    """采集图像存储的统计信息和保留规则"""
+    try:
+        return jsonify({'success': True, 'stats': artifact_store.stats()})
+    except Exception as e:
+        logger.error(f"获取采集图像存储统计失败: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@files_bp.route('/artifacts/prune', methods=['POST'])
+def prune_artifacts():
+    """立即按保留规则清理采集图像和执行记录"""
+    try:
+        result = artifact_store.prune()
+        return jsonify({'success': True, **result, 'stats': artifact_store.stats()})
+    except Exception as e:
+        logger.error(f"清理采集图像失败: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @files_bp.route('/upload', methods=['POST'])
 def upload_file():
     """上传文件到指定目录"""
@@ -361,6 +385,12 @@ def upload_file():
         file.save(file_path)
         logger.info(f"文件上传成功: {file_path}")
 
+        file_manifest.record(file_path)
+
+        # 后台预先计算参考图特征（ORB、灰度金字塔、感知哈希），验证时直接加载
+        schedule_features(file_path)
+        screen_index.invalidate()
+
         # 构建访问URL
         if file_type == 'screenshot':
             # 前端public目录的文件可以直接通过/img/upload/访问
@@ -456,8 +486,12 @@ def delete_file():
                 'file_path': file_path
             })
 
-        # 删除文件
+        # 删除文件及其特征旁路文件、忽略区域文件
         os.remove(file_path)
+        file_manifest.forget(file_path)
+        remove_features(file_path)
+        remove_regions(file_path)
+        screen_index.invalidate()
         logger.info(f"文件删除成功: {file_path}")
 
         return jsonify({
@@ -472,4 +506,162 @@ def delete_file():
         return jsonify({
             'success': False,
             'error': f'文件删除失败: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+def _resolve_reference_path(file_url):
+    """将参考图的访问URL（/img/upload/... 或 /screenshot/upload/...）转换为文件路径，无法识别时返回None"""
+    for directory, url_prefix in REFERENCE_DIRS:
+        if file_url.startswith(url_prefix):
+            filename = secure_filename(file_url[len(url_prefix):])
+            if filename:
+                return os.path.join(directory, filename)
+    return None
+
+
+@files_bp.route('/mask', methods=['GET', 'PUT'])
+def reference_mask():
+    """
+    读取或设置参考图的忽略区域
+
+    GET 参数 fileUrl；PUT 请求体 {fileUrl, regions, coordinateSize}，regions 为空列表时清除忽略区域。
+    区域格式见 utils/ignore_mask.py，预设区域来自 ROI_REGIONS。
+    """
+    try:
+        if request.method == 'PUT':
+            data = request.get_json(silent=True) or {}
+        else:
+            data = request.args
+        file_url = data.get('fileUrl')
+        if not file_url:
+            return jsonify({
+                'success': False,
+                'error': '缺少fileUrl参数'
+            }), 400
+
+        file_path = _resolve_reference_path(file_url)
+        if not file_path:
+            return jsonify({
+                'success': False,
+                'error': f'无法解析参考图路径: {file_url}'
+            }), 400
+        if not os.path.exists(file_path):
+            return jsonify({
+                'success': False,
+                'error': f'参考图不存在: {file_url}'
+            }), 404
+
+        if request.method == 'PUT':
+            try:
+                regions = save_regions(file_path, data.get('regions') or [], data.get('coordinateSize'))
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            logger.info(f"已更新参考图忽略区域: {file_url}, 共 {len(regions)} 个")
+
+        mask = load_regions(file_path)
+        return jsonify({
+            'success': True,
+            'fileUrl': file_url,
+            'regions': mask['regions'] if mask else [],
+            'coordinateSize': mask['coordinate_size'] if mask else None,
+            'presets': {name: {'region': list(preset['region']), 'description': preset['description']}
+                        for name, preset in ROI_REGIONS.items()}
+        })
+
+    except Exception as e:
+        logger.error(f"处理参考图忽略区域失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'处理参考图忽略区域失败: {str(e)}'
+        }), 500
+
+
+@files_bp.route('/glyphs', methods=['GET', 'POST', 'DELETE'])
+def glyph_sets():
+    """
+    管理字形模板快速识别使用的字形集
+
+    GET 参数 glyphSet（可选）：返回所有字形集名称及该字形集每个字符的样本数；
+    POST 请求体 {fileUrl, text, region, glyphSet}：从参考截图的指定区域学习字形，text 为区域中显示的文本；
+    DELETE 参数 glyphSet：删除字形集。
+    """
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+        else:
+            data = request.args
+        name = data.get('glyphSet')
+
+        if request.method == 'DELETE':
+            if not name:
+                return jsonify({
+                    'success': False,
+                    'error': '缺少glyphSet参数'
+                }), 400
+            if not remove_glyph_set(name):
+                return jsonify({
+                    'success': False,
+                    'error': f'字形集不存在: {name}'
+                }), 404
+            logger.info(f"已删除字形集: {name}")
+            return jsonify({
+                'success': True,
+                'glyphSets': list_glyph_sets()
+            })
+
+        if request.method == 'POST':
+            file_url = data.get('fileUrl')
+            if not name or not file_url or not data.get('text'):
+                return jsonify({
+                    'success': False,
+                    'error': '缺少glyphSet、fileUrl或text参数'
+                }), 400
+            file_path = _resolve_reference_path(file_url)
+            if not file_path:
+                return jsonify({
+                    'success': False,
+                    'error': f'无法解析参考图路径: {file_url}'
+                }), 400
+            image = cv2.imread(file_path) if os.path.exists(file_path) else None
+            if image is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'参考图不存在: {file_url}'
+                }), 404
+            try:
+                result = learn_glyphs(image, data['text'], name, region=data.get('region'))
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            return jsonify({
+                'success': True,
+                'glyphSet': name,
+                'learned': result['learned'],
+                'labels': result['labels'],
+                'glyphSets': list_glyph_sets()
+            })
+
+        glyph_set = load_glyph_set(name) if name else None
+        return jsonify({
+            'success': True,
+            'glyphSet': name,
+            'labels': glyph_set.label_counts() if glyph_set else {},
+            'glyphSets': list_glyph_sets()
+        })
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"处理字形集失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'处理字形集失败: {str(e)}'
+        }), 500
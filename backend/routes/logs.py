@@ -1,6 +1,8 @@
 import os
-from flask import Blueprint, jsonify, current_app
+from flask import Blueprint, jsonify, current_app, send_file
 from flask_cors import cross_origin
+from utils.log_stream import parse_log_lines
+from utils.http_cache import version_etag, not_modified
 
 # 创建Blueprint
 logs_bp = Blueprint('logs', __name__, url_prefix='/api/logs')
@@ -8,7 +10,7 @@ logs_bp = Blueprint('logs', __name__, url_prefix='/api/logs')
 @logs_bp.route('/vp180', methods=['GET'])
 @cross_origin()
 def get_vp180_log():
-    """获取VP_180.log日志文件内容"""
+    """获取VP_180.log日志文件内容（文件未变化时返回304）"""
     try:
         log_file_path = os.path.join(current_app.config['DATA_DIR'], 'logs', 'VP_180.log')
         
@@ -18,41 +20,25 @@ def get_vp180_log():
                 'message': "日志文件不存在",
                 'data': []
             }), 404
-            
-        with open(log_file_path, 'r', encoding='utf-8') as file:
-            log_lines = file.readlines()
+
+        # 按文件修改时间和大小生成ETag，未变化时不再读取和解析
+        stat = os.stat(log_file_path)
+        etag = version_etag(f"{stat.st_mtime_ns}:{stat.st_size}")
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
             
         # 处理日志行，解析日期、级别等信息
-        parsed_logs = []
-        for line in log_lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # 尝试解析日志格式: 2025-04-23 16:55:33 - INFO - utils.button_clicker - 成功加载FUNCTIONS配置
-            parts = line.split(' - ', 3)
-            if len(parts) >= 4:
-                timestamp, level, source, message = parts
-                parsed_logs.append({
-                    'timestamp': timestamp,
-                    'level': level,
-                    'source': source,
-                    'message': message
-                })
-            else:
-                # 如果格式不匹配，直接将整行作为消息
-                parsed_logs.append({
-                    'timestamp': '',
-                    'level': 'UNKNOWN',
-                    'source': '',
-                    'message': line
-                })
+        with open(log_file_path, 'r', encoding='utf-8') as file:
+            parsed_logs = parse_log_lines(file)
                 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'message': "成功获取日志数据",
             'data': parsed_logs
         })
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         current_app.logger.error(f"获取VP_180.log文件时出错: {str(e)}")
@@ -62,6 +48,25 @@ def get_vp180_log():
             'data': []
         }), 500
 
+@logs_bp.route('/vp180/raw', methods=['GET'])
+@cross_origin()
+def get_vp180_log_raw():
+    """
+    获取VP_180.log原始内容
+
+    支持 If-None-Match/If-Modified-Since 条件请求和 Range 请求，
+    前端可以用 Range: bytes=<已读取的长度>- 只获取新增的部分
+    """
+    log_file_path = os.path.join(current_app.config['DATA_DIR'], 'logs', 'VP_180.log')
+    if not os.path.exists(log_file_path):
+        return jsonify({
+            'success': False,
+            'message': "日志文件不存在"
+        }), 404
+    response = send_file(log_file_path, mimetype='text/plain', conditional=True, max_age=0)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @logs_bp.route('/vp180/clear', methods=['POST'])
 @cross_origin()
 def clear_vp180_log():
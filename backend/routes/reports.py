@@ -8,6 +8,11 @@ from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app
 from flask_cors import cross_origin
 
+from utils.run_records import load_run, list_runs
+from config import REVERIFY_SYNC_MAX_RUNS
+from utils.reverification import reverify, submit_reverify, get_job
+from models.execution_history import execution_history
+
 # 设置日志
 logger = logging.getLogger(__name__)
 
@@ -140,3 +145,225 @@ def list_reports():
             'success': False,
             'message': f'获取报告列表失败: {str(e)}'
         }), 500
+
+@reports_bp.route('/runs', methods=['GET'])
+@cross_origin()
+def list_run_records():
+    """获取执行记录列表，可按 testCaseId 过滤、按 limit 限制数量"""
+    try:
+        test_case_id = request.args.get('testCaseId', type=int)
+        limit = request.args.get('limit', type=int)
+        runs = list_runs(test_case_id=test_case_id, limit=limit)
+        return jsonify({
+            'success': True,
+            'data': runs,
+            'count': len(runs)
+        })
+
+    except Exception as e:
+        logger.error(f"获取执行记录列表失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'获取执行记录列表失败: {str(e)}'
+        }), 500
+
+@reports_bp.route('/runs/<run_id>', methods=['GET'])
+@cross_origin()
+def get_run_record(run_id):
+    """获取一次执行的完整记录（各验证步骤的方法、阈值、得分和图像）"""
+    try:
+        record = load_run(run_id)
+        if record is None:
+            return jsonify({
+                'success': False,
+                'message': '执行记录不存在'
+            }), 404
+        return jsonify({
+            'success': True,
+            'data': record
+        })
+
+    except Exception as e:
+        logger.error(f"获取执行记录失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'获取执行记录失败: {str(e)}'
+        }), 500
+
+@reports_bp.route('/reverify', methods=['POST'])
+@cross_origin()
+def reverify_runs():
+    """
+    使用新的阈值、比较方法或参考图离线重新验证历史执行
+
+    请求体（均为可选）:
+        runIds: 执行记录ID列表，为空时按 testCaseId / limit 选择最近的执行
+        testCaseId: 测试用例ID
+        limit: 最多重新验证的执行数
+        method: 比较方法名，或以验证步骤名称/原方法为键的字典
+        thresholds: 阈值，或以验证步骤名称/方法为键的字典
+        references: 以原参考图路径或文件名为键、新参考图文件名（参考图目录中的文件）为值的字典
+        workers: 并行进程数，不超过 REVERIFY_WORKERS
+        background: 为true时作为后台任务运行
+
+    执行数超过 REVERIFY_SYNC_MAX_RUNS（或未指定 runIds 和 limit）时也作为后台任务运行，
+    返回202和任务ID，通过 /reverify/jobs/<job_id> 查询结果
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        options = dict(
+            run_ids=data.get('runIds'),
+            test_case_id=data.get('testCaseId'),
+            limit=data.get('limit'),
+            method=data.get('method'),
+            thresholds=data.get('thresholds'),
+            references=data.get('references'),
+            workers=data.get('workers')
+        )
+        if data.get('background') or _reverify_size(options) > REVERIFY_SYNC_MAX_RUNS:
+            job = submit_reverify(**options)
+            return jsonify({
+                'success': True,
+                'data': {
+                    'jobId': job['job_id'],
+                    'status': job['status']
+                }
+            }), 202
+
+        report = reverify(**options)
+        return jsonify({
+            'success': True,
+            'data': report
+        })
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"离线重新验证失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'离线重新验证失败: {str(e)}'
+        }), 500
+
+
+def _reverify_size(options):
+    """本次重新验证最多涉及的执行数，未限制时为无穷大"""
+    if options['run_ids']:
+        return len(options['run_ids'])
+    try:
+        return int(options['limit']) if options['limit'] else float('inf')
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的数量限制: {options['limit']}")
+
+
+@reports_bp.route('/reverify/jobs/<job_id>', methods=['GET'])
+@cross_origin()
+def get_reverify_job(job_id):
+    """查询后台重新验证任务的状态和结果"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': f'任务不存在: {job_id}'
+        }), 404
+    return jsonify({
+        'success': True,
+        'data': {
+            'jobId': job['job_id'],
+            'status': job['status'],
+            'submittedAt': job['submitted_at'],
+            'finishedAt': job['finished_at'],
+            'result': job['result'],
+            'error': job['error']
+        }
+    })
+
+
+def _history_filters():
+    """执行历史查询的公共参数：testCaseId、projectId、since、until"""
+    return {
+        'test_case_id': request.args.get('testCaseId', type=int),
+        'project_id': request.args.get('projectId') or None,
+        'since': request.args.get('since') or None,
+        'until': request.args.get('until') or None,
+    }
+
+
+def _history_response(query, error_message):
+    """执行历史查询的统一响应：参数错误返回400，其他错误返回500"""
+    try:
+        return jsonify({
+            'success': True,
+            **query()
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"{error_message}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'{error_message}: {str(e)}'
+        }), 500
+
+@reports_bp.route('/history', methods=['GET'])
+@cross_origin()
+def list_history():
+    """
+    分页获取执行历史，按开始时间从新到旧
+
+    查询参数: testCaseId、projectId、success（true/false）、since、until、limit、cursor（上一页返回的 nextCursor）
+    """
+    def query():
+        success = request.args.get('success')
+        page = execution_history.list_runs(
+            success=None if success is None else success.lower() in ('true', '1'),
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor') or None,
+            **_history_filters()
+        )
+        return {'data': page['runs'], 'count': len(page['runs']), 'nextCursor': page['next_cursor']}
+
+    return _history_response(query, '获取执行历史失败')
+
+@reports_bp.route('/history/<run_id>', methods=['GET'])
+@cross_origin()
+def get_history_run(run_id):
+    """获取一次执行的历史记录，包含每个步骤的耗时和结果"""
+    run = execution_history.get_run(run_id)
+    if run is None:
+        return jsonify({
+            'success': False,
+            'message': '执行历史不存在'
+        }), 404
+    return jsonify({
+        'success': True,
+        'data': run
+    })
+
+@reports_bp.route('/history/trend', methods=['GET'])
+@cross_origin()
+def get_pass_rate_trend():
+    """通过率趋势，查询参数: testCaseId、projectId、bucket（day/week/month）、since、until"""
+    return _history_response(lambda: {'data': execution_history.pass_rate_trend(
+        bucket=request.args.get('bucket', 'day'), **_history_filters())}, '获取通过率趋势失败')
+
+@reports_bp.route('/history/slowest-steps', methods=['GET'])
+@cross_origin()
+def get_slowest_steps():
+    """平均耗时最长的步骤，查询参数: testCaseId、projectId、phase、since、until、limit"""
+    return _history_response(lambda: {'data': execution_history.slowest_steps(
+        phase=request.args.get('phase') or None, limit=request.args.get('limit', 20, type=int),
+        **_history_filters())}, '获取最慢步骤失败')
+
+@reports_bp.route('/history/failures', methods=['GET'])
+@cross_origin()
+def get_failure_clusters():
+    """按步骤类型和失败原因聚类的失败步骤，查询参数: testCaseId、projectId、since、until、limit"""
+    return _history_response(lambda: {'data': execution_history.failure_clusters(
+        limit=request.args.get('limit', 20, type=int), **_history_filters())}, '获取失败聚类失败')
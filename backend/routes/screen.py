@@ -4,11 +4,20 @@ import os
 import logging
 from utils.get_latest_image import GetLatestImage
 from utils.ssh_manager import SSHManager
+from utils.feature_sidecar import schedule_features
+from utils.screen_index import screen_index, REFERENCE_DIRS
+from utils.batch_comparator import BatchComparator
+from config import SCREENSHOTS_DIR, OPERATION_IMAGES_DIR, DISPLAY_IMAGES_DIR
+import numpy as np
 
 # 创建蓝图
 screen_bp = Blueprint('screen', __name__)
 logger = logging.getLogger(__name__)
 
+# GET /api/screen/identify 按文件名查找已保存图像的目录：采集的截图和参考截图
+SAVED_IMAGE_DIRS = (SCREENSHOTS_DIR, OPERATION_IMAGES_DIR, DISPLAY_IMAGES_DIR,
+                    *(directory for directory, _ in REFERENCE_DIRS))
+
 @screen_bp.route('/api/screen/capture', methods=['GET'])
 def capture_screen():
     """
@@ -63,6 +72,10 @@ def capture_screen():
         cv2.imwrite(file_path, image)
         logger.info(f"通过SSH连接获取的操作界面截图保存成功: {file_path}")
 
+        # 后台预先计算参考图特征（ORB、灰度金字塔、感知哈希），验证时直接加载
+        schedule_features(file_path)
+        screen_index.invalidate()
+
         # 构建访问URL
         file_url = f'/img/upload/{file_name}'
 
@@ -80,4 +93,164 @@ def capture_screen():
         return jsonify({
             'success': False,
             'error': f'通过SSH连接获取操作界面截图时出错: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+def _find_image(name, directories):
+    """在目录中按文件名查找图像（只使用文件名部分），找不到时返回None"""
+    safe_name = os.path.basename(name)
+    return next((os.path.join(directory, safe_name) for directory in directories
+                 if safe_name and os.path.isfile(os.path.join(directory, safe_name))), None)
+
+
+def _get_query_image():
+    """
+    获取待识别/比较的图像：优先使用上传的 file，没有上传文件时通过SSH获取设备当前截图
+
+    Returns:
+        tuple: (图像, 来源, 错误响应)，成功时错误响应为None
+    """
+    if 'file' in request.files and request.files['file'].filename:
+        data = np.frombuffer(request.files['file'].read(), dtype=np.uint8)
+        image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        if image is None:
+            return None, 'upload', (jsonify({
+                'success': False,
+                'error': '无法解码上传的图像'
+            }), 400)
+        return image, 'upload', None
+
+    ssh_connection = SSHManager.get_client()
+    if not ssh_connection:
+        logger.error("无法获取SSH连接")
+        return None, 'device', (jsonify({
+            'success': False,
+            'error': '无法通过SSH连接到设备，请检查SSH连接设置'
+        }), 500)
+    image = GetLatestImage(ssh_connection).get_screen_capture()
+    if image is None:
+        return None, 'device', (jsonify({
+            'success': False,
+            'error': '通过SSH连接获取操作界面截图失败'
+        }), 500)
+    return image, 'device', None
+
+
+@screen_bp.route('/api/screen/identify', methods=['GET', 'POST'])
+def identify_screen():
+    """
+    识别界面：在所有参考截图的感知哈希索引中查找最接近的k张
+
+    GET 只识别已保存的图像（filename 指定的采集截图或参考截图），不会从设备获取截图或写入文件；
+    POST 上传的 file 作为待识别图像，没有上传文件时通过SSH获取设备当前截图。
+
+    Query/Form参数:
+        filename: 待识别图像的文件名（GET必需），在截图、操作界面、显示界面和参考截图目录中查找
+        k: 返回的参考截图数量，默认5
+        maxDistance: 允许的最大pHash汉明距离，默认64（不限制）
+
+    Returns:
+        JSON: 按相似度排序的参考截图列表
+    """
+    try:
+        k = int(request.values.get('k', 5))
+        max_distance = int(request.values.get('maxDistance', 64))
+
+        if request.method == 'GET':
+            filename = request.args.get('filename')
+            if not filename:
+                return jsonify({
+                    'success': False,
+                    'error': '缺少filename参数，从设备获取截图识别请使用POST'
+                }), 400
+            path = _find_image(filename, SAVED_IMAGE_DIRS)
+            if path is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'图像文件不存在: {filename}'
+                }), 404
+            image = cv2.imread(path)
+            if image is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'无法读取图像文件: {filename}'
+                }), 400
+            source = 'file'
+        else:
+            image, source, error = _get_query_image()
+            if error:
+                return error
+
+        matches = screen_index.query(image, k=k, max_distance=max_distance)
+        logger.info(f"屏幕识别完成，来源: {source}，最接近: {matches[0]['name'] if matches else '无'}")
+
+        return jsonify({
+            'success': True,
+            'source': source,
+            'matches': matches,
+            'index': screen_index.stats()
+        })
+
+    except Exception as e:
+        logger.exception(f"屏幕识别时出错: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'屏幕识别时出错: {str(e)}'
+        }), 500
+
+
+@screen_bp.route('/api/screen/compare', methods=['POST'])
+def compare_screen():
+    """
+    将一张截图与多张参考截图批量比较，返回按得分排序的结果表
+
+    上传的 file 作为截图；没有上传文件时通过SSH获取设备当前截图。
+
+    Form参数:
+        references: 参考截图文件名，可重复指定或以逗号分隔，在参考截图目录中查找
+        method: 比较方法，ssim / template / histogram，默认ssim
+        threshold: 通过阈值，默认使用各方法的默认值
+
+    Returns:
+        JSON: 批量比较结果
+    """
+    try:
+        names = []
+        for value in request.values.getlist('references'):
+            names.extend(name.strip() for name in value.split(',') if name.strip())
+        if not names:
+            return jsonify({
+                'success': False,
+                'error': '缺少references参数'
+            }), 400
+
+        method = request.values.get('method', 'ssim')
+        if method not in BatchComparator.METHODS:
+            return jsonify({
+                'success': False,
+                'error': f'不支持的比较方法: {method}'
+            }), 400
+        threshold = request.values.get('threshold')
+
+        # 在参考截图目录中查找，找不到的保留文件名，结果中标记为无法读取
+        reference_dirs = [directory for directory, _ in REFERENCE_DIRS]
+        paths = [_find_image(name, reference_dirs) or os.path.join(reference_dirs[0], os.path.basename(name))
+                 for name in names]
+
+        image, source, error = _get_query_image()
+        if error:
+            return error
+
+        report = BatchComparator(image).compare(paths, method=method, threshold=threshold, names=names)
+        return jsonify({
+            'success': True,
+            'source': source,
+            **report
+        })
+
+    except Exception as e:
+        logger.exception(f"批量比较截图时出错: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'批量比较截图时出错: {str(e)}'
+        }), 500
@@ -4,19 +4,28 @@
 from flask import request, jsonify
 from . import settings_bp
 from models.settings import Settings
+from services.config_service import config_service
+from utils.http_cache import version_etag, not_modified
 
 
 @settings_bp.route('/projects', methods=['GET'])
 def get_projects():
-    """获取项目列表"""
+    """获取项目列表（设置文件未变化时返回304）"""
     try:
+        etag = version_etag(config_service.version())
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
         settings = Settings.load()
         projects = settings.get('projects', [])
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'projects': projects
         })
+        response.set_etag(etag)
+        return response
     except Exception as e:
         return jsonify({
             'success': False,
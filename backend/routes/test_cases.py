@@ -3,10 +3,9 @@
 """
 from flask import Blueprint, request, jsonify
 from services.test_case_service import TestCaseService
+from utils.http_cache import version_etag, not_modified
 import os
-import json
 import logging
-from datetime import datetime
 
 # 定义数据目录
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
@@ -15,14 +14,62 @@ DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
 from routes import test_cases_bp
 test_case_service = TestCaseService()
 
+MAX_LIST_LIMIT = 1000
+
+
 @test_cases_bp.route('', methods=['GET'])
 def get_test_cases():
-    """获取所有测试用例"""
-    test_cases = TestCaseService.get_all()
-    return jsonify({
+    """
+    获取测试用例列表
+
+    查询参数（均为可选，不带参数时返回全部测试用例的全部字段）:
+        project_id / status / type: 精确过滤
+        search: 标题包含的文本
+        sort: 排序字段（id、title、type、status、create_time、last_execution_time、project_id），默认id
+        order: asc（默认）或 desc
+        limit / cursor: 每页数量和上一页返回的 next_cursor
+        fields: 逗号分隔的返回字段，例如 id,title,status（列表页可省略 script_content）
+
+    响应带ETag，数据和查询参数都没有变化时返回304
+    """
+    etag = version_etag(TestCaseService.version())
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    try:
+        limit = request.args.get('limit', type=int)
+        if limit is not None and not 1 <= limit <= MAX_LIST_LIMIT:
+            raise ValueError(f"limit 必须在 1 到 {MAX_LIST_LIMIT} 之间")
+        order = request.args.get('order', 'asc').lower()
+        if order not in ('asc', 'desc'):
+            raise ValueError(f"不支持的排序方向: {order}")
+        fields = request.args.get('fields')
+        result = TestCaseService.query(
+            project_id=request.args.get('project_id') or None,
+            status=request.args.get('status') or None,
+            case_type=request.args.get('type') or None,
+            search=request.args.get('search') or None,
+            sort=request.args.get('sort', 'id'),
+            descending=order == 'desc',
+            limit=limit,
+            cursor=request.args.get('cursor') or None,
+            fields=[field.strip() for field in fields.split(',') if field.strip()] if fields else None
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+    response = jsonify({
         'success': True,
-        'test_cases': test_cases
+        'test_cases': result['items'],
+        'total': result['total'],
+        'next_cursor': result['next_cursor']
     })
+    response.set_etag(etag)
+    return response
 
 @test_cases_bp.route('', methods=['POST'])
 def create_test_case():
@@ -193,25 +240,9 @@ def update_test_case_status(test_case_id):
         if not status:
             return jsonify({'success': False, 'message': '缺少状态参数'}), 400
         
-        # 读取测试用例数据
-        test_cases_file = os.path.join(DATA_DIR, 'test_cases.json')
-        if not os.path.exists(test_cases_file):
-            return jsonify({'success': False, 'message': '测试用例数据文件不存在'}), 404
-            
-        with open(test_cases_file, 'r', encoding='utf-8') as f:
-            test_cases = json.load(f)
-        
-        # 查找并更新指定测试用例
-        for test_case in test_cases:
-            if test_case['id'] == test_case_id:
-                test_case['status'] = status
-                # 添加最后执行时间
-                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                test_case['last_execution_time'] = current_time
-                # 保存更新后的数据
-                with open(test_cases_file, 'w', encoding='utf-8') as f:
-                    json.dump(test_cases, f, ensure_ascii=False, indent=2)
-                return jsonify({'success': True, 'message': '测试用例状态已更新'})
+        # 只更新状态和最新执行时间
+        if TestCaseService.update_status(test_case_id, status):
+            return jsonify({'success': True, 'message': '测试用例状态已更新'})
         
         return jsonify({'success': False, 'message': f'未找到ID为{test_case_id}的测试用例'}), 404
         
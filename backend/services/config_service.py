@@ -0,0 +1,162 @@
+"""
+配置服务 - settings.json 的内存缓存
+
+settings.json 原本在每个串口步骤、按钮点击器、触摸监控和SSH管理器中各自重新读取，项目查找也是逐个比较。
+该服务只在文件变化时读取一次，按项目ID建立索引，并在设置变化时通知订阅者：
+- 通过 save() 写入（/api/settings 等路由经 Settings.save 调用）后立即更新缓存并通知
+- 文件被其他程序修改时，下次读取（或有订阅者时的后台检查）发现修改时间/大小变化后重新加载并通知
+
+主要类：
+- ConfigService: 配置服务，全局实例为 config_service
+"""
+import copy
+import json
+import logging
+import os
+import threading
+import time
+
+from config import SETTINGS_FILE, DEFAULT_SSH_CONFIG, DEFAULT_SERIAL_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 有订阅者时后台检查文件变化的间隔（秒）
+WATCH_INTERVAL = 1.0
+
+
+class ConfigService:
+    """settings.json 的缓存、项目索引和变更通知"""
+
+    def __init__(self, path=SETTINGS_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self._settings = None
+        self._projects = {}
+        self._signature = None
+        self._subscribers = []
+        self._watcher = None
+
+    def _read_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _defaults():
+        return {**DEFAULT_SSH_CONFIG, **DEFAULT_SERIAL_CONFIG}
+
+    def _set(self, settings, signature):
+        self._settings = settings
+        self._projects = {str(project.get('id')): project for project in settings.get('projects', [])
+                          if isinstance(project, dict)}
+        self._signature = signature
+
+    def _refresh(self):
+        """文件修改时间或大小变化时重新加载，返回是否重新加载了"""
+        signature = self._read_signature()
+        if self._settings is not None and signature == self._signature:
+            return False
+        settings = None
+        if signature is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    content = f.read().strip()
+                if content:
+                    settings = json.loads(content)
+            except Exception as e:
+                logger.error(f"加载设置数据出错: {e}")
+        if settings is None:
+            logger.info("设置文件不存在或为空，使用默认设置")
+            settings = self._defaults()
+        self._set(settings, signature)
+        return True
+
+    def get(self):
+        """
+        返回当前设置（共享的缓存对象，调用方不得修改；需要修改后保存时使用 Settings.load 获取副本）
+        """
+        with self._lock:
+            changed = self._refresh()
+            settings = self._settings
+        if changed and self._signature is not None:
+            self._notify(settings)
+        return settings
+
+    def version(self):
+        """
+        设置文件的版本（修改时间和大小），文件变化后改变，用于接口的ETag
+        """
+        self.get()
+        signature = self._signature
+        return 'default' if signature is None else f"{signature[0]}:{signature[1]}"
+
+    def get_project(self, project_id):
+        """按项目ID查找项目配置（共享对象，不得修改），不存在时返回None"""
+        if project_id is None:
+            return None
+        self.get()
+        return self._projects.get(str(project_id))
+
+    def save(self, settings):
+        """
+        写入设置文件（临时文件+替换）并更新缓存、通知订阅者
+
+        返回:
+            bool: 是否保存成功
+        """
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                temp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(settings, f, ensure_ascii=False, indent=2)
+                os.replace(temp_path, self.path)
+                settings = copy.deepcopy(settings)
+                self._set(settings, self._read_signature())
+        except Exception as e:
+            logger.error(f"保存设置数据出错: {e}")
+            return False
+        logger.info("成功保存设置到文件")
+        self._notify(settings)
+        return True
+
+    def subscribe(self, callback):
+        """
+        订阅设置变化，设置变化时以新的设置字典调用 callback(settings)
+
+        订阅后会启动后台线程检查设置文件是否被其他程序修改
+        """
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name='config-watcher', daemon=True)
+                self._watcher.start()
+
+    def unsubscribe(self, callback):
+        """取消订阅"""
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _notify(self, settings):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(settings)
+            except Exception as e:
+                logger.error(f"设置变更通知出错 {callback}: {e}")
+
+    def _watch(self):
+        while True:
+            time.sleep(WATCH_INTERVAL)
+            try:
+                self.get()
+            except Exception as e:
+                logger.error(f"检查设置文件变化出错: {e}")
+
+
+config_service = ConfigService()
@@ -22,6 +22,16 @@ class TestCaseService:
         """获取所有测试用例"""
         return TestCase.get_all()
     
+    @classmethod
+    def query(cls, **kwargs):
+        """按条件查询测试用例（过滤、排序、游标分页、字段投影）"""
+        return TestCase.query(**kwargs)
+    
+    @classmethod
+    def version(cls):
+        """测试用例数据版本"""
+        return TestCase.version()
+    
     @classmethod
     def get_by_id(cls, case_id):
         """根据ID获取测试用例"""
@@ -42,6 +52,11 @@ class TestCaseService:
         """删除测试用例"""
         return TestCase.delete(case_id)
     
+    @classmethod
+    def update_status(cls, case_id, status):
+        """更新测试用例状态和最新执行时间"""
+        return TestCase.update_status(case_id, status)
+    
     
     @classmethod
     def run(cls, case_id):
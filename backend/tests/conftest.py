@@ -0,0 +1,10 @@
+"""
+测试公共配置：把backend目录加入Python路径，保证 `from config import ...` 等导入可用
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,140 @@
+"""
+文件清单测试
+
+文件列表接口按 (修改时间, 目录, 文件名) 游标分页，逐页取完必须与一次取全部的结果一致；
+列表响应的ETag由清单版本和查询参数生成，目录内容不变时返回304，文件增删后ETag改变。
+采集图像存储与文件清单使用同一个规则从文件名中取出测试用例ID。
+"""
+
+import os
+
+import pytest
+from flask import Flask
+from sqlalchemy import select
+
+import routes.files as files_routes
+from routes import files_bp
+from utils.artifact_store import ArtifactStore, artifacts_table
+from utils.file_manifest import FileManifest, case_id_from_name
+from utils.http_cache import init_http_cache
+
+# 文件名 -> 修改时间，两个目录中有修改时间相同的文件
+SCREENSHOTS = {'id_1_a.png': 1000.0, 'id_1_b.png': 1002.0, 'id_2_c.png': 1002.0, '1_d.png': 1004.0,
+               'screen_capture_e.png': 1001.0}
+UPLOADS = {'id_1_f.png': 1002.0, 'notes.txt': 1003.0}
+
+
+def write_files(directory, files):
+    os.makedirs(directory, exist_ok=True)
+    for name, mtime in files.items():
+        path = os.path.join(directory, name)
+        with open(path, 'wb') as f:
+            f.write(name.encode('utf-8'))
+        os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    kind_dirs = {'screenshots': str(tmp_path / 'screenshots'), 'upload': str(tmp_path / 'upload')}
+    write_files(kind_dirs['screenshots'], SCREENSHOTS)
+    write_files(kind_dirs['upload'], UPLOADS)
+    manifest = FileManifest(uri=f"sqlite:///{tmp_path / 'app.db'}", kind_dirs=kind_dirs)
+    yield manifest
+    manifest.dispose()
+
+
+@pytest.fixture
+def client(manifest, monkeypatch):
+    monkeypatch.setattr(files_routes, 'file_manifest', manifest)
+    app = Flask(__name__)
+    init_http_cache(app)
+    app.register_blueprint(files_bp)
+    return app.test_client()
+
+
+def pages(manifest, kinds, limit, **filters):
+    names, cursor = [], None
+    while True:
+        result = manifest.query(kinds, limit=limit, cursor=cursor, **filters)
+        names.extend((item['kind'], item['name']) for item in result['items'])
+        cursor = result['next_cursor']
+        if cursor is None:
+            return names, result['total']
+
+
+def test_case_id_from_name():
+    assert case_id_from_name('id_12_screenshot.png') == '12'
+    assert case_id_from_name('12_screenshot.png') == '12'
+    assert case_id_from_name('screen_capture_20260101_120000.png') == ''
+    assert case_id_from_name('id_x_screenshot.png') == ''
+
+
+def test_artifact_store_uses_manifest_case_ids(tmp_path):
+    capture_dir = tmp_path / 'data' / 'screenshots'
+    write_files(str(capture_dir), SCREENSHOTS)
+    store = ArtifactStore(root=str(tmp_path / 'data' / 'artifacts'), uri=f"sqlite:///{tmp_path / 'artifacts.db'}",
+                          data_dir=str(tmp_path / 'data'), capture_dirs=(str(capture_dir),), prune_interval=0)
+    try:
+        store.scan()
+        with store.engine.connect() as connection:
+            rows = dict(connection.execute(select(artifacts_table.c.path, artifacts_table.c.test_case_id)).all())
+    finally:
+        store.close()
+    assert {os.path.basename(path): case_id for path, case_id in rows.items()} == {
+        name: case_id_from_name(name) for name in SCREENSHOTS}
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3])
+def test_cursor_paging_matches_full_listing(manifest, limit):
+    full = manifest.query(['screenshots', 'upload'])
+    expected = [(item['kind'], item['name']) for item in full['items']]
+
+    names, total = pages(manifest, ['screenshots', 'upload'], limit)
+
+    assert names == expected
+    assert total == full['total'] == len(SCREENSHOTS) + 1
+    # 修改时间相同的文件按目录、文件名倒序
+    assert expected[:4] == [('screenshots', '1_d.png'), ('upload', 'id_1_f.png'),
+                            ('screenshots', 'id_2_c.png'), ('screenshots', 'id_1_b.png')]
+
+
+def test_cursor_paging_with_filters(manifest):
+    names, total = pages(manifest, ['screenshots', 'upload'], 1, test_case_id=1, since='1970-01-01T00:16:41+00:00')
+
+    assert names == [('screenshots', '1_d.png'), ('upload', 'id_1_f.png'), ('screenshots', 'id_1_b.png')]
+    assert total == 3
+
+
+def test_invalid_cursor_is_rejected(manifest):
+    with pytest.raises(ValueError):
+        manifest.query(['screenshots'], limit=2, cursor='not-a-cursor')
+
+
+def test_list_etag_changes_only_with_manifest_or_query(client, manifest):
+    first = client.get('/api/files/screenshots/list?limit=2')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.json['total'] == len(SCREENSHOTS)
+
+    assert client.get('/api/files/screenshots/list?limit=2', headers={'If-None-Match': etag}).status_code == 304
+    # 不同的查询参数使用不同的ETag
+    next_page = client.get('/api/files/screenshots/list', query_string={'limit': 2, 'cursor': first.json['nextCursor']},
+                           headers={'If-None-Match': etag})
+    assert next_page.status_code == 200 and next_page.headers['ETag'] != etag
+
+    # 其他程序在目录中新增文件：清单重新同步，版本改变
+    write_files(manifest.kind_dirs['screenshots'], {'id_3_g.png': 1005.0})
+    changed = client.get('/api/files/screenshots/list?limit=2', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert changed.json['screenshots'][0] == 'id_3_g.png'
+
+    # 本程序删除文件后同样改变
+    etag = changed.headers['ETag']
+    path = os.path.join(manifest.kind_dirs['screenshots'], 'id_3_g.png')
+    os.remove(path)
+    manifest.forget(path)
+    assert client.get('/api/files/screenshots/list?limit=2', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_list_rejects_invalid_limit(client):
+    response = client.get('/api/files/screenshots/list?limit=0')
+    assert response.status_code == 400 and response.json['success'] is False
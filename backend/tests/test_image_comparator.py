@@ -0,0 +1,112 @@
+"""
+ImageComparator 金字塔SSIM测试
+
+降采样会滤掉像素级噪声，噪声很大的截图在低分辨率层的得分接近1，原始分辨率的得分却很低。
+金字塔SSIM不能因为低分辨率得分高就判定通过。
+
+比较在每线程工作区中计算，两张图像尺寸不一致时各方法保持原有的处理方式：
+SSIM和颜色差异缩放后比较，对比度按各自的原尺寸计算，边缘比较判定为不相似。
+"""
+
+import numpy as np
+import cv2
+import pytest
+
+from utils.comparator_workspace import get_workspace
+from utils.image_comparator import ImageComparator
+
+
+def make_screen(width=640, height=400, seed=0):
+    """生成由色块组成的合成界面截图"""
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 30, dtype=np.uint8)
+    for _ in range(30):
+        x1, y1 = int(rng.integers(0, width - 20)), int(rng.integers(0, height - 20))
+        x2 = min(width - 1, x1 + int(rng.integers(20, width // 4)))
+        y2 = min(height - 1, y1 + int(rng.integers(20, height // 4)))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, -1)
+    return image
+
+
+def add_noise(image, sigma, seed=0):
+    """叠加高斯噪声"""
+    jitter = np.random.default_rng(seed).normal(0, sigma, image.shape)
+    return np.clip(image.astype(np.float32) + jitter, 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize('sigma', [10, 20, 30])
+@pytest.mark.parametrize('threshold', [0.9, 0.98])
+def test_noisy_capture_is_not_accepted_at_coarse_level(sigma, threshold):
+    reference = make_screen(seed=1)
+    capture = add_noise(reference, sigma, seed=sigma)
+
+    report = ImageComparator.ssim_pyramid(capture, reference, threshold=threshold)
+    full_score = ImageComparator.ssim_score(capture, reference)
+
+    assert report['coarse_score'] > full_score
+    assert full_score < threshold
+    assert not report['passed']
+    if not report['early_exit']:
+        assert report['score'] == pytest.approx(full_score, abs=1e-6)
+
+
+def test_pass_is_confirmed_at_full_resolution():
+    reference = make_screen(seed=1)
+
+    report = ImageComparator.ssim_pyramid(reference.copy(), reference, threshold=0.9)
+
+    assert report['passed']
+    assert report['level'] == 0
+    assert not report['early_exit']
+
+
+def test_clearly_different_capture_is_rejected_at_coarse_level():
+    report = ImageComparator.ssim_pyramid(make_screen(seed=2), make_screen(seed=1), threshold=0.9)
+
+    assert not report['passed']
+    assert report['early_exit']
+    assert report['level'] > 0
+
+
+def mismatched_pair():
+    """内容相同、尺寸不同的截图和参考图"""
+    capture = make_screen(seed=1)
+    return capture, cv2.resize(capture, (500, 320))
+
+
+def test_mismatched_sizes_ssim_resizes_second_image():
+    capture, reference = mismatched_pair()
+    gray1 = cv2.cvtColor(capture, cv2.COLOR_BGR2GRAY)
+    gray2 = cv2.resize(cv2.cvtColor(reference, cv2.COLOR_BGR2GRAY), (capture.shape[1], capture.shape[0]))
+
+    score = ImageComparator.ssim_score(capture, reference)
+
+    assert score == pytest.approx(ImageComparator._ssim_index(gray1, gray2), abs=1e-3)
+    assert score > 0.9
+
+
+def test_mismatched_sizes_color_difference_uses_smaller_size():
+    capture, reference = mismatched_pair()
+    height, width = reference.shape[:2]
+    expected = np.mean(np.abs(cv2.resize(capture, (width, height)).astype(np.float32)
+                              - reference.astype(np.float32)))
+
+    assert get_workspace(width, height).color_difference(capture, reference) == pytest.approx(expected, abs=1e-4)
+
+
+def test_mismatched_sizes_contrast_uses_each_original_size():
+    capture, reference = mismatched_pair()
+    std1 = np.std(cv2.cvtColor(capture, cv2.COLOR_BGR2GRAY).astype(np.float32))
+    std2 = np.std(cv2.cvtColor(reference, cv2.COLOR_BGR2GRAY).astype(np.float32))
+
+    similarity = ImageComparator._workspace(capture).contrast_similarity(capture, reference)
+
+    assert similarity == pytest.approx(min(std1, std2) / max(std1, std2), abs=1e-5)
+
+
+def test_mismatched_sizes_edge_comparison_is_not_similar():
+    capture, reference = mismatched_pair()
+
+    assert not ImageComparator.edge_detection_comparison(capture, reference, threshold=0.0)
+    assert ImageComparator.edge_detection_comparison(capture, capture.copy())
@@ -0,0 +1,59 @@
+"""
+参考图像缓存的容量计算测试
+
+加载特征旁路文件、生成缩放尺寸等会增加缓存项的占用，缓存的总字节数必须与各项实际计入的字节数一致，
+移除和淘汰后不能出现偏差或负数。
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+from utils.feature_sidecar import get_features
+from utils.reference_cache import ReferenceImageCache
+
+
+def write_reference(directory, name, seed):
+    """写入一张带有特征旁路文件的参考图"""
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    cv2.rectangle(image, (40, 40), (200, 160), (255, 255, 255), 3)
+    path = os.path.join(directory, name)
+    cv2.imwrite(path, image)
+    assert get_features(path, image) is not None
+    return path
+
+
+def test_loading_features_is_counted_and_released(tmp_path):
+    path = write_reference(str(tmp_path), 'reference.png', seed=0)
+    cache = ReferenceImageCache(max_bytes=1 << 30)
+
+    entry = cache.get(path)
+    before = cache.stats()['bytes']
+    features = cache.get_features(path)
+
+    assert features is not None and entry.features is features
+    assert cache.stats()['bytes'] == entry.nbytes > before
+
+    cache.invalidate(path)
+    assert cache.stats()['bytes'] == 0
+
+
+def test_eviction_keeps_byte_count_consistent(tmp_path):
+    paths = [write_reference(str(tmp_path), f'reference_{i}.png', seed=i) for i in range(3)]
+    cache = ReferenceImageCache(max_bytes=1 << 30)
+    cache.get(paths[0])
+    cache.get_features(paths[0])
+    cache.get_variant(paths[0], (160, 120), ssim_stats=True)
+    # 容量不足时只保留刚使用的一项，加入新项会淘汰已加载特征的旧项
+    cache.max_bytes = 1
+
+    for path in paths[1:]:
+        cache.get(path)
+        cache.get_features(path)
+
+    stats = cache.stats()
+    assert stats['evictions'] == 2
+    assert stats['entries'] == 1
+    assert stats['bytes'] == cache.get(paths[-1]).nbytes
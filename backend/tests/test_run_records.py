@@ -0,0 +1,77 @@
+"""
+执行记录与采集图像存储的同步测试
+
+旧版本（图像保存在 RUNS_DIR/artifacts）的执行记录在首次清理时登记到采集图像存储：
+只有 artifacts/<哈希>.png 形式的旧图像移入存储并改写为内容哈希，参考图路径等其他字段保持不变。
+"""
+
+import json
+import os
+
+import cv2
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+import utils.run_records as run_records
+from utils.artifact_store import ArtifactStore, is_digest, run_artifacts_table
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """临时目录中的采集图像存储和执行记录目录"""
+    data_dir = tmp_path / 'data'
+    store = ArtifactStore(root=str(data_dir / 'artifacts'), uri=f"sqlite:///{data_dir / 'app.db'}",
+                          data_dir=str(data_dir), capture_dirs=(), prune_interval=0)
+    monkeypatch.setattr(run_records, 'RUNS_DIR', str(data_dir / 'runs'))
+    monkeypatch.setattr(run_records, 'artifact_store', store)
+    os.makedirs(data_dir / 'runs' / 'artifacts')
+    yield store
+    store.close()
+
+
+def write_legacy_record(run_id, artifacts, **fields):
+    """按旧版本格式直接写入执行记录文件"""
+    record = {'run_id': run_id, 'test_case_id': 1, 'success': True,
+              'steps': [{'index': 0, 'method': 'ssim', 'threshold': 0.9, 'artifacts': artifacts, **fields}]}
+    with open(os.path.join(run_records.RUNS_DIR, f'{run_id}.json'), 'w', encoding='utf-8') as f:
+        json.dump(record, f)
+
+
+def test_sync_keeps_reference_path_and_moves_only_legacy_artifacts(store, tmp_path):
+    image = np.random.default_rng(0).integers(0, 255, (40, 60, 3), dtype=np.uint8)
+    cv2.imwrite(os.path.join(run_records.RUNS_DIR, 'artifacts', 'abc.png'), image)
+    # 参考图本身不在执行记录目录中，不能被当作旧图像移入存储
+    reference_path = str(tmp_path / 'upload' / 'reference.png')
+    os.makedirs(os.path.dirname(reference_path))
+    cv2.imwrite(reference_path, image[::-1])
+    write_legacy_record('20250101_000000_000000_1', {
+        'image': 'artifacts/abc.png',
+        'reference': 'artifacts/abc.png',
+        'reference_path': reference_path,
+    })
+
+    assert run_records.sync_runs(store) == {'added': 1, 'missing': 0}
+
+    artifacts = run_records.load_run('20250101_000000_000000_1')['steps'][0]['artifacts']
+    assert artifacts['reference_path'] == reference_path
+    assert is_digest(artifacts['image']) and artifacts['reference'] == artifacts['image']
+    assert os.path.exists(run_records.artifact_path(artifacts['image']))
+    # 只有旧图像一份内容进入存储，旧目录迁移后删除
+    assert store.stats()['blobs'] == 1
+    assert not os.path.exists(os.path.join(run_records.RUNS_DIR, 'artifacts'))
+
+
+def test_sync_registers_digests_only(store):
+    digest = run_records.save_artifact(np.zeros((10, 10), dtype=np.uint8))
+    # Windows 下的参考图路径不含 '/'，也不能被当作内容哈希登记
+    write_legacy_record('20260101_000000_000000_1', {'image': digest, 'reference': digest,
+                                                     'reference_path': 'C:\\screenshot\\upload\\reference.png'})
+
+    run_records.sync_runs(store)
+
+    with store.engine.connect() as connection:
+        referenced = set(connection.execute(select(run_artifacts_table.c.digest)).scalars())
+    assert referenced == {digest}
+    record = run_records.load_run('20260101_000000_000000_1')
+    assert record['steps'][0]['artifacts']['reference_path'] == 'C:\\screenshot\\upload\\reference.png'
@@ -0,0 +1,79 @@
+"""
+屏幕识别接口测试
+
+GET /api/screen/identify 只识别已保存的图像，不能从设备获取截图或写入文件；从设备获取截图只能通过POST。
+"""
+
+import os
+
+import cv2
+import numpy as np
+import pytest
+from flask import Flask
+
+import routes.screen as screen_routes
+from utils.screen_index import ScreenIndex
+
+
+def write_image(directory, name, seed):
+    os.makedirs(directory, exist_ok=True)
+    image = np.random.default_rng(seed).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    path = os.path.join(directory, name)
+    cv2.imwrite(path, image)
+    return path
+
+
+@pytest.fixture
+def device_calls(monkeypatch):
+    """记录对设备的SSH连接请求，并且不返回连接"""
+    calls = []
+
+    def get_client():
+        calls.append(True)
+        return None
+
+    monkeypatch.setattr(screen_routes.SSHManager, 'get_client', staticmethod(get_client))
+    return calls
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, device_calls):
+    reference_dir = str(tmp_path / 'reference')
+    screenshots_dir = str(tmp_path / 'screenshots')
+    write_image(reference_dir, 'home.png', seed=0)
+    write_image(reference_dir, 'settings.png', seed=1)
+    write_image(screenshots_dir, 'id_1_home.png', seed=0)
+    monkeypatch.setattr(screen_routes, 'screen_index', ScreenIndex(directories=((reference_dir, '/reference/'),)))
+    monkeypatch.setattr(screen_routes, 'SAVED_IMAGE_DIRS', (screenshots_dir, reference_dir))
+    app = Flask(__name__)
+    app.register_blueprint(screen_routes.screen_bp)
+    return app.test_client()
+
+
+def test_get_identifies_saved_image_without_device(client, tmp_path, device_calls):
+    before = sorted(os.listdir(tmp_path / 'screenshots'))
+
+    response = client.get('/api/screen/identify?filename=id_1_home.png&k=1')
+
+    assert response.status_code == 200
+    assert response.json['source'] == 'file'
+    assert response.json['matches'][0]['name'] == 'home.png'
+    assert device_calls == []
+    assert sorted(os.listdir(tmp_path / 'screenshots')) == before
+
+
+@pytest.mark.parametrize('query, status', [
+    ('', 400),
+    ('?filename=missing.png', 404),
+    ('?filename=../reference/home.png', 200),
+])
+def test_get_never_captures_from_device(client, device_calls, query, status):
+    assert client.get(f'/api/screen/identify{query}').status_code == status
+    assert device_calls == []
+
+
+def test_post_without_upload_captures_from_device(client, device_calls):
+    response = client.post('/api/screen/identify')
+
+    assert response.status_code == 500
+    assert device_calls == [True]
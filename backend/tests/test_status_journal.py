@@ -0,0 +1,114 @@
+"""
+状态日志测试
+
+JSON存储下状态更新只追加到状态日志，进程崩溃后重新读取测试用例文件时要重放日志；
+崩溃时写了一半的最后一行要跳过；合并后测试用例文件包含全部状态，日志被清空。
+"""
+
+import json
+import os
+import threading
+
+import pytest
+
+import models.test_case as test_case_module
+from models.status_journal import StatusJournal
+from models.test_case import JSONTestCaseStore, TestCase
+
+CASES = [
+    {'id': 1, 'title': '开机', 'type': '功能测试', 'status': '未运行', 'create_time': '2026-01-01 09:00',
+     'description': '', 'script_content': ''},
+    {'id': 2, 'title': '关机', 'type': '功能测试', 'status': '未运行', 'create_time': '2026-01-01 09:00',
+     'description': '', 'script_content': ''},
+]
+
+
+@pytest.fixture
+def cases_file(tmp_path, monkeypatch):
+    path = tmp_path / 'test_cases.json'
+    path.write_text(json.dumps(CASES, ensure_ascii=False), encoding='utf-8')
+    TestCase.close_journal()
+    TestCase.invalidate_cache()
+    monkeypatch.setattr(test_case_module, 'TEST_CASES_FILE', str(path))
+    yield str(path)
+    TestCase.close_journal()
+    TestCase.invalidate_cache()
+
+
+def journal_path(cases_file):
+    return os.path.splitext(cases_file)[0] + '.status.jsonl'
+
+
+def file_statuses(cases_file):
+    with open(cases_file, encoding='utf-8') as f:
+        return {case['id']: case['status'] for case in json.load(f)}
+
+
+def test_status_update_appends_to_journal_only(cases_file):
+    assert JSONTestCaseStore().update_status(1, '通过', '2026-01-02 10:00:00')
+
+    assert file_statuses(cases_file) == {1: '未运行', 2: '未运行'}
+    assert StatusJournal(journal_path(cases_file)).read() == [
+        {'id': 1, 'status': '通过', 'last_execution_time': '2026-01-02 10:00:00'}]
+
+
+def test_journal_is_replayed_over_reloaded_file(cases_file):
+    # 上一个进程追加了状态更新，崩溃前没有合并
+    previous = StatusJournal(journal_path(cases_file))
+    previous.append(1, '失败', '2026-01-02 10:00:00')
+    previous.append(1, '通过', '2026-01-02 11:00:00')
+    previous.append(99, '通过', '2026-01-02 11:00:00')
+    previous.close()
+
+    store = JSONTestCaseStore()
+    case = store.get(1)
+
+    assert case['status'] == '通过'
+    assert case['last_execution_time'] == '2026-01-02 11:00:00'
+    assert store.get(2)['status'] == '未运行'
+    assert file_statuses(cases_file)[1] == '未运行'
+
+
+def test_torn_last_line_is_skipped(cases_file):
+    path = journal_path(cases_file)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'id': 1, 'status': '失败', 'last_execution_time': '2026-01-02 10:00:00'}) + '\n')
+        f.write(json.dumps({'id': 2, 'status': '通过', 'last_execution_time': '2026-01-02 10:01:00'}) + '\n')
+        f.write('{"id": 1, "status": "通')
+
+    journal = StatusJournal(path)
+    assert len(journal) == 2
+    assert [entry['id'] for entry in journal.read()] == [1, 2]
+
+    store = JSONTestCaseStore()
+    assert store.get(1)['status'] == '失败'
+    assert store.get(2)['status'] == '通过'
+
+
+def test_compaction_writes_statuses_and_clears_journal(cases_file):
+    store = JSONTestCaseStore()
+    store.update_status(1, '通过', '2026-01-02 10:00:00')
+    store.update_status(2, '失败', '2026-01-02 10:01:00')
+    version = store.version()
+
+    TestCase.compact()
+
+    assert file_statuses(cases_file) == {1: '通过', 2: '失败'}
+    assert not os.path.exists(journal_path(cases_file))
+    assert len(TestCase.journal()) == 0
+    assert store.version() != version
+    # 合并后重新读取文件，不再有需要重放的日志
+    TestCase.invalidate_cache()
+    assert store.get(2)['status'] == '失败'
+
+
+def test_background_compaction_after_entry_limit(tmp_path):
+    compacted = threading.Event()
+    journal = StatusJournal(str(tmp_path / 'cases.status.jsonl'), fsync_interval=0.01, compact_entries=2,
+                            compact_interval=3600, on_compact=compacted.set)
+    try:
+        journal.append(1, '通过', '2026-01-02 10:00:00')
+        journal.append(2, '通过', '2026-01-02 10:00:00')
+        assert compacted.wait(5)
+    finally:
+        journal.close()
@@ -0,0 +1,166 @@
+"""
+测试用例存储测试
+
+SQLite存储和JSON存储对外的接口和数据格式相同：
+- 首次使用时从JSON文件导入，导入后的测试用例与JSON存储读取时的转换结果（_convert_keys、_ensure_fields）一致
+- 列表查询按排序字段和ID分页，游标翻页的结果与不分页时一致
+- 更新不存在的测试用例的状态返回False，不改变数据版本
+"""
+
+import json
+
+import pytest
+
+import models.test_case as test_case_module
+from models.test_case import JSONTestCaseStore, TestCase
+from models.test_case_db import SQLiteTestCaseStore
+
+CASES = [
+    {
+        'id': 1, 'title': '开机自检', 'type': '功能测试', 'status': '通过', 'create_time': '2026-01-02 10:00',
+        'description': '旧字段名的步骤',
+        'script_content': json.dumps({
+            'operationSteps': [{'operation_type': '点击', 'x': 10, 'y': 20}],
+            'verificationSteps': [{'verification_type': '截图精准匹配', 'threshold': 0.95}],
+            'name': '自检',
+        }, ensure_ascii=False),
+        'project_id': 'p1', 'project_name': '项目一',
+    },
+    {
+        'id': 2, 'title': '关机', 'type': '功能测试', 'status': '失败', 'create_time': '2026-01-02 10:00',
+        'description': '缺少可选字段', 'script_content': '',
+    },
+    {
+        'id': 3, 'title': '串口开机', 'type': '串口测试', 'status': '未运行', 'create_time': '2026-01-01 09:00',
+        'description': '', 'serial_connect': True, 'last_execution_time': '2026-01-03 08:00:00',
+        'script_content': json.dumps({'operationSteps': [{'operation_key': '串口开机'}]}, ensure_ascii=False),
+        'project_id': 'p2', 'project_name': '项目二', 'owner': 'qa',
+    },
+    {
+        'id': 4, 'title': '原文脚本', 'type': '功能测试', 'status': '通过', 'create_time': '2026-01-03 12:00',
+        'description': '', 'script_content': 'not json', 'project_id': 'p1', 'project_name': '项目一',
+    },
+    {
+        'id': 5, 'title': '开机自检（复测）', 'type': '功能测试', 'status': '通过', 'create_time': '2026-01-02 10:00',
+        'description': '', 'script_content': json.dumps({'verificationSteps': []}), 'project_id': 'p1',
+        'project_name': '项目一',
+    },
+]
+
+
+@pytest.fixture
+def cases_file(tmp_path):
+    path = tmp_path / 'test_cases.json'
+    path.write_text(json.dumps(CASES, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def sqlite_store(tmp_path, cases_file):
+    store = SQLiteTestCaseStore(uri=f"sqlite:///{tmp_path / 'app.db'}", json_file=cases_file)
+    yield store
+    store.dispose()
+
+
+@pytest.fixture
+def json_store(cases_file, monkeypatch):
+    TestCase.close_journal()
+    TestCase.invalidate_cache()
+    monkeypatch.setattr(test_case_module, 'TEST_CASES_FILE', cases_file)
+    yield JSONTestCaseStore()
+    TestCase.close_journal()
+    TestCase.invalidate_cache()
+
+
+@pytest.fixture(params=['sqlite_store', 'json_store'])
+def store(request):
+    return request.getfixturevalue(request.param)
+
+
+def test_update_status_of_missing_case_keeps_version(store):
+    version = store.version()
+
+    assert store.update_status(999, '通过', '2026-01-05 10:00:00') is False
+    assert store.version() == version
+
+    assert store.update_status(1, '失败', '2026-01-05 10:00:00') is True
+    assert store.get(1)['status'] == '失败'
+    assert store.version() != version
+
+
+def test_delete_missing_case_keeps_version(store):
+    version = store.version()
+
+    assert not store.delete(999)
+    assert store.version() == version
+
+
+def test_json_import_round_trip_matches_json_conversion(sqlite_store):
+    expected = [TestCase._ensure_fields(TestCase._convert_keys(dict(case))) for case in CASES]
+
+    assert sqlite_store.get_all() == expected
+    assert sqlite_store.get(3) == expected[2]
+    # 旧字段名在导入时转换为 operation_key / verification_key
+    script = json.loads(sqlite_store.get(1)['script_content'])
+    assert script['operationSteps'] == [{'x': 10, 'y': 20, 'operation_key': '点击'}]
+    assert script['verificationSteps'] == [{'threshold': 0.95, 'verification_key': '截图精准匹配'}]
+
+
+def test_import_happens_only_once(sqlite_store, cases_file):
+    sqlite_store.delete(2)
+    sqlite_store.dispose()
+
+    reopened = SQLiteTestCaseStore(uri=sqlite_store.uri, json_file=cases_file)
+    try:
+        assert [case['id'] for case in reopened.get_all()] == [1, 3, 4, 5]
+    finally:
+        reopened.dispose()
+
+
+def test_sqlite_and_json_stores_return_the_same_cases(sqlite_store, json_store):
+    assert sqlite_store.get_all() == json_store.get_all()
+
+
+@pytest.mark.parametrize('sort, descending', [('id', False), ('create_time', True), ('title', False),
+                                              ('status', True)])
+def test_cursor_paging_matches_unpaged_query(store, sort, descending):
+    full = store.query(sort=sort, descending=descending, fields=['id'])
+    assert full['next_cursor'] is None
+    assert full['total'] == len(CASES)
+
+    ids, cursor, pages = [], None, 0
+    while True:
+        page = store.query(sort=sort, descending=descending, limit=2, cursor=cursor, fields=['id'])
+        assert page['total'] == len(CASES)
+        assert len(page['items']) <= 2
+        ids.extend(item['id'] for item in page['items'])
+        pages += 1
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    assert ids == [item['id'] for item in full['items']]
+    assert pages == 3
+
+
+def test_ties_are_ordered_by_id(store):
+    # 1、2、5 的创建时间相同，按ID排序
+    result = store.query(sort='create_time', fields=['id', 'create_time'])
+    assert [item['id'] for item in result['items']] == [3, 1, 2, 5, 4]
+
+
+def test_filtered_paging(store):
+    first = store.query(project_id='p1', limit=2, fields=['id', 'title'])
+    second = store.query(project_id='p1', limit=2, cursor=first['next_cursor'], fields=['id', 'title'])
+
+    assert first['total'] == 3
+    assert [item['id'] for item in first['items'] + second['items']] == [1, 4, 5]
+    assert second['next_cursor'] is None
+    assert set(first['items'][0]) == {'id', 'title'}
+
+
+def test_cursor_from_another_sort_is_rejected(store):
+    cursor = store.query(sort='id', limit=1)['next_cursor']
+
+    with pytest.raises(ValueError):
+        store.query(sort='title', limit=1, cursor=cursor)
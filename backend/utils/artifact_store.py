@@ -0,0 +1,552 @@
+"""
+采集图像存储 - 按内容哈希保存采集的图像，相同内容只保存一份，并按保留规则清理
+
+获取图像、获取截图、获取操作界面等步骤采集的图像原本在 data/img/operation_img、data/img/display_img 和
+data/screenshots 中各自保存一个PNG，重复执行会留下大量内容完全相同的图像，清理只能通过 /api/files/clear 全部删除。
+该模块：
+- 把图像内容保存为 ARTIFACTS_DIR/<哈希前2位>/<sha256>.png，原文件名（id_{id}_{name}）改为指向该文件的硬链接，
+  按文件名查找图像的代码不受影响；文件系统不支持硬链接时退回复制
+- 在数据库（与测试用例同一个 DATABASE_URI）的 capture_artifacts 表中记录每个文件名对应的哈希、大小和测试用例ID，
+  执行结束后记录所属的执行ID和执行结果
+- 执行记录（run_records）中验证使用的截图和参考图同样按内容哈希保存在存储中（没有文件名），
+  run_records 和 run_artifacts 表记录每次执行及其引用的内容
+- 后台按保留规则清理：每个测试用例保留最近 ARTIFACT_KEEP_RUNS 次执行的图像和执行记录，失败执行至少保留
+  ARTIFACT_KEEP_FAILED_DAYS 天，总大小（采集图像和执行记录引用的内容一起计算）超过 ARTIFACT_QUOTA_MB 时
+  从最旧的通过执行开始删除；不再被任何文件名或执行记录引用的内容随之删除
+
+主要类：
+- ArtifactStore: 采集图像存储，全局实例为 artifact_store
+
+主要函数：
+- file_digest: 计算文件内容哈希
+- is_digest: 判断字符串是否为存储使用的内容哈希
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import (
+    Boolean, Column, Float, Index, Integer, MetaData, String, Table, delete, func, select, union_all, update
+)
+from sqlalchemy.dialects.sqlite import insert
+
+from config import (
+    ARTIFACTS_DIR, ARTIFACT_KEEP_FAILED_DAYS, ARTIFACT_KEEP_RUNS, ARTIFACT_PRUNE_INTERVAL, ARTIFACT_QUOTA_MB,
+    DATA_DIR, DATABASE_URI, DISPLAY_IMAGES_DIR, OPERATION_IMAGES_DIR, SCREENSHOTS_DIR
+)
+from models.test_case_db import create_sqlite_engine
+from .file_manifest import case_id_from_name, file_manifest
+from .log_config import setup_logger
+
+# 获取日志记录器
+logger = setup_logger(__name__)
+
+metadata = MetaData()
+
+artifacts_table = Table(
+    'capture_artifacts', metadata,
+    # 相对于数据目录的文件路径，如 screenshots/id_1_xxx.png
+    Column('path', String, primary_key=True),
+    Column('digest', String, nullable=False),
+    Column('size', Integer, nullable=False),
+    Column('test_case_id', String, nullable=False, default=''),
+    # 执行结束前为NULL
+    Column('run_id', String),
+    Column('success', Boolean),
+    Column('created_at', Float, nullable=False),
+    Index('ix_capture_artifacts_digest', 'digest'),
+    Index('ix_capture_artifacts_case_created', 'test_case_id', 'created_at'),
+)
+
+# 保存了执行记录的执行，与同一执行采集的图像一起按保留规则清理
+runs_table = Table(
+    'run_records', metadata,
+    Column('run_id', String, primary_key=True),
+    Column('test_case_id', String, nullable=False, default=''),
+    Column('success', Boolean),
+    Column('created_at', Float, nullable=False),
+    Index('ix_run_records_case_created', 'test_case_id', 'created_at'),
+)
+
+# 执行记录引用的内容
+run_artifacts_table = Table(
+    'run_artifacts', metadata,
+    Column('run_id', String, primary_key=True),
+    Column('digest', String, primary_key=True),
+    Column('size', Integer, nullable=False),
+    Index('ix_run_artifacts_digest', 'digest'),
+)
+
+CAPTURE_DIRS = (OPERATION_IMAGES_DIR, DISPLAY_IMAGES_DIR, SCREENSHOTS_DIR)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif')
+# 尚未关联到执行的图像（执行中，或在执行之外采集）在采集后的这段时间（秒）内不会被清理；
+# 执行记录保存前，验证图像的内容在保存或复用后的这段时间内同样不会被清理
+PENDING_GRACE = 3600
+# 一条SQL语句中IN列表的最大长度
+_CHUNK = 500
+_HASH_BLOCK = 1 << 20
+_DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def file_digest(path):
+    """计算文件内容的SHA-256，返回 (十六进制哈希, 文件大小)"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+            digest.update(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+
+def is_digest(value):
+    """判断字符串是否为存储使用的内容哈希（64位小写十六进制的SHA-256）"""
+    return isinstance(value, str) and _DIGEST_PATTERN.match(value) is not None
+
+
+class ArtifactStore:
+    """采集图像的内容寻址存储、索引和保留规则"""
+
+    def __init__(self, root=ARTIFACTS_DIR, uri=DATABASE_URI, data_dir=DATA_DIR, capture_dirs=CAPTURE_DIRS,
+                 keep_runs=ARTIFACT_KEEP_RUNS, keep_failed_days=ARTIFACT_KEEP_FAILED_DAYS,
+                 quota_mb=ARTIFACT_QUOTA_MB, prune_interval=ARTIFACT_PRUNE_INTERVAL):
+        self.root = root
+        self.uri = uri
+        self.data_dir = data_dir
+        self.capture_dirs = capture_dirs
+        self.keep_runs = keep_runs
+        self.keep_failed_days = keep_failed_days
+        self.quota_bytes = int(quota_mb * 1024 * 1024)
+        self.prune_interval = prune_interval
+        self._engine = None
+        # 保护内容文件的创建和删除，保证清理不会删除正在被引用的内容
+        self._lock = threading.RLock()
+        self._pruner = None
+        self._stop = threading.Event()
+
+    @property
+    def engine(self):
+        """数据库引擎，首次访问时建表"""
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    engine = create_sqlite_engine(self.uri)
+                    metadata.create_all(engine)
+                    self._engine = engine
+        return self._engine
+
+    # ---------- 路径 ----------
+
+    def blob_path(self, digest):
+        """内容哈希对应的文件路径"""
+        return os.path.join(self.root, digest[:2], f'{digest}.png')
+
+    def _key(self, path):
+        return os.path.relpath(os.path.abspath(path), self.data_dir).replace(os.sep, '/')
+
+    def _abspath(self, key):
+        return os.path.join(self.data_dir, *key.split('/'))
+
+    @staticmethod
+    def _link(source, path):
+        """把 path 原子地替换为 source 的硬链接（不支持硬链接时复制）"""
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, path)
+
+    # ---------- 写入 ----------
+
+    def add(self, source, path, test_case_id=None, created_at=None):
+        """
+        保存采集的图像：内容存入存储（已有相同内容时不重复保存），path 成为指向该内容的文件
+
+        采集方应先把图像写入临时文件再调用，不要直接写入 path：path 可能与其他文件名共用同一份内容。
+
+        参数:
+            source: 采集到的临时文件，保存后删除；与 path 相同时表示收录已有的文件
+            path: 图像的文件名路径，如 data/screenshots/id_1_xxx.png
+            test_case_id: 测试用例ID
+            created_at: 采集时间（时间戳），默认为当前时间
+
+        返回:
+            str: 内容哈希，存储失败时返回None（此时 source 仍会移动到 path）
+        """
+        same_file = os.path.abspath(source) == os.path.abspath(path)
+        try:
+            digest, size = file_digest(source)
+            blob = self.blob_path(digest)
+            with self._lock:
+                if not os.path.exists(blob):
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    self._link(source, blob)
+                self._link(blob, path)
+                if not same_file:
+                    os.remove(source)
+                statement = insert(artifacts_table).values(
+                    path=self._key(path), digest=digest, size=size,
+                    test_case_id='' if test_case_id is None else str(test_case_id),
+                    run_id=None, success=None, created_at=time.time() if created_at is None else created_at)
+                with self.engine.begin() as connection:
+                    connection.execute(statement.on_conflict_do_update(
+                        index_elements=['path'],
+                        set_={name: statement.excluded[name] for name in
+                              ('digest', 'size', 'test_case_id', 'run_id', 'success', 'created_at')}))
+        except Exception as e:
+            logger.warning(f"保存采集图像到存储失败 {path}: {str(e)}")
+            if not same_file and os.path.exists(source):
+                os.replace(source, path)
+            return None
+        file_manifest.record(path)
+        self._start_pruner()
+        return digest
+
+    def add_bytes(self, data):
+        """
+        保存编码好的图像内容（不对应任何文件名），已有相同内容时只更新其修改时间
+
+        内容在被执行记录引用（add_run）之前，保存或复用后 PENDING_GRACE 秒内不会被清理。
+
+        参数:
+            data: PNG编码的图像数据
+
+        返回:
+            str: 内容哈希
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        blob = self.blob_path(digest)
+        with self._lock:
+            if os.path.exists(blob):
+                os.utime(blob)
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                temp_path = f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, blob)
+        self._start_pruner()
+        return digest
+
+    def touch(self, digest):
+        """
+        更新内容的修改时间，视为刚保存（见 add_bytes）
+
+        返回:
+            bool: 内容是否存在
+        """
+        with self._lock:
+            try:
+                os.utime(self.blob_path(digest))
+            except FileNotFoundError:
+                return False
+        return True
+
+    def add_run(self, run_id, test_case_id, success, digests, created_at=None):
+        """
+        登记一次执行的执行记录及其引用的内容（已登记时覆盖）
+
+        参数:
+            run_id: 执行记录ID
+            test_case_id: 测试用例ID
+            success: 执行是否成功
+            digests: 执行记录引用的内容哈希
+            created_at: 执行时间（时间戳），默认为当前时间
+        """
+        references = []
+        for digest in set(digests):
+            try:
+                references.append({'run_id': run_id, 'digest': digest,
+                                   'size': os.path.getsize(self.blob_path(digest))})
+            except OSError:
+                logger.warning(f"执行记录 {run_id} 引用的内容不存在: {digest}")
+        statement = insert(runs_table).values(
+            run_id=run_id, test_case_id='' if test_case_id is None else str(test_case_id),
+            success=None if success is None else bool(success),
+            created_at=time.time() if created_at is None else created_at)
+        with self.engine.begin() as connection:
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=['run_id'],
+                set_={name: statement.excluded[name] for name in ('test_case_id', 'success', 'created_at')}))
+            connection.execute(delete(run_artifacts_table).where(run_artifacts_table.c.run_id == run_id))
+            if references:
+                connection.execute(insert(run_artifacts_table), references)
+        self._start_pruner()
+
+    def run_ids(self):
+        """已登记的执行记录ID"""
+        with self.engine.connect() as connection:
+            return set(connection.execute(select(runs_table.c.run_id)).scalars())
+
+    def remove_runs(self, run_ids):
+        """删除执行记录的登记，引用的内容在下次清理时随之删除"""
+        run_ids = sorted(run_ids)
+        with self.engine.begin() as connection:
+            self._delete_runs(connection, run_ids)
+
+    @staticmethod
+    def _delete_runs(connection, run_ids):
+        for start in range(0, len(run_ids), _CHUNK):
+            chunk = run_ids[start:start + _CHUNK]
+            connection.execute(delete(run_artifacts_table).where(run_artifacts_table.c.run_id.in_(chunk)))
+            connection.execute(delete(runs_table).where(runs_table.c.run_id.in_(chunk)))
+
+    def finish_run(self, test_case_id, run_id, success):
+        """
+        把该测试用例尚未关联执行的图像关联到本次执行
+
+        返回:
+            int: 关联的图像数
+        """
+        if test_case_id is None:
+            return 0
+        with self.engine.begin() as connection:
+            result = connection.execute(update(artifacts_table).where(
+                artifacts_table.c.test_case_id == str(test_case_id),
+                artifacts_table.c.run_id.is_(None),
+            ).values(run_id=run_id, success=bool(success)))
+        return result.rowcount
+
+    def scan(self):
+        """
+        使索引与采集目录一致：收录尚未收录的图像（如启用存储前保存的图像），删除文件已不存在的记录
+
+        返回:
+            dict: {'added': 收录的图像数, 'missing': 删除的记录数}
+        """
+        with self.engine.connect() as connection:
+            known = set(connection.execute(select(artifacts_table.c.path)).scalars())
+        present = set()
+        added = 0
+        for directory in self.capture_dirs:
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if not name.lower().endswith(IMAGE_EXTENSIONS) or not os.path.isfile(path):
+                    continue
+                key = self._key(path)
+                present.add(key)
+                if key in known:
+                    continue
+                if self.add(path, path, case_id_from_name(name) or None,
+                            created_at=os.path.getmtime(path)) is not None:
+                    added += 1
+        missing = sorted(known - present)
+        if missing:
+            with self.engine.begin() as connection:
+                for start in range(0, len(missing), _CHUNK):
+                    connection.execute(delete(artifacts_table).where(
+                        artifacts_table.c.path.in_(missing[start:start + _CHUNK])))
+        return {'added': added, 'missing': len(missing)}
+
+    # ---------- 保留规则 ----------
+
+    def _plan(self, rows, now):
+        """
+        按保留规则选出要删除的执行（或未关联执行的单张图像）
+
+        参数:
+            rows: 采集图像记录，以及执行记录的引用（path 为None，没有引用内容的执行 digest 为None）
+
+        返回:
+            list: 要删除的记录
+        """
+        groups = {}
+        for row in rows:
+            key = (row['test_case_id'], row['run_id'] or f"capture:{row['path']}")
+            group = groups.setdefault(key, {'rows': [], 'created_at': 0.0, 'success': row['success'],
+                                            'pending': row['run_id'] is None})
+            group['rows'].append(row)
+            group['created_at'] = max(group['created_at'], row['created_at'])
+        by_case = {}
+        for (case_id, _), group in groups.items():
+            by_case.setdefault(case_id, []).append(group)
+
+        failed_seconds = self.keep_failed_days * 86400
+        removed, candidates = [], []
+        for case_groups in by_case.values():
+            case_groups.sort(key=lambda group: group['created_at'], reverse=True)
+            for index, group in enumerate(case_groups):
+                age = now - group['created_at']
+                # 最新的一次执行和刚采集的图像始终保留
+                if index == 0 or (group['pending'] and age < PENDING_GRACE):
+                    continue
+                if index < self.keep_runs or (group['success'] is False and age < failed_seconds):
+                    candidates.append(group)
+                else:
+                    removed.append(group)
+
+        if self.quota_bytes > 0:
+            references = Counter(row['digest'] for row in rows if row['digest'] is not None)
+            sizes = {row['digest']: row['size'] for row in rows if row['digest'] is not None}
+            stored = sum(sizes.values())
+
+            def release(group):
+                freed = 0
+                for row in group['rows']:
+                    if row['digest'] is None:
+                        continue
+                    references[row['digest']] -= 1
+                    if references[row['digest']] == 0:
+                        freed += sizes[row['digest']]
+                return freed
+
+            for group in removed:
+                stored -= release(group)
+            # 超出配额时先删除通过的执行，再删除失败的执行，各自从最旧的开始
+            candidates.sort(key=lambda group: (group['success'] is False, group['created_at']))
+            for group in candidates:
+                if stored <= self.quota_bytes:
+                    break
+                stored -= release(group)
+                removed.append(group)
+        return [row for group in removed for row in group['rows']]
+
+    def _run_rows(self, connection):
+        """执行记录的引用，格式与采集图像记录相同（path 为None）"""
+        query = select(runs_table, run_artifacts_table.c.digest, run_artifacts_table.c.size).select_from(
+            runs_table.outerjoin(run_artifacts_table, runs_table.c.run_id == run_artifacts_table.c.run_id))
+        return [{**row, 'path': None} for row in connection.execute(query).mappings()]
+
+    def prune(self, now=None):
+        """
+        按保留规则清理采集图像和执行记录，并删除不再被引用的内容文件
+
+        返回:
+            dict: {'removed_files': 删除的图像数, 'removed_runs': 删除的执行记录数,
+                   'removed_blobs': 删除的内容文件数, 'freed_bytes': 释放的字节数}
+        """
+        from .run_records import remove_run, sync_runs
+        now = time.time() if now is None else now
+        self.scan()
+        sync_runs(self)
+        with self.engine.connect() as connection:
+            rows = list(connection.execute(select(artifacts_table)).mappings()) + self._run_rows(connection)
+        removed_paths = []
+        removed_runs = set()
+        with self._lock:
+            with self.engine.begin() as connection:
+                for row in self._plan(rows, now):
+                    if row['path'] is None:
+                        removed_runs.add(row['run_id'])
+                        continue
+                    # 读取记录后同名文件可能已被新的采集替换，只删除未变化的记录
+                    result = connection.execute(delete(artifacts_table).where(
+                        artifacts_table.c.path == row['path'],
+                        artifacts_table.c.created_at == row['created_at'],
+                        artifacts_table.c.digest == row['digest']))
+                    if not result.rowcount:
+                        continue
+                    path = self._abspath(row['path'])
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    removed_paths.append(path)
+                for run_id in removed_runs:
+                    remove_run(run_id)
+                self._delete_runs(connection, sorted(removed_runs))
+            removed_blobs, freed_bytes = self._collect_garbage(now)
+        file_manifest.forget(*removed_paths)
+        removed_files = len(removed_paths)
+        if removed_files or removed_runs or removed_blobs:
+            logger.info(f"清理采集图像: 删除 {removed_files} 个文件、{len(removed_runs)} 条执行记录、"
+                        f"{removed_blobs} 份内容，释放 {freed_bytes} 字节")
+        return {'removed_files': removed_files, 'removed_runs': len(removed_runs), 'removed_blobs': removed_blobs,
+                'freed_bytes': freed_bytes}
+
+    def _collect_garbage(self, now):
+        """
+        删除不再被任何文件名或执行记录引用的内容文件（调用方持有 self._lock）；
+        PENDING_GRACE 内保存或复用的内容可能属于尚未保存执行记录的执行，暂不删除
+        """
+        with self.engine.connect() as connection:
+            referenced = set(connection.execute(select(artifacts_table.c.digest).distinct()).scalars())
+            referenced.update(connection.execute(select(run_artifacts_table.c.digest).distinct()).scalars())
+        removed, freed = 0, 0
+        if not os.path.isdir(self.root):
+            return removed, freed
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if not name.endswith('.png') or name[:-len('.png')] in referenced:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                    if now - stat.st_mtime < PENDING_GRACE:
+                        continue
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"删除内容文件失败 {path}: {str(e)}")
+                    continue
+                removed += 1
+                freed += stat.st_size
+            if not os.listdir(directory):
+                os.rmdir(directory)
+        return removed, freed
+
+    def stats(self):
+        """存储统计：文件数、执行记录数、内容数、按文件名计算的大小和实际占用的大小"""
+        with self.engine.connect() as connection:
+            files, logical_bytes, runs = connection.execute(select(
+                func.count(), func.coalesce(func.sum(artifacts_table.c.size), 0),
+                func.count(artifacts_table.c.run_id.distinct()))).one()
+            run_records = connection.execute(select(func.count()).select_from(runs_table)).scalar()
+            references = union_all(select(artifacts_table.c.digest, artifacts_table.c.size),
+                                   select(run_artifacts_table.c.digest, run_artifacts_table.c.size)).subquery()
+            blobs_query = select(references.c.digest, func.max(references.c.size).label('size')) \
+                .group_by(references.c.digest).subquery()
+            blobs, stored_bytes = connection.execute(select(
+                func.count(), func.coalesce(func.sum(blobs_query.c.size), 0))).one()
+        return {
+            'files': files,
+            'blobs': blobs,
+            'runs': runs,
+            'run_records': run_records,
+            'logical_bytes': logical_bytes,
+            'stored_bytes': stored_bytes,
+            'quota_bytes': self.quota_bytes,
+            'keep_runs': self.keep_runs,
+            'keep_failed_days': self.keep_failed_days,
+        }
+
+    # ---------- 后台清理 ----------
+
+    def _start_pruner(self):
+        if self._pruner is not None or self.prune_interval <= 0:
+            return
+        with self._lock:
+            if self._pruner is None:
+                self._pruner = threading.Thread(target=self._background, name='artifact-pruner', daemon=True)
+                self._pruner.start()
+
+    def _background(self):
+        """后台线程：每隔 prune_interval 秒按保留规则清理一次"""
+        while not self._stop.wait(self.prune_interval):
+            try:
+                self.prune()
+            except Exception as e:
+                logger.error(f"后台清理采集图像出错: {str(e)}")
+
+    def close(self):
+        """停止后台清理线程并关闭数据库连接"""
+        self._stop.set()
+        if self._pruner is not None and self._pruner is not threading.current_thread():
+            self._pruner.join(timeout=5)
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+                self._engine = None
+
+
+artifact_store = ArtifactStore()
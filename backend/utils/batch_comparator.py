@@ -0,0 +1,269 @@
+"""
+批量图像比较模块
+
+该模块用于"一张截图对比多张候选参考图"的场景。逐张调用 ImageComparator.is_ssim 时，
+每次都会重新转换和归一化同一张截图；这里截图只预处理一次，再依次与各参考图比较。
+主要功能包括：
+1. 截图只做一次灰度转换、归一化和高斯均值/方差计算
+2. SSIM：参考图统计量来自参考图缓存，每张参考图只需一次高斯模糊，中间结果使用复用的缓冲区
+3. 模板匹配：共用截图灰度图，逐张参考图匹配并记录最佳位置
+4. 直方图：所有参考图的H通道直方图组成矩阵，一次计算全部相关系数
+5. 返回按得分排序的结果表，而不是布尔值
+
+主要类：
+- BatchComparator: 预处理一张截图，并与多张参考图批量比较
+
+参考图可以是文件路径（经参考图缓存读取，SSIM统计量会被缓存复用）或已解码的图像数组。
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+from .image_comparator import ImageComparator, SSIM_WINDOW, SSIM_SIGMA, SSIM_C1, SSIM_C2
+from .reference_cache import reference_cache, ReferenceVariant
+from .log_config import setup_logger
+
+# 获取日志记录器
+logger = setup_logger(__name__)
+
+# 直方图参数，与 ImageComparator.histogram_comparison 一致
+HIST_BINS = 50
+HIST_RANGE = [0, 180]
+# 各方法的默认阈值，与 ImageComparator 中对应方法一致
+DEFAULT_THRESHOLDS = {
+    'ssim': 0.98,
+    'template': 0.8,
+    'histogram': 0.90,
+}
+
+
+class BatchComparator:
+    """
+    预处理一张截图，并与多张参考图批量比较
+
+    用法:
+        comparator = BatchComparator(capture)
+        table = comparator.compare(['a.png', 'b.png'], method='ssim')
+    """
+
+    METHODS = ('ssim', 'template', 'histogram')
+
+    def __init__(self, query):
+        self.query = query
+        self.gray = ImageComparator._to_gray(query)
+        self._ssim_terms = None
+        self._hist = None
+
+    @property
+    def size(self):
+        """截图的(宽, 高)"""
+        return self.gray.shape[1], self.gray.shape[0]
+
+    def _query_ssim_terms(self):
+        """
+        截图一侧的SSIM项，只计算一次
+
+        返回:
+            (gray_f, mu, 2*mu, mu^2+C1, sigma^2+C2)
+        """
+        if self._ssim_terms is None:
+            gray_f = self.gray.astype(np.float32) / 255.0
+            mu, sigma_sq = ImageComparator._ssim_stats(gray_f)
+            self._ssim_terms = (gray_f, mu, 2 * mu, mu * mu + SSIM_C1, sigma_sq + SSIM_C2)
+        return self._ssim_terms
+
+    def _query_hist(self):
+        """截图的H通道直方图，只计算一次"""
+        if self._hist is None:
+            self._hist = _hue_histograms([self.query])[0]
+        return self._hist
+
+    @staticmethod
+    def _name(reference, index, names):
+        if names is not None:
+            return names[index]
+        if isinstance(reference, str):
+            return os.path.basename(reference)
+        return f"#{index}"
+
+    def _load_variant(self, reference, size, ssim_stats=False):
+        """
+        获取参考图在目标尺寸下的数据：路径经参考图缓存读取，数组直接转换
+
+        返回:
+            ReferenceVariant，路径无法读取时返回None
+        """
+        if isinstance(reference, str):
+            return reference_cache.get_variant(reference, size, ssim_stats=ssim_stats)
+        image = reference
+        if size is not None and (image.shape[1], image.shape[0]) != tuple(size):
+            image = cv2.resize(image, tuple(size))
+        variant = ReferenceVariant(image)
+        if ssim_stats:
+            variant.compute_ssim_stats()
+        return variant
+
+    def ssim_scores(self, references):
+        """
+        计算截图与每张参考图的SSIM值，参考图尺寸不同时缩放到截图尺寸
+
+        截图一侧的均值、方差以及由它们组成的项只计算一次；参考图一侧的统计量来自参考图缓存。
+        每张参考图只需一次高斯模糊（协方差项），中间结果写入复用的缓冲区，不再分配新数组。
+
+        返回:
+            list: 与references一一对应的SSIM值，无法读取的参考图为None
+        """
+        gray_q, mu_q, mu_q2, mu_q_sq_c1, sigma_q_c2 = self._query_ssim_terms()
+        buf1 = np.empty_like(gray_q)
+        buf2 = np.empty_like(gray_q)
+        buf3 = np.empty_like(gray_q)
+
+        scores = []
+        for reference in references:
+            variant = self._load_variant(reference, self.size, ssim_stats=True)
+            if variant is None:
+                scores.append(None)
+                continue
+            mu_r, sigma_r = variant.mu, variant.sigma_sq
+
+            # 协方差 sigma12 = G(q*r) - mu_q*mu_r
+            np.multiply(gray_q, variant.gray_f, out=buf1)
+            cv2.GaussianBlur(buf1, SSIM_WINDOW, SSIM_SIGMA, dst=buf2)
+            np.multiply(mu_q, mu_r, out=buf1)
+            np.subtract(buf2, buf1, out=buf2)
+            # 分子 (2*mu_q*mu_r + C1) * (2*sigma12 + C2)
+            buf2 *= 2
+            buf2 += SSIM_C2
+            np.multiply(mu_q2, mu_r, out=buf1)
+            buf1 += SSIM_C1
+            buf1 *= buf2
+            # 分母 (mu_q^2 + mu_r^2 + C1) * (sigma_q^2 + sigma_r^2 + C2)
+            np.multiply(mu_r, mu_r, out=buf2)
+            buf2 += mu_q_sq_c1
+            np.add(sigma_r, sigma_q_c2, out=buf3)
+            buf2 *= buf3
+            buf1 /= buf2
+
+            scores.append(max(0.0, min(1.0, float(buf1.mean()))))
+        return scores
+
+    def template_scores(self, references):
+        """
+        在截图中查找每张参考图，参考图大于截图时按比例缩小
+
+        返回:
+            list: 与references一一对应的 (最大匹配值, 左上角位置)，无法读取的参考图为None
+        """
+        height, width = self.gray.shape[:2]
+        results = []
+        for reference in references:
+            variant = self._load_variant(reference, None)
+            if variant is None:
+                results.append(None)
+                continue
+            ref_width, ref_height = variant.size
+            if ref_height > height or ref_width > width:
+                scale = min(height / ref_height, width / ref_width)
+                size = (max(1, int(ref_width * scale)), max(1, int(ref_height * scale)))
+                variant = self._load_variant(reference, size)
+            result = cv2.matchTemplate(self.gray, variant.gray, cv2.TM_CCOEFF_NORMED)
+            _, max_val, _, max_loc = cv2.minMaxLoc(result)
+            results.append((float(max_val), [int(max_loc[0]), int(max_loc[1])]))
+        return results
+
+    def histogram_scores(self, references):
+        """
+        计算截图与每张参考图H通道直方图的相关系数
+
+        返回:
+            list: 与references一一对应的相关系数，无法读取的参考图为None
+        """
+        indices = []
+        images = []
+        for index, reference in enumerate(references):
+            variant = self._load_variant(reference, None)
+            if variant is not None:
+                indices.append(index)
+                images.append(variant.image)
+
+        scores = [None] * len(references)
+        if not images:
+            return scores
+
+        # 与 cv2.compareHist(HISTCMP_CORREL) 相同的皮尔逊相关系数，所有参考图一次计算
+        hists = _hue_histograms(images)
+        query = self._query_hist()
+        hists_c = hists - hists.mean(axis=1, keepdims=True)
+        query_c = query - query.mean()
+        denom = np.sqrt((hists_c * hists_c).sum(axis=1) * (query_c * query_c).sum())
+        correl = np.where(denom > 0, hists_c @ query_c / np.where(denom > 0, denom, 1), 1.0)
+
+        for index, score in zip(indices, correl):
+            scores[index] = float(score)
+        return scores
+
+    def compare(self, references, method='ssim', threshold=None, names=None):
+        """
+        将截图与多张参考图批量比较，返回按得分从高到低排序的结果表
+
+        参数:
+            references: 参考图列表，元素为文件路径或图像数组
+            method: 比较方法，ssim / template / histogram
+            threshold: 通过阈值，默认使用各方法在 ImageComparator 中的默认值
+            names: 参考图名称列表，默认取文件名或序号
+
+        返回:
+            dict: 包含以下字段
+                - method: 比较方法
+                - threshold: 通过阈值
+                - elapsed_ms: 耗时（毫秒）
+                - results: 结果列表，每项包含 name/index/score/passed，模板匹配另有 location，
+                  无法读取的参考图 score 为None并附带 error
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"不支持的比较方法: {method}，可选: {', '.join(self.METHODS)}")
+        threshold = DEFAULT_THRESHOLDS[method] if threshold is None else float(threshold)
+
+        start = time.perf_counter()
+        if method == 'ssim':
+            raw = self.ssim_scores(references)
+        elif method == 'template':
+            raw = self.template_scores(references)
+        else:
+            raw = self.histogram_scores(references)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+
+        results = []
+        for index, (reference, value) in enumerate(zip(references, raw)):
+            row = {'name': self._name(reference, index, names), 'index': index}
+            if value is None:
+                row.update({'score': None, 'passed': False, 'error': '无法读取参考图'})
+            elif method == 'template':
+                row.update({'score': round(value[0], 4), 'passed': value[0] >= threshold, 'location': value[1]})
+            else:
+                row.update({'score': round(value, 4), 'passed': value >= threshold})
+            results.append(row)
+
+        results.sort(key=lambda row: -1.0 if row['score'] is None else row['score'], reverse=True)
+        logger.info(f"批量比较完成 ({method})，参考图 {len(references)} 张，耗时 {elapsed_ms:.1f}ms，"
+                    f"最佳: {results[0]['name'] if results else '无'}")
+        return {
+            'method': method,
+            'threshold': threshold,
+            'elapsed_ms': round(elapsed_ms, 3),
+            'results': results,
+        }
+
+
+def _hue_histograms(images):
+    """计算多张BGR图像的H通道直方图并按 MINMAX 归一化到0-1，返回 (N, HIST_BINS) 矩阵"""
+    hists = np.empty((len(images), HIST_BINS), dtype=np.float32)
+    for index, image in enumerate(images):
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0], None, [HIST_BINS], HIST_RANGE)
+        cv2.normalize(hist, hist, 0, 1, cv2.NORM_MINMAX)
+        hists[index] = hist.ravel()
+    return hists
@@ -12,14 +12,13 @@
 """
 
 # vp_180/utils/button_clicker.py
-import os
 import time
 import logging
 import struct
 import random
-import json
 from .log_config import setup_logger
 from .ssh_manager import SSHManager
+from services.config_service import config_service
 try:
     from .Config import FUNCTIONS
     logger = setup_logger(__name__)
@@ -74,33 +73,24 @@ class ButtonClicker:
         :return: 是否加载成功
         """
         try:
-            # 获取settings.json文件路径
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            settings_path = os.path.join(current_dir, '..', 'data', 'settings.json')
-            
-            # 读取settings.json文件
-            with open(settings_path, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
+            # 从配置服务的缓存中按项目ID查找
+            project = config_service.get_project(project_id)
+            if project is None:
+                logger.warning(f"未找到项目ID为 {project_id} 的配置")
+                return False
             
-            # 查找匹配的项目
-            projects = settings.get('projects', [])
-            for project in projects:
-                if project.get('id') == project_id:
-                    # 获取屏幕分辨率
-                    resolution_width = project.get('resolutionWidth')
-                    resolution_height = project.get('resolutionHeight')
-                    
-                    if resolution_width and resolution_height:
-                        self.screen_width = resolution_width
-                        self.screen_height = resolution_height
-                        logger.info(f"已加载项目 {project_id} 的屏幕分辨率: {self.screen_width}x{self.screen_height}")
-                        return True
-                    else:
-                        logger.warning(f"项目 {project_id} 缺少分辨率配置，使用默认值")
-                        return False
+            # 获取屏幕分辨率
+            resolution_width = project.get('resolutionWidth')
+            resolution_height = project.get('resolutionHeight')
             
-            logger.warning(f"未找到项目ID为 {project_id} 的配置")
-            return False
+            if resolution_width and resolution_height:
+                self.screen_width = resolution_width
+                self.screen_height = resolution_height
+                logger.info(f"已加载项目 {project_id} 的屏幕分辨率: {self.screen_width}x{self.screen_height}")
+                return True
+            else:
+                logger.warning(f"项目 {project_id} 缺少分辨率配置，使用默认值")
+                return False
             
         except Exception as e:
             logger.error(f"加载项目配置失败: {str(e)}")
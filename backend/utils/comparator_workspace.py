@@ -0,0 +1,310 @@
+"""
+图像比较工作区模块
+
+SSIM、颜色差异、边缘比较和对比度比较每次调用都会新分配浮点副本、乘积和模糊结果。
+在验证循环中反复比较时，这些大数组的分配和释放占了不少时间。
+该模块提供按分辨率预先分配缓冲区的比较工作区，ImageComparator 的 ssim_score、ssim_reference_score、
+color_difference、edge_detection_comparison、contrast_comparison 和 analyze 都通过它计算。主要功能包括：
+1. 为指定分辨率预先分配灰度、浮点和中间结果缓冲区
+2. 所有计算使用 OpenCV 的 dst= 输出和 NumPy 的 out= 原地运算，比较时不再分配大数组
+3. 返回数值得分，由 ImageComparator 的对应方法判断是否通过
+4. 记录每个方法的调用次数和耗时，缓冲区占用的内存可以通过 nbytes 查看
+
+主要类：
+- ComparatorWorkspace: 绑定一个分辨率的比较工作区
+
+主要函数：
+- get_workspace: 获取当前线程在指定分辨率下的工作区（缓冲区不是线程安全的，每个线程各用一份，
+  每个线程最多保留 MAX_WORKSPACES_PER_THREAD 个分辨率）
+
+图像尺寸与工作区不一致时，先缩放到工作区尺寸（缩放结果同样写入预分配的缓冲区）。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from .image_comparator import SSIM_WINDOW, SSIM_SIGMA, SSIM_C1, SSIM_C2
+from .log_config import setup_logger
+
+# 获取日志记录器
+logger = setup_logger(__name__)
+
+# Canny 阈值，与 ImageComparator.edge_detection_comparison 一致
+CANNY_THRESHOLD1 = 100
+CANNY_THRESHOLD2 = 200
+# 每个线程保留的工作区数（不同分辨率），超出时丢弃最久未使用的，1080p的工作区约占80MB
+MAX_WORKSPACES_PER_THREAD = 2
+
+
+class ComparatorWorkspace:
+    """
+    绑定一个分辨率的比较工作区
+
+    用法:
+        workspace = get_workspace(1024, 600)
+        score = workspace.ssim(capture, reference)
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        shape = (height, width)
+
+        # 输入图像缩放和灰度转换的缓冲区
+        self._bgr1 = np.empty(shape + (3,), dtype=np.uint8)
+        self._bgr2 = np.empty(shape + (3,), dtype=np.uint8)
+        self._gray1 = np.empty(shape, dtype=np.uint8)
+        self._gray2 = np.empty(shape, dtype=np.uint8)
+        # 颜色差异和边缘比较的缓冲区
+        self._diff = np.empty(shape + (3,), dtype=np.uint8)
+        self._edges1 = np.empty(shape, dtype=np.uint8)
+        self._edges2 = np.empty(shape, dtype=np.uint8)
+        # SSIM 的浮点缓冲区
+        self._f1, self._f2, self._mu1, self._mu2, self._s1, self._s2, self._s12, self._tmp = (
+            np.empty(shape, dtype=np.float32) for _ in range(8)
+        )
+
+        # 方法名 -> {'calls', 'total_ms', 'last_ms'}
+        self.timings = {}
+
+    @property
+    def size(self):
+        """(宽, 高)"""
+        return self.width, self.height
+
+    @property
+    def nbytes(self):
+        """所有缓冲区占用的字节数"""
+        return sum(value.nbytes for value in vars(self).values() if isinstance(value, np.ndarray))
+
+    def _record(self, method, start):
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        timing = self.timings.setdefault(method, {'calls': 0, 'total_ms': 0.0, 'last_ms': 0.0})
+        timing['calls'] += 1
+        timing['total_ms'] += elapsed_ms
+        timing['last_ms'] = elapsed_ms
+
+    def _fit(self, img, dst):
+        """BGR图像尺寸不一致时缩放到工作区尺寸，结果写入dst；尺寸一致时直接返回原图"""
+        if img.shape[:2] == (self.height, self.width):
+            return img
+        return cv2.resize(img, self.size, dst=dst)
+
+    def _gray(self, img, dst):
+        """转换为工作区尺寸的灰度图，结果写入dst"""
+        if img.ndim == 2:
+            if img.shape == dst.shape:
+                return img
+            return cv2.resize(img, self.size, dst=dst)
+        bgr = self._fit(img, self._bgr1 if dst is self._gray1 else self._bgr2)
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY, dst=dst)
+
+    def ssim(self, img1, img2, weights=None):
+        """
+        计算平均SSIM值，与 ImageComparator.ssim_score 使用的计算一致
+
+        参数:
+            img1, img2: 图像（BGR或灰度），尺寸与工作区不一致时先缩放
+            weights: SSIM权重图（见 ignore_mask），尺寸与工作区一致，提供时计算加权平均
+
+        返回:
+            0-1范围内的平均SSIM值
+        """
+        start = time.perf_counter()
+        self._load(img1, self._gray1, self._f1, self._mu1, self._s1)
+        self._load(img2, self._gray2, self._f2, self._mu2, self._s2)
+        score = self._ssim(self._f2, self._mu2, self._s2, weights)
+        self._record('ssim', start)
+        return score
+
+    def ssim_reference(self, img, gray_f, mu, sigma_sq, weights=None):
+        """
+        使用预先计算好的参考图统计量计算平均SSIM值，与 ImageComparator.ssim_reference_score 一致
+
+        参数:
+            img: 操作界面截图
+            gray_f, mu, sigma_sq: 参考图归一化灰度图、均值图和方差图（只读，尺寸与工作区一致）
+            weights: SSIM权重图，提供时计算加权平均
+
+        返回:
+            0-1范围内的平均SSIM值
+        """
+        start = time.perf_counter()
+        self._load(img, self._gray1, self._f1, self._mu1, self._s1)
+        score = self._ssim(gray_f, mu, sigma_sq, weights)
+        self._record('ssim_reference', start)
+        return score
+
+    def _load(self, img, gray_dst, f, mu, sigma_sq):
+        """计算图像的归一化灰度图、均值图和方差图，分别写入 f、mu、sigma_sq"""
+        gray = self._gray(img, gray_dst)
+        np.multiply(gray, np.float32(1.0 / 255.0), out=f)
+        cv2.GaussianBlur(f, SSIM_WINDOW, SSIM_SIGMA, dst=mu)
+        # 方差 sigma^2 = G(x*x) - mu^2
+        tmp = self._tmp
+        np.multiply(f, f, out=tmp)
+        cv2.GaussianBlur(tmp, SSIM_WINDOW, SSIM_SIGMA, dst=sigma_sq)
+        np.multiply(mu, mu, out=tmp)
+        sigma_sq -= tmp
+
+    def _ssim(self, f2, mu2, s2, weights):
+        """
+        由图像1（工作区的 f1/mu1/s1）和图像2的统计量计算平均SSIM值
+
+        图像2的数组只读取不修改，可以是参考图缓存中的只读数组；图像1的缓冲区在计算中被复用
+        """
+        f1, mu1, s1, s12, tmp = self._f1, self._mu1, self._s1, self._s12, self._tmp
+
+        # 协方差 sigma12 = G(x*y) - mu1*mu2
+        np.multiply(f1, f2, out=tmp)
+        cv2.GaussianBlur(tmp, SSIM_WINDOW, SSIM_SIGMA, dst=s12)
+        np.multiply(mu1, mu2, out=tmp)
+        s12 -= tmp
+
+        # 分子 (2*mu1*mu2 + C1) * (2*sigma12 + C2)，tmp 中已是 mu1*mu2
+        tmp *= 2
+        tmp += SSIM_C1
+        s12 *= 2
+        s12 += SSIM_C2
+        tmp *= s12
+
+        # 分母 (mu1^2 + mu2^2 + C1) * (sigma1^2 + sigma2^2 + C2)，f1 已不再需要，用作缓冲区
+        np.multiply(mu1, mu1, out=f1)
+        cv2.accumulateSquare(mu2, f1)
+        f1 += SSIM_C1
+        s1 += s2
+        s1 += SSIM_C2
+        f1 *= s1
+
+        tmp /= f1
+        if weights is not None:
+            tmp *= weights
+            score = float(cv2.sumElems(tmp)[0] / cv2.sumElems(weights)[0])
+        else:
+            score = float(cv2.mean(tmp)[0])
+        return max(0.0, min(1.0, score))
+
+    def color_difference(self, img1, img2):
+        """
+        计算平均颜色差异，与 ImageComparator.color_difference 一致
+
+        uint8 的绝对差是精确的，不需要转换为浮点
+
+        返回:
+            所有像素、所有通道的平均绝对差
+        """
+        start = time.perf_counter()
+        if img1.ndim == 2 or img2.ndim == 2:
+            # 灰度图之间比较，差值写入单通道缓冲区
+            img1 = self._gray(img1, self._gray1)
+            img2 = self._gray(img2, self._gray2)
+            diff = self._edges1
+        else:
+            img1 = self._fit(img1, self._bgr1)
+            img2 = self._fit(img2, self._bgr2)
+            diff = self._diff
+        cv2.absdiff(img1, img2, dst=diff)
+        channels = cv2.mean(diff)[:diff.shape[2] if diff.ndim == 3 else 1]
+        score = float(sum(channels) / len(channels))
+        self._record('color_difference', start)
+        return score
+
+    def edge_similarity(self, img1, img2):
+        """
+        计算边缘相似度，与 ImageComparator.edge_detection_comparison 一致
+
+        Canny 边缘图只有 0 和 255 两种值，均方误差等于 255^2 乘以不同像素的比例，
+        因此只需统计不同的像素数，不需要浮点运算
+
+        返回:
+            0-1范围内的边缘相似度
+
+        异常:
+            ValueError: 两张图像尺寸不一致（与原实现一致，不缩放后比较）
+        """
+        if img1.shape[:2] != img2.shape[:2]:
+            raise ValueError(f"图像尺寸不一致: {img1.shape[:2]} 与 {img2.shape[:2]}")
+        start = time.perf_counter()
+        gray1 = self._gray(img1, self._gray1)
+        gray2 = self._gray(img2, self._gray2)
+        cv2.Canny(gray1, CANNY_THRESHOLD1, CANNY_THRESHOLD2, edges=self._edges1)
+        cv2.Canny(gray2, CANNY_THRESHOLD1, CANNY_THRESHOLD2, edges=self._edges2)
+        cv2.absdiff(self._edges1, self._edges2, dst=self._edges1)
+        different = cv2.countNonZero(self._edges1)
+        mse = 255.0 * 255.0 * different / (self.width * self.height)
+        similarity = 1.0 if mse == 0 else 1.0 / (1.0 + mse / 100000)
+        self._record('edge_similarity', start)
+        return similarity
+
+    def contrast_similarity(self, img1, img2):
+        """
+        计算对比度相似度（灰度标准差之比），与 ImageComparator.contrast_comparison 一致
+
+        标准差是整幅图像的统计量，尺寸不一致时各自按原尺寸计算，不缩放
+
+        返回:
+            0-1范围内的对比度相似度
+        """
+        start = time.perf_counter()
+        contrast1 = self._contrast(img1, self._gray1)
+        contrast2 = self._contrast(img2, self._gray2)
+        max_contrast = max(contrast1, contrast2)
+        similarity = 1.0 if max_contrast == 0 else min(contrast1, contrast2) / max_contrast
+        self._record('contrast_similarity', start)
+        return similarity
+
+    def _contrast(self, img, dst):
+        """灰度标准差；尺寸与工作区一致时在dst中转换灰度，否则按原尺寸转换"""
+        if img.shape[:2] == dst.shape:
+            gray = self._gray(img, dst)
+        else:
+            gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return float(cv2.meanStdDev(gray)[1][0][0])
+
+    def stats(self):
+        """返回工作区的内存占用和各方法的平均耗时"""
+        return {
+            'size': list(self.size),
+            'buffer_bytes': self.nbytes,
+            'timings': {
+                method: {
+                    'calls': timing['calls'],
+                    'mean_ms': round(timing['total_ms'] / timing['calls'], 4),
+                    'last_ms': round(timing['last_ms'], 4),
+                }
+                for method, timing in self.timings.items()
+            },
+        }
+
+
+_local = threading.local()
+
+
+def get_workspace(width, height):
+    """
+    获取当前线程在指定分辨率下的工作区，不存在时创建
+
+    参数:
+        width: 图像宽度
+        height: 图像高度
+
+    返回:
+        ComparatorWorkspace
+    """
+    workspaces = getattr(_local, 'workspaces', None)
+    if workspaces is None:
+        workspaces = _local.workspaces = OrderedDict()
+    key = (width, height)
+    workspace = workspaces.get(key)
+    if workspace is None:
+        workspace = workspaces[key] = ComparatorWorkspace(width, height)
+        logger.info(f"创建 {width}x{height} 比较工作区，缓冲区 {workspace.nbytes / 1024 / 1024:.1f}MB")
+        while len(workspaces) > MAX_WORKSPACES_PER_THREAD:
+            workspaces.popitem(last=False)
+    else:
+        workspaces.move_to_end(key)
+    return workspace
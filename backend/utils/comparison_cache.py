@@ -0,0 +1,237 @@
+"""
+图像比较结果缓存模块
+
+批量执行中重复的用例、失败用例的重新执行、以及引用相同步骤ID的多个验证步骤，
+经常会对完全相同的两张图像做相同的比较。该模块按图像内容缓存比较结果。主要功能包括：
+1. 以图像内容的哈希（而不是文件名或步骤ID）识别图像，内容相同即视为同一张图
+2. 以 (图像1哈希, 图像2哈希, 比较方法, 参数) 为键缓存比较结果
+3. 按条目数量限制缓存大小，超出时淘汰最久未使用的条目
+4. 可选持久化到JSON文件，服务重启后仍可复用之前的结果
+
+主要类：
+- ComparisonCache: 比较结果的LRU缓存
+
+主要函数：
+- image_digest: 计算图像内容的哈希
+
+只读数组（如参考图缓存中的图像）的哈希会被记住，同一个数组只计算一次。
+模块级实例 comparison_cache 供执行器共用。
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from config import COMPARISON_CACHE_MAX_ENTRIES, COMPARISON_CACHE_FILE
+from .log_config import setup_logger
+
+# 获取日志记录器
+logger = setup_logger(__name__)
+
+# 持久化时每新增多少条结果写一次文件（退出时也会写一次）
+SAVE_INTERVAL = 50
+
+# id(只读数组) -> (数组的弱引用, 哈希)
+_digest_memo = {}
+_digest_lock = threading.Lock()
+
+
+def image_digest(image):
+    """
+    计算图像内容的哈希，形状和数据类型也参与计算
+
+    参数:
+        image: 图像数组
+
+    返回:
+        str: 32位十六进制字符串
+    """
+    frozen = not image.flags.writeable
+    if frozen:
+        with _digest_lock:
+            memo = _digest_memo.get(id(image))
+        if memo is not None and memo[0]() is image:
+            return memo[1]
+
+    # SHA-256 在支持硬件加速的CPU上比 blake2b/md5 更快，截取前32位十六进制即可
+    hasher = hashlib.sha256(f"{image.shape}{image.dtype.str}".encode())
+    hasher.update(np.ascontiguousarray(image).data)
+    digest = hasher.hexdigest()[:32]
+
+    if frozen:
+        key = id(image)
+
+        def _forget(_, key=key):
+            with _digest_lock:
+                _digest_memo.pop(key, None)
+
+        with _digest_lock:
+            _digest_memo[key] = (weakref.ref(image, _forget), digest)
+    return digest
+
+
+def _to_builtin(value):
+    """将NumPy标量转换为Python内置类型，便于保存为JSON"""
+    if isinstance(value, dict):
+        return {key: _to_builtin(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_builtin(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class ComparisonCache:
+    """
+    比较结果的LRU缓存
+
+    用法:
+        result = comparison_cache.get_or_compute(
+            capture, reference, 'ssim',
+            lambda: ImageComparator.is_ssim(capture, reference, threshold=0.98),
+            threshold=0.98
+        )
+    """
+
+    def __init__(self, max_entries=COMPARISON_CACHE_MAX_ENTRIES, persist_path=None):
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    @staticmethod
+    def make_key(img1, img2, method, params=None):
+        """
+        生成缓存键
+
+        参数:
+            img1: 第一张图像
+            img2: 第二张图像
+            method: 比较方法名
+            params: 影响结果的参数字典（阈值等）
+
+        返回:
+            str: 缓存键
+        """
+        params_text = json.dumps(_to_builtin(params or {}), sort_keys=True, ensure_ascii=False)
+        return f"{image_digest(img1)}:{image_digest(img2)}:{method}:{params_text}"
+
+    def get(self, key):
+        """
+        查找缓存结果
+
+        返回:
+            (是否命中, 结果)
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        """保存比较结果，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._entries[key] = _to_builtin(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._unsaved += 1
+            should_save = self.persist_path and self._unsaved >= SAVE_INTERVAL
+        if should_save:
+            self.save()
+
+    def get_or_compute(self, img1, img2, method, compute, **params):
+        """
+        命中时直接返回缓存结果，否则调用compute计算并缓存
+
+        参数:
+            img1: 第一张图像
+            img2: 第二张图像
+            method: 比较方法名
+            compute: 无参数的计算函数，返回比较结果
+            **params: 影响结果的参数
+
+        返回:
+            比较结果（NumPy标量已转换为Python内置类型）
+        """
+        key = self.make_key(img1, img2, method, params)
+        found, value = self.get(key)
+        if found:
+            logger.info(f"命中比较结果缓存 ({method})，跳过图像比较")
+            return value
+        value = _to_builtin(compute())
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._unsaved += 1
+
+    def load(self):
+        """从持久化文件加载缓存，文件不存在或损坏时忽略"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取比较结果缓存文件失败 {self.persist_path}: {str(e)}")
+            return
+        with self._lock:
+            for key, value in data.get('entries', [])[-self.max_entries:]:
+                self._entries[key] = value
+            self._unsaved = 0
+        logger.info(f"已加载比较结果缓存，共 {len(self._entries)} 条")
+
+    def save(self):
+        """将缓存写入持久化文件，先写临时文件再替换"""
+        if not self.persist_path:
+            return
+        with self._lock:
+            if not self._unsaved:
+                return
+            entries = list(self._entries.items())
+            self._unsaved = 0
+        temp_path = f"{self.persist_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.persist_path) or '.', exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'entries': entries}, f, ensure_ascii=False)
+            os.replace(temp_path, self.persist_path)
+        except Exception as e:
+            logger.warning(f"保存比较结果缓存文件失败 {self.persist_path}: {str(e)}")
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'persist_path': self.persist_path,
+            }
+
+
+# 全局比较结果缓存实例
+comparison_cache = ComparisonCache(persist_path=COMPARISON_CACHE_FILE or None)
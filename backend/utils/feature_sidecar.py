@@ -0,0 +1,271 @@
+"""
+参考图特征旁路文件模块
+
+参考截图上传或通过 /api/screen/capture 获取后，在后台预先计算一次特征并保存在图片旁边，
+验证时直接加载，不再每次比较都重新计算。主要功能包括：
+1. 计算ORB关键点和描述符、灰度金字塔的低分辨率层、感知哈希（pHash/dHash）
+2. 以压缩的 .npz 文件保存在图片所在目录的 .features 子目录中；原始分辨率的灰度图可由图片直接得到，不保存
+3. 记录源文件的修改时间和大小，源文件变化后旁路文件自动失效
+4. 后台线程异步计算，不阻塞上传和截图接口
+
+主要类：
+- ReferenceFeatures: 一张图片的预计算特征
+
+主要函数：
+- get_features: 加载有效的旁路文件，没有时计算并保存
+- load_features: 只加载有效的旁路文件，不计算
+- load_hashes: 只读取旁路文件中的感知哈希
+- schedule_features: 提交后台计算任务
+- remove_features: 删除图片对应的旁路文件
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from .image_hash import dhash, phash
+from .log_config import setup_logger
+
+# 获取日志记录器
+logger = setup_logger(__name__)
+
+# 旁路文件所在的子目录名和格式版本，计算方式变化时递增版本号使旧文件失效
+SIDECAR_DIR_NAME = '.features'
+SIDECAR_VERSION = 2
+# 灰度金字塔层数（含原始分辨率，原始分辨率层不保存），与金字塔SSIM默认使用的层级一致
+SIDECAR_PYRAMID_LEVELS = 3
+
+# 后台计算使用单个线程，避免上传大量图片时占满CPU
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='feature-sidecar')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+class ReferenceFeatures:
+    """一张图片的预计算特征"""
+
+    def __init__(self, keypoints, descriptors, shape, coarse_levels, phash_value, dhash_value):
+        # 关键点以 (N, 7) 的float32数组保存：x, y, size, angle, response, octave, class_id
+        self.keypoints = keypoints
+        self.descriptors = descriptors
+        # 原始分辨率灰度图的 (高, 宽)
+        self.shape = tuple(int(value) for value in shape)
+        # 灰度金字塔的低分辨率层：coarse_levels[i] 为第 i+1 层（宽高各缩小 2**(i+1) 倍）
+        self.coarse_levels = coarse_levels
+        self.phash = phash_value
+        self.dhash = dhash_value
+
+    def orb(self):
+        """返回 (关键点数组, 描述符)，可直接传给 ImageComparator.is_orb"""
+        return self.keypoints, (self.descriptors if len(self.descriptors) else None)
+
+    def cv_keypoints(self):
+        """将关键点数组转换为 cv2.KeyPoint 列表"""
+        return [
+            cv2.KeyPoint(float(x), float(y), float(size), float(angle), float(response), int(octave), int(class_id))
+            for x, y, size, angle, response, octave, class_id in self.keypoints
+        ]
+
+
+def sidecar_path(image_path):
+    """返回图片对应的旁路文件路径"""
+    directory, filename = os.path.split(os.path.abspath(image_path))
+    return os.path.join(directory, SIDECAR_DIR_NAME, filename + '.npz')
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def compute_features(image):
+    """
+    计算图片的特征
+
+    参数:
+        image: BGR图像
+
+    返回:
+        ReferenceFeatures
+    """
+    # 与 ImageComparator.is_orb 使用相同的ORB参数，保证结果一致
+    orb = cv2.ORB_create()
+    kps, des = orb.detectAndCompute(image, None)
+    keypoints = np.array(
+        [(kp.pt[0], kp.pt[1], kp.size, kp.angle, kp.response, kp.octave, kp.class_id) for kp in kps],
+        dtype=np.float32
+    ).reshape(-1, 7)
+    descriptors = des if des is not None else np.empty((0, 32), dtype=np.uint8)
+
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    coarse_levels = []
+    level = gray
+    for _ in range(1, SIDECAR_PYRAMID_LEVELS):
+        level = cv2.pyrDown(level)
+        coarse_levels.append(level)
+
+    return ReferenceFeatures(keypoints, descriptors, gray.shape, coarse_levels, phash(gray), dhash(gray))
+
+
+def save_features(image_path, features, stat=None):
+    """
+    保存旁路文件，先写临时文件再替换，避免读到写了一半的文件
+
+    参数:
+        image_path: 源图片路径
+        features: ReferenceFeatures
+        stat: 计算特征时源文件的 (修改时间, 大小)，默认读取当前值
+    """
+    stat = stat or _stat(image_path)
+    if stat is None:
+        return
+    path = sidecar_path(image_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    arrays = {
+        'version': np.array(SIDECAR_VERSION),
+        'source_mtime_ns': np.array(stat[0], dtype=np.int64),
+        'source_size': np.array(stat[1], dtype=np.int64),
+        'orb_keypoints': features.keypoints,
+        'orb_descriptors': features.descriptors,
+        'shape': np.array(features.shape, dtype=np.int64),
+        'phash': np.array(features.phash, dtype=np.uint64),
+        'dhash': np.array(features.dhash, dtype=np.uint64),
+    }
+    for index, level in enumerate(features.coarse_levels, start=1):
+        arrays[f'pyramid_{index}'] = level
+
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(temp_path, path)
+
+
+def load_features(image_path):
+    """
+    加载有效的旁路文件
+
+    返回:
+        ReferenceFeatures，旁路文件不存在、版本不符或源文件已变化时返回None
+    """
+    path = sidecar_path(image_path)
+    stat = _stat(image_path)
+    if stat is None or not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            if int(data['version']) != SIDECAR_VERSION:
+                return None
+            if (int(data['source_mtime_ns']), int(data['source_size'])) != stat:
+                logger.info(f"参考图已修改，旁路文件失效: {image_path}")
+                return None
+            coarse_levels = []
+            while f'pyramid_{len(coarse_levels) + 1}' in data.files:
+                coarse_levels.append(data[f'pyramid_{len(coarse_levels) + 1}'])
+            return ReferenceFeatures(
+                data['orb_keypoints'],
+                data['orb_descriptors'],
+                data['shape'],
+                coarse_levels,
+                int(data['phash']),
+                int(data['dhash']),
+            )
+    except Exception as e:
+        logger.warning(f"读取旁路文件失败 {path}: {str(e)}")
+        return None
+
+
+def load_hashes(image_path):
+    """
+    只读取旁路文件中的感知哈希，不加载关键点和金字塔
+
+    返回:
+        (phash, dhash)，旁路文件无效时返回None
+    """
+    path = sidecar_path(image_path)
+    stat = _stat(image_path)
+    if stat is None or not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            if int(data['version']) != SIDECAR_VERSION:
+                return None
+            if (int(data['source_mtime_ns']), int(data['source_size'])) != stat:
+                return None
+            return int(data['phash']), int(data['dhash'])
+    except Exception as e:
+        logger.warning(f"读取旁路文件失败 {path}: {str(e)}")
+        return None
+
+
+def get_features(image_path, image=None):
+    """
+    获取图片的特征：有效的旁路文件直接加载，否则计算并保存
+
+    参数:
+        image_path: 图片路径
+        image: 已经解码的图片，提供时不再重复读取
+
+    返回:
+        ReferenceFeatures，图片无法读取时返回None
+    """
+    features = load_features(image_path)
+    if features is not None:
+        return features
+
+    stat = _stat(image_path)
+    if stat is None:
+        return None
+    if image is None:
+        image = cv2.imread(image_path)
+        if image is None:
+            logger.warning(f"无法读取图片，跳过特征计算: {image_path}")
+            return None
+
+    features = compute_features(image)
+    try:
+        save_features(image_path, features, stat)
+        logger.info(f"已生成参考图特征旁路文件: {sidecar_path(image_path)}")
+    except Exception as e:
+        logger.warning(f"保存旁路文件失败 {image_path}: {str(e)}")
+    return features
+
+
+def _background_compute(image_path):
+    try:
+        get_features(image_path)
+    except Exception as e:
+        logger.error(f"后台计算参考图特征失败 {image_path}: {str(e)}")
+    finally:
+        with _pending_lock:
+            _pending.discard(image_path)
+
+
+def schedule_features(image_path):
+    """
+    提交后台计算任务，同一张图片已在排队时不重复提交
+
+    参数:
+        image_path: 图片路径
+    """
+    image_path = os.path.abspath(image_path)
+    with _pending_lock:
+        if image_path in _pending:
+            return
+        _pending.add(image_path)
+    _executor.submit(_background_compute, image_path)
+
+
+def remove_features(image_path):
+    """删除图片对应的旁路文件"""
+    path = sidecar_path(image_path)
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError as e:
+        logger.warning(f"删除旁路文件失败 {path}: {str(e)}")
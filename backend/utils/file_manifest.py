@@ -0,0 +1,322 @@
+"""
+文件清单 - 图像目录的文件列表索引，供文件列表接口分页查询
+
+/api/files/images/list、/screenshots/list、/upload/list 原本在每次请求时列出目录并逐个读取文件信息，一次返回全部文件。
+该模块在数据库（与测试用例同一个 DATABASE_URI）的 file_manifest 表中维护各目录的文件名、大小、修改时间和测试用例ID：
+- 本程序写入或删除文件时（采集图像存储、上传、删除接口）直接更新清单
+- 查询前检查目录的修改时间，变化时（其他程序增删了文件）与目录重新同步；每隔 RECONCILE_INTERVAL 秒也会完整同步一次
+- 查询按修改时间从新到旧排序，支持按目录、测试用例、修改日期过滤和 (修改时间, 目录, 文件名) 游标分页
+- 每个目录有一个版本号，清单变化时递增，用于生成列表接口的ETag
+
+主要类：
+- FileManifest: 文件清单，全局实例为 file_manifest
+
+主要函数：
+- case_id_from_name: 从文件名中取出测试用例ID
+"""
+
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import Column, Float, Index, Integer, MetaData, String, Table, and_, delete, func, or_, select
+from sqlalchemy.dialects.sqlite import insert
+
+from config import DATABASE_URI, DISPLAY_IMAGES_DIR, OPERATION_IMAGES_DIR, SCREENSHOTS_DIR
+from models.test_case_db import create_sqlite_engine
+from .screen_index import FRONTEND_PUBLIC_DIR
+from .log_config import setup_logger
+
+# 获取日志记录器
+logger = setup_logger(__name__)
+
+metadata = MetaData()
+
+manifest_table = Table(
+    'file_manifest', metadata,
+    Column('kind', String, primary_key=True),
+    Column('name', String, primary_key=True),
+    Column('size', Integer, nullable=False),
+    Column('mtime', Float, nullable=False),
+    Column('test_case_id', String, nullable=False, default=''),
+    Index('ix_file_manifest_kind_mtime', 'kind', 'mtime', 'name'),
+    Index('ix_file_manifest_case_mtime', 'test_case_id', 'kind', 'mtime', 'name'),
+)
+
+manifest_dirs_table = Table(
+    'file_manifest_dirs', metadata,
+    Column('kind', String, primary_key=True),
+    # 上次同步时目录的修改时间
+    Column('mtime_ns', Integer, nullable=False, default=0),
+    Column('version', Integer, nullable=False, default=0),
+)
+
+# 目录类型 -> 目录路径
+KIND_DIRS = {
+    'operation_img': OPERATION_IMAGES_DIR,
+    'display_img': DISPLAY_IMAGES_DIR,
+    'screenshots': SCREENSHOTS_DIR,
+    'upload': os.path.join(FRONTEND_PUBLIC_DIR, 'img', 'upload'),
+}
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.tiff', '.tif', '.webp')
+# 即使目录修改时间没有变化，也至少每隔这么久（秒）与目录完整同步一次
+RECONCILE_INTERVAL = 300
+# 一次批量写入的最大行数
+_CHUNK = 500
+# 文件名中的测试用例ID：id_{id}_xxx 或 {id}_xxx（采集图像存储也使用该规则）
+CASE_ID_PATTERN = re.compile(r'^(?:id_)?(\d+)_')
+
+
+def case_id_from_name(name):
+    """从文件名中取出测试用例ID，文件名不带测试用例ID时返回空字符串"""
+    match = CASE_ID_PATTERN.match(name)
+    return match.group(1) if match else ''
+
+
+def _timestamp(value, name):
+    """把ISO格式的日期或时间转换为时间戳"""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"无效的{name}: {value}")
+
+
+class FileManifest:
+    """图像目录的文件列表索引"""
+
+    def __init__(self, uri=DATABASE_URI, kind_dirs=None):
+        self.uri = uri
+        self.kind_dirs = dict(KIND_DIRS if kind_dirs is None else kind_dirs)
+        self._engine = None
+        self._lock = threading.RLock()
+        # 目录类型 -> (上次同步时目录的修改时间, 同步时间)
+        self._synced = {}
+
+    @property
+    def engine(self):
+        """数据库引擎，首次访问时建表"""
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    engine = create_sqlite_engine(self.uri)
+                    metadata.create_all(engine)
+                    self._engine = engine
+        return self._engine
+
+    def _kind_of(self, path):
+        directory = os.path.abspath(os.path.dirname(path))
+        for kind, kind_dir in self.kind_dirs.items():
+            if os.path.abspath(kind_dir) == directory:
+                return kind
+        return None
+
+    def _dir_mtime(self, kind):
+        try:
+            return os.stat(self.kind_dirs[kind]).st_mtime_ns
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _bump(connection, kind, mtime_ns=None):
+        """递增目录的版本号（mtime_ns 不为None时同时记录同步时的目录修改时间）"""
+        statement = insert(manifest_dirs_table).values(kind=kind, mtime_ns=mtime_ns or 0, version=1)
+        values = {'version': manifest_dirs_table.c.version + 1}
+        if mtime_ns is not None:
+            values['mtime_ns'] = statement.excluded.mtime_ns
+        connection.execute(statement.on_conflict_do_update(index_elements=['kind'], set_=values))
+
+    # ---------- 写入时更新 ----------
+
+    def record(self, path):
+        """文件写入后更新清单（不在清单目录中的文件忽略）"""
+        kind = self._kind_of(path)
+        name = os.path.basename(path)
+        if kind is None or not name.lower().endswith(IMAGE_EXTENSIONS):
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.forget(path)
+            return
+        try:
+            with self._lock:
+                statement = insert(manifest_table).values(kind=kind, name=name, size=stat.st_size,
+                                                          mtime=stat.st_mtime, test_case_id=case_id_from_name(name))
+                with self.engine.begin() as connection:
+                    connection.execute(statement.on_conflict_do_update(
+                        index_elements=['kind', 'name'],
+                        set_={'size': statement.excluded.size, 'mtime': statement.excluded.mtime}))
+                    self._keep_synced(connection, kind)
+        except Exception as e:
+            # 清单更新失败不影响文件写入，下次同步目录时补上
+            logger.warning(f"更新文件清单失败 {path}: {str(e)}")
+
+    def forget(self, *paths):
+        """文件删除后从清单中移除"""
+        by_kind = {}
+        for path in paths:
+            kind = self._kind_of(path)
+            if kind is not None:
+                by_kind.setdefault(kind, []).append(os.path.basename(path))
+        if not by_kind:
+            return
+        try:
+            with self._lock:
+                with self.engine.begin() as connection:
+                    for kind, names in by_kind.items():
+                        for start in range(0, len(names), _CHUNK):
+                            connection.execute(delete(manifest_table).where(
+                                manifest_table.c.kind == kind, manifest_table.c.name.in_(names[start:start + _CHUNK])))
+                        self._keep_synced(connection, kind)
+        except Exception as e:
+            logger.warning(f"更新文件清单失败: {str(e)}")
+
+    def _keep_synced(self, connection, kind):
+        """
+        本程序的写入会改变目录修改时间：清单在写入前已与目录同步时，记录新的目录修改时间，避免下次查询重新同步
+        """
+        if kind in self._synced:
+            mtime_ns = self._dir_mtime(kind)
+            self._synced[kind] = (mtime_ns, self._synced[kind][1])
+            self._bump(connection, kind, mtime_ns)
+        else:
+            self._bump(connection, kind)
+
+    # ---------- 与目录同步 ----------
+
+    def sync(self, kinds=None):
+        """目录修改时间变化（或距上次完整同步超过 RECONCILE_INTERVAL）时与目录重新同步"""
+        for kind in kinds or self.kind_dirs:
+            with self._lock:
+                mtime_ns = self._dir_mtime(kind)
+                synced = self._synced.get(kind)
+                if synced is None:
+                    with self.engine.connect() as connection:
+                        stored = connection.execute(select(manifest_dirs_table.c.mtime_ns).where(
+                            manifest_dirs_table.c.kind == kind)).scalar()
+                    # 上次运行时同步过且目录没有变化时，本次启动不必重新同步
+                    if stored is not None and stored == mtime_ns:
+                        synced = self._synced[kind] = (mtime_ns, time.monotonic())
+                if synced is None or synced[0] != mtime_ns or time.monotonic() - synced[1] >= RECONCILE_INTERVAL:
+                    self._reconcile(kind, mtime_ns)
+
+    def _reconcile(self, kind, mtime_ns):
+        """与目录完整同步：新增、修改和删除的文件写入清单"""
+        started = time.perf_counter()
+        present = {}
+        directory = self.kind_dirs[kind]
+        if os.path.isdir(directory):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    present[entry.name] = (stat.st_size, stat.st_mtime)
+        with self.engine.begin() as connection:
+            known = {row.name: (row.size, row.mtime) for row in connection.execute(
+                select(manifest_table.c.name, manifest_table.c.size, manifest_table.c.mtime)
+                .where(manifest_table.c.kind == kind))}
+            added, changed = [], []
+            for name in sorted(present):
+                size, mtime = present[name]
+                if known.get(name) != (size, mtime):
+                    (changed if name in known else added).append(
+                        {'kind': kind, 'name': name, 'size': size, 'mtime': mtime, 'test_case_id': case_id_from_name(name)})
+            removed = [name for name in known if name not in present]
+            if added:
+                connection.execute(insert(manifest_table), added)
+            if changed:
+                statement = insert(manifest_table)
+                connection.execute(statement.on_conflict_do_update(
+                    index_elements=['kind', 'name'],
+                    set_={'size': statement.excluded.size, 'mtime': statement.excluded.mtime}), changed)
+            for start in range(0, len(removed), _CHUNK):
+                connection.execute(delete(manifest_table).where(
+                    manifest_table.c.kind == kind, manifest_table.c.name.in_(removed[start:start + _CHUNK])))
+            if added or changed or removed:
+                self._bump(connection, kind, mtime_ns)
+            else:
+                connection.execute(insert(manifest_dirs_table).values(kind=kind, mtime_ns=mtime_ns, version=0)
+                                   .on_conflict_do_update(index_elements=['kind'], set_={'mtime_ns': mtime_ns}))
+        self._synced[kind] = (mtime_ns, time.monotonic())
+        if added or changed or removed:
+            logger.debug(f"文件清单同步 {kind}: 新增 {len(added)} 个，更新 {len(changed)} 个，删除 {len(removed)} 个，"
+                         f"耗时 {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    # ---------- 查询 ----------
+
+    def version(self, kinds):
+        """指定目录的清单版本，清单变化时改变"""
+        with self.engine.connect() as connection:
+            versions = dict(connection.execute(select(manifest_dirs_table.c.kind, manifest_dirs_table.c.version)
+                                               .where(manifest_dirs_table.c.kind.in_(list(kinds)))).all())
+        return ','.join(f"{kind}:{versions.get(kind, 0)}" for kind in kinds)
+
+    def query(self, kinds, test_case_id=None, since=None, until=None, limit=None, cursor=None):
+        """
+        列出文件，按修改时间从新到旧排列
+
+        参数:
+            kinds: 目录类型列表（KIND_DIRS 的键）
+            test_case_id: 只列出文件名以 id_{id}_ 或 {id}_ 开头的文件
+            since / until: 修改时间范围（ISO格式的日期或时间），until 不含
+            limit: 每页数量，None表示全部
+            cursor: 上一页返回的 next_cursor
+
+        返回:
+            dict: {'items': [{'kind', 'name', 'size', 'mtime'}], 'total': 符合条件的文件总数,
+                   'next_cursor': 下一页游标，没有更多时为None}
+        """
+        unknown = [kind for kind in kinds if kind not in self.kind_dirs]
+        if unknown:
+            raise ValueError(f"不支持的目录: {', '.join(unknown)}")
+        table = manifest_table
+        conditions = [table.c.kind.in_(list(kinds))]
+        if test_case_id:
+            conditions.append(table.c.test_case_id == str(test_case_id))
+        if since:
+            conditions.append(table.c.mtime >= _timestamp(since, '开始时间'))
+        if until:
+            conditions.append(table.c.mtime < _timestamp(until, '结束时间'))
+        page_conditions = list(conditions)
+        if cursor:
+            try:
+                mtime, kind, name = cursor.split('|', 2)
+                mtime = float(mtime)
+            except ValueError:
+                raise ValueError(f"无效的游标: {cursor}")
+            page_conditions.append(or_(
+                table.c.mtime < mtime,
+                and_(table.c.mtime == mtime, or_(table.c.kind < kind, and_(table.c.kind == kind, table.c.name < name)))))
+        query = (select(table.c.kind, table.c.name, table.c.size, table.c.mtime).where(*page_conditions)
+                 .order_by(table.c.mtime.desc(), table.c.kind.desc(), table.c.name.desc()))
+        if limit is not None:
+            query = query.limit(limit + 1)
+
+        self.sync(kinds)
+        with self.engine.connect() as connection:
+            items = [dict(row) for row in connection.execute(query).mappings()]
+            total = connection.execute(select(func.count()).select_from(table).where(*conditions)).scalar()
+        next_cursor = None
+        if limit is not None and len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_cursor = f"{last['mtime']!r}|{last['kind']}|{last['name']}"
+        return {'items': items, 'total': total, 'next_cursor': next_cursor}
+
+    def dispose(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+                self._engine = None
+
+
+file_manifest = FileManifest()
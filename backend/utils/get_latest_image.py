@@ -19,6 +19,7 @@ import logging
 from datetime import datetime
 from .ssh_manager import SSHManager  # 替换为ssh_manager
 from .log_config import setup_logger
+from .artifact_store import artifact_store
 from .button_clicker import ButtonClicker  # 添加ButtonClicker导入
 import re
 import time
@@ -218,23 +219,25 @@ class GetLatestImage:
                     logger.error(f"无法读取图像文件: {temp_tiff_path}")
                     raise Exception(f"无法读取图像文件: {temp_tiff_path}")
                 
-                # 如果不是PNG格式，则保存为PNG格式
+                # 如果不是PNG格式，则转换为PNG格式；PNG先写入临时文件，再存入采集图像存储（相同内容只保存一份）
                 if not original_filename.lower().endswith('.png'):
-                    cv2.imwrite(local_png_path, image)
+                    temp_png_path = os.path.join(self.temp_dir, f"temp_{uuid.uuid4().hex}.png")
+                    cv2.imwrite(temp_png_path, image)
+                    artifact_store.add(temp_png_path, local_png_path, test_case_id=id)
                     logger.debug(f"已转换并保存PNG图像到: {local_png_path}")
                 else:
-                    # 如果已经是PNG格式，直接复制到目标位置
-                    import shutil
-                    shutil.copy2(temp_tiff_path, local_png_path)
-                    logger.debug(f"已复制PNG图像到: {local_png_path}")
+                    # 如果已经是PNG格式，直接存入目标位置
+                    artifact_store.add(temp_tiff_path, local_png_path, test_case_id=id)
+                    logger.debug(f"已保存PNG图像到: {local_png_path}")
                 
                 # 删除本地临时文件
-                logger.debug(f"删除临时图像文件: {temp_tiff_path}")
-                try:
-                    os.remove(temp_tiff_path)
-                    logger.debug(f"已删除临时图像文件")
-                except Exception as e:
-                    logger.warning(f"删除临时图像文件失败: {str(e)}")
+                if os.path.exists(temp_tiff_path):
+                    logger.debug(f"删除临时图像文件: {temp_tiff_path}")
+                    try:
+                        os.remove(temp_tiff_path)
+                        logger.debug(f"已删除临时图像文件")
+                    except Exception as e:
+                        logger.warning(f"删除临时图像文件失败: {str(e)}")
                 
                 logger.debug("图像获取成功")
                 return image
@@ -323,8 +326,10 @@ class GetLatestImage:
             try:
                 # 创建SFTP客户端
                 sftp = self.ssh.open_sftp()
-                # 下载文件
-                sftp.get(output_path, local_path)
+                # 下载到临时文件后存入采集图像存储（相同内容只保存一份）
+                temp_local_path = os.path.join(self.temp_dir, f"temp_{uuid.uuid4().hex}_{output_filename}")
+                sftp.get(output_path, temp_local_path)
+                artifact_store.add(temp_local_path, local_path, test_case_id=id)
                 # 删除远程文件
                 sftp.remove(output_path)
                 sftp.close()
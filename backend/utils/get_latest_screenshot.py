@@ -23,6 +23,7 @@ import uuid  # 添加uuid导入
 from datetime import datetime
 from .ssh_manager import SSHManager  # 替换为ssh_manager
 from .log_config import setup_logger
+from .artifact_store import artifact_store
 from .button_clicker import ButtonClicker  # 添加ButtonClicker导入
 
 # 获取日志记录器
@@ -208,23 +209,25 @@ class GetLatestScreenshot:
                     logger.error(f"无法读取图像文件: {temp_tiff_path}")
                     raise Exception(f"无法读取图像文件: {temp_tiff_path}")
                 
-                # 如果不是PNG格式，则保存为PNG格式
+                # 如果不是PNG格式，则转换为PNG格式；PNG先写入临时文件，再存入采集图像存储（相同内容只保存一份）
                 if not original_filename.lower().endswith('.png'):
-                    cv2.imwrite(local_png_path, image)
+                    temp_png_path = os.path.join(self.temp_dir, f"temp_{uuid.uuid4().hex}.png")
+                    cv2.imwrite(temp_png_path, image)
+                    artifact_store.add(temp_png_path, local_png_path, test_case_id=id)
                     logger.debug(f"已转换并保存PNG图像到: {local_png_path}")
                 else:
-                    # 如果已经是PNG格式，直接复制到目标位置
-                    import shutil
-                    shutil.copy2(temp_tiff_path, local_png_path)
-                    logger.debug(f"已复制PNG图像到: {local_png_path}")
+                    # 如果已经是PNG格式，直接存入目标位置
+                    artifact_store.add(temp_tiff_path, local_png_path, test_case_id=id)
+                    logger.debug(f"已保存PNG图像到: {local_png_path}")
                 
                 # 删除本地临时文件
-                logger.debug(f"删除临时图像文件: {temp_tiff_path}")
-                try:
-                    os.remove(temp_tiff_path)
-                    logger.debug(f"已删除临时图像文件")
-                except Exception as e:
-                    logger.warning(f"删除临时图像文件失败: {str(e)}")
+                if os.path.exists(temp_tiff_path):
+                    logger.debug(f"删除临时图像文件: {temp_tiff_path}")
+                    try:
+                        os.remove(temp_tiff_path)
+                        logger.debug(f"已删除临时图像文件")
+                    except Exception as e:
+                        logger.warning(f"删除临时图像文件失败: {str(e)}")
                 
                 logger.debug("截图获取成功")
                 return image
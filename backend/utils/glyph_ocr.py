@@ -0,0 +1,374 @@
+"""
+字形模板快速识别模块
+
+设备状态栏上的数值和固定标签使用已知的界面字体显示，不需要完整的 PaddleOCR 检测和识别。
+该模块从参考截图中学习每个字符的字形模板，识别时只做二值化、切分和模板比对，几毫秒即可完成。
+主要功能包括：
+1. 从参考截图的指定区域和已知文本中学习字形（每个字符可保存多个样本）
+2. 按行、按列投影切分字符，与字形模板做归一化相关比对，并比较字符的宽高比、相对高度和在行内的位置
+3. 返回识别文本、置信度（所有字符中最低的匹配得分）和每行文本的位置框
+4. 字形集以 .npz 文件保存在 GLYPHS_DIR 中，按文件修改时间缓存
+
+置信度低于 GLYPH_MIN_CONFIDENCE 时，调用方应退回 PaddleOCR（见 test_case_executor 的文本识别验证）。
+区域格式与 ocr.resolve_region 相同。
+
+主要类：
+- GlyphSet: 一组字形模板
+
+主要函数：
+- learn_glyphs: 从参考截图学习字形
+- recognize_glyphs: 使用字形集识别文本
+- load_glyph_set / list_glyph_sets / remove_glyph_set: 读取、列出、删除字形集
+"""
+
+import os
+import re
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from config import GLYPHS_DIR
+from .ocr import resolve_region
+from .log_config import setup_logger
+
+# 获取日志记录器
+logger = setup_logger(__name__)
+
+# 字形模板的尺寸 (宽, 高)
+GLYPH_SIZE = (16, 24)
+# 每个字符最多保存的样本数
+MAX_SAMPLES_PER_GLYPH = 8
+# 与已有样本的相似度高于该值时不再重复保存
+DUPLICATE_SAMPLE_SCORE = 0.98
+# 字符间距大于行字符高度（一行中最高字符的高度）的该比例时视为空格
+SPACE_GAP_RATIO = 0.4
+# 切分出的字符四周留出的边距（相对字符尺寸），使点、横线等实心字符的模板仍有明暗变化
+GLYPH_MARGIN_RATIO = 0.15
+# 高度小于该值的行视为噪点
+MIN_LINE_HEIGHT = 4
+
+_GLYPH_SET_NAME = re.compile(r'^[\w\-]+$')
+
+
+def _glyph_set_path(name):
+    if not name or not _GLYPH_SET_NAME.match(name):
+        raise ValueError(f"字形集名称只能包含字母、数字、下划线和连字符: {name}")
+    return os.path.join(GLYPHS_DIR, f"{name}.npz")
+
+
+def _normalize(glyphs):
+    """将字形图像展平为零均值、单位长度的向量，便于用矩阵乘法计算归一化相关"""
+    vectors = glyphs.reshape(len(glyphs), GLYPH_SIZE[0] * GLYPH_SIZE[1]).astype(np.float32)
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-6)
+
+
+class GlyphSet:
+    """
+    一组字形模板
+
+    属性:
+        name: 字形集名称
+        labels: 每个模板对应的字符
+        glyphs: 模板图像，形状为 (N, 高, 宽) 的 uint8 数组
+        shapes: 每个模板的形状特征，形状为 (N, 3)：宽高比、相对高度、中心的相对纵向位置（见 _glyph_images）
+    """
+
+    def __init__(self, name, labels=None, glyphs=None, shapes=None):
+        self.name = name
+        self.labels = list(labels) if labels is not None else []
+        self.glyphs = glyphs if glyphs is not None else np.zeros((0, GLYPH_SIZE[1], GLYPH_SIZE[0]), dtype=np.uint8)
+        self.shapes = np.asarray(shapes if shapes is not None else np.zeros((0, 3)), dtype=np.float32)
+        self._vectors = _normalize(self.glyphs)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def match(self, glyphs, shapes):
+        """
+        将切分出的字形与模板比对
+
+        得分为归一化相关系数乘以形状特征的接近程度：宽高比和相对高度取较小值/较大值，
+        纵向位置取 1 - 差值。模板缩放到统一尺寸后，“.”和“-”、“1”和“l”这类字符主要靠这些特征区分。
+
+        返回:
+            (字符列表, 得分数组)
+        """
+        if not len(self) or not len(glyphs):
+            return [''] * len(glyphs), np.zeros(len(glyphs), dtype=np.float32)
+        scores = _normalize(glyphs) @ self._vectors.T
+        shapes = np.asarray(shapes, dtype=np.float32)[:, None, :]
+        templates = self.shapes[None, :, :]
+        ratios = np.minimum(shapes[..., :2], templates[..., :2]) / np.maximum(
+            np.maximum(shapes[..., :2], templates[..., :2]), 1e-6)
+        scores *= ratios[..., 0] * ratios[..., 1]
+        scores *= np.clip(1.0 - np.abs(shapes[..., 2] - templates[..., 2]), 0.0, 1.0)
+        best = scores.argmax(axis=1)
+        return [self.labels[i] for i in best], scores[np.arange(len(best)), best]
+
+    def add(self, label, glyph, shape):
+        """
+        添加一个字形样本，与已有样本几乎相同或该字符样本已满时跳过
+
+        返回:
+            bool: 是否添加
+        """
+        indices = [i for i, existing in enumerate(self.labels) if existing == label]
+        if len(indices) >= MAX_SAMPLES_PER_GLYPH:
+            return False
+        if indices:
+            scores = _normalize(glyph[None])[0] @ self._vectors[indices].T
+            if scores.max() >= DUPLICATE_SAMPLE_SCORE:
+                return False
+        self.labels.append(label)
+        self.glyphs = np.concatenate([self.glyphs, glyph[None]])
+        self.shapes = np.concatenate([self.shapes, np.asarray(shape, dtype=np.float32)[None]])
+        self._vectors = _normalize(self.glyphs)
+        return True
+
+    def label_counts(self):
+        """返回每个字符的样本数"""
+        counts = {}
+        for label in self.labels:
+            counts[label] = counts.get(label, 0) + 1
+        return counts
+
+    def save(self):
+        """保存到 GLYPHS_DIR，先写临时文件再替换"""
+        path = _glyph_set_path(self.name)
+        os.makedirs(GLYPHS_DIR, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(temp_path, labels=np.array(self.labels, dtype=str), glyphs=self.glyphs,
+                            shapes=self.shapes)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, name):
+        """从 GLYPHS_DIR 读取字形集，文件不存在时返回None"""
+        path = _glyph_set_path(name)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return cls(name, labels=data['labels'].tolist(), glyphs=data['glyphs'], shapes=data['shapes'])
+
+
+# 名称 -> (文件修改时间, GlyphSet)
+_glyph_sets = {}
+_glyph_sets_lock = threading.Lock()
+
+
+def load_glyph_set(name):
+    """
+    读取字形集，文件未变化时返回缓存的对象
+
+    返回:
+        GlyphSet，不存在或无法读取时返回None
+    """
+    path = _glyph_set_path(name)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    with _glyph_sets_lock:
+        cached = _glyph_sets.get(name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    try:
+        glyph_set = GlyphSet.load(name)
+    except Exception as e:
+        logger.warning(f"读取字形集失败 {path}: {str(e)}")
+        return None
+    with _glyph_sets_lock:
+        _glyph_sets[name] = (mtime, glyph_set)
+    return glyph_set
+
+
+def list_glyph_sets():
+    """列出所有字形集名称"""
+    if not os.path.isdir(GLYPHS_DIR):
+        return []
+    return sorted(name[:-len('.npz')] for name in os.listdir(GLYPHS_DIR)
+                  if name.endswith('.npz') and _GLYPH_SET_NAME.match(name[:-len('.npz')]))
+
+
+def remove_glyph_set(name):
+    """
+    删除字形集
+
+    返回:
+        bool: 字形集是否存在
+    """
+    path = _glyph_set_path(name)
+    with _glyph_sets_lock:
+        _glyph_sets.pop(name, None)
+    if not os.path.exists(path):
+        return False
+    os.remove(path)
+    return True
+
+
+def _runs(mask):
+    """返回布尔序列中连续为True的区间 [(开始, 结束), ...]"""
+    padded = np.concatenate([[False], mask, [False]]).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def _prepare(image, region):
+    """裁剪区域并二值化，返回 (前景为255的二值图, 区域左上角)"""
+    roi = resolve_region(region, (image.shape[1], image.shape[0]))
+    if roi is not None:
+        x, y, w, h = roi
+        image = image[y:y + h, x:x + w]
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # 文字像素占少数：浅底深字时反转，使文字为前景
+    if cv2.countNonZero(binary) > binary.size // 2:
+        binary = cv2.bitwise_not(binary)
+    return binary, (roi[0], roi[1]) if roi is not None else (0, 0)
+
+
+def _segment(binary):
+    """
+    按行、按列投影切分字符
+
+    返回:
+        list: 每行为 ((y1, y2), [(x1, x2), ...])
+    """
+    lines = []
+    for y1, y2 in _runs(binary.any(axis=1)):
+        if y2 - y1 < MIN_LINE_HEIGHT:
+            continue
+        lines.append(((y1, y2), _runs(binary[y1:y2].any(axis=0))))
+    return lines
+
+
+def _glyph_images(binary, lines):
+    """
+    取出每个字符的图像和形状特征
+
+    每个字符按自身的外接框裁剪、四周留出边距后缩放到模板尺寸。形状特征相对于所在行最高字符的高度和行顶部计算，
+    数字、大写字母和下伸字母（如 p、g）的高度接近，因此不受行中是否只有标点影响：
+    - 宽高比: 字符宽度 / 字符高度
+    - 相对高度: 字符高度 / 行字符高度
+    - 纵向位置: (字符中心 - 行顶部) / 行字符高度
+
+    返回:
+        (字形图像数组, 形状特征数组, 每行的 (行内字符框列表, 行字符高度))
+    """
+    glyphs = []
+    shapes = []
+    layout = []
+    for (y1, y2), columns in lines:
+        boxes = []
+        for x1, x2 in columns:
+            rows = _runs(binary[y1:y2, x1:x2].any(axis=1))
+            boxes.append((x1, y1 + rows[0][0], x2, y1 + rows[-1][1]))
+        if not boxes:
+            continue
+        heights = np.array([bottom - top for _, top, _, bottom in boxes], dtype=np.float32)
+        centers = np.array([(top + bottom) / 2.0 for _, top, _, bottom in boxes], dtype=np.float32)
+        line_height = float(heights.max())
+        line_top = float(min(top for _, top, _, _ in boxes))
+        for (x1, top, x2, bottom), height, center in zip(boxes, heights, centers):
+            glyph = binary[top:bottom, x1:x2]
+            margin = max(1, int(round(GLYPH_MARGIN_RATIO * max(glyph.shape))))
+            glyph = cv2.copyMakeBorder(glyph, margin, margin, margin, margin, cv2.BORDER_CONSTANT, value=0)
+            glyphs.append(cv2.resize(glyph, GLYPH_SIZE, interpolation=cv2.INTER_AREA))
+            shapes.append(((x2 - x1) / height, height / line_height, (center - line_top) / line_height))
+        layout.append((boxes, line_height))
+    if not glyphs:
+        return np.zeros((0, GLYPH_SIZE[1], GLYPH_SIZE[0]), dtype=np.uint8), np.zeros((0, 3), dtype=np.float32), layout
+    return np.stack(glyphs), np.asarray(shapes, dtype=np.float32), layout
+
+
+def learn_glyphs(image, text, name, region=None):
+    """
+    从参考截图学习字形
+
+    区域内切分出的字符数必须与文本中非空白字符的数量一致，按从左到右、从上到下的顺序对应。
+
+    参数:
+        image: 参考截图（BGR或灰度图像数组）
+        text: 区域中显示的文本
+        name: 字形集名称，不存在时新建
+        region: 文本所在区域，格式见 ocr.resolve_region
+
+    返回:
+        dict: {'glyph_set', 'learned'（新增样本数）, 'labels'（每个字符的样本数）}
+
+    异常:
+        ValueError: 区域或名称无效、切分出的字符数与文本不一致
+    """
+    _glyph_set_path(name)
+    characters = [character for character in text if not character.isspace()]
+    if not characters:
+        raise ValueError("学习字形需要提供区域中显示的文本")
+    binary, _ = _prepare(image, region)
+    glyphs, shapes, _ = _glyph_images(binary, _segment(binary))
+    if len(glyphs) != len(characters):
+        raise ValueError(f"区域中切分出 {len(glyphs)} 个字符，与文本中的 {len(characters)} 个字符不一致，"
+                         f"请调整区域使其只包含该文本")
+
+    glyph_set = load_glyph_set(name) or GlyphSet(name)
+    learned = sum(glyph_set.add(label, glyph, shape) for label, glyph, shape in zip(characters, glyphs, shapes))
+    glyph_set.save()
+    with _glyph_sets_lock:
+        _glyph_sets.pop(name, None)
+    logger.info(f"字形集 {name} 新增 {learned} 个样本，共 {len(glyph_set)} 个")
+    return {'glyph_set': name, 'learned': learned, 'labels': glyph_set.label_counts()}
+
+
+def recognize_glyphs(image, name, region=None):
+    """
+    使用字形集识别文本
+
+    参数:
+        image: 截图（BGR或灰度图像数组）
+        name: 字形集名称
+        region: 识别区域，格式见 ocr.resolve_region
+
+    返回:
+        dict: {'text_results'（每行文本）, 'items'（每行的 text/confidence/box）, 'confidence', 'elapsed_ms'}，
+        字形集不存在或为空时返回None
+
+    异常:
+        ValueError: 区域或名称无效
+    """
+    start = time.perf_counter()
+    glyph_set = load_glyph_set(name)
+    if glyph_set is None or not len(glyph_set):
+        return None
+
+    binary, (offset_x, offset_y) = _prepare(image, region)
+    glyphs, shapes, layout = _glyph_images(binary, _segment(binary))
+    labels, scores = glyph_set.match(glyphs, shapes)
+
+    items = []
+    position = 0
+    for boxes, line_height in layout:
+        count = len(boxes)
+        line_labels = labels[position:position + count]
+        line_scores = scores[position:position + count]
+        position += count
+        text = line_labels[0]
+        for previous, following, label in zip(boxes, boxes[1:], line_labels[1:]):
+            if following[0] - previous[2] > SPACE_GAP_RATIO * line_height:
+                text += ' '
+            text += label
+        items.append({
+            'text': text,
+            'confidence': float(line_scores.min()),
+            'box': [int(boxes[0][0] + offset_x), int(min(box[1] for box in boxes) + offset_y),
+                    int(boxes[-1][2] + offset_x), int(max(box[3] for box in boxes) + offset_y)],
+        })
+
+    return {
+        'text_results': [item['text'] for item in items],
+        'items': items,
+        'confidence': min((item['confidence'] for item in items), default=0.0),
+        'elapsed_ms': round((time.perf_counter() - start) * 1000.0, 3),
+    }
@@ -0,0 +1,141 @@
+"""
+HTTP缓存和压缩模块 - 所有蓝图共用的响应处理
+
+前端轮询的JSON接口原本每次都返回完整的未压缩数据。该模块：
+1. 为JSON等文本响应补充强ETag（接口未设置时按响应内容计算）和 Cache-Control: no-cache，
+   请求的 If-None-Match 匹配时返回304
+2. 较大的文本响应按 Accept-Encoding 使用brotli（已安装 brotli 包时）或gzip压缩，
+   压缩后的ETag带编码后缀（如 "xxx-gzip"），不同编码的表示使用不同的强ETag
+3. 提供按数据版本生成ETag的函数：接口在读取数据前比较版本，未变化时直接返回304，不必重新查询和序列化
+
+文件接口（send_from_directory / send_file）由Flask处理ETag、Last-Modified、条件请求和Range，这里不再处理。
+
+主要函数：
+- init_http_cache: 在Flask应用上注册响应处理
+- version_etag: 由数据版本和查询参数生成ETag
+- not_modified: If-None-Match 匹配时返回304响应
+"""
+
+import gzip
+import hashlib
+
+from flask import make_response, request
+
+from config import HTTP_COMPRESS_MIN_BYTES
+from .log_config import setup_logger
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 获取日志记录器
+logger = setup_logger(__name__)
+
+# 需要补充ETag和压缩的响应类型
+TEXT_MIMETYPES = ('application/json', 'text/plain', 'text/html', 'text/css', 'text/csv', 'application/javascript')
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _encodings():
+    """可以使用的压缩编码，按优先顺序"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def version_etag(version):
+    """
+    由数据版本和请求的查询参数生成ETag
+
+    参数:
+        version: 数据版本，数据变化时必须改变
+
+    返回:
+        str: ETag（不带引号）
+    """
+    query = request.query_string.decode('utf-8', 'replace')
+    return hashlib.sha1(f"{request.path}?{query}#{version}".encode('utf-8')).hexdigest()
+
+
+def _matched_tag(etag):
+    """返回 If-None-Match 中与 etag（不压缩或任一压缩编码）匹配的ETag，没有匹配时返回None"""
+    for tag in (etag, *(f"{etag}-{encoding}" for encoding in _encodings())):
+        if request.if_none_match.contains(tag):
+            return tag
+    return None
+
+
+def not_modified(etag):
+    """
+    请求的 If-None-Match 与 etag 匹配时返回304响应，否则返回None
+
+    用法:
+        etag = version_etag(store.version())
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        ...
+        response.set_etag(etag)
+    """
+    tag = _matched_tag(etag)
+    if tag is None:
+        return None
+    response = make_response('', 304)
+    response.set_etag(tag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _choose_encoding(size):
+    if size < HTTP_COMPRESS_MIN_BYTES:
+        return None
+    for encoding in _encodings():
+        if request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def _process_response(response):
+    """补充ETag、处理条件请求并压缩文本响应"""
+    if (request.method not in ('GET', 'HEAD') or response.status_code != 200 or response.direct_passthrough
+            or response.is_streamed or response.mimetype not in TEXT_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    data = response.get_data()
+    etag, weak = response.get_etag()
+    if etag is None:
+        etag = hashlib.sha1(data).hexdigest()
+    elif weak:
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = 'no-cache'
+
+    cached = not_modified(etag)
+    if cached is not None:
+        for header in ('Access-Control-Allow-Origin', 'Access-Control-Allow-Credentials'):
+            if header in response.headers:
+                cached.headers[header] = response.headers[header]
+        return cached
+
+    encoding = _choose_encoding(len(data))
+    if encoding is None:
+        response.set_etag(etag)
+        return response
+    response.set_data(_compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    response.set_etag(f"{etag}-{encoding}")
+    return response
+
+
+def init_http_cache(app):
+    """在Flask应用上注册响应处理（应在CORS之后注册，使304响应也带有CORS头）"""
+    app.after_request(_process_response)
@@ -0,0 +1,215 @@
+"""
+参考图忽略区域模块
+
+时钟、计时器和实时内镜画面等动态区域会让整幅图像的SSIM比较无故失败。
+该模块为每张参考图保存忽略区域，比较时这些区域不参与计算。主要功能包括：
+1. 忽略区域可以是矩形、多边形，或 ROI_REGIONS 中的预设区域
+2. 以JSON文件保存在参考图所在目录的 .features 子目录中（与特征旁路文件放在一起）
+3. 按参考图的实际尺寸将忽略区域预先转换为掩码和SSIM权重图
+4. SSIM权重图会把忽略区域向外扩展半个高斯窗口，保证参与计算的SSIM值不受忽略区域内像素的影响
+
+区域格式（坐标单位为像素）：
+- "center": ROI_REGIONS 中的预设名称
+- {"preset": "center"}: 同上
+- {"rect": [x, y, 宽, 高]}: 矩形
+- {"polygon": [[x1, y1], [x2, y2], ...]}: 多边形
+- [x, y, 宽, 高]: 矩形的简写
+
+预设区域的坐标基于 SCREEN_REGION 的尺寸；自定义区域的坐标基于 coordinate_size，
+未指定时基于参考图本身的尺寸。生成掩码时都会按比例换算到目标尺寸。
+
+主要函数：
+- load_regions / save_regions / remove_regions: 读取、保存、删除参考图的忽略区域
+- normalize_regions: 校验并统一区域格式
+- build_keep_mask: 生成掩码（255为参与比较，0为忽略）
+- build_ssim_weights: 由掩码生成SSIM权重图
+"""
+
+import json
+import os
+
+import cv2
+import numpy as np
+
+from .Config import ROI_REGIONS, SCREEN_REGION
+from .feature_sidecar import SIDECAR_DIR_NAME
+from .image_comparator import SSIM_WINDOW
+from .log_config import setup_logger
+
+# 获取日志记录器
+logger = setup_logger(__name__)
+
+MASK_FILE_SUFFIX = '.mask.json'
+# 预设区域坐标所基于的屏幕尺寸 (宽, 高)
+PRESET_COORDINATE_SIZE = (SCREEN_REGION[2], SCREEN_REGION[3])
+
+
+def mask_path(image_path):
+    """返回参考图对应的忽略区域文件路径"""
+    directory, filename = os.path.split(os.path.abspath(image_path))
+    return os.path.join(directory, SIDECAR_DIR_NAME, filename + MASK_FILE_SUFFIX)
+
+
+def normalize_regions(regions):
+    """
+    校验并统一区域格式
+
+    参数:
+        regions: 区域列表，格式见模块说明
+
+    返回:
+        list: 统一格式后的区域列表，每项为 {"preset": 名称}、{"rect": [...]} 或 {"polygon": [...]}
+
+    异常:
+        ValueError: 区域格式错误或预设名称不存在
+    """
+    normalized = []
+    for region in regions or []:
+        if isinstance(region, str):
+            region = {'preset': region}
+        elif isinstance(region, (list, tuple)):
+            region = {'rect': list(region)}
+        if not isinstance(region, dict):
+            raise ValueError(f"无法识别的忽略区域: {region}")
+
+        if 'preset' in region:
+            if region['preset'] not in ROI_REGIONS:
+                raise ValueError(f"预设区域不存在: {region['preset']}，可选: {', '.join(ROI_REGIONS)}")
+            normalized.append({'preset': region['preset']})
+        elif 'rect' in region:
+            rect = region['rect']
+            if len(rect) != 4 or rect[2] <= 0 or rect[3] <= 0:
+                raise ValueError(f"矩形区域应为 [x, y, 宽, 高]: {rect}")
+            normalized.append({'rect': [float(value) for value in rect]})
+        elif 'polygon' in region:
+            points = region['polygon']
+            if len(points) < 3 or any(len(point) != 2 for point in points):
+                raise ValueError(f"多边形区域至少需要3个 [x, y] 顶点: {points}")
+            normalized.append({'polygon': [[float(x), float(y)] for x, y in points]})
+        else:
+            raise ValueError(f"无法识别的忽略区域: {region}")
+    return normalized
+
+
+def load_regions(image_path):
+    """
+    读取参考图的忽略区域
+
+    返回:
+        dict: {"regions": [...], "coordinate_size": [宽, 高] 或 None}，没有设置忽略区域时返回None
+    """
+    path = mask_path(image_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        regions = normalize_regions(data.get('regions'))
+    except Exception as e:
+        logger.warning(f"读取忽略区域文件失败 {path}: {str(e)}")
+        return None
+    if not regions:
+        return None
+    return {'regions': regions, 'coordinate_size': data.get('coordinate_size')}
+
+
+def save_regions(image_path, regions, coordinate_size=None):
+    """
+    保存参考图的忽略区域，区域为空时删除忽略区域文件
+
+    参数:
+        image_path: 参考图路径
+        regions: 区域列表，格式见模块说明
+        coordinate_size: 自定义区域坐标所基于的尺寸 (宽, 高)，默认为参考图本身的尺寸
+
+    返回:
+        list: 统一格式后的区域列表
+    """
+    regions = normalize_regions(regions)
+    if not regions:
+        remove_regions(image_path)
+        return regions
+    path = mask_path(image_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {
+        'regions': regions,
+        'coordinate_size': list(coordinate_size) if coordinate_size else None,
+    }
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+    logger.info(f"已保存参考图忽略区域 ({len(regions)} 个): {image_path}")
+    return regions
+
+
+def remove_regions(image_path):
+    """删除参考图的忽略区域文件"""
+    path = mask_path(image_path)
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError as e:
+        logger.warning(f"删除忽略区域文件失败 {path}: {str(e)}")
+
+
+def build_keep_mask(regions, size, coordinate_size=None):
+    """
+    生成目标尺寸下的掩码
+
+    参数:
+        regions: 统一格式的区域列表（见 normalize_regions）
+        size: 目标尺寸 (宽, 高)
+        coordinate_size: 自定义区域坐标所基于的尺寸，默认与目标尺寸相同
+
+    返回:
+        np.ndarray: uint8 掩码，255为参与比较，0为忽略；没有区域时返回None
+    """
+    if not regions:
+        return None
+    width, height = size
+    coordinate_size = tuple(coordinate_size) if coordinate_size else (width, height)
+    keep = np.full((height, width), 255, dtype=np.uint8)
+
+    for region in regions:
+        if 'preset' in region:
+            x, y, w, h = ROI_REGIONS[region['preset']]['region']
+            points = np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], dtype=np.float64)
+            base = PRESET_COORDINATE_SIZE
+        elif 'rect' in region:
+            x, y, w, h = region['rect']
+            points = np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], dtype=np.float64)
+            base = coordinate_size
+        else:
+            points = np.array(region['polygon'], dtype=np.float64)
+            base = coordinate_size
+        # 按比例换算到目标尺寸
+        points[:, 0] *= width / base[0]
+        points[:, 1] *= height / base[1]
+        cv2.fillPoly(keep, [np.round(points).astype(np.int32)], 0)
+
+    if not cv2.countNonZero(keep):
+        logger.warning("忽略区域覆盖了整张图像，忽略区域不生效")
+        return None
+    return keep
+
+
+def build_ssim_weights(keep_mask):
+    """
+    由掩码生成SSIM权重图
+
+    SSIM图上每个像素的值取决于其周围一个高斯窗口内的像素，因此忽略区域向外扩展半个窗口，
+    窗口与忽略区域有重叠的像素同样不参与平均。扩展后没有剩余像素时退回原始掩码。
+
+    参数:
+        keep_mask: build_keep_mask 生成的掩码
+
+    返回:
+        np.ndarray: float32 权重图（1为参与平均，0为忽略），keep_mask为None时返回None
+    """
+    if keep_mask is None:
+        return None
+    eroded = cv2.erode(keep_mask, np.ones(SSIM_WINDOW, dtype=np.uint8), borderType=cv2.BORDER_REPLICATE)
+    if not cv2.countNonZero(eroded):
+        eroded = keep_mask
+    return (eroded > 0).astype(np.float32)
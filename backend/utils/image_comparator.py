@@ -15,16 +15,56 @@ import cv2
 import numpy as np
 import logging
 import os
+import time
 # from skimage.metrics import structural_similarity as ssim
 from .log_config import setup_logger
 
 # 获取日志记录器
 logger = setup_logger(__name__)
 
+# SSIM 高斯窗口参数和常数
+SSIM_WINDOW = (11, 11)
+SSIM_SIGMA = 1.5
+SSIM_C1 = 0.01 ** 2
+SSIM_C2 = 0.03 ** 2
+
+# 金字塔 SSIM 默认参数：低分辨率层级，以及提前拒绝需要低于阈值的距离
+# 降采样会滤掉像素级噪声，低分辨率得分通常偏高：低分辨率得分明显低于阈值时原始分辨率也不会达到阈值，
+# 但低分辨率得分高不能说明原始分辨率得分高（噪声很大的截图低分辨率得分可达0.99，原始分辨率只有0.6），
+# 因此只提前拒绝，不提前通过
+PYRAMID_SSIM_LEVEL = 2
+PYRAMID_SSIM_REJECT_BAND = 0.02
+
+# 金字塔模板匹配：低分辨率层的模板边长不小于该值，最多降采样的层数，低分辨率层保留的候选位置数
+PYRAMID_TEMPLATE_MIN_SIZE = 12
+PYRAMID_TEMPLATE_MAX_LEVEL = 3
+PYRAMID_TEMPLATE_CANDIDATES = 5
+# 粗匹配得分比最佳候选低出该值的候选位置不再精确匹配
+PYRAMID_TEMPLATE_CANDIDATE_BAND = 0.1
+
+# 综合分析（analyze）支持的指标及默认阈值，阈值与对应的单项比较方法一致
+# color_difference 和 brightness_difference 是差异值，小于阈值为通过；其余为相似度，大于等于阈值为通过
+ANALYSIS_THRESHOLDS = {
+    'histogram': 0.90,
+    'color_difference': 30.0,
+    'brightness_difference': 20.0,
+    'contrast': 0.70,
+    'texture': 0.65,
+    'edge': 0.60,
+    'ssim': 0.98,
+}
+ANALYSIS_LOWER_IS_BETTER = ('color_difference', 'brightness_difference')
+# SSIM 计算量比其余指标大得多，默认不计算，需要时在 metrics 中指定
+ANALYSIS_DEFAULT_METRICS = ('histogram', 'color_difference', 'brightness_difference', 'contrast', 'texture', 'edge')
+
 class ImageComparator:
     @staticmethod
-    def is_orb(img1, img2, min_matches=25, img1_name=None, img2_name=None):
-        """使用 ORB 关键点检测判断图像是否放大"""
+    def is_orb(img1, img2, min_matches=25, img1_name=None, img2_name=None, features1=None, features2=None):
+        """
+        使用 ORB 关键点检测判断图像是否放大
+
+        features1/features2 为预先计算好的 (关键点, 描述符)（见 feature_sidecar），提供时不再重新检测
+        """
         logger.info(f"开始 ORB 关键点检测 - 图像1: {img1_name or '未命名'}, 图像2: {img2_name or '未命名'}")
         
         try:
@@ -32,9 +72,9 @@ class ImageComparator:
             orb = cv2.ORB_create()
             logger.info("创建 ORB 检测器成功")
 
-            # 检测关键点和描述符
-            kp1, des1 = orb.detectAndCompute(img1, None)
-            kp2, des2 = orb.detectAndCompute(img2, None)
+            # 检测关键点和描述符，已有预计算结果的图像直接使用
+            kp1, des1 = features1 if features1 is not None else orb.detectAndCompute(img1, None)
+            kp2, des2 = features2 if features2 is not None else orb.detectAndCompute(img2, None)
             
             logger.info(f"图像1关键点数量: {len(kp1)}")
             logger.info(f"图像2关键点数量: {len(kp2)}")
@@ -75,43 +115,178 @@ class ImageComparator:
             return False
 
     @staticmethod
-    def is_ssim(img1, img2, threshold=0.98, min_threshold=0.80, img1_name=None, img2_name=None):
-        """使用 SSIM 结构相似性指数判断图像是否相似"""
-        try:
-            logger.info(f"开始 SSIM 结构相似性分析 - 图像1: {img1_name or '未命名'}, 图像2: {img2_name or '未命名'}")
-            # 转换为灰度图并转换为float32类型
-            gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY).astype(np.float32)
-            gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    def _to_gray(img):
+        """将BGR图像转换为灰度图，已经是单通道的图像直接返回"""
+        if img.ndim == 2:
+            return img
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
-            # 确保两张图片尺寸相同
-            if gray1.shape != gray2.shape:
-                gray2 = cv2.resize(gray2, (gray1.shape[1], gray1.shape[0]))
+    @staticmethod
+    def _workspace(img):
+        """当前线程在图像尺寸下的比较工作区（见 comparator_workspace）"""
+        from .comparator_workspace import get_workspace
+        return get_workspace(img.shape[1], img.shape[0])
 
-            # 归一化图像值到 0-1 范围
-            gray1 = gray1 / 255.0
-            gray2 = gray2 / 255.0
+    @staticmethod
+    def _ssim_stats(gray):
+        """
+        计算单张图像的SSIM统计量
+
+        参数:
+            gray: 已归一化到0-1的float32灰度图
+
+        返回:
+            (mu, sigma_sq): 高斯窗口内的均值图和方差图
+        """
+        mu = cv2.GaussianBlur(gray, SSIM_WINDOW, SSIM_SIGMA)
+        sigma_sq = cv2.GaussianBlur(gray * gray, SSIM_WINDOW, SSIM_SIGMA) - mu * mu
+        return mu, sigma_sq
 
-            # 计算均值
-            mu1 = cv2.GaussianBlur(gray1, (11, 11), 1.5)
-            mu2 = cv2.GaussianBlur(gray2, (11, 11), 1.5)
+    @staticmethod
+    def _ssim_from_stats(gray1, mu1, sigma1_sq, gray2, mu2, sigma2_sq, weights=None):
+        """
+        由两张图像各自的统计量计算平均SSIM值，只需额外计算协方差
 
-            # 计算方差和协方差
-            sigma1_sq = cv2.GaussianBlur(gray1 * gray1, (11, 11), 1.5) - mu1 * mu1
-            sigma2_sq = cv2.GaussianBlur(gray2 * gray2, (11, 11), 1.5) - mu2 * mu2
-            sigma12 = cv2.GaussianBlur(gray1 * gray2, (11, 11), 1.5) - mu1 * mu2
+        参数:
+            gray1, gray2: 已归一化到0-1的float32灰度图
+            mu1, mu2: 均值图
+            sigma1_sq, sigma2_sq: 方差图
+            weights: SSIM权重图（见 ignore_mask），提供时计算加权平均，权重为0的像素不参与
 
-            # SSIM 常数
-            C1 = 0.01 ** 2
-            C2 = 0.03 ** 2
+        返回:
+            0-1范围内的平均SSIM值
+        """
+        sigma12 = cv2.GaussianBlur(gray1 * gray2, SSIM_WINDOW, SSIM_SIGMA) - mu1 * mu2
 
-            # 计算 SSIM
-            num = (2 * mu1 * mu2 + C1) * (2 * sigma12 + C2)
-            den = (mu1 * mu1 + mu2 * mu2 + C1) * (sigma1_sq + sigma2_sq + C2)
-            ssim_map = num / den
+        # 计算 SSIM
+        num = (2 * mu1 * mu2 + SSIM_C1) * (2 * sigma12 + SSIM_C2)
+        den = (mu1 * mu1 + mu2 * mu2 + SSIM_C1) * (sigma1_sq + sigma2_sq + SSIM_C2)
+        ssim_map = num / den
 
-            # 计算平均 SSIM，确保在 0-1 范围内
+        # 计算平均 SSIM，确保在 0-1 范围内
+        if weights is not None:
+            ssim_index = float(cv2.sumElems(cv2.multiply(ssim_map, weights))[0] / cv2.sumElems(weights)[0])
+        else:
             ssim_index = float(np.mean(ssim_map))
-            ssim_index = max(0.0, min(1.0, ssim_index))
+        return max(0.0, min(1.0, ssim_index))
+
+    @staticmethod
+    def _ssim_index(gray1, gray2, weights=None):
+        """
+        计算两张灰度图的平均SSIM值
+
+        参数:
+            gray1: 第一张灰度图（uint8，或已归一化到0-1的float32）
+            gray2: 第二张灰度图，尺寸与gray1相同
+            weights: SSIM权重图，提供时计算加权平均
+
+        返回:
+            0-1范围内的平均SSIM值
+        """
+        # 转换为float32类型并归一化图像值到 0-1 范围
+        if gray1.dtype != np.float32:
+            gray1 = gray1.astype(np.float32) / 255.0
+        if gray2.dtype != np.float32:
+            gray2 = gray2.astype(np.float32) / 255.0
+
+        # 计算均值、方差
+        mu1, sigma1_sq = ImageComparator._ssim_stats(gray1)
+        mu2, sigma2_sq = ImageComparator._ssim_stats(gray2)
+
+        return ImageComparator._ssim_from_stats(gray1, mu1, sigma1_sq, gray2, mu2, sigma2_sq, weights)
+
+    @staticmethod
+    def ssim_score(img1, img2, weights=None):
+        """
+        计算两张图像的平均SSIM值，尺寸不同时将图像2缩放到图像1的尺寸
+
+        参数:
+            img1: 第一张图像
+            img2: 第二张图像
+            weights: SSIM权重图（见 ignore_mask），提供时权重为0的像素不参与平均
+
+        返回:
+            0-1范围内的SSIM值
+        """
+        # 在图像1尺寸的工作区中计算，图像2尺寸不同时由工作区缩放
+        height, width = img1.shape[:2]
+        if weights is not None and weights.shape != (height, width):
+            weights = cv2.resize(weights, (width, height), interpolation=cv2.INTER_NEAREST)
+        return ImageComparator._workspace(img1).ssim(img1, img2, weights)
+
+    @staticmethod
+    def ssim_reference_score(img, reference):
+        """
+        使用预先计算好的参考图统计量计算SSIM值，结果与 ssim_score 相同
+
+        参数:
+            img: 操作界面截图
+            reference: 参考图数据（ReferenceVariant），需包含 gray_f、mu、sigma_sq，
+                       尺寸应与img一致，不一致时退回 ssim_score；
+                       带有 ssim_weights（参考图设置了忽略区域）时，忽略区域不参与平均
+
+        返回:
+            0-1范围内的SSIM值
+        """
+        weights = getattr(reference, 'ssim_weights', None)
+        if reference.mu is None or img.shape[:2] != reference.mu.shape:
+            return ImageComparator.ssim_score(img, reference.image, weights=weights)
+
+        if weights is not None:
+            logger.info("参考图设置了忽略区域，忽略区域不参与SSIM计算")
+        return ImageComparator._workspace(img).ssim_reference(img, reference.gray_f, reference.mu,
+                                                              reference.sigma_sq, weights)
+
+    @staticmethod
+    def is_ssim_reference(img, reference, threshold=0.98, img1_name=None, img2_name=None):
+        """
+        使用预先计算好的参考图统计量进行SSIM判断，结果与 is_ssim 相同
+
+        参数:
+            img: 操作界面截图
+            reference: 参考图数据（ReferenceVariant），见 ssim_reference_score
+            threshold: 相似度阈值
+            img1_name: 图像1名称，用于日志记录
+            img2_name: 图像2名称，用于日志记录
+
+        返回:
+            是否达到阈值
+        """
+        try:
+            logger.info(f"开始 SSIM 结构相似性分析（参考图统计量已缓存） - 图像1: {img1_name or '未命名'}, 图像2: {img2_name or '未命名'}")
+            ssim_index = ImageComparator.ssim_reference_score(img, reference)
+
+            logger.info(f"SSIM 相似度: {ssim_index:.4f}")
+
+            is_similar = ssim_index >= threshold
+            logger.info(f"图像相似度{'达到' if is_similar else '未达到'}阈值,测试 {'通过' if is_similar else '不通过'}"
+                       f"(SSIM 值: {ssim_index:.4f}, "
+                       f"阈值: {threshold:.2f})")
+            logger.info(f"SSIM 结构相似性分析完成 - 图像1: {img1_name or '未命名'}, 图像2: {img2_name or '未命名'}")
+
+            return is_similar
+
+        except Exception as e:
+            logger.error(f"SSIM 计算过程出错: {str(e)}")
+            return False
+
+    @staticmethod
+    def is_ssim(img1, img2, threshold=0.98, min_threshold=0.80, img1_name=None, img2_name=None, pyramid=False,
+                weights=None):
+        """
+        使用 SSIM 结构相似性指数判断图像是否相似
+
+        pyramid为True时使用多分辨率模式（见 ssim_pyramid），明显不相似的图像在低分辨率层即可判定不通过；
+        weights为SSIM权重图（见 ignore_mask），提供时权重为0的像素不参与平均，此时不使用多分辨率模式
+        """
+        if pyramid and weights is None:
+            report = ImageComparator.ssim_pyramid(img1, img2, threshold=threshold,
+                                                  img1_name=img1_name, img2_name=img2_name)
+            return report['passed']
+
+        try:
+            logger.info(f"开始 SSIM 结构相似性分析 - 图像1: {img1_name or '未命名'}, 图像2: {img2_name or '未命名'}")
+            ssim_index = ImageComparator.ssim_score(img1, img2, weights=weights)
 
             logger.info(f"SSIM 相似度: {ssim_index:.4f}")
 
@@ -127,7 +302,264 @@ class ImageComparator:
         except Exception as e:
             logger.error(f"SSIM 计算过程出错: {str(e)}")
             return False
+
+    @staticmethod
+    def ssim_pyramid(img1, img2, threshold=0.98, level=PYRAMID_SSIM_LEVEL, reject_band=PYRAMID_SSIM_REJECT_BAND,
+                     img1_name=None, img2_name=None, coarse_levels2=None):
+        """
+        多分辨率（金字塔）SSIM：先在低分辨率层计算，得分明显低于阈值时直接判定不通过，
+        否则回到原始分辨率精确计算。通过的结果总是由原始分辨率得出
+
+        参数:
+            img1: 第一张图像
+            img2: 第二张图像
+            threshold: 相似度阈值
+            level: 低分辨率层级，每一级宽高各缩小一半（level=2 即 1/4 宽高、1/16 像素）
+            reject_band: 低分辨率得分 < threshold - reject_band 时直接判定不通过
+            img1_name: 图像1名称，用于日志记录
+            img2_name: 图像2名称，用于日志记录
+            coarse_levels2: 图像2预先计算好的灰度金字塔低分辨率层（第i项为第i+1层，见 feature_sidecar），
+                            尺寸与图像1对应层一致时直接使用，不再重新降采样
+
+        返回:
+            dict: 包含以下字段
+                - passed: 是否达到阈值
+                - score: 最终采用的SSIM值
+                - level: 得出结果的层级（0表示原始分辨率）
+                - coarse_score: 低分辨率层的SSIM值
+                - early_exit: 是否在低分辨率层直接判定不通过
+                - elapsed_ms: 实际耗时（毫秒）
+                - estimated_full_ms: 按像素比例估算的原始分辨率计算耗时（毫秒）
+                - saved_ms: 估算节省的时间（毫秒），回到原始分辨率时为负数，表示额外开销
+        """
+        report = {
+            'passed': False,
+            'score': 0.0,
+            'level': 0,
+            'coarse_score': None,
+            'early_exit': False,
+            'elapsed_ms': 0.0,
+            'estimated_full_ms': 0.0,
+            'saved_ms': 0.0,
+        }
+        try:
+            logger.info(f"开始金字塔 SSIM 分析 - 图像1: {img1_name or '未命名'}, 图像2: {img2_name or '未命名'}")
+            start = time.perf_counter()
+
+            gray1 = ImageComparator._to_gray(img1)
+            gray2 = ImageComparator._to_gray(img2)
+            if gray1.shape != gray2.shape:
+                gray2 = cv2.resize(gray2, (gray1.shape[1], gray1.shape[0]))
+
+            # 构建低分辨率层，图像太小时减少层级，保证高斯窗口仍然有意义
+            coarse1, coarse2 = gray1, gray2
+            reached = 0
+            while reached < level and min(coarse1.shape[:2]) >= 4 * SSIM_WINDOW[0]:
+                coarse1 = cv2.pyrDown(coarse1)
+                reached += 1
+                if (coarse_levels2 is not None and reached <= len(coarse_levels2)
+                        and coarse_levels2[reached - 1].shape == coarse1.shape):
+                    coarse2 = coarse_levels2[reached - 1]
+                else:
+                    coarse2 = cv2.pyrDown(coarse2)
+
+            coarse_start = time.perf_counter()
+            coarse_score = ImageComparator._ssim_index(coarse1, coarse2)
+            coarse_ms = (time.perf_counter() - coarse_start) * 1000.0
+            # SSIM的计算量与像素数成正比，据此估算原始分辨率的耗时
+            estimated_full_ms = coarse_ms * (4 ** reached)
+
+            report['coarse_score'] = coarse_score
+            report['level'] = reached
+
+            if reached > 0 and coarse_score < threshold - reject_band:
+                # 明显低于阈值，直接采用低分辨率层的结果
+                report['score'] = coarse_score
+                report['early_exit'] = True
+            else:
+                # 可能通过，回到原始分辨率精确计算
+                report['score'] = ImageComparator._workspace(gray1).ssim(gray1, gray2) if reached > 0 else coarse_score
+                report['level'] = 0
+
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            report['passed'] = report['score'] >= threshold
+            report['elapsed_ms'] = round(elapsed_ms, 3)
+            report['estimated_full_ms'] = round(estimated_full_ms, 3)
+            report['saved_ms'] = round(estimated_full_ms - elapsed_ms, 3)
+
+            logger.info(f"金字塔 SSIM 结果: {'通过' if report['passed'] else '不通过'} "
+                        f"(SSIM 值: {report['score']:.4f}, 阈值: {threshold:.2f}, "
+                        f"低分辨率层 {reached} 得分: {coarse_score:.4f}, 结束层级: {report['level']}, "
+                        f"耗时: {report['elapsed_ms']:.1f}ms, 估算节省: {report['saved_ms']:.1f}ms)")
+            return report
+
+        except Exception as e:
+            logger.error(f"金字塔 SSIM 计算过程出错: {str(e)}")
+            return report
             
+    @staticmethod
+    def _match_template(image, template, mask=None):
+        """
+        TM_CCOEFF_NORMED 模板匹配，mask为模板的掩码（0为忽略）
+
+        带掩码时，模板有效区域方差为0的位置会得到NaN或无穷大，统一置为-1
+        """
+        if mask is None or mask.shape != template.shape[:2]:
+            return cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+        result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED, mask=mask)
+        result[~np.isfinite(result)] = -1.0
+        return result
+
+    @staticmethod
+    def _template_candidates(result, count, template_size):
+        """
+        在匹配结果中取得分最高的若干个位置，每取一个就抑制其周围一个模板大小的区域，
+        得分比最佳位置低出 PYRAMID_TEMPLATE_CANDIDATE_BAND 的位置不再保留
+        """
+        result = result.copy()
+        half_w, half_h = max(1, template_size[0] // 2), max(1, template_size[1] // 2)
+        candidates = []
+        for _ in range(count):
+            _, max_val, _, (x, y) = cv2.minMaxLoc(result)
+            if candidates and max_val < candidates[0][2] - PYRAMID_TEMPLATE_CANDIDATE_BAND:
+                break
+            candidates.append((x, y, float(max_val)))
+            result[max(0, y - half_h):y + half_h + 1, max(0, x - half_w):x + half_w + 1] = -1.0
+        return candidates
+
+    @staticmethod
+    def template_matching_pyramid(img1, img2, threshold=0.8, scales=(1.0,), level=None,
+                                  candidates=PYRAMID_TEMPLATE_CANDIDATES, img1_name=None, img2_name=None, mask=None):
+        """
+        由粗到精的多尺度模板匹配：先在低分辨率层找出候选位置，
+        再只在这些位置附近的小窗口内以原始分辨率精确匹配
+
+        参数:
+            img1: 原始图像
+            img2: 要查找的模板
+            threshold: 匹配阈值，默认0.8
+            scales: 模板的缩放比例，默认只匹配原始大小；如 (0.9, 1.0, 1.1) 可容忍轻微的缩放差异
+            level: 低分辨率层级，默认按模板大小自动选择（低分辨率层的模板边长不小于 PYRAMID_TEMPLATE_MIN_SIZE）
+            candidates: 低分辨率层保留的候选位置数
+            img1_name: 原始图像名称，用于日志记录
+            img2_name: 模板图像名称，用于日志记录
+            mask: 模板的掩码（见 ignore_mask，0为忽略），尺寸与模板一致，随模板一起缩放
+
+        返回:
+            dict: 包含以下字段
+                - passed: 是否达到阈值
+                - score: 最大匹配值（TM_CCOEFF_NORMED）
+                - location: 最佳匹配的左上角位置 [x, y]（原始图像坐标）
+                - size: 匹配到的模板大小 [宽, 高]
+                - scale: 最佳匹配使用的缩放比例
+                - level: 粗匹配使用的层级（0表示直接在原始分辨率匹配）
+                - coarse_score: 粗匹配的最大匹配值
+                - elapsed_ms: 耗时（毫秒）
+        """
+        report = {
+            'passed': False,
+            'score': 0.0,
+            'location': None,
+            'size': None,
+            'scale': None,
+            'level': 0,
+            'coarse_score': None,
+            'elapsed_ms': 0.0,
+        }
+        try:
+            logger.info(f"开始金字塔模板匹配 - 原始图像: {img1_name or '未命名'}, 模板图像: {img2_name or '未命名'}")
+            start = time.perf_counter()
+
+            gray1 = ImageComparator._to_gray(img1)
+            gray2 = ImageComparator._to_gray(img2)
+            if mask is not None and mask.shape != gray2.shape:
+                mask = None
+            height, width = gray1.shape[:2]
+            # 原始图像的金字塔，各尺度共用，按需构建
+            pyramid = [gray1]
+
+            best = None
+            for scale in scales:
+                template_mask = mask
+                if scale == 1.0:
+                    template = gray2
+                else:
+                    size = (max(1, int(round(gray2.shape[1] * scale))), max(1, int(round(gray2.shape[0] * scale))))
+                    template = cv2.resize(gray2, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+                    if mask is not None:
+                        template_mask = cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+                t_height, t_width = template.shape[:2]
+                if t_height > height or t_width > width:
+                    logger.info(f"缩放比例 {scale} 下模板大于原始图像，跳过")
+                    continue
+
+                # 选择粗匹配层级：低分辨率层的模板不能太小，否则失去细节
+                coarse_level = level
+                if coarse_level is None:
+                    coarse_level = 0
+                    while (coarse_level < PYRAMID_TEMPLATE_MAX_LEVEL
+                           and min(t_height, t_width) >> (coarse_level + 1) >= PYRAMID_TEMPLATE_MIN_SIZE):
+                        coarse_level += 1
+                while len(pyramid) <= coarse_level:
+                    pyramid.append(cv2.pyrDown(pyramid[-1]))
+
+                if coarse_level == 0:
+                    result = ImageComparator._match_template(gray1, template, template_mask)
+                    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+                    found = (float(max_val), max_loc, float(max_val))
+                else:
+                    coarse_template = template
+                    for _ in range(coarse_level):
+                        coarse_template = cv2.pyrDown(coarse_template)
+                    coarse_mask = None
+                    if template_mask is not None:
+                        coarse_mask = cv2.resize(template_mask, (coarse_template.shape[1], coarse_template.shape[0]),
+                                                 interpolation=cv2.INTER_NEAREST)
+                    coarse_result = ImageComparator._match_template(pyramid[coarse_level], coarse_template, coarse_mask)
+                    coarse_candidates = ImageComparator._template_candidates(
+                        coarse_result, candidates, (coarse_template.shape[1], coarse_template.shape[0])
+                    )
+
+                    # 在每个候选位置附近的窗口内以原始分辨率精确匹配，窗口边距覆盖降采样带来的位置误差
+                    factor = 1 << coarse_level
+                    margin = 2 * factor
+                    found = None
+                    for x, y, _ in coarse_candidates:
+                        x0 = max(0, x * factor - margin)
+                        y0 = max(0, y * factor - margin)
+                        x1 = min(width, x * factor + t_width + margin)
+                        y1 = min(height, y * factor + t_height + margin)
+                        if x1 - x0 < t_width or y1 - y0 < t_height:
+                            continue
+                        result = ImageComparator._match_template(gray1[y0:y1, x0:x1], template, template_mask)
+                        _, max_val, _, (dx, dy) = cv2.minMaxLoc(result)
+                        if found is None or max_val > found[0]:
+                            found = (float(max_val), (x0 + dx, y0 + dy), coarse_candidates[0][2])
+
+                if found is not None and (best is None or found[0] > best['score']):
+                    best = {
+                        'score': found[0],
+                        'location': [int(found[1][0]), int(found[1][1])],
+                        'size': [int(t_width), int(t_height)],
+                        'scale': scale,
+                        'level': coarse_level,
+                        'coarse_score': found[2],
+                    }
+
+            if best is not None:
+                report.update(best)
+                report['passed'] = best['score'] >= threshold
+            report['elapsed_ms'] = round((time.perf_counter() - start) * 1000.0, 3)
+
+            logger.info(f"金字塔模板匹配结果: {'成功' if report['passed'] else '失败'} "
+                        f"(匹配值: {report['score']:.4f}, 阈值: {threshold:.2f}, 位置: {report['location']}, "
+                        f"缩放: {report['scale']}, 粗匹配层级: {report['level']}, 耗时: {report['elapsed_ms']:.1f}ms)")
+            return report
+
+        except Exception as e:
+            logger.error(f"金字塔模板匹配过程出错: {str(e)}")
+            return report
+
     @staticmethod
     def histogram_comparison(img1, img2, threshold=0.90):
         """
@@ -189,16 +621,14 @@ class ImageComparator:
         logger.info("开始计算颜色差异")
         
         try:
-            # 确保两张图像尺寸一致
+            # 尺寸不一致时两张图像都缩放到较小的宽高（由工作区缩放）
+            h, w = min(img1.shape[0], img2.shape[0]), min(img1.shape[1], img2.shape[1])
             if img1.shape != img2.shape:
-                h, w = min(img1.shape[0], img2.shape[0]), min(img1.shape[1], img2.shape[1])
-                img1 = cv2.resize(img1, (w, h))
-                img2 = cv2.resize(img2, (w, h))
                 logger.info(f"调整图像尺寸至 {w}x{h}")
             
             # 计算平均颜色差异
-            diff = np.abs(img1.astype(np.float32) - img2.astype(np.float32))
-            mean_diff = np.mean(diff)
+            from .comparator_workspace import get_workspace
+            mean_diff = get_workspace(w, h).color_difference(img1, img2)
             logger.info(f"平均颜色差异: {mean_diff:.4f}")
             
             # 判断差异是否小于阈值
@@ -213,7 +643,35 @@ class ImageComparator:
             return False
     
     @staticmethod
-    def template_matching(img1, img2, threshold=0.8, img1_name=None, img2_name=None):
+    def template_score(img1, img2, mask=None):
+        """
+        在图像1中查找模板图像2，返回最大匹配值及其位置
+
+        参数:
+            img1: 原始图像
+            img2: 模板，大于原始图像时交换两者
+            mask: 模板的掩码（见 ignore_mask，0为忽略），尺寸与模板一致
+
+        返回:
+            (最大匹配值, 左上角位置 [x, y])
+        """
+        # 转换为灰度图（模板可以直接传入缓存的灰度图）
+        gray1 = ImageComparator._to_gray(img1)
+        gray2 = ImageComparator._to_gray(img2)
+
+        # 确保模板小于或等于原始图像
+        if gray2.shape[0] > gray1.shape[0] or gray2.shape[1] > gray1.shape[1]:
+            # 交换图像，使得模板总是小于原始图像
+            gray1, gray2 = gray2, gray1
+            mask = None
+            logger.info("交换图像顺序以确保模板尺寸小于原始图像")
+
+        result = ImageComparator._match_template(gray1, gray2, mask)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        return float(max_val), [int(max_loc[0]), int(max_loc[1])]
+
+    @staticmethod
+    def template_matching(img1, img2, threshold=0.8, img1_name=None, img2_name=None, mask=None):
         """
         使用模板匹配算法判断一幅图像是否包含在另一幅图像中
         
@@ -223,6 +681,7 @@ class ImageComparator:
             threshold: 匹配阈值，默认0.8
             img1_name: 原始图像名称，用于日志记录
             img2_name: 模板图像名称，用于日志记录
+            mask: 模板的掩码（见 ignore_mask，0为忽略），尺寸与模板一致
             
         返回:
             是否成功匹配
@@ -230,21 +689,7 @@ class ImageComparator:
         logger.info(f"开始模板匹配分析 - 原始图像: {img1_name or '未命名'}, 模板图像: {img2_name or '未命名'}")
         
         try:
-            # 转换为灰度图
-            gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
-            gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-            
-            # 确保模板小于或等于原始图像
-            if gray2.shape[0] > gray1.shape[0] or gray2.shape[1] > gray1.shape[1]:
-                # 交换图像，使得模板总是小于原始图像
-                gray1, gray2 = gray2, gray1
-                logger.info("交换图像顺序以确保模板尺寸小于原始图像")
-            
-            # 执行模板匹配
-            result = cv2.matchTemplate(gray1, gray2, cv2.TM_CCOEFF_NORMED)
-            
-            # 获取最大匹配值及其位置
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+            max_val, _ = ImageComparator.template_score(img1, img2, mask=mask)
             logger.info(f"最大匹配值: {max_val:.4f}")
             
             # 判断是否匹配成功
@@ -275,26 +720,9 @@ class ImageComparator:
         logger.info("开始边缘检测比较")
         
         try:
-            # 转换为灰度图
-            gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
-            gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-            
-            # 使用Canny边缘检测
-            edges1 = cv2.Canny(gray1, 100, 200)
-            edges2 = cv2.Canny(gray2, 100, 200)
-            
-            # 计算边缘图的相似度（使用结构相似性指数）
-            # 将边缘图转换为浮点型
-            edges1_float = edges1.astype(np.float32)
-            edges2_float = edges2.astype(np.float32)
-            
-            # 计算MSE（均方误差）
-            mse = np.mean((edges1_float - edges2_float) ** 2)
-            if mse == 0:
-                similarity = 1.0
-            else:
-                # 转换MSE为0-1之间的相似度值
-                similarity = 1.0 / (1.0 + mse / 100000)
+            # Canny边缘图的均方误差转换为0-1之间的相似度值（在图像1尺寸的工作区中计算）；
+            # 两张图像尺寸不一致时无法逐像素比较，判定为不相似
+            similarity = ImageComparator._workspace(img1).edge_similarity(img1, img2)
             
             logger.info(f"边缘检测相似度: {similarity:.4f}")
             
@@ -366,25 +794,9 @@ class ImageComparator:
         logger.info("开始对比度比较分析")
         
         try:
-            # 转换为灰度图
-            gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
-            gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-            
-            # 计算标准差作为对比度的度量
-            contrast1 = np.std(gray1.astype(np.float32))
-            contrast2 = np.std(gray2.astype(np.float32))
-            
-            # 计算对比度相似度
-            max_contrast = max(contrast1, contrast2)
-            min_contrast = min(contrast1, contrast2)
-            
-            if max_contrast == 0:
-                similarity = 1.0
-            else:
-                similarity = min_contrast / max_contrast
+            # 以灰度标准差作为对比度的度量，相似度为两者之比（尺寸不一致时各自按原尺寸计算）
+            similarity = ImageComparator._workspace(img1).contrast_similarity(img1, img2)
             
-            logger.info(f"图像1对比度: {contrast1:.2f}")
-            logger.info(f"图像2对比度: {contrast2:.2f}")
             logger.info(f"对比度相似度: {similarity:.4f}")
             
             # 判断是否相似
@@ -443,4 +855,116 @@ class ImageComparator:
             
         except Exception as e:
             logger.error(f"纹理比较过程出错: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    @staticmethod
+    def _hist_correl(hist1, hist2):
+        """MINMAX归一化后计算两个直方图的相关系数，与各单项比较方法的做法一致"""
+        hist1 = hist1.astype(np.float32).reshape(-1, 1)
+        hist2 = hist2.astype(np.float32).reshape(-1, 1)
+        cv2.normalize(hist1, hist1, 0, 1, cv2.NORM_MINMAX)
+        cv2.normalize(hist2, hist2, 0, 1, cv2.NORM_MINMAX)
+        return float(cv2.compareHist(hist1, hist2, cv2.HISTCMP_CORREL))
+
+    @staticmethod
+    def analyze(img1, img2, metrics=None, thresholds=None, img1_name=None, img2_name=None):
+        """
+        综合分析两张图像，一次计算多个指标并返回全部得分
+
+        每张图像只转换一次灰度和HSV，各指标共用中间结果：
+        灰度图的256级直方图同时给出平均亮度、标准差（对比度）和8级纹理直方图，
+        Canny边缘只在需要时计算。各指标的得分与对应的单项比较方法一致。
+        两张图像尺寸不同时，先将图像2缩放到图像1的尺寸。
+
+        参数:
+            img1: 第一张图像（BGR）
+            img2: 第二张图像（BGR）
+            metrics: 要计算的指标，默认 ANALYSIS_DEFAULT_METRICS，可选指标见 ANALYSIS_THRESHOLDS
+            thresholds: 覆盖默认阈值的字典
+            img1_name: 图像1名称，用于日志记录
+            img2_name: 图像2名称，用于日志记录
+
+        返回:
+            dict: 包含以下字段
+                - scores: 指标 -> 得分
+                - passed: 指标 -> 是否通过
+                - all_passed: 所有指标是否都通过
+                - thresholds: 使用的阈值
+                - elapsed_ms: 耗时（毫秒）
+        """
+        metrics = tuple(metrics or ANALYSIS_DEFAULT_METRICS)
+        unknown = [m for m in metrics if m not in ANALYSIS_THRESHOLDS]
+        if unknown:
+            raise ValueError(f"不支持的分析指标: {', '.join(unknown)}")
+        thresholds = {**ANALYSIS_THRESHOLDS, **(thresholds or {})}
+
+        logger.info(f"开始综合图像分析 - 图像1: {img1_name or '未命名'}, 图像2: {img2_name or '未命名'}, "
+                    f"指标: {', '.join(metrics)}")
+        start = time.perf_counter()
+
+        if img1.shape[:2] != img2.shape[:2]:
+            img2 = cv2.resize(img2, (img1.shape[1], img1.shape[0]))
+
+        scores = {}
+        gray1 = gray2 = None
+        if any(m in metrics for m in ('brightness_difference', 'contrast', 'texture', 'edge', 'ssim')):
+            gray1 = ImageComparator._to_gray(img1)
+            gray2 = ImageComparator._to_gray(img2)
+
+        if any(m in metrics for m in ('brightness_difference', 'contrast', 'texture')):
+            # 一次256级灰度直方图得到均值、标准差和纹理直方图
+            levels = np.arange(256, dtype=np.float64)
+            stats = []
+            for gray in (gray1, gray2):
+                hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel().astype(np.float64)
+                count = hist.sum()
+                mean = float((levels * hist).sum() / count)
+                variance = float((levels * levels * hist).sum() / count) - mean * mean
+                stats.append((hist, mean, max(variance, 0.0) ** 0.5))
+            (hist1, mean1, std1), (hist2, mean2, std2) = stats
+
+            if 'brightness_difference' in metrics:
+                scores['brightness_difference'] = abs(mean1 - mean2)
+            if 'contrast' in metrics:
+                max_contrast = max(std1, std2)
+                scores['contrast'] = 1.0 if max_contrast == 0 else min(std1, std2) / max_contrast
+            if 'texture' in metrics:
+                # 灰度值整除32后的8级直方图，等于256级直方图每32级合并
+                scores['texture'] = ImageComparator._hist_correl(hist1.reshape(8, 32).sum(axis=1),
+                                                                 hist2.reshape(8, 32).sum(axis=1))
+
+        if 'histogram' in metrics:
+            hue1 = cv2.cvtColor(img1, cv2.COLOR_BGR2HSV)
+            hue2 = cv2.cvtColor(img2, cv2.COLOR_BGR2HSV)
+            scores['histogram'] = ImageComparator._hist_correl(
+                cv2.calcHist([hue1], [0], None, [50], [0, 180]),
+                cv2.calcHist([hue2], [0], None, [50], [0, 180])
+            )
+
+        # 颜色差异、边缘和SSIM在工作区的预分配缓冲区中计算
+        workspace = ImageComparator._workspace(img1)
+        if 'color_difference' in metrics:
+            scores['color_difference'] = workspace.color_difference(img1, img2)
+
+        if 'edge' in metrics:
+            scores['edge'] = workspace.edge_similarity(gray1, gray2)
+
+        if 'ssim' in metrics:
+            scores['ssim'] = workspace.ssim(gray1, gray2)
+
+        scores = {m: round(float(scores[m]), 4) for m in metrics}
+        passed = {
+            m: (scores[m] < thresholds[m]) if m in ANALYSIS_LOWER_IS_BETTER else (scores[m] >= thresholds[m])
+            for m in metrics
+        }
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+
+        logger.info(f"综合图像分析完成，得分: {scores}，"
+                    f"{'全部通过' if all(passed.values()) else '未通过: ' + ', '.join(m for m in metrics if not passed[m])}")
+        return {
+            'scores': scores,
+            'passed': passed,
+            'all_passed': all(passed.values()),
+            'thresholds': {m: thresholds[m] for m in metrics},
+            'elapsed_ms': round(elapsed_ms, 3),
+        }
@@ -0,0 +1,79 @@
+"""
+图像感知哈希模块
+
+该模块提供图像的感知哈希计算。主要功能包括：
+1. dHash（差值哈希）：比较相邻像素的亮度变化，计算快，对整体亮度变化不敏感
+2. pHash（DCT哈希）：取低频DCT系数与中位数比较，对缩放、压缩和轻微噪声更稳定
+3. 计算两个哈希之间的汉明距离
+
+哈希均为64位，以Python整数表示，汉明距离越小表示图像越相似。
+
+主要函数：
+- dhash: 计算差值哈希
+- phash: 计算DCT感知哈希
+- hamming_distance: 计算两个哈希的汉明距离
+"""
+
+import cv2
+import numpy as np
+
+# 哈希边长，8x8共64位
+HASH_SIZE = 8
+# pHash 在 32x32 的图像上做DCT，取左上角 8x8 的低频系数
+PHASH_IMAGE_SIZE = 32
+
+
+def _to_gray(image):
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def _bits_to_int(bits):
+    """将布尔数组按行展开为整数"""
+    value = 0
+    for bit in bits.flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash(image, hash_size=HASH_SIZE):
+    """
+    计算差值哈希（dHash）
+
+    参数:
+        image: BGR或灰度图像
+        hash_size: 哈希边长，结果为 hash_size*hash_size 位
+
+    返回:
+        int: 哈希值
+    """
+    gray = _to_gray(image)
+    resized = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return _bits_to_int(resized[:, 1:] > resized[:, :-1])
+
+
+def phash(image, hash_size=HASH_SIZE, image_size=PHASH_IMAGE_SIZE):
+    """
+    计算DCT感知哈希（pHash）
+
+    参数:
+        image: BGR或灰度图像
+        hash_size: 哈希边长，结果为 hash_size*hash_size 位
+        image_size: 做DCT前缩放到的边长
+
+    返回:
+        int: 哈希值
+    """
+    gray = _to_gray(image)
+    resized = cv2.resize(gray, (image_size, image_size), interpolation=cv2.INTER_AREA)
+    dct = cv2.dct(resized.astype(np.float32))
+    low = dct[:hash_size, :hash_size]
+    # 直流分量只反映整体亮度，不参与计算中位数
+    median = np.median(low.flatten()[1:])
+    return _bits_to_int(low > median)
+
+
+def hamming_distance(hash1, hash2):
+    """计算两个哈希值的汉明距离"""
+    return bin(hash1 ^ hash2).count('1')
@@ -0,0 +1,164 @@
+"""
+日志流解析模块
+
+该模块负责VP_180.log的解析和增量读取。主要功能包括：
+1. 解析单行日志（时间、级别、来源、消息）
+2. 批量解析日志内容
+3. 按文件大小/修改时间增量读取新增日志
+
+主要类：
+- LogTailer: 记录读取位置，增量读取并解析新增日志，供/ws/logs使用
+"""
+
+import os
+import hashlib
+from typing import Dict, List, Optional
+
+
+def parse_log_line(line: str) -> Optional[Dict[str, str]]:
+    """
+    解析一行日志
+
+    日志格式: 2025-04-23 16:55:33 - INFO - utils.button_clicker - 成功加载FUNCTIONS配置
+
+    Args:
+        line: 日志行
+
+    Returns:
+        解析后的日志字典，空行返回None
+    """
+    line = line.strip()
+    if not line:
+        return None
+
+    parts = line.split(' - ', 3)
+    if len(parts) >= 4:
+        timestamp, level, source, message = parts
+        return {
+            'timestamp': timestamp,
+            'level': level,
+            'source': source,
+            'message': message
+        }
+
+    # 如果格式不匹配，直接将整行作为消息
+    return {
+        'timestamp': '',
+        'level': 'UNKNOWN',
+        'source': '',
+        'message': line
+    }
+
+
+def parse_log_lines(lines) -> List[Dict[str, str]]:
+    """
+    批量解析日志行，跳过空行
+
+    Args:
+        lines: 可迭代的日志行
+
+    Returns:
+        解析后的日志列表
+    """
+    parsed_logs = []
+    for line in lines:
+        entry = parse_log_line(line)
+        if entry is not None:
+            parsed_logs.append(entry)
+    return parsed_logs
+
+
+class LogTailer:
+    """日志增量读取器，只在文件大小或修改时间变化时读取新增内容"""
+
+    def __init__(self, log_file_path: str, from_end: bool = True):
+        """
+        初始化日志增量读取器
+
+        Args:
+            log_file_path: 日志文件路径
+            from_end: 是否从文件末尾开始读取（只推送之后的新增日志）
+        """
+        self.log_file_path = log_file_path
+        self.last_size = 0  # 记录上次读取的文件大小
+        self.last_mtime = 0  # 记录上次读取的文件修改时间
+        self.file_position = 0  # 当前文件读取位置
+        self.last_content_hash = None  # 记录上次读取内容的哈希值，用于检测重复内容
+
+        if from_end and os.path.exists(log_file_path):
+            self.last_size = os.path.getsize(log_file_path)
+            self.last_mtime = os.path.getmtime(log_file_path)
+            self.file_position = self.last_size
+
+    def reset(self):
+        """重置读取位置和内容哈希（日志文件被清空后调用）"""
+        self.file_position = 0
+        self.last_size = 0
+        self.last_content_hash = None
+        if os.path.exists(self.log_file_path):
+            self.last_mtime = os.path.getmtime(self.log_file_path)
+
+    def stat(self):
+        """
+        获取日志文件当前的大小和修改时间
+
+        Returns:
+            (size, mtime)，文件不存在时返回None
+        """
+        try:
+            st = os.stat(self.log_file_path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime
+
+    def has_changed(self, current=None) -> bool:
+        """判断文件大小或修改时间是否发生变化"""
+        current = current or self.stat()
+        if current is None:
+            return False
+        current_size, current_mtime = current
+        return current_size != self.last_size or current_mtime != self.last_mtime
+
+    def mark_seen(self, current=None):
+        """记录当前的文件大小和修改时间，但不读取内容"""
+        current = current or self.stat()
+        if current is not None:
+            self.last_size, self.last_mtime = current
+
+    def read_new(self, current=None) -> Optional[List[Dict[str, str]]]:
+        """
+        读取并解析新增日志
+
+        Args:
+            current: 预先获取的 (size, mtime)，为空时重新stat
+
+        Returns:
+            解析后的新增日志列表；内容与上次完全相同时返回None
+        """
+        current = current or self.stat()
+        if current is None:
+            return []
+        current_size, current_mtime = current
+
+        with open(self.log_file_path, 'r', encoding='utf-8') as file:
+            # 如果文件大小变小了，可能是文件被清空或重写，从头开始读取
+            if current_size < self.file_position:
+                self.file_position = 0
+
+            # 移动到上次读取的位置，读取新增内容
+            file.seek(self.file_position)
+            new_content = file.read()
+            self.file_position = file.tell()
+
+        self.last_size = current_size
+        self.last_mtime = current_mtime
+
+        # 检查是否与上次内容相同
+        content_hash = hashlib.md5(new_content.encode('utf-8')).hexdigest()
+        if content_hash == self.last_content_hash and new_content:
+            return None
+        self.last_content_hash = content_hash
+
+        if not new_content:
+            return []
+        return parse_log_lines(new_content.split('\n'))
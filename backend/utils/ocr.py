@@ -1,71 +1,406 @@
+"""
+OCR文本识别模块
+
+PaddleOCR 的检测和识别模型加载需要数秒并占用大量内存，因此引擎只加载一次并常驻：
+1. 默认在独立的工作进程中加载引擎（OCR_WORKERS 个），识别请求通过进程池的任务队列分发
+2. OCR_WORKERS 为0时在当前进程中加载一个引擎，识别请求串行执行
+3. 首次识别时加载引擎；OCR_WARMUP 为true时服务启动后立即在后台预热
+4. 工作进程异常退出时自动重建进程池并重试一次
+
+输入与输出：
+- 可直接传入图像数组（BGR，与 cv2 一致），不需要先保存为文件
+- 可指定识别区域，只把该区域送入引擎，结果中的位置仍为整张图像的坐标
+- 多张图像合并为一次 predict 调用批量识别
+- 结果包含每段文本的位置框和置信度；相同图像和区域的结果会被缓存，重复识别直接返回
+
+区域格式：
+- None / "全屏" / "full_screen": 整张图像
+- "center" 等 ROI_REGIONS 中的预设名称: 坐标基于 SCREEN_REGION 的尺寸，按图像实际尺寸换算
+- [x, y, 宽, 高] 或 "x,y,宽,高": 图像像素坐标
+
+主要类：
+- OCRService: 常驻OCR引擎池
+
+主要函数：
+- process_image: 识别单张图片
+- process_images: 批量识别多张图片
+- resolve_region: 将区域转换为图像像素坐标
+"""
+import atexit
 import os
 import json
 import logging
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import cv2
 import numpy as np
-from PIL import Image
-from paddleocr import PaddleOCR
+
+from config import OCR_WORKERS, OCR_LANG
+from .Config import ROI_REGIONS, SCREEN_REGION
+from .comparison_cache import image_digest
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def process_image(image_path):
+# 表示整张图像的区域名称
+FULL_IMAGE_REGIONS = ('', '全屏', 'full_screen')
+# 识别结果缓存的条目数
+RESULT_CACHE_SIZE = 64
+
+# 当前进程中的引擎（工作进程或进程内模式各自持有一个）
+_engine = None
+# PaddleOCR 引擎不是线程安全的，同一进程内的识别请求串行执行
+_engine_lock = threading.Lock()
+
+
+def _get_engine():
+    """返回当前进程的OCR引擎，首次调用时加载模型"""
+    global _engine
+    if _engine is None:
+        from paddleocr import PaddleOCR
+        start = time.perf_counter()
+        _engine = PaddleOCR(use_textline_orientation=True, lang=OCR_LANG)
+        logger.info(f"OCR引擎加载完成 (pid={os.getpid()})，耗时 {time.perf_counter() - start:.1f}s")
+    return _engine
+
+
+def _parse_result(result):
     """
-    处理单个图片并返回OCR结果（适配新版PaddleOCR API，修正list结构解析）
-    Args:
-        image_path (str): 图片路径
-    Returns:
-        dict: 包含OCR结果的字典
+    从单张图像的predict结果中取出文本、置信度和位置框
+
+    返回:
+        list: [{'text', 'confidence', 'box': [x1, y1, x2, y2]}, ...]
+    """
+    if not isinstance(result, dict):
+        logger.warning(f"predict返回非预期结构: {type(result)}，内容: {result}")
+        return []
+    texts = list(result.get('rec_texts', []))
+    scores = result.get('rec_scores')
+    boxes = result.get('rec_boxes')
+    polys = result.get('rec_polys')
+
+    items = []
+    for index, text in enumerate(texts):
+        box = None
+        if boxes is not None and len(boxes) > index:
+            box = [int(value) for value in boxes[index][:4]]
+        elif polys is not None and len(polys) > index:
+            points = np.asarray(polys[index])
+            box = [int(points[:, 0].min()), int(points[:, 1].min()),
+                   int(points[:, 0].max()), int(points[:, 1].max())]
+        confidence = float(scores[index]) if scores is not None and len(scores) > index else None
+        items.append({'text': text, 'confidence': confidence, 'box': box})
+    return items
+
+
+def _predict_batch(images):
+    """在当前进程中一次 predict 识别多张图像，返回每张图像的文本项列表"""
+    with _engine_lock:
+        results = list(_get_engine().predict(images))
+    if len(results) != len(images):
+        raise RuntimeError(f"predict返回 {len(results)} 个结果，预期 {len(images)} 个")
+    return [_parse_result(result) for result in results]
+
+
+def _warmup():
+    """加载引擎并识别一张空白图像，完成推理的首次初始化"""
+    _predict_batch([np.full((64, 256, 3), 255, dtype=np.uint8)])
+    return os.getpid()
+
+
+class OCRService:
+    """
+    常驻OCR引擎池
+
+    用法:
+        items = ocr_service.recognize(image)
+        items_list = ocr_service.recognize_batch([image1, image2])
+    """
+
+    def __init__(self, workers=OCR_WORKERS):
+        self.workers = max(0, workers)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # 使用 spawn 启动工作进程，避免在多线程的Web服务中 fork 带来的锁状态问题
+                context = multiprocessing.get_context('spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                logger.info(f"已启动OCR引擎进程池，进程数: {self.workers}")
+            return self._executor
+
+    def _reset_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                return executor.submit(func, *args).result()
+            except BrokenProcessPool:
+                logger.warning("OCR工作进程异常退出，重建进程池" + ("后重试" if attempt == 0 else ""))
+                self._reset_executor(executor)
+        raise RuntimeError("OCR工作进程异常退出")
+
+    def recognize(self, image):
+        """
+        识别一张图像
+
+        参数:
+            image: BGR图像数组
+
+        返回:
+            list: 文本项列表，每项包含 text、confidence、box
+        """
+        return self._run(_predict_batch, [image])[0]
+
+    def recognize_batch(self, images):
+        """
+        批量识别多张图像
+
+        图像按工作进程数分成若干组，每组在一个工作进程中通过一次 predict 调用识别。
+
+        参数:
+            images: BGR图像数组列表
+
+        返回:
+            list: 每张图像的文本项列表；某组识别失败时，该组图像的结果为异常对象
+        """
+        if not images:
+            return []
+        groups = max(1, min(self.workers, len(images)))
+        size = -(-len(images) // groups)
+        chunks = [images[i:i + size] for i in range(0, len(images), size)]
+        if len(chunks) == 1:
+            try:
+                return self._run(_predict_batch, chunks[0])
+            except Exception as e:
+                return [e] * len(chunks[0])
+
+        executor = self._get_executor()
+        futures = [executor.submit(_predict_batch, chunk) for chunk in chunks]
+        results = []
+        for chunk, future in zip(chunks, futures):
+            try:
+                results.extend(future.result())
+            except BrokenProcessPool as e:
+                self._reset_executor(executor)
+                results.extend([e] * len(chunk))
+            except Exception as e:
+                results.extend([e] * len(chunk))
+        return results
+
+    def warmup(self, wait=True):
+        """
+        预热：在每个工作进程（或当前进程）中加载引擎
+
+        参数:
+            wait: 是否等待预热完成；为False时在后台线程中预热
+        """
+        if not wait:
+            threading.Thread(target=self.warmup, name='ocr-warmup', daemon=True).start()
+            return
+        start = time.perf_counter()
+        try:
+            if not self.workers:
+                _warmup()
+            else:
+                # 同时提交与进程数相同的任务，使每个工作进程都加载一次引擎
+                executor = self._get_executor()
+                for future in [executor.submit(_warmup) for _ in range(self.workers)]:
+                    future.result()
+            logger.info(f"OCR引擎预热完成，耗时 {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            logger.error(f"OCR引擎预热失败: {str(e)}")
+
+    def shutdown(self):
+        """关闭工作进程"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 全局OCR服务实例
+ocr_service = OCRService()
+atexit.register(ocr_service.shutdown)
+
+# (图像哈希, 区域) -> 文本项列表
+_result_cache = OrderedDict()
+_result_cache_lock = threading.Lock()
+
+
+def resolve_region(region, image_size):
     """
-    try:
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"找不到文件: {image_path}")
-
-        ocr = PaddleOCR(use_textline_orientation=True, lang="ch")
-        image = Image.open(image_path)
-        result = ocr.predict(np.array(image))
-
-        text_results = []
-        # 修正：新版predict返回list，list[0]为dict
-        if isinstance(result, list) and len(result) > 0 and isinstance(result[0], dict):
-            res = result[0]
-            texts = res.get('rec_texts', [])
-            for text in texts:
-                text_results.append(text)
+    将区域转换为图像像素坐标
+
+    参数:
+        region: 区域，格式见模块说明
+        image_size: 图像尺寸 (宽, 高)
+
+    返回:
+        tuple: (x, y, 宽, 高)，已裁剪到图像范围内；整张图像时返回None
+
+    异常:
+        ValueError: 区域格式错误、预设名称不存在或区域在图像之外
+    """
+    if region is None:
+        return None
+    width, height = image_size
+    if isinstance(region, str):
+        region = region.strip()
+        if region in FULL_IMAGE_REGIONS:
+            return None
+        if region in ROI_REGIONS:
+            x, y, w, h = ROI_REGIONS[region]['region']
+            scale_x = width / SCREEN_REGION[2]
+            scale_y = height / SCREEN_REGION[3]
+            region = [x * scale_x, y * scale_y, w * scale_x, h * scale_y]
         else:
-            logger.warning(f"predict返回非预期结构: {type(result)}，内容: {result}")
-
-        return {
-            "image_path": image_path,
-            "text_results": text_results,
-            "error": None if text_results else "未识别到文本或返回结构异常"
-        }
-    except Exception as e:
-        logger.error(f"处理图片 {image_path} 时出错: {str(e)}")
-        return {
-            "image_path": image_path,
-            "text_results": [],
-            "error": str(e)
-        }
-
-def process_images(image_paths):
+            try:
+                region = [float(value) for value in region.replace('，', ',').split(',')]
+            except ValueError:
+                raise ValueError(f"识别区域不存在: {region}，可选: 全屏, {', '.join(ROI_REGIONS)}，或 x,y,宽,高")
+    if len(region) != 4:
+        raise ValueError(f"识别区域应为 [x, y, 宽, 高]: {region}")
+
+    x, y, w, h = (int(round(float(value))) for value in region)
+    x1, y1 = max(0, x), max(0, y)
+    x2, y2 = min(width, x + w), min(height, y + h)
+    if x2 <= x1 or y2 <= y1:
+        raise ValueError(f"识别区域 {list(region)} 不在图像范围 {width}x{height} 内")
+    if (x1, y1, x2, y2) == (0, 0, width, height):
+        return None
+    return x1, y1, x2 - x1, y2 - y1
+
+
+def _load_image(image):
+    """读取图像并转换为3通道BGR"""
+    if isinstance(image, (str, os.PathLike)):
+        if not os.path.exists(image):
+            raise FileNotFoundError(f"找不到文件: {image}")
+        loaded = cv2.imread(str(image), cv2.IMREAD_COLOR)
+        if loaded is None:
+            raise ValueError(f"无法读取图片: {image}")
+        return loaded
+    if image is None:
+        raise ValueError("图像为空")
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+    return image
+
+
+def _offset_items(items, region):
+    """将区域内的位置框换算为整张图像的坐标"""
+    if region is None:
+        return items
+    x, y = region[0], region[1]
+    return [dict(item, box=[item['box'][0] + x, item['box'][1] + y, item['box'][2] + x, item['box'][3] + y])
+            if item['box'] else dict(item) for item in items]
+
+
+def _describe(image, index):
+    return f"图片 {image}" if isinstance(image, (str, os.PathLike)) else f"第 {index + 1} 张图片"
+
+
+def _make_result(image, items=None, region=None, error=None, cached=False):
+    items = items or []
+    text_results = [item['text'] for item in items]
+    return {
+        "image_path": image if isinstance(image, (str, os.PathLike)) else None,
+        "text_results": text_results,
+        "items": items,
+        "region": list(region) if region else None,
+        "cached": cached,
+        "error": error if error else (None if text_results else "未识别到文本或返回结构异常")
+    }
+
+
+def process_images(images, region=None, use_cache=True):
     """
-    处理多个图片并返回OCR结果
+    批量识别多张图片，未命中缓存的图片合并为一次 predict 调用
     Args:
-        image_paths (list): 图片路径列表
+        images (list): 图片路径或BGR图像数组列表
+        region: 识别区域，对所有图片生效，格式见模块说明
+        use_cache (bool): 是否使用识别结果缓存
     Returns:
-        dict: 包含所有图片OCR结果的字典
+        dict: 包含所有图片OCR结果的字典，每个结果包含 text_results、items（文本、置信度、位置框）、region
     """
-    results = []
-    for image_path in image_paths:
-        result = process_image(image_path)
-        results.append(result)
+    results = [None] * len(images)
+    # 缓存键 -> (区域, 区域图像, 等待该结果的图片序号)，同一批中相同的图片只识别一次
+    pending = OrderedDict()
+    for index, image in enumerate(images):
+        try:
+            full = _load_image(image)
+            roi = resolve_region(region, (full.shape[1], full.shape[0]))
+            key = (image_digest(full), roi)
+            if key in pending:
+                pending[key][2].append(index)
+                continue
+            if use_cache:
+                with _result_cache_lock:
+                    items = _result_cache.get(key)
+                    if items is not None:
+                        _result_cache.move_to_end(key)
+                if items is not None:
+                    results[index] = _make_result(image, [dict(item) for item in items], roi, cached=True)
+                    continue
+            crop = full if roi is None else np.ascontiguousarray(full[roi[1]:roi[1] + roi[3], roi[0]:roi[0] + roi[2]])
+            pending[key] = (roi, crop, [index])
+        except Exception as e:
+            logger.error(f"处理{_describe(image, index)} 时出错: {str(e)}")
+            results[index] = _make_result(image, error=str(e))
+
+    if pending:
+        start = time.perf_counter()
+        outcomes = ocr_service.recognize_batch([crop for _, crop, _ in pending.values()])
+        logger.info(f"OCR识别 {len(pending)} 张图片，耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+        for (key, (roi, _, indices)), outcome in zip(pending.items(), outcomes):
+            if isinstance(outcome, Exception):
+                for index in indices:
+                    logger.error(f"处理{_describe(images[index], index)} 时出错: {str(outcome)}")
+                    results[index] = _make_result(images[index], error=str(outcome))
+                continue
+            items = _offset_items(outcome, roi)
+            with _result_cache_lock:
+                _result_cache[key] = items
+                _result_cache.move_to_end(key)
+                while len(_result_cache) > RESULT_CACHE_SIZE:
+                    _result_cache.popitem(last=False)
+            for index in indices:
+                results[index] = _make_result(images[index], [dict(item) for item in items], roi)
     return {
         "success": True,
         "data": results,
         "error": None
     }
 
+def process_image(image, region=None, use_cache=True):
+    """
+    处理单个图片并返回OCR结果（适配新版PaddleOCR API，修正list结构解析）
+    Args:
+        image: 图片路径或BGR图像数组
+        region: 识别区域，格式见模块说明
+        use_cache (bool): 是否使用识别结果缓存
+    Returns:
+        dict: 包含OCR结果的字典
+    """
+    return process_images([image], region=region, use_cache=use_cache)['data'][0]
+
 if __name__ == "__main__":
     # 测试代码
     test_image = "data/img/id_23_screen_capture_20250520_155304.png"
@@ -0,0 +1,362 @@
+"""
+参考图像缓存模块
+
+该模块缓存验证步骤使用的参考截图（frontend/public/screenshot/upload 和 frontend/public/img/upload 下的图片）。
+同一张参考图在批量执行和重复执行时会被反复读取，每次都要重新解码PNG、转换灰度并计算SSIM的参考侧统计量。
+主要功能包括：
+1. 按文件路径缓存解码后的图像，文件修改时间或大小变化时自动失效
+2. 按目标尺寸缓存缩放后的图像、灰度图、归一化浮点灰度图
+3. 按需预先计算SSIM参考侧的均值图和方差图，比较时只需要计算截图一侧
+4. 按实际占用的字节数限制缓存大小，超出时淘汰最久未使用的图片
+5. 参考图设置了忽略区域（见 ignore_mask）时，按目标尺寸预先生成掩码和SSIM权重图，忽略区域文件修改后自动重新生成
+
+主要类：
+- ReferenceImageCache: 有容量上限的LRU参考图像缓存
+- ReferenceImage: 单张参考图的缓存项
+- ReferenceVariant: 参考图在某个目标尺寸下的数据
+
+缓存中的数组都设置为只读，调用方需要修改时请先复制。
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from config import REFERENCE_CACHE_MAX_MB
+from .log_config import setup_logger
+
+# 获取日志记录器
+logger = setup_logger(__name__)
+
+
+def _freeze(array):
+    """将数组设置为只读，防止调用方修改缓存内容"""
+    array.flags.writeable = False
+    return array
+
+
+class ReferenceVariant:
+    """参考图在某个目标尺寸下的数据"""
+
+    def __init__(self, image, gray=None):
+        self.image = _freeze(image)
+        if gray is None:
+            gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        self.gray = _freeze(gray)
+        self.gray_f = None
+        self.mu = None
+        self.sigma_sq = None
+        # 忽略区域的掩码（uint8，0为忽略）和SSIM权重图，参考图没有忽略区域时为None
+        self.keep_mask = None
+        self.ssim_weights = None
+        self.masks_ready = False
+
+    @property
+    def size(self):
+        """(宽, 高)"""
+        return self.image.shape[1], self.image.shape[0]
+
+    @property
+    def has_ssim_stats(self):
+        return self.mu is not None
+
+    def compute_ssim_stats(self):
+        """计算SSIM参考侧的统计量：归一化浮点灰度图、高斯均值图和方差图"""
+        if self.has_ssim_stats:
+            return
+        from .image_comparator import ImageComparator
+        gray_f = self.gray.astype(np.float32) / 255.0
+        mu, sigma_sq = ImageComparator._ssim_stats(gray_f)
+        self.gray_f = _freeze(gray_f)
+        self.mu = _freeze(mu)
+        self.sigma_sq = _freeze(sigma_sq)
+
+    def compute_masks(self, ignore_regions, original_size=None):
+        """
+        按本尺寸生成忽略区域的掩码和SSIM权重图
+
+        参数:
+            ignore_regions: load_regions 返回的忽略区域，None表示没有忽略区域
+            original_size: 参考图原图的(宽, 高)，忽略区域未指定坐标尺寸时以此为准
+        """
+        if self.masks_ready:
+            return
+        if ignore_regions:
+            from .ignore_mask import build_keep_mask, build_ssim_weights
+            keep_mask = build_keep_mask(ignore_regions['regions'], self.size,
+                                        ignore_regions['coordinate_size'] or original_size)
+            if keep_mask is not None:
+                self.keep_mask = _freeze(keep_mask)
+                self.ssim_weights = _freeze(build_ssim_weights(keep_mask))
+        self.masks_ready = True
+
+    def clear_masks(self):
+        """丢弃已生成的掩码，忽略区域变化后调用"""
+        self.keep_mask = None
+        self.ssim_weights = None
+        self.masks_ready = False
+
+    @property
+    def nbytes(self):
+        total = self.image.nbytes
+        # 原尺寸的图像本身就是灰度图时，gray 与 image 共用同一个数组
+        if self.gray is not self.image:
+            total += self.gray.nbytes
+        for array in (self.gray_f, self.mu, self.sigma_sq, self.keep_mask, self.ssim_weights):
+            if array is not None:
+                total += array.nbytes
+        return total
+
+
+class ReferenceImage:
+    """单张参考图的缓存项：解码后的原图以及各目标尺寸下的数据"""
+
+    def __init__(self, path, mtime, file_size, image):
+        self.path = path
+        self.mtime = mtime
+        self.file_size = file_size
+        self.image = _freeze(image)
+        self.variants = {}
+        self._features = None
+        self._features_loaded = False
+        self._ignore_regions = None
+        self._mask_stat = None
+        # 缓存中为该项计入的字节数，加载特征、生成掩码等使占用变化后由缓存重新计入
+        self.charged_bytes = 0
+
+    @property
+    def features(self):
+        """参考图的预计算特征（见 feature_sidecar），尚未通过 ReferenceImageCache.get_features 加载时为None"""
+        return self._features
+
+    def load_features(self):
+        """
+        加载特征旁路文件（只加载一次），没有有效旁路文件时返回None并提交后台计算；
+        由 ReferenceImageCache.get_features 在缓存锁内调用，以便计入增加的字节数
+        """
+        if not self._features_loaded:
+            from .feature_sidecar import load_features, schedule_features
+            self._features = load_features(self.path)
+            self._features_loaded = True
+            if self._features is None:
+                schedule_features(self.path)
+        return self._features
+
+    @property
+    def ignore_regions(self):
+        """
+        参考图的忽略区域（见 ignore_mask），每次访问时检查忽略区域文件是否变化，
+        变化时重新读取并丢弃各尺寸下已生成的掩码
+        """
+        from .ignore_mask import mask_path, load_regions
+        try:
+            stat = os.stat(mask_path(self.path))
+            mask_stat = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            mask_stat = None
+        if mask_stat != self._mask_stat:
+            self._mask_stat = mask_stat
+            self._ignore_regions = load_regions(self.path) if mask_stat is not None else None
+            for variant in self.variants.values():
+                variant.clear_masks()
+        return self._ignore_regions
+
+    @property
+    def size(self):
+        """原图的(宽, 高)"""
+        return self.image.shape[1], self.image.shape[0]
+
+    @property
+    def nbytes(self):
+        total = self.image.nbytes
+        features = self._features
+        if features is not None:
+            total += features.keypoints.nbytes + features.descriptors.nbytes
+            total += sum(level.nbytes for level in features.coarse_levels)
+        for variant in self.variants.values():
+            total += variant.nbytes
+            # 原尺寸的数据与原图共用同一个数组，不重复计算
+            if variant.image is self.image:
+                total -= self.image.nbytes
+        return total
+
+
+class ReferenceImageCache:
+    """
+    有容量上限的LRU参考图像缓存
+
+    以文件的绝对路径为键，命中时比较文件的修改时间和大小，不一致则重新读取。
+    容量按缓存中所有数组实际占用的字节数计算。
+    """
+
+    def __init__(self, max_bytes=REFERENCE_CACHE_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, path):
+        """
+        获取参考图的缓存项，文件不存在或无法解码时返回None
+
+        参数:
+            path: 参考图路径
+
+        返回:
+            ReferenceImage 或 None
+        """
+        key = os.path.abspath(path)
+        stat = self._stat(key)
+        if stat is None:
+            self.invalidate(key)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.mtime, entry.file_size) == stat:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                logger.info(f"参考图已修改，重新读取: {key}")
+                self._remove(key)
+            self.misses += 1
+
+        # 解码放在锁外进行，避免阻塞其他线程读取已缓存的图片
+        image = cv2.imread(key)
+        if image is None:
+            logger.warning(f"无法读取参考图: {key}")
+            return None
+
+        entry = ReferenceImage(key, stat[0], stat[1], image)
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None and (existing.mtime, existing.file_size) == stat:
+                # 其他线程已经放入了同一版本
+                self._entries.move_to_end(key)
+                return existing
+            if existing is not None:
+                self._remove(key)
+            self._entries[key] = entry
+            self._charge(entry)
+        return entry
+
+    def get_variant(self, path, size=None, ssim_stats=False, masks=False):
+        """
+        获取参考图在目标尺寸下的数据
+
+        参数:
+            path: 参考图路径
+            size: 目标尺寸(宽, 高)，None表示原始尺寸
+            ssim_stats: 是否同时准备SSIM参考侧统计量
+            masks: 是否同时准备忽略区域的掩码和SSIM权重图（参考图没有忽略区域时两者为None）
+
+        返回:
+            ReferenceVariant 或 None
+        """
+        entry = self.get(path)
+        if entry is None:
+            return None
+
+        size = tuple(size) if size else entry.size
+        with self._lock:
+            variant = entry.variants.get(size)
+            if variant is None:
+                if size == entry.size:
+                    variant = ReferenceVariant(entry.image)
+                else:
+                    variant = ReferenceVariant(cv2.resize(entry.image, size))
+                entry.variants[size] = variant
+            if ssim_stats:
+                variant.compute_ssim_stats()
+            if masks:
+                variant.compute_masks(entry.ignore_regions, entry.size)
+            self._charge(entry)
+        return variant
+
+    def get_features(self, path):
+        """
+        获取参考图的预计算特征（见 feature_sidecar），首次获取时加载旁路文件并计入缓存占用
+
+        返回:
+            ReferenceFeatures，参考图不存在或没有有效旁路文件时返回None（后台计算旁路文件）
+        """
+        entry = self.get(path)
+        if entry is None:
+            return None
+        with self._lock:
+            features = entry.load_features()
+            self._charge(entry)
+        return features
+
+    def _charge(self, entry):
+        """按缓存项当前的实际占用重新计入字节数（调用方持有 self._lock），超出上限时淘汰"""
+        if self._entries.get(entry.path) is not entry:
+            return
+        nbytes = entry.nbytes
+        if nbytes != entry.charged_bytes:
+            self._bytes += nbytes - entry.charged_bytes
+            entry.charged_bytes = nbytes
+            self._evict(keep=entry.path)
+
+    def invalidate(self, path=None):
+        """
+        使缓存失效
+
+        参数:
+            path: 参考图路径，None表示清空全部缓存
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            key = os.path.abspath(path)
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        # 减去计入时的字节数，而不是当前占用，保证 _bytes 与各项计入的总和一致
+        self._bytes -= entry.charged_bytes
+
+    def _evict(self, keep=None):
+        """淘汰最久未使用的缓存项，直到占用不超过上限；刚使用的缓存项即使单独超限也保留"""
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if key == keep:
+                self._entries.move_to_end(key)
+                key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+            logger.info(f"参考图缓存超出上限，淘汰: {key}")
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+# 全局参考图像缓存实例，执行器的各验证步骤共用
+reference_cache = ReferenceImageCache()
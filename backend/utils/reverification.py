@@ -0,0 +1,448 @@
+"""
+离线重新验证模块
+
+修改阈值或比较方法后，原本需要在设备上重新执行全部用例才能知道结果是否变化。
+该模块利用执行记录（见 run_records）中保存的截图和参考图，在不连接设备的情况下重新评估历史执行。
+主要功能包括：
+1. 按执行记录ID或测试用例选择要重新验证的历史执行
+2. 可替换阈值、比较方法和参考图
+3. 使用进程池并行计算，图像比较不受GIL限制；进程数不超过 REVERIFY_WORKERS（0表示CPU核数），
+   同一时间只运行一个进程池
+4. 报告每个验证步骤和每次执行的结果是否变化
+5. 大批量的重新验证作为后台任务依次运行，按任务ID查询状态和结果
+
+支持的比较方法：
+- ssim: SSIM相似度（截图精准匹配、对比图像相似度）
+- template / template_pyramid: 模板匹配（截图包含匹配）
+- analyze: 综合图像比较
+- orb: ORB关键点
+- histogram: H通道直方图相关系数
+
+主要函数：
+- reverify: 重新验证一组历史执行并返回变化报告
+- submit_reverify / get_job: 提交后台重新验证任务、查询任务状态
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+
+from config import REVERIFY_WORKERS
+from .image_comparator import ImageComparator
+from .run_records import artifact_path, load_run, list_runs
+from .log_config import setup_logger
+
+# 获取日志记录器
+logger = setup_logger(__name__)
+
+METHODS = ('ssim', 'template', 'template_pyramid', 'analyze', 'orb', 'histogram')
+# 各方法的默认阈值，与执行器和 ImageComparator 一致
+DEFAULT_THRESHOLDS = {
+    'ssim': 0.98,
+    'template': 0.8,
+    'template_pyramid': 0.8,
+    'histogram': 0.90,
+}
+# 任务数少于该值时直接在当前进程计算，避免启动进程池的开销
+MIN_PARALLEL_TASKS = 4
+# 保留的已结束后台任务数，超出时丢弃最早结束的任务
+MAX_FINISHED_JOBS = 50
+
+# 同一时间只允许一个进程池，多个请求同时重新验证时依次使用
+_pool_slot = threading.Lock()
+# 后台任务依次运行
+_job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reverify')
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def _load(path, grayscale=False):
+    if not path or not os.path.exists(path):
+        return None
+    return cv2.imread(path, cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR)
+
+
+def _evaluate(task):
+    """
+    在工作进程中评估一个验证步骤
+
+    参数:
+        task: 任务字典，包含 method、threshold、image、reference、mask（均为文件路径）以及 reference_regions、scales
+
+    返回:
+        dict: {'success', 'scores'}，图像无法读取或计算出错时包含 error
+    """
+    try:
+        method = task['method']
+        image = _load(task['image'])
+        reference = _load(task['reference'])
+        if image is None or reference is None:
+            return {'success': False, 'scores': None, 'error': '无法读取执行记录中的图像'}
+
+        # 忽略区域：替换了参考图时按新参考图的忽略区域生成，否则使用执行时保存的掩码
+        mask = _load(task.get('mask'), grayscale=True)
+        if task.get('reference_regions'):
+            from .ignore_mask import build_keep_mask
+            regions = task['reference_regions']
+            mask = build_keep_mask(regions['regions'], (reference.shape[1], reference.shape[0]),
+                                   regions['coordinate_size'] or (reference.shape[1], reference.shape[0]))
+
+        threshold = task.get('threshold')
+        if method == 'ssim':
+            weights = None
+            if mask is not None:
+                from .ignore_mask import build_ssim_weights
+                if mask.shape != image.shape[:2]:
+                    mask = cv2.resize(mask, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_NEAREST)
+                weights = build_ssim_weights(mask)
+            score = ImageComparator.ssim_score(image, reference, weights=weights)
+            return {'success': score >= threshold, 'scores': {'ssim': score}}
+
+        if method in ('template', 'template_pyramid'):
+            # 参考内容大于截图时按比例缩小，与执行器一致
+            height, width = image.shape[:2]
+            ref_height, ref_width = reference.shape[:2]
+            scale = min(height / ref_height, width / ref_width)
+            if scale < 1:
+                size = (max(1, int(ref_width * scale)), max(1, int(ref_height * scale)))
+                reference = cv2.resize(reference, size)
+                if mask is not None:
+                    mask = cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+            if mask is not None and mask.shape != reference.shape[:2]:
+                mask = cv2.resize(mask, (reference.shape[1], reference.shape[0]), interpolation=cv2.INTER_NEAREST)
+            if method == 'template':
+                score, _ = ImageComparator.template_score(image, reference, mask=mask)
+            else:
+                report = ImageComparator.template_matching_pyramid(image, reference, threshold=threshold,
+                                                                    scales=tuple(task.get('scales') or (1.0,)),
+                                                                    mask=mask)
+                score = report['score']
+            return {'success': score >= threshold, 'scores': {'template': score}}
+
+        if method == 'analyze':
+            analysis = ImageComparator.analyze(image, reference, metrics=task.get('metrics'),
+                                               thresholds=threshold if isinstance(threshold, dict) else None)
+            return {'success': analysis['all_passed'], 'scores': analysis['scores']}
+
+        if method == 'histogram':
+            analysis = ImageComparator.analyze(image, reference, metrics=['histogram'],
+                                               thresholds={'histogram': threshold})
+            return {'success': analysis['all_passed'], 'scores': analysis['scores']}
+
+        if method == 'orb':
+            return {'success': bool(ImageComparator.is_orb(image, reference)), 'scores': {}}
+
+        return {'success': False, 'scores': None, 'error': f'不支持的比较方法: {method}'}
+
+    except Exception as e:
+        return {'success': False, 'scores': None, 'error': str(e)}
+
+
+def _pick(option, step, method):
+    """
+    从替换选项中取出对某个步骤生效的值
+
+    选项可以是单个值（对所有步骤生效），或以验证步骤名称、比较方法为键的字典
+    """
+    if not isinstance(option, dict):
+        return option
+    verification_key = step['step'].get('verification_key')
+    if verification_key in option:
+        return option[verification_key]
+    return option.get(method)
+
+
+def _resolve_references(references):
+    """
+    校验替换参考图：值只能是参考图目录（screenshot/upload、img/upload）中已有图片的文件名，
+    解析为该目录中的绝对路径，不接受其他路径
+
+    返回:
+        dict: 原参考图路径或文件名 -> 新参考图的绝对路径，references为空时返回None
+
+    异常:
+        ValueError: 格式不正确、不是文件名或参考图目录中没有该文件
+    """
+    if not references:
+        return None
+    if not isinstance(references, dict):
+        raise ValueError("references 必须是以原参考图路径或文件名为键、新参考图文件名为值的字典")
+    from werkzeug.utils import safe_join
+    from .screen_index import REFERENCE_DIRS
+
+    resolved = {}
+    for key, name in references.items():
+        if not isinstance(name, str) or not name or os.path.basename(name) != name:
+            raise ValueError(f"替换参考图只能是参考图目录中的文件名: {name}")
+        candidates = (safe_join(directory, name) for directory, _ in REFERENCE_DIRS)
+        path = next((path for path in candidates if path and os.path.isfile(path)), None)
+        if path is None:
+            raise ValueError(f"参考图目录中没有该文件: {name}")
+        resolved[key] = path
+    return resolved
+
+
+def _build_task(step, method=None, thresholds=None, references=None):
+    """
+    根据执行记录中的步骤和替换选项生成评估任务
+
+    返回:
+        任务字典，步骤没有保存图像时返回None
+    """
+    artifacts = step.get('artifacts') or {}
+    if not artifacts.get('image') or not artifacts.get('reference') or not step.get('method'):
+        return None
+
+    original_method = step['method']
+    new_method = _pick(method, step, original_method) or original_method
+    if new_method not in METHODS:
+        raise ValueError(f"不支持的比较方法: {new_method}，可选: {', '.join(METHODS)}")
+
+    if new_method == 'analyze':
+        threshold = _pick(thresholds, step, new_method)
+        if not isinstance(threshold, dict):
+            threshold = step['threshold'] if original_method == 'analyze' else None
+        metrics = list(step['scores']) if original_method == 'analyze' and step.get('scores') else None
+    else:
+        threshold = _pick(thresholds, step, new_method)
+        if threshold is None:
+            # 方法未变时沿用执行时的阈值
+            same_family = original_method == new_method or {original_method, new_method} <= {'template', 'template_pyramid'}
+            threshold = step['threshold'] if same_family and step.get('threshold') is not None \
+                else DEFAULT_THRESHOLDS.get(new_method)
+        threshold = float(threshold) if threshold is not None else None
+        metrics = None
+
+    task = {
+        'method': new_method,
+        'threshold': threshold,
+        'metrics': metrics,
+        'scales': step.get('scales'),
+        'image': artifact_path(artifacts['image']),
+        'reference': artifact_path(artifacts['reference']),
+        'mask': artifact_path(artifacts['mask']) if artifacts.get('mask') else None,
+        'reference_regions': None,
+    }
+
+    # 替换参考图：键为执行时的参考图路径或文件名，值为已由 _resolve_references 解析的新参考图路径
+    if references:
+        # 执行时的参考图路径，旧版本记录中保存在 artifacts 里
+        reference_path = step.get('reference_path') or artifacts.get('reference_path')
+        replacement = None
+        if reference_path:
+            replacement = references.get(reference_path) or references.get(os.path.basename(reference_path))
+        if replacement:
+            from .ignore_mask import load_regions
+            task['reference'] = replacement
+            task['mask'] = None
+            task['reference_regions'] = load_regions(replacement)
+    return task
+
+
+def _max_workers():
+    return REVERIFY_WORKERS or os.cpu_count() or 1
+
+
+def _check_workers(workers):
+    """
+    校验请求的进程数，不超过 REVERIFY_WORKERS（0表示CPU核数）
+
+    异常:
+        ValueError: 不是正整数
+    """
+    if workers in (None, ''):
+        return _max_workers()
+    try:
+        workers = int(workers)
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的进程数: {workers}")
+    if workers < 1:
+        raise ValueError("进程数必须大于0")
+    return min(workers, _max_workers())
+
+
+def _check_method(method):
+    """校验替换的比较方法（方法名，或值为方法名的字典）"""
+    names = method.values() if isinstance(method, dict) else [method]
+    for name in names:
+        if name and name not in METHODS:
+            raise ValueError(f"不支持的比较方法: {name}，可选: {', '.join(METHODS)}")
+
+
+def reverify(run_ids=None, test_case_id=None, limit=None, method=None, thresholds=None, references=None,
+             workers=None):
+    """
+    重新验证一组历史执行
+
+    参数:
+        run_ids: 执行记录ID列表；为空时按 test_case_id / limit 选择最近的执行
+        test_case_id: 只选择该测试用例的执行
+        limit: 未指定run_ids时最多选择的执行数
+        method: 替换比较方法，可以是方法名，或以验证步骤名称/原方法为键的字典
+        thresholds: 替换阈值，可以是数值，或以验证步骤名称/方法为键的字典（analyze 的值为各指标阈值字典）
+        references: 替换参考图，以执行时的参考图路径或文件名为键、参考图目录中的新参考图文件名为值
+        workers: 进程数，默认且最多为 REVERIFY_WORKERS（0表示CPU核数）
+
+    返回:
+        dict: 包含以下字段
+            - summary: runs/steps/evaluated/changed_steps/changed_runs/newly_passed/newly_failed/errors/elapsed_ms
+            - runs: 每次执行的结果，包含 run_id、old_success、new_success、changed 和 steps 列表，
+              每个步骤包含 verification_key、old/new 方法、阈值、得分、是否通过和 changed
+
+    异常:
+        ValueError: 参数无效
+    """
+    _check_method(method)
+    return _reverify(run_ids, test_case_id, limit, method, thresholds,
+                     _resolve_references(references), _check_workers(workers))
+
+
+def _reverify(run_ids, test_case_id, limit, method, thresholds, references, workers):
+    """重新验证（参数已校验，references 为解析后的路径）"""
+    start = time.perf_counter()
+    if not run_ids:
+        run_ids = [summary['run_id'] for summary in list_runs(test_case_id=test_case_id, limit=limit)]
+
+    runs = []
+    tasks = []
+    for run_id in run_ids:
+        record = load_run(run_id)
+        if record is None:
+            logger.warning(f"执行记录不存在，跳过: {run_id}")
+            continue
+        runs.append(record)
+        for step in record.get('steps', []):
+            task = _build_task(step, method=method, thresholds=thresholds, references=references)
+            if task is not None:
+                tasks.append((record['run_id'], step['index'], task))
+
+    payloads = [task for _, _, task in tasks]
+    if workers <= 1 or len(payloads) < MIN_PARALLEL_TASKS:
+        outcomes = [_evaluate(task) for task in payloads]
+    else:
+        # 使用 spawn 启动工作进程，避免在多线程的Web服务中 fork 带来的锁状态问题
+        context = multiprocessing.get_context('spawn')
+        with _pool_slot:
+            with ProcessPoolExecutor(max_workers=min(workers, len(payloads)), mp_context=context) as executor:
+                outcomes = list(executor.map(_evaluate, payloads,
+                                             chunksize=max(1, len(payloads) // (workers * 4))))
+    results = {(run_id, index): (task, outcome) for (run_id, index, task), outcome in zip(tasks, outcomes)}
+
+    summary = {'runs': len(runs), 'steps': 0, 'evaluated': len(tasks), 'changed_steps': 0, 'changed_runs': 0,
+               'newly_passed': 0, 'newly_failed': 0, 'errors': 0}
+    report_runs = []
+    for record in runs:
+        steps = []
+        new_steps_success = []
+        for step in record.get('steps', []):
+            summary['steps'] += 1
+            entry = {
+                'index': step['index'],
+                'verification_key': step['step'].get('verification_key'),
+                'old_method': step.get('method'),
+                'old_threshold': step.get('threshold'),
+                'old_scores': step.get('scores'),
+                'old_success': step['success'],
+            }
+            task, outcome = results.get((record['run_id'], step['index']), (None, None))
+            if outcome is None:
+                # 没有保存图像的步骤（如文本识别）无法离线评估，沿用原结果
+                entry.update({'evaluated': False, 'new_success': step['success'], 'changed': False})
+            else:
+                entry.update({
+                    'evaluated': True,
+                    'new_method': task['method'],
+                    'new_threshold': task['threshold'],
+                    'new_scores': outcome['scores'],
+                    'new_success': bool(outcome['success']),
+                    'changed': bool(outcome['success']) != step['success'],
+                })
+                if 'error' in outcome:
+                    entry['error'] = outcome['error']
+                    summary['errors'] += 1
+                if entry['changed']:
+                    summary['changed_steps'] += 1
+            new_steps_success.append(entry['new_success'])
+            steps.append(entry)
+
+        old_success = record.get('success')
+        new_success = record.get('operations_success', True) and all(new_steps_success)
+        changed = old_success is not None and new_success != old_success
+        if changed:
+            summary['changed_runs'] += 1
+            summary['newly_passed' if new_success else 'newly_failed'] += 1
+        report_runs.append({
+            'run_id': record['run_id'],
+            'test_case_id': record.get('test_case_id'),
+            'title': record.get('title'),
+            'started_at': record.get('started_at'),
+            'old_success': old_success,
+            'new_success': new_success,
+            'changed': changed,
+            'steps': steps,
+        })
+
+    summary['elapsed_ms'] = round((time.perf_counter() - start) * 1000.0, 3)
+    logger.info(f"离线重新验证完成: 执行 {summary['runs']} 次，评估步骤 {summary['evaluated']} 个，"
+                f"结果变化的步骤 {summary['changed_steps']} 个、执行 {summary['changed_runs']} 次，"
+                f"耗时 {summary['elapsed_ms']:.1f}ms")
+    return {'summary': summary, 'runs': report_runs}
+
+
+def submit_reverify(run_ids=None, test_case_id=None, limit=None, method=None, thresholds=None, references=None,
+                    workers=None):
+    """
+    提交后台重新验证任务，参数同 reverify；参数在提交时校验，任务依次在后台线程中运行
+
+    返回:
+        dict: 任务状态（见 get_job）
+
+    异常:
+        ValueError: 参数无效
+    """
+    _check_method(method)
+    args = (run_ids, test_case_id, limit, method, thresholds, _resolve_references(references),
+            _check_workers(workers))
+    job_id = uuid.uuid4().hex
+    job = {'job_id': job_id, 'status': 'queued', 'submitted_at': time.time(), 'finished_at': None,
+           'result': None, 'error': None}
+    with _jobs_lock:
+        _jobs[job_id] = job
+    _job_executor.submit(_run_job, job, args)
+    logger.info(f"已提交离线重新验证任务: {job_id}")
+    return get_job(job_id)
+
+
+def _run_job(job, args):
+    job['status'] = 'running'
+    try:
+        job['result'] = _reverify(*args)
+        job['status'] = 'done'
+    except Exception as e:
+        logger.error(f"离线重新验证任务 {job['job_id']} 失败: {str(e)}")
+        job['error'] = str(e)
+        job['status'] = 'failed'
+    job['finished_at'] = time.time()
+    with _jobs_lock:
+        finished = [job_id for job_id, item in _jobs.items() if item['finished_at'] is not None]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del _jobs[job_id]
+
+
+def get_job(job_id):
+    """
+    查询后台任务
+
+    返回:
+        dict: job_id、status（queued/running/done/failed）、submitted_at、finished_at、
+              result（完成时为 reverify 的返回值）、error；任务不存在时返回None
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job is not None else None
@@ -0,0 +1,271 @@
+"""
+执行记录模块
+
+验证步骤的结果原本只保留通过/不通过。该模块为每次执行保存一份执行记录，供离线重新验证使用（见 reverification）。
+主要功能包括：
+1. 把验证步骤使用的截图和参考图保存到采集图像存储（artifact_store，按内容哈希保存，相同内容只保存一份）
+2. 保存每个验证步骤的比较方法、阈值、原始得分和引用的图像内容哈希
+3. 按测试用例、时间列出和读取执行记录
+4. 执行记录登记在采集图像存储中，与采集图像按同样的保留规则和配额清理（见 artifact_store.prune）
+
+目录结构（RUNS_DIR，默认 data/runs）：
+- <run_id>.json: 一次执行的记录
+- artifacts/<哈希>.png: 旧版本保存的验证图像，清理时移入采集图像存储并改写记录
+
+主要函数：
+- save_artifact / artifact_path: 保存验证使用的图像、把记录中的图像引用转换为文件路径
+- new_run_id / save_run / load_run / list_runs / remove_run: 生成、保存、读取、列出、删除执行记录
+- sync_runs: 在采集图像存储中登记尚未登记的执行记录
+"""
+
+
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import cv2
+
+from config import RUNS_DIR
+from .artifact_store import artifact_store, is_digest
+from .comparison_cache import image_digest
+from .log_config import setup_logger
+
+# 获取日志记录器
+logger = setup_logger(__name__)
+
+# 旧版本保存验证图像的目录（相对于 RUNS_DIR）
+LEGACY_ARTIFACTS_DIR_NAME = 'artifacts'
+# 图像按较低的PNG压缩级别保存，执行时的额外开销更小
+ARTIFACT_PNG_COMPRESSION = 1
+# 记住最近保存的图像（按像素哈希）对应的内容哈希，重复保存相同图像时不再编码
+DIGEST_MEMO_SIZE = 256
+
+_lock = threading.Lock()
+_digest_memo = OrderedDict()
+_digest_memo_lock = threading.Lock()
+
+
+def artifact_path(reference):
+    """将执行记录中的图像引用（内容哈希，旧版本记录中为相对于 RUNS_DIR 的路径）转换为绝对路径"""
+    if is_digest(reference):
+        return artifact_store.blob_path(reference)
+    return os.path.join(RUNS_DIR, reference)
+
+
+def _is_legacy_artifact(reference):
+    """是否为旧版本记录中 RUNS_DIR/artifacts 下的图像路径"""
+    return isinstance(reference, str) and reference.startswith(f"{LEGACY_ARTIFACTS_DIR_NAME}/") \
+        and '..' not in reference.split('/')
+
+
+def save_artifact(image):
+    """
+    把验证使用的图像保存到采集图像存储，相同内容只保存一份
+
+    参数:
+        image: 图像数组
+
+    返回:
+        str: 内容哈希，保存失败时返回None
+    """
+    if image is None:
+        return None
+    key = image_digest(image)
+    with _digest_memo_lock:
+        digest = _digest_memo.get(key)
+        if digest is not None:
+            _digest_memo.move_to_end(key)
+    try:
+        # 相同的图像已保存过时只更新内容的修改时间，避免在执行记录保存前被清理
+        if digest is not None and artifact_store.touch(digest):
+            return digest
+        ok, encoded = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, ARTIFACT_PNG_COMPRESSION])
+        if not ok:
+            logger.warning("编码验证图像失败")
+            return None
+        digest = artifact_store.add_bytes(encoded.tobytes())
+    except Exception as e:
+        logger.warning(f"保存验证图像失败: {str(e)}")
+        return None
+    with _digest_memo_lock:
+        _digest_memo[key] = digest
+        while len(_digest_memo) > DIGEST_MEMO_SIZE:
+            _digest_memo.popitem(last=False)
+    return digest
+
+
+def new_run_id(test_case_id=None):
+    """生成执行记录ID：时间戳加测试用例ID"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{test_case_id if test_case_id is not None else 'none'}"
+
+
+def _write_run(record):
+    """写入执行记录文件，先写临时文件再替换"""
+    path = os.path.join(RUNS_DIR, f"{record['run_id']}.json")
+    with _lock:
+        os.makedirs(RUNS_DIR, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+
+def save_run(record):
+    """
+    保存执行记录，并在采集图像存储中登记该执行引用的图像
+
+    参数:
+        record: 执行记录字典，需包含 run_id
+    """
+    _write_run(record)
+    try:
+        artifact_store.add_run(record['run_id'], record.get('test_case_id'), record.get('success'),
+                               _record_digests(record))
+    except Exception as e:
+        # 未登记的执行记录会在下次清理时登记（见 sync_runs）
+        logger.warning(f"登记执行记录到采集图像存储失败 {record['run_id']}: {str(e)}")
+    logger.info(f"已保存执行记录: {record['run_id']}")
+
+
+def load_run(run_id):
+    """
+    读取执行记录
+
+    返回:
+        dict，记录不存在或无法读取时返回None
+    """
+    path = os.path.join(RUNS_DIR, f"{os.path.basename(run_id)}.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"读取执行记录失败 {path}: {str(e)}")
+        return None
+
+
+def list_runs(test_case_id=None, limit=None):
+    """
+    列出执行记录摘要，按时间从新到旧排列
+
+    参数:
+        test_case_id: 只列出该测试用例的记录
+        limit: 最多返回的数量
+
+    返回:
+        list: 摘要字典列表，包含 run_id、test_case_id、title、started_at、success、steps（验证步骤数）
+    """
+    if not os.path.isdir(RUNS_DIR):
+        return []
+    # 记录ID以时间戳开头，按文件名倒序即为时间倒序
+    names = sorted((name for name in os.listdir(RUNS_DIR) if name.endswith('.json')), reverse=True)
+    summaries = []
+    for name in names:
+        if test_case_id is not None and not name[:-len('.json')].endswith(f"_{test_case_id}"):
+            continue
+        record = load_run(name[:-len('.json')])
+        if record is None:
+            continue
+        summaries.append({
+            'run_id': record['run_id'],
+            'test_case_id': record.get('test_case_id'),
+            'title': record.get('title'),
+            'started_at': record.get('started_at'),
+            'success': record.get('success'),
+            'steps': len(record.get('steps', [])),
+        })
+        if limit and len(summaries) >= limit:
+            break
+    return summaries
+
+
+def remove_run(run_id):
+    """删除执行记录文件，记录不存在时忽略"""
+    try:
+        os.remove(os.path.join(RUNS_DIR, f"{os.path.basename(run_id)}.json"))
+    except FileNotFoundError:
+        pass
+
+
+def _record_digests(record):
+    """执行记录引用的内容哈希（不含旧版本记录中的路径）"""
+    digests = set()
+    for step in record.get('steps', []):
+        for reference in (step.get('artifacts') or {}).values():
+            if is_digest(reference):
+                digests.add(reference)
+    return digests
+
+
+def _migrate_artifacts(record, store, migrated):
+    """
+    把旧版本记录引用的 RUNS_DIR/artifacts 中的图像移入存储，改写为内容哈希；
+    其他值（如旧版本记录中的 reference_path）保持不变
+
+    返回:
+        bool: 记录是否有改动
+    """
+    changed = False
+    for step in record.get('steps', []):
+        artifacts = step.get('artifacts') or {}
+        for name, reference in artifacts.items():
+            if not _is_legacy_artifact(reference):
+                continue
+            if reference not in migrated:
+                path = artifact_path(reference)
+                if not os.path.exists(path):
+                    logger.warning(f"执行记录 {record['run_id']} 引用的旧图像不存在: {reference}")
+                    continue
+                with open(path, 'rb') as f:
+                    migrated[reference] = store.add_bytes(f.read())
+            artifacts[name] = migrated[reference]
+            changed = True
+    return changed
+
+
+def sync_runs(store=None):
+    """
+    使采集图像存储中登记的执行与执行记录文件一致：登记尚未登记的执行记录（旧版本记录的图像移入存储），
+    删除记录文件已不存在的登记；旧的图像目录迁移完成后删除
+
+    参数:
+        store: 采集图像存储，默认为全局的 artifact_store
+
+    返回:
+        dict: {'added': 登记的执行记录数, 'missing': 删除的登记数}
+    """
+    store = store or artifact_store
+    # 先读取登记的执行，再列出记录文件：期间保存的执行只会被重复登记，不会被误删登记
+    known = store.run_ids()
+    present = set()
+    if os.path.isdir(RUNS_DIR):
+        present = {name[:-len('.json')] for name in os.listdir(RUNS_DIR) if name.endswith('.json')}
+    added, failed = 0, 0
+    migrated = {}
+    for run_id in sorted(present - known):
+        path = os.path.join(RUNS_DIR, f"{run_id}.json")
+        record = load_run(run_id)
+        if record is None:
+            continue
+        try:
+            created_at = os.path.getmtime(path)
+            if _migrate_artifacts(record, store, migrated):
+                _write_run(record)
+            store.add_run(run_id, record.get('test_case_id'), record.get('success'), _record_digests(record),
+                          created_at=created_at)
+            added += 1
+        except Exception as e:
+            failed += 1
+            logger.warning(f"登记执行记录失败 {run_id}: {str(e)}")
+    missing = known - present
+    if missing:
+        store.remove_runs(missing)
+    legacy_dir = os.path.join(RUNS_DIR, LEGACY_ARTIFACTS_DIR_NAME)
+    if not failed and os.path.isdir(legacy_dir):
+        shutil.rmtree(legacy_dir, ignore_errors=True)
+        logger.info(f"旧的验证图像已移入采集图像存储，删除目录: {legacy_dir}")
+    return {'added': added, 'missing': len(missing)}
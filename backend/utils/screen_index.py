@@ -0,0 +1,265 @@
+"""
+屏幕识别索引模块
+
+该模块对所有参考截图建立感知哈希索引，回答"设备当前处于哪个界面"。主要功能包括：
+1. 扫描参考图目录（frontend/public/screenshot/upload 和 frontend/public/img/upload）
+2. 以pHash建立BK树，按汉明距离查找最近的k张参考图，dHash用于同距离时排序
+3. 参考图的哈希优先取自特征旁路文件（见 feature_sidecar），没有时读取图片计算
+4. 目录内容变化时增量更新：只为新增或修改过的图片重新计算哈希
+
+主要类：
+- BKTree: 基于汉明距离的BK树
+- ScreenIndex: 参考图感知哈希索引
+
+模块级实例 screen_index 供执行器和 /api/screen/identify 接口共用。
+"""
+
+import os
+import heapq
+import threading
+import time
+
+import cv2
+
+from .image_hash import phash, dhash, hamming_distance
+from .feature_sidecar import load_hashes
+from .log_config import setup_logger
+
+# 获取日志记录器
+logger = setup_logger(__name__)
+
+FRONTEND_PUBLIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                   'frontend', 'public')
+# 参考图目录及其对应的访问URL前缀
+REFERENCE_DIRS = (
+    (os.path.join(FRONTEND_PUBLIC_DIR, 'screenshot', 'upload'), '/screenshot/upload/'),
+    (os.path.join(FRONTEND_PUBLIC_DIR, 'img', 'upload'), '/img/upload/'),
+)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.tif', '.webp')
+# 两次扫描目录之间的最短间隔（秒），期间的查询直接使用现有索引
+SCAN_INTERVAL = 2.0
+# 哈希位数，距离换算为相似度时使用
+HASH_BITS = 64
+
+
+class BKTree:
+    """
+    基于汉明距离的BK树
+
+    每个节点保存一个哈希值和哈希相同的所有条目，子节点按与父节点的距离分组。
+    查询时利用三角不等式剪枝，只访问可能落在搜索半径内的分支。
+    """
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, hash_value, item):
+        """添加一个条目"""
+        self._size += 1
+        if self._root is None:
+            self._root = [hash_value, [item], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(hash_value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [hash_value, [item], {}]
+                return
+            node = child
+
+    def search(self, hash_value, radius):
+        """
+        查找距离不超过radius的所有条目
+
+        返回:
+            list: (距离, 条目) 列表，按距离升序
+        """
+        results = []
+        if self._root is None:
+            return results
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(hash_value, node[0])
+            if distance <= radius:
+                results.extend((distance, item) for item in node[1])
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        results.sort(key=lambda pair: pair[0])
+        return results
+
+    def nearest(self, hash_value, k, max_distance=HASH_BITS):
+        """
+        查找距离最近的k个条目
+
+        返回:
+            list: (距离, 条目) 列表，按距离升序
+        """
+        if self._root is None or k <= 0:
+            return []
+        # 大顶堆保存当前最好的k个结果，堆顶是其中最差的一个，随着结果变好逐步收紧搜索半径
+        best = []
+        counter = 0
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(hash_value, node[0])
+            radius = -best[0][0] if len(best) >= k else max_distance
+            if distance <= radius:
+                for item in node[1]:
+                    counter += 1
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, counter, item))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, counter, item))
+                radius = -best[0][0] if len(best) >= k else max_distance
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return sorted(((-neg_distance, item) for neg_distance, _, item in best), key=lambda pair: pair[0])
+
+
+class ScreenIndex:
+    """
+    参考图感知哈希索引
+
+    以pHash建立BK树，查询时先取pHash最近的候选，再以dHash距离作为次要排序。
+    """
+
+    def __init__(self, directories=REFERENCE_DIRS, scan_interval=SCAN_INTERVAL):
+        self.directories = directories
+        self.scan_interval = scan_interval
+        self._lock = threading.RLock()
+        # 路径 -> 条目信息（含文件修改时间、大小和哈希），目录变化时复用未变化文件的哈希
+        self._entries = {}
+        self._tree = BKTree()
+        self._last_scan = 0.0
+        self._dirty = True
+
+    def invalidate(self):
+        """标记索引需要重新扫描（参考图上传、替换或删除后调用）"""
+        self._dirty = True
+
+    def _scan(self):
+        """扫描参考图目录，返回 路径 -> (修改时间, 大小, 文件名, URL)"""
+        found = {}
+        for directory, url_prefix in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                stat = entry.stat()
+                found[os.path.abspath(entry.path)] = (stat.st_mtime_ns, stat.st_size, entry.name, url_prefix + entry.name)
+        return found
+
+    @staticmethod
+    def _compute_hashes(path):
+        """优先读取旁路文件中的哈希，没有时读取图片计算"""
+        hashes = load_hashes(path)
+        if hashes is not None:
+            return hashes
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            return None
+        return phash(gray), dhash(gray)
+
+    def refresh(self, force=False):
+        """
+        根据目录内容更新索引
+
+        参数:
+            force: 忽略扫描间隔，立即扫描
+
+        返回:
+            bool: 索引内容是否发生变化
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and not self._dirty and now - self._last_scan < self.scan_interval:
+                return False
+            self._last_scan = now
+            self._dirty = False
+
+            found = self._scan()
+            changed = set(found) != set(self._entries)
+            entries = {}
+            for path, (mtime, size, name, url) in found.items():
+                entry = self._entries.get(path)
+                if entry is None or (entry['mtime'], entry['size']) != (mtime, size):
+                    hashes = self._compute_hashes(path)
+                    if hashes is None:
+                        logger.warning(f"无法读取参考图，跳过索引: {path}")
+                        continue
+                    entry = {'path': path, 'name': name, 'url': url, 'mtime': mtime, 'size': size,
+                             'phash': hashes[0], 'dhash': hashes[1]}
+                    changed = True
+                entries[path] = entry
+
+            if changed:
+                tree = BKTree()
+                for entry in entries.values():
+                    tree.add(entry['phash'], entry)
+                self._entries = entries
+                self._tree = tree
+                logger.info(f"屏幕识别索引已更新，共 {len(entries)} 张参考图")
+            return changed
+
+    def query(self, image, k=5, max_distance=HASH_BITS):
+        """
+        查找与图像最相近的k张参考图
+
+        参数:
+            image: BGR或灰度图像
+            k: 返回的数量
+            max_distance: 允许的最大pHash汉明距离
+
+        返回:
+            list: 按相似度从高到低排列的字典列表，包含以下字段
+                - name: 参考图文件名
+                - path: 参考图路径
+                - url: 前端访问URL
+                - distance: pHash汉明距离
+                - dhash_distance: dHash汉明距离
+                - similarity: 1 - distance / 64
+        """
+        self.refresh()
+        query_phash = phash(image)
+        query_dhash = dhash(image)
+        with self._lock:
+            tree = self._tree
+        # 多取一些候选，pHash距离相同时再按dHash距离排序
+        candidates = tree.nearest(query_phash, k * 2, max_distance=max_distance)
+        results = []
+        for distance, entry in candidates:
+            results.append({
+                'name': entry['name'],
+                'path': entry['path'],
+                'url': entry['url'],
+                'distance': distance,
+                'dhash_distance': hamming_distance(query_dhash, entry['dhash']),
+                'similarity': round(1.0 - distance / HASH_BITS, 4),
+            })
+        results.sort(key=lambda r: (r['distance'], r['dhash_distance']))
+        return results[:k]
+
+    def stats(self):
+        """返回索引统计信息"""
+        with self._lock:
+            return {
+                'references': len(self._entries),
+                'directories': [directory for directory, _ in self.directories],
+            }
+
+
+# 全局屏幕识别索引实例
+screen_index = ScreenIndex()
@@ -11,13 +11,12 @@ SSH连接管理模块
 """
 
 import paramiko
-import json
-import os
 import logging
 from .log_config import setup_logger
 import time
 import socket
 import subprocess
+from services.config_service import config_service
 
 # 禁止 paramiko 库的错误日志输出
 paramiko_logger = logging.getLogger('paramiko.transport')
@@ -26,13 +25,10 @@ paramiko_logger.setLevel(logging.CRITICAL)
 # 获取日志记录器
 logger = setup_logger(__name__)
 
-# 读取设置文件
+# 读取设置（来自配置服务的缓存）
 def load_settings():
-    settings_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'settings.json')
     try:
-        if os.path.exists(settings_file):
-            with open(settings_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        return config_service.get()
     except Exception as e:
         logger.error(f"读取设置文件失败: {e}")
     # 默认设置为OpenSSH配置
@@ -1,5 +1,6 @@
 import json
 import os
+import time
 import cv2
 from datetime import datetime
 from .get_latest_image import GetLatestImage
@@ -7,8 +8,16 @@ from .get_latest_screenshot import GetLatestScreenshot
 from .button_clicker import ButtonClicker
 from .ssh_manager import SSHManager
 from .image_comparator import ImageComparator
+from .reference_cache import reference_cache
+from .feature_sidecar import load_features
+from .screen_index import screen_index
+from .comparison_cache import comparison_cache
+from .run_records import new_run_id, save_artifact, save_run
+from .artifact_store import artifact_store
 from .log_config import setup_logger
+from config import GLYPH_MIN_CONFIDENCE
 from models.settings import Settings
+from models.execution_history import execution_history
 
 logger = setup_logger(__name__)
 
@@ -98,6 +107,22 @@ class TestCaseExecutor:
             logger.error(f"查找匹配文件时出错: {str(e)}")
             return None
         
+    @staticmethod
+    def _history_steps(phase, key_field, steps, results, durations):
+        """把一组步骤的配置、结果和耗时转换为执行历史的步骤记录"""
+        return [
+            {
+                'phase': phase,
+                'position': position,
+                'step_key': step.get(key_field, ''),
+                'step_id': step.get('id', ''),
+                'success': bool(result.get('success')),
+                'duration_ms': duration,
+                'message': result.get('message', ''),
+            }
+            for position, (step, result, duration) in enumerate(zip(steps, results, durations))
+        ]
+
     def execute_test_case(self, test_case):
         """执行测试用例"""
         try:
@@ -139,6 +164,7 @@ class TestCaseExecutor:
             all_operation_results = []
             all_verification_results = []
             overall_success = True
+            run_ids = []
             
             # 根据重复次数执行测试用例
             for run_index in range(repeat_count):
@@ -146,6 +172,9 @@ class TestCaseExecutor:
                 
                 # 创建一个字典来存储操作步骤的结果，特别是图像数据
                 operation_data = {}
+                run_id = new_run_id(test_case_id)
+                started_at = datetime.now().isoformat()
+                run_started = time.perf_counter()
 
                 # 分离普通操作步骤和清理操作步骤
                 normal_operation_steps = []
@@ -163,8 +192,9 @@ class TestCaseExecutor:
                 # 用户在前端界面中已经通过拖拽等方式设置了步骤的执行顺序
                 # 这个顺序已经保存在数组中，应该按照这个顺序执行
 
-                # 执行普通操作步骤
+                # 执行普通操作步骤（同时记录每个步骤的耗时，写入执行历史）
                 current_operation_results = []
+                operation_durations, verification_durations, cleanup_durations = [], [], []
                 logger.info(f"开始执行普通操作步骤，共 {len(normal_operation_steps)} 个步骤")
                 for step in normal_operation_steps:
                     # 打印当前执行的步骤信息
@@ -172,7 +202,9 @@ class TestCaseExecutor:
                     step_id = step.get('id', 'n/a')
                     logger.info(f"当前执行步骤：{step_name} (ID: {step_id})")
 
+                    step_started = time.perf_counter()
                     result = self._execute_operation_step(step, test_case['title'], test_case_id)
+                    operation_durations.append((time.perf_counter() - step_started) * 1000)
                     current_operation_results.append(result)
                     
                     # 存储关键操作的结果数据，特别是图像和截图
@@ -183,7 +215,6 @@ class TestCaseExecutor:
                     
                     # 在操作步骤之间添加等待时间
                     if self.operation_interval > 0:
-                        import time
                         logger.debug(f"等待操作步骤间隔时间: {self.operation_interval}秒")
                         time.sleep(self.operation_interval)
 
@@ -200,7 +231,9 @@ class TestCaseExecutor:
                         logger.info(f"当前执行步骤：{step_name} (ID: {step_id})")
 
                         # 将操作步骤的结果数据传递给验证步骤
+                        step_started = time.perf_counter()
                         result = self._execute_verification_step(step, operation_data)
+                        verification_durations.append((time.perf_counter() - step_started) * 1000)
                         current_verification_results.append(result)
                         logger.info(f"验证步骤结果: {result.get('success', False)} - {result.get('message', '无消息')}")
                     logger.info(f"验证步骤执行完成，结果: {'测试通过' if all(r['success'] for r in current_verification_results) else '测试不通过'}")
@@ -218,11 +251,12 @@ class TestCaseExecutor:
 
                      # 在清理步骤之间添加等待时间
                     if self.operation_interval > 0:
-                        import time
                         logger.debug(f"等待操作步骤间隔时间: {self.operation_interval}秒")
                         time.sleep(self.operation_interval)
 
+                    step_started = time.perf_counter()
                     result = self._execute_operation_step(step, test_case['title'], test_case_id) # 清理步骤也是操作步骤，复用执行函数
+                    cleanup_durations.append((time.perf_counter() - step_started) * 1000)
                     current_cleanup_results.append(result)
 
                 # 判断当前执行的测试结果
@@ -231,6 +265,69 @@ class TestCaseExecutor:
 
                 if not current_success:
                     overall_success = False
+
+                # 保存本次执行的记录：验证步骤配置、原始得分和使用的图像，供离线重新验证
+                try:
+                    save_run({
+                        'run_id': run_id,
+                        'test_case_id': test_case_id,
+                        'title': test_case['title'],
+                        'run_index': run_index,
+                        'started_at': started_at,
+                        'finished_at': datetime.now().isoformat(),
+                        'success': current_success,
+                        'operations_success': all(r['success'] for r in current_operation_results + current_cleanup_results),
+                        'steps': [
+                            {
+                                'index': index,
+                                'step': {k: v for k, v in step.items() if isinstance(v, (str, int, float, bool, list, dict, type(None)))},
+                                'success': bool(result.get('success')),
+                                'message': result.get('message'),
+                                'method': result.get('method'),
+                                'threshold': result.get('threshold'),
+                                'scales': result.get('scales'),
+                                'scores': result.get('scores'),
+                                'artifacts': result.get('artifacts'),
+                                'reference_path': result.get('reference_path'),
+                            }
+                            for index, (step, result) in enumerate(
+                                zip(script_content.get('verificationSteps', []), current_verification_results))
+                        ],
+                    })
+                    run_ids.append(run_id)
+                except Exception as e:
+                    logger.warning(f"保存执行记录失败: {str(e)}")
+
+                # 写入执行历史数据库：每个步骤的耗时和结果，用于趋势和统计
+                try:
+                    execution_history.record_run({
+                        'run_id': run_id,
+                        'test_case_id': test_case_id,
+                        'project_id': project_id,
+                        'title': test_case['title'],
+                        'run_index': run_index,
+                        'started_at': started_at,
+                        'finished_at': datetime.now().isoformat(),
+                        'duration_ms': (time.perf_counter() - run_started) * 1000,
+                        'success': current_success,
+                        'steps': (
+                            self._history_steps('operation', 'operation_key', normal_operation_steps,
+                                                current_operation_results, operation_durations)
+                            + self._history_steps('verification', 'verification_key',
+                                                  script_content.get('verificationSteps', []),
+                                                  current_verification_results, verification_durations)
+                            + self._history_steps('cleanup', 'operation_key', cleanup_operation_steps,
+                                                  current_cleanup_results, cleanup_durations)
+                        ),
+                    })
+                except Exception as e:
+                    logger.warning(f"写入执行历史失败: {str(e)}")
+
+                # 把本次执行采集的图像关联到执行，用于按执行次数和结果保留
+                try:
+                    artifact_store.finish_run(test_case_id, run_id, current_success)
+                except Exception as e:
+                    logger.warning(f"关联采集图像到执行失败: {str(e)}")
                 
                 # 收集当前执行的结果
                 all_operation_results.extend(current_operation_results + current_cleanup_results) # 将清理操作结果添加到总操作结果中
@@ -273,7 +370,8 @@ class TestCaseExecutor:
                 'status': status,
                 'operation_results': cleaned_operation_results,
                 'verification_results': cleaned_verification_results,
-                'repeat_count': repeat_count
+                'repeat_count': repeat_count,
+                'run_ids': run_ids
             }
 
         except Exception as e:
@@ -661,13 +759,16 @@ class TestCaseExecutor:
         try:
             verification_key = step.get('verification_key', '')
             
-            if verification_key in ['对比图像相似度', '对比图像关键点']:
+            if verification_key in ['对比图像相似度', '对比图像关键点', '综合图像比较']:
                 img1_ref = step.get('img1', '')
                 img2_ref = step.get('img2', '')
                 
                 # 尝试从操作步骤的结果中获取图像
                 img1 = None
                 img2 = None
+                # 从文件读取的图像可以使用预计算的ORB特征（见 feature_sidecar）
+                features1 = None
+                features2 = None
                 
                 # 首先尝试从操作步骤数据中获取图像
                 if img1_ref in operation_data and 'image' in operation_data[img1_ref]:
@@ -696,6 +797,7 @@ class TestCaseExecutor:
                             img_path = os.path.join(screenshot_dir, latest_file)
                             try:
                                 img1 = cv2.imread(img_path)
+                                features1 = load_features(img_path)
                                 logger.info(f"从截图目录读取图像1: {img_path}")
                             except Exception as e:
                                 logger.warning(f"无法从文件 {img_path} 读取图像1: {str(e)}")
@@ -711,6 +813,7 @@ class TestCaseExecutor:
                             img_path = os.path.join(screenshot_dir, latest_file)
                             try:
                                 img2 = cv2.imread(img_path)
+                                features2 = load_features(img_path)
                                 logger.info(f"从截图目录读取图像2: {img_path}")
                             except Exception as e:
                                 logger.warning(f"无法从文件 {img_path} 读取图像2: {str(e)}")
@@ -729,17 +832,57 @@ class TestCaseExecutor:
                     img1_name = f"参考图像_{img1_ref}"
                     img2_name = f"对比图像_{img2_ref}"
                     
+                    # 记录原始得分和使用的图像，供离线重新验证（见 reverification）
+                    artifacts = {'image': save_artifact(img1), 'reference': save_artifact(img2)}
+
                     if verification_key == '对比图像相似度':
-                        result = ImageComparator.is_ssim(img1, img2, img1_name=img1_name, img2_name=img2_name)
+                        threshold = float(step.get('threshold', 0.98))
+                        score = comparison_cache.get_or_compute(
+                            img1, img2, 'ssim_score', lambda: ImageComparator.ssim_score(img1, img2)
+                        )
+                        result = score >= threshold
+                        logger.info(f"SSIM 相似度: {score:.4f}, 阈值: {threshold:.2f}")
                         method = 'SSIM相似度'
+                        record = {'method': 'ssim', 'threshold': threshold, 'scores': {'ssim': score}}
+                    elif verification_key == '综合图像比较':
+                        # 一次计算多个指标，metrics 可以是列表或逗号分隔的字符串
+                        metrics = step.get('metrics') or None
+                        if isinstance(metrics, str):
+                            metrics = [m.strip() for m in metrics.split(',') if m.strip()]
+                        analysis = comparison_cache.get_or_compute(
+                            img1, img2, 'analyze',
+                            lambda: ImageComparator.analyze(img1, img2, metrics=metrics,
+                                                            img1_name=img1_name, img2_name=img2_name),
+                            metrics=metrics
+                        )
+                        failed = [m for m, passed in analysis['passed'].items() if not passed]
+                        return {
+                            'success': analysis['all_passed'],
+                            'message': f'综合图像比较完成: {"通过" if analysis["all_passed"] else "未通过指标: " + ", ".join(failed)}',
+                            'details': analysis,
+                            'method': 'analyze',
+                            'threshold': analysis['thresholds'],
+                            'scores': analysis['scores'],
+                            'artifacts': artifacts
+                        }
                     else:  # 对比图像关键点
-                        result = ImageComparator.is_orb(img1, img2, img1_name=img1_name, img2_name=img2_name)
+                        result = comparison_cache.get_or_compute(
+                            img1, img2, 'is_orb',
+                            lambda: ImageComparator.is_orb(
+                                img1, img2, img1_name=img1_name, img2_name=img2_name,
+                                features1=features1.orb() if features1 is not None else None,
+                                features2=features2.orb() if features2 is not None else None
+                            )
+                        )
                         method = 'ORB关键点'
+                        record = {'method': 'orb', 'threshold': None, 'scores': {}}
                     
                     logger.info(f"图像对比完成 ({method}): 结果: {result}")
                     return {
                         'success': result,
-                        'message': f'图像对比完成 ({method}): 结果: {"通过" if result else "不通过"}'
+                        'message': f'图像对比完成 ({method}): 结果: {"通过" if result else "不通过"}',
+                        'artifacts': artifacts,
+                        **record
                     }
                     
                 except Exception as e:
@@ -752,7 +895,7 @@ class TestCaseExecutor:
             elif verification_key == '文本识别验证':
                 # 导入OCR处理模块
                 from .ocr import process_image
-                import tempfile
+                from .glyph_ocr import recognize_glyphs
                 
                 # 获取预期文本和操作界面截图ID
                 expected_text = step.get('expected_text', '')
@@ -823,20 +966,29 @@ class TestCaseExecutor:
                     }
                 
                 try:
-                    # 将图像保存为临时文件
-                    with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-                        temp_path = temp_file.name
-                        cv2.imwrite(temp_path, image)
-                        logger.info(f"临时图像保存到: {temp_path}")
+                    # 直接识别内存中的图像，可通过 region 限定识别区域
+                    region = step.get('region')
+                    ocr_result = None
                     
-                    # 使用OCR进行文本识别
-                    ocr_result = process_image(temp_path)
+                    # 指定了字形集时先用字形模板快速识别，置信度不足时再使用PaddleOCR
+                    glyph_set = step.get('glyph_set')
+                    if glyph_set:
+                        try:
+                            glyph_result = recognize_glyphs(image, glyph_set, region=region)
+                        except ValueError as e:
+                            logger.warning(f"字形识别失败: {str(e)}")
+                            glyph_result = None
+                        if glyph_result is None:
+                            logger.warning(f"字形集 {glyph_set} 不存在或为空，使用PaddleOCR识别")
+                        elif glyph_result['confidence'] >= GLYPH_MIN_CONFIDENCE:
+                            logger.info(f"字形识别结果: {glyph_result['text_results']}，置信度 {glyph_result['confidence']:.3f}，"
+                                        f"耗时 {glyph_result['elapsed_ms']:.1f}ms")
+                            ocr_result = dict(glyph_result, engine='glyph', error=None)
+                        else:
+                            logger.info(f"字形识别置信度 {glyph_result['confidence']:.3f} 低于 {GLYPH_MIN_CONFIDENCE}，使用PaddleOCR识别")
                     
-                    # 删除临时文件
-                    try:
-                        os.unlink(temp_path)
-                    except Exception as e:
-                        logger.warning(f"删除临时文件失败: {str(e)}")
+                    if ocr_result is None:
+                        ocr_result = dict(process_image(image, region=region), engine='paddleocr')
                     
                     # 检查OCR结果是否包含错误
                     if ocr_result.get('error'):
@@ -864,7 +1016,10 @@ class TestCaseExecutor:
                         'message': f"文本识别验证 {'通过' if contains_text else '不通过'}: 预期文本 '{expected_text}' {'存在' if contains_text else '不存在'} 于识别结果中",
                         'details': {
                             'expected_text': expected_text,
-                            'recognized_texts': text_results
+                            'recognized_texts': text_results,
+                            'items': ocr_result.get('items', []),
+                            'region': ocr_result.get('region'),
+                            'engine': ocr_result['engine']
                         }
                     }
                     
@@ -929,8 +1084,8 @@ class TestCaseExecutor:
                         'message': f'无法获取操作界面截图: screenshot_id={screenshot_id}'
                     }
                 
-                # 获取参考截图
-                reference_image = None
+                # 获取参考截图（经参考图缓存读取，同一张参考图只解码一次）
+                reference_entry = None
                 
                 # 尝试解析参考截图路径
                 try:                    
@@ -941,54 +1096,114 @@ class TestCaseExecutor:
                         # 1. 先尝试public/screenshot/upload目录
                         img_path = self.find_matching_file(os.path.join('..', 'frontend', 'public', 'screenshot', 'upload'), ref_filename)
                         if img_path and os.path.exists(img_path):
-                            reference_image = cv2.imread(img_path)
+                            reference_entry = reference_cache.get(img_path)
                             logger.info(f"从public/screenshot/upload目录读取参考截图: {img_path}")
                         
                         # 3. 如果仍找不到，尝试public/img/upload目录
-                        if reference_image is None:
+                        if reference_entry is None:
                             img_path = self.find_matching_file(os.path.join('..', 'frontend', 'public', 'img', 'upload'), ref_filename)
                             
                             if img_path and os.path.exists(img_path):
-                                reference_image = cv2.imread(img_path)
+                                reference_entry = reference_cache.get(img_path)
                                 logger.info(f"从public/img/upload目录读取参考截图: {img_path}")
                 except Exception as e:
                     logger.warning(f"解析参考截图路径出错: {str(e)}")
                 
                 # 如果仍然无法获取参考截图，返回失败
-                if reference_image is None:
+                if reference_entry is None:
                     logger.error(f"无法获取参考截图: reference_screenshot={reference_screenshot}")
                     return {
                         'success': False,
-                        'message': f'无法获取参考截图'
+                        'message': '无法获取参考截图'
                     }
                 
                 try:
                     # 使用ImageComparator的is_ssim方法进行精准匹配
                     
-                    # 确保图像尺寸相同
-                    if reference_image.shape != operation_image.shape:
-                        reference_image = cv2.resize(reference_image, (operation_image.shape[1], operation_image.shape[0]))
+                    # 确保图像尺寸相同：直接取缓存中与操作界面截图同尺寸的参考图
+                    target_size = (operation_image.shape[1], operation_image.shape[0])
+                    if reference_entry.size != target_size:
                         logger.info("调整参考截图尺寸以匹配操作界面截图")
+                    use_pyramid = step.get('pyramid', False)
+                    # 参考图设置了忽略区域时，同时取出该尺寸下预先生成的SSIM权重图
+                    reference = reference_cache.get_variant(reference_entry.path, target_size,
+                                                            ssim_stats=not use_pyramid, masks=True)
+                    if reference is None:
+                        logger.error(f"无法获取参考截图: reference_screenshot={reference_screenshot}")
+                        return {
+                            'success': False,
+                            'message': '无法获取参考截图'
+                        }
                     
                     # 提取图片名称信息
                     operation_img_name = f"操作界面截图_{img_path}"
                     reference_img_name = f"参考截图_{reference_screenshot}"
                     
-                    # 使用用户设置的阈值作为上限，0.5作为下限
-                    match_result = ImageComparator.is_ssim(
-                        operation_image,
-                        reference_image,
-                        threshold=threshold,
-                        min_threshold=0.5,
-                        img1_name=operation_img_name,
-                        img2_name=reference_img_name
+                    ignore_regions = reference_entry.ignore_regions
+                    if reference.ssim_weights is not None:
+                        logger.info(f"参考截图设置了 {len(ignore_regions['regions'])} 个忽略区域，使用带权重的SSIM")
+                        if not reference.has_ssim_stats:
+                            reference = reference_cache.get_variant(reference_entry.path, target_size,
+                                                                    ssim_stats=True, masks=True)
+
+                    # 记录原始得分和使用的图像，供离线重新验证（见 reverification）
+                    artifacts = {
+                        'image': save_artifact(operation_image),
+                        'reference': save_artifact(reference_entry.image),
+                        'mask': save_artifact(reference.keep_mask),
+                    }
+
+                    # 步骤开启pyramid时使用多分辨率SSIM，明显不相似时在低分辨率层直接判定不通过；
+                    # 多分辨率SSIM不支持忽略区域，参考图有忽略区域时仍按原始分辨率计算
+                    if use_pyramid and reference.ssim_weights is None:
+                        # 参考图有特征旁路文件时直接使用其中的低分辨率灰度层
+                        features = reference_cache.get_features(reference_entry.path)
+                        ssim_report = comparison_cache.get_or_compute(
+                            operation_image, reference.image, 'ssim_pyramid',
+                            lambda: ImageComparator.ssim_pyramid(
+                                operation_image,
+                                reference.image,
+                                threshold=threshold,
+                                img1_name=operation_img_name,
+                                img2_name=reference_img_name,
+                                coarse_levels2=features.coarse_levels if features is not None else None
+                            ),
+                            threshold=threshold
+                        )
+                        match_result = ssim_report['passed']
+                        logger.info(f"截图精准匹配结果: {'通过' if match_result else '不通过'}, 阈值: {threshold}, "
+                                    f"结束层级: {ssim_report['level']}, 估算节省: {ssim_report['saved_ms']}ms")
+                        return {
+                            'success': match_result,
+                            'message': f"截图精准匹配 {'通过' if match_result else '不通过'} (阈值: {threshold})",
+                            'details': ssim_report,
+                            'method': 'ssim',
+                            'threshold': threshold,
+                            'scores': {'ssim': ssim_report['score']},
+                            'artifacts': artifacts,
+                            'reference_path': reference_entry.path
+                        }
+                    
+                    # 参考图一侧的均值、方差已在缓存中预先计算，只需计算截图一侧
+                    # 相同的截图与参考图、相同忽略区域的SSIM值直接取自比较结果缓存
+                    score = comparison_cache.get_or_compute(
+                        operation_image, reference.image, 'ssim_score',
+                        lambda: ImageComparator.ssim_reference_score(operation_image, reference),
+                        ignore_regions=ignore_regions
                     )
+                    match_result = score >= threshold
                     
-                    logger.info(f"截图精准匹配结果: {'通过' if match_result else '不通过'}, 阈值: {threshold}")
+                    logger.info(f"截图精准匹配结果: {'通过' if match_result else '不通过'}, SSIM 值: {score:.4f}, 阈值: {threshold}")
                     
                     return {
                         'success': match_result,
                         'message': f"截图精准匹配 {'通过' if match_result else '不通过'} (阈值: {threshold})",
+                        'method': 'ssim',
+                        'threshold': threshold,
+                        'scores': {'ssim': score},
+                        'ignore_regions': ignore_regions,
+                        'artifacts': artifacts,
+                        'reference_path': reference_entry.path
                     }
                     
                 except Exception as e:
@@ -1049,8 +1264,8 @@ class TestCaseExecutor:
                         'message': f'无法获取操作界面截图: screenshot_id={screenshot_id}'
                     }
                 
-                # 获取参考内容
-                reference_image = None
+                # 获取参考内容（经参考图缓存读取，同一张参考图只解码一次）
+                reference_entry = None
                 
                 # 尝试解析参考内容路径
                 try:
@@ -1062,17 +1277,17 @@ class TestCaseExecutor:
                         img_path = self.find_matching_file(os.path.join('..', 'frontend', 'public', 'img', 'upload'), ref_filename)
                         
                         if img_path and os.path.exists(img_path):
-                            reference_image = cv2.imread(img_path)
+                            reference_entry = reference_cache.get(img_path)
                             logger.info(f"从public/img/upload目录读取参考内容: {img_path}")
                 except Exception as e:
                     logger.warning(f"解析参考内容路径出错: {str(e)}")
                 
                 # 如果仍然无法获取参考内容，返回失败
-                if reference_image is None:
+                if reference_entry is None:
                     logger.error(f"无法获取参考内容: reference_content={reference_content}")
                     return {
                         'success': False,
-                        'message': f'无法获取参考内容'
+                        'message': '无法获取参考内容'
                     }
                 
                 try:
@@ -1080,34 +1295,87 @@ class TestCaseExecutor:
                     # from .image_comparator import ImageComparator
                     
                     # 确保参考内容尺寸小于操作界面截图尺寸
-                    if reference_image.shape[0] > operation_image.shape[0] or reference_image.shape[1] > operation_image.shape[1]:
+                    ref_width, ref_height = reference_entry.size
+                    target_size = (ref_width, ref_height)
+                    if ref_height > operation_image.shape[0] or ref_width > operation_image.shape[1]:
                         # 调整参考内容尺寸，确保其不大于操作界面截图
-                        scale = min(operation_image.shape[0] / reference_image.shape[0],
-                                  operation_image.shape[1] / reference_image.shape[1])
+                        scale = min(operation_image.shape[0] / ref_height,
+                                  operation_image.shape[1] / ref_width)
                         if scale < 1:  # 只有需要缩小时才调整
-                            new_height = int(reference_image.shape[0] * scale)
-                            new_width = int(reference_image.shape[1] * scale)
-                            reference_image = cv2.resize(reference_image, (new_width, new_height))
+                            new_height = int(ref_height * scale)
+                            new_width = int(ref_width * scale)
+                            target_size = (new_width, new_height)
                             logger.info(f"调整参考内容尺寸为 {new_width}x{new_height}")
+                    # 模板匹配只使用灰度图，直接取缓存中对应尺寸的灰度参考图；参考内容设置了忽略区域时同时取出掩码
+                    reference_variant = reference_cache.get_variant(reference_entry.path, target_size, masks=True)
+                    reference_image = reference_variant.gray
+                    reference_mask = reference_variant.keep_mask
+                    ignore_regions = reference_entry.ignore_regions
                     
                     # 提取图片名称信息
                     operation_img_name = f"操作界面截图_{screenshot_id}"
                     reference_img_name = f"参考内容_{reference_content}"
                     
+                    # 记录原始得分和使用的图像（缩放后的灰度参考内容），供离线重新验证（见 reverification）
+                    artifacts = {
+                        'image': save_artifact(operation_image),
+                        'reference': save_artifact(reference_image),
+                        'mask': save_artifact(reference_mask),
+                    }
+
                     # 使用用户设置的阈值进行模板匹配，并传递图片名称
-                    match_result = ImageComparator.template_matching(
-                        operation_image,
-                        reference_image,
-                        threshold=threshold,
-                        img1_name=operation_img_name,
-                        img2_name=reference_img_name
+                    # 步骤开启pyramid时使用由粗到精的模板匹配，scales 可指定要搜索的模板缩放比例
+                    if step.get('pyramid', False):
+                        scales = step.get('scales') or (1.0,)
+                        if isinstance(scales, str):
+                            scales = [s.strip() for s in scales.split(',') if s.strip()]
+                        scales = tuple(float(scale) for scale in scales)
+                        match_report = comparison_cache.get_or_compute(
+                            operation_image, reference_image, 'template_matching_pyramid',
+                            lambda: ImageComparator.template_matching_pyramid(
+                                operation_image,
+                                reference_image,
+                                threshold=threshold,
+                                scales=scales,
+                                img1_name=operation_img_name,
+                                img2_name=reference_img_name,
+                                mask=reference_mask
+                            ),
+                            threshold=threshold, scales=scales, ignore_regions=ignore_regions
+                        )
+                        match_result = match_report['passed']
+                        logger.info(f"截图包含匹配结果: {'通过' if match_result else '不通过'}, 阈值: {threshold}, "
+                                    f"位置: {match_report['location']}, 缩放: {match_report['scale']}")
+                        return {
+                            'success': match_result,
+                            'message': f"截图包含匹配 {'通过' if match_result else '不通过'} (阈值: {threshold})",
+                            'details': match_report,
+                            'method': 'template_pyramid',
+                            'threshold': threshold,
+                            'scales': list(scales),
+                            'scores': {'template': match_report['score']},
+                            'artifacts': artifacts,
+                            'reference_path': reference_entry.path
+                        }
+
+                    score, location = comparison_cache.get_or_compute(
+                        operation_image, reference_image, 'template_score',
+                        lambda: ImageComparator.template_score(operation_image, reference_image, mask=reference_mask),
+                        ignore_regions=ignore_regions
                     )
+                    match_result = score >= threshold
                     
-                    logger.info(f"截图包含匹配结果: {'通过' if match_result else '不通过'}, 阈值: {threshold}")
+                    logger.info(f"截图包含匹配结果: {'通过' if match_result else '不通过'}, 匹配值: {score:.4f}, "
+                                f"阈值: {threshold}, 位置: {location}")
                     
                     return {
                         'success': match_result,
                         'message': f"截图包含匹配 {'通过' if match_result else '不通过'} (阈值: {threshold})",
+                        'method': 'template',
+                        'threshold': threshold,
+                        'scores': {'template': score},
+                        'artifacts': artifacts,
+                        'reference_path': reference_entry.path
                     }
                     
                 except Exception as e:
@@ -1117,6 +1385,74 @@ class TestCaseExecutor:
                         'message': f'截图包含匹配过程出错: {str(e)}'
                     }
                 
+            elif verification_key == '屏幕识别':
+                # 通过感知哈希索引识别操作界面截图对应的参考截图（即设备当前所在的界面）
+                expected_screen = step.get('expected_screen', '')
+                screenshot_id = step.get('operation_screenshot', '')
+                max_distance = int(step.get('max_distance', 10))  # 允许的最大pHash汉明距离，默认10
+                top_k = int(step.get('top_k', 5))
+                
+                if not expected_screen:
+                    logger.error("屏幕识别缺少预期界面")
+                    return {
+                        'success': False,
+                        'message': '屏幕识别缺少预期界面'
+                    }
+                
+                if not screenshot_id:
+                    logger.error("屏幕识别缺少操作界面截图ID")
+                    return {
+                        'success': False,
+                        'message': '屏幕识别缺少操作界面截图ID'
+                    }
+                
+                # 获取操作界面截图
+                operation_image = None
+                
+                # 首先尝试从操作步骤数据中获取图像
+                if screenshot_id in operation_data and 'image' in operation_data[screenshot_id]:
+                    operation_image = operation_data[screenshot_id]['image']
+                    logger.info(f"从操作步骤 {screenshot_id} 获取到操作界面截图")
+                
+                # 如果无法从操作步骤数据中获取，尝试从img/operation_img目录获取
+                if operation_image is None:
+                    img_path = self.find_matching_file(os.path.join('data', 'img', 'operation_img'), f"id_{screenshot_id}_")
+                    if img_path:
+                        operation_image = cv2.imread(img_path)
+                        logger.info(f"从img/operation_img目录读取操作界面截图: {img_path}")
+                
+                if operation_image is None:
+                    logger.error(f"无法获取操作界面截图: screenshot_id={screenshot_id}")
+                    return {
+                        'success': False,
+                        'message': f'无法获取操作界面截图: screenshot_id={screenshot_id}'
+                    }
+                
+                try:
+                    candidates = screen_index.query(operation_image, k=top_k, max_distance=max_distance)
+                    best = candidates[0] if candidates else None
+                    match_result = best is not None and expected_screen in best['name']
+                    
+                    if best is None:
+                        message = f"屏幕识别 不通过: 没有距离在 {max_distance} 以内的参考截图"
+                    else:
+                        message = (f"屏幕识别 {'通过' if match_result else '不通过'}: "
+                                   f"最接近 {best['name']} (距离: {best['distance']})")
+                    logger.info(message)
+                    
+                    return {
+                        'success': match_result,
+                        'message': message,
+                        'details': {'expected_screen': expected_screen, 'candidates': candidates}
+                    }
+                    
+                except Exception as e:
+                    logger.error(f"屏幕识别过程出错: {str(e)}")
+                    return {
+                        'success': False,
+                        'message': f'屏幕识别过程出错: {str(e)}'
+                    }
+                
             elif verification_key == '检查数值范围':
                 # TODO: 实现数值范围检查逻辑
                 value = float(step.get('value', 0))
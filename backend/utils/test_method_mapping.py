@@ -244,15 +244,27 @@ STEP_METHODS: StepMethods = {
             },
             "expected_result": True
         },
+        "综合图像比较": {
+            "verification_key": "图像验证",
+            "short_description": "一次计算多项指标",
+            "description": "一次计算直方图、颜色差异、亮度差异、对比度、纹理和边缘等多项指标，所有指标都通过才算通过。两张图像只各转换一次灰度和HSV，各指标共用中间结果，比逐项调用更快。可通过metrics指定要计算的指标（可选ssim）。",
+            "verification_type": "图像验证",
+            "params": ["img1", "img2", "metrics"],
+            "default_values": {
+                "metrics": "histogram,color_difference,brightness_difference,contrast,texture,edge"
+            },
+            "expected_result": True
+        },
         "文本识别验证": {
             "verification_key": "操作界面验证",
             "short_description": "识别并验证界面文本",
-            "description": "使用OCR技术从界面截图中识别文本内容，并与预期文本进行比较。适用于验证界面上显示的文字、数字、状态信息等是否符合预期，支持模糊匹配和精确匹配两种模式。",
+            "description": "使用OCR技术从界面截图中识别文本内容，并与预期文本进行比较。适用于验证界面上显示的文字、数字、状态信息等是否符合预期，支持模糊匹配和精确匹配两种模式。指定glyph_set（从参考截图学习的字形集）时先用字形模板快速识别设备固定字体的数值和标签，置信度不足时再使用PaddleOCR。",
             "verification_type": "操作界面验证",
-            "params": ["screenshot", "expected_text", "match_mode", "region"],
+            "params": ["screenshot", "expected_text", "match_mode", "region", "glyph_set"],
             "default_values": {
                 "match_mode": "精确匹配",
-                "region": "全屏"
+                "region": "全屏",
+                "glyph_set": ""
             },
             "expected_result": True
         },
@@ -277,6 +289,17 @@ STEP_METHODS: StepMethods = {
                 "threshold": 0.80
             },
             "expected_result": True
+        },
+        "屏幕识别": {
+            "verification_key": "操作界面验证",
+            "short_description": "识别当前所在界面",
+            "description": "计算测试运行时获取的截图的感知哈希，在所有已上传的参考截图中查找最接近的几张，判断最接近的参考截图是否为预期界面。不需要逐张比对，参考截图很多时也能快速给出结果，适用于确认设备当前处于哪个界面。",
+            "verification_type": "操作界面验证",
+            "params": ["runtime_screenshot", "expected_screen", "max_distance"],
+            "default_values": {
+                "max_distance": 10
+            },
+            "expected_result": True
         }
     }
 }
@@ -0,0 +1,231 @@
+"""
+缩略图模块 - 按需生成并缓存图像的缩小版本
+
+日志和报告页面原本通过文件服务接口加载原始尺寸的PNG，图库页每张图片都要传输数MB。
+文件服务接口带 w（宽度）和 fmt（webp、jpeg、png）参数时改为返回缩略图：
+1. 缩略图按源图像的内容哈希命名（THUMBNAILS_DIR/<哈希前2位>/<哈希>_w<宽度>.<扩展名>），
+   内容相同的图像共用缩略图，源图像被替换后自动使用新的缩略图
+2. 由后台线程池生成，同一缩略图同时被多次请求时只生成一次
+3. 源文件的内容哈希按 (修改时间, 大小) 缓存在内存中，未变化的源文件不重复计算
+4. 缓存总大小超过 THUMBNAIL_CACHE_MB 时删除最早生成的缩略图
+
+主要类：
+- ThumbnailCache: 缩略图缓存，全局实例为 thumbnail_cache
+
+主要函数：
+- parse_variant: 校验并解析宽度和格式参数
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import cv2
+
+from config import THUMBNAILS_DIR, THUMBNAIL_WORKERS, THUMBNAIL_CACHE_MB
+from .artifact_store import file_digest
+from .log_config import setup_logger
+
+# 获取日志记录器
+logger = setup_logger(__name__)
+
+# 格式 -> (扩展名, MIME类型, 编码参数)
+THUMBNAIL_FORMATS = {
+    'webp': ('webp', 'image/webp', [cv2.IMWRITE_WEBP_QUALITY, 80]),
+    'jpeg': ('jpg', 'image/jpeg', [cv2.IMWRITE_JPEG_QUALITY, 85]),
+    'png': ('png', 'image/png', [cv2.IMWRITE_PNG_COMPRESSION, 3]),
+}
+EXTENSION_FORMATS = {extension: fmt for fmt, (extension, _, _) in THUMBNAIL_FORMATS.items()}
+DEFAULT_FORMAT = 'webp'
+MIN_WIDTH = 16
+MAX_WIDTH = 4096
+# 请求等待缩略图生成的最长时间（秒），超时后返回原图
+WAIT_TIMEOUT = 10.0
+# 内存中缓存内容哈希的源文件数
+DIGEST_CACHE_ENTRIES = 4096
+
+
+def parse_variant(width, fmt):
+    """
+    校验缩略图参数
+
+    参数:
+        width: 宽度（字符串或整数，为空时保持原宽度）
+        fmt: 格式（webp、jpeg、png，为空时使用webp）
+
+    返回:
+        (宽度或None, 格式)
+
+    异常:
+        ValueError: 参数无效
+    """
+    fmt = (fmt or DEFAULT_FORMAT).lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if fmt not in THUMBNAIL_FORMATS:
+        raise ValueError(f"不支持的缩略图格式: {fmt}，支持: {', '.join(THUMBNAIL_FORMATS)}")
+    if width in (None, ''):
+        return None, fmt
+    try:
+        width = int(width)
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的缩略图宽度: {width}")
+    if not MIN_WIDTH <= width <= MAX_WIDTH:
+        raise ValueError(f"缩略图宽度必须在 {MIN_WIDTH} 到 {MAX_WIDTH} 之间")
+    return width, fmt
+
+
+def variant_name(digest, width, fmt):
+    """缩略图文件名：<哈希>_w<宽度>.<扩展名>，宽度为None时为 <哈希>_w0.<扩展名>"""
+    return f"{digest}_w{width or 0}.{THUMBNAIL_FORMATS[fmt][0]}"
+
+
+class ThumbnailCache:
+    """按内容哈希缓存的缩略图"""
+
+    def __init__(self, root=THUMBNAILS_DIR, workers=THUMBNAIL_WORKERS, max_mb=THUMBNAIL_CACHE_MB):
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='thumbnail')
+        self._lock = threading.Lock()
+        # 生成中的缩略图文件名 -> Future
+        self._pending = {}
+        # 源文件路径 -> ((修改时间, 大小), 内容哈希)
+        self._digests = OrderedDict()
+        # 缓存目录的总大小，首次生成缩略图时统计
+        self._total_bytes = None
+
+    def path(self, name):
+        """缩略图文件名对应的路径"""
+        return os.path.join(self.root, name[:2], name)
+
+    def source_digest(self, source):
+        """源文件的内容哈希，文件未变化时使用内存中的结果"""
+        stat = os.stat(source)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        key = os.path.abspath(source)
+        with self._lock:
+            cached = self._digests.get(key)
+            if cached is not None and cached[0] == signature:
+                self._digests.move_to_end(key)
+                return cached[1]
+        digest = file_digest(source)[0]
+        with self._lock:
+            self._digests[key] = (signature, digest)
+            self._digests.move_to_end(key)
+            while len(self._digests) > DIGEST_CACHE_ENTRIES:
+                self._digests.popitem(last=False)
+        return digest
+
+    def get(self, source, width, fmt, timeout=WAIT_TIMEOUT):
+        """
+        返回源图像的缩略图，没有缓存时提交后台生成并等待
+
+        参数:
+            source: 源图像路径
+            width: 目标宽度，None表示保持原宽度（只转换格式）；不会放大
+            fmt: 格式
+            timeout: 最长等待时间（秒）
+
+        返回:
+            str: 缩略图文件名（用 path() 获取路径），生成失败或超时时返回None
+        """
+        name = variant_name(self.source_digest(source), width, fmt)
+        if os.path.exists(self.path(name)):
+            return name
+        with self._lock:
+            future = self._pending.get(name)
+            if future is None:
+                future = self._executor.submit(self._render, source, name, width, fmt)
+                self._pending[name] = future
+                future.add_done_callback(lambda _: self._forget(name))
+        try:
+            return name if future.result(timeout=timeout) else None
+        except TimeoutError:
+            logger.warning(f"生成缩略图超时: {source}")
+            return None
+
+    def _forget(self, name):
+        with self._lock:
+            self._pending.pop(name, None)
+
+    def _render(self, source, name, width, fmt):
+        """生成缩略图（后台线程），返回是否成功"""
+        try:
+            image = cv2.imread(source, cv2.IMREAD_UNCHANGED)
+            if image is None:
+                logger.warning(f"无法读取图像，不能生成缩略图: {source}")
+                return False
+            if image.ndim == 3 and image.shape[2] == 4 and fmt == 'jpeg':
+                image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+            height, original_width = image.shape[:2]
+            if width and width < original_width:
+                size = (width, max(1, round(height * width / original_width)))
+                image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+            extension, _, params = THUMBNAIL_FORMATS[fmt]
+            ok, encoded = cv2.imencode(f'.{extension}', image, params)
+            if not ok:
+                logger.warning(f"缩略图编码失败: {source}")
+                return False
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(encoded.tobytes())
+            os.replace(temp_path, path)
+        except Exception as e:
+            logger.warning(f"生成缩略图失败 {source}: {str(e)}")
+            return False
+        self._account(len(encoded))
+        return True
+
+    def _account(self, size):
+        """累计缓存大小，超过上限时删除最早生成的缩略图，直到降到上限的90%"""
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._total_bytes += size
+            if self._total_bytes <= self.max_bytes:
+                return
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            target = self.max_bytes * 0.9
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            self._total_bytes = total
+        logger.info(f"缩略图缓存超过上限，删除了 {removed} 个最早生成的缩略图")
+
+    def _entries(self):
+        """缓存中的全部缩略图：(路径, 大小, 修改时间)"""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+
+thumbnail_cache = ThumbnailCache()
@@ -16,11 +16,11 @@ SSH连接触摸和键盘事件监控模块
 import sys
 import time
 from .ssh_manager import SSHManager
+from services.config_service import config_service
 import signal
 import re
 import json
 import logging
-import os
 
 # 设置日志级别为DEBUG
 logger = logging.getLogger(__name__)
@@ -39,29 +39,32 @@ class TouchMonitorConfig:
         self.screen_width = DEFAULT_SCREEN_WIDTH
         self.screen_height = DEFAULT_SCREEN_HEIGHT
         self.monitor_keyboard = True  # 是否监控键盘事件
+        self.project_id = None
+        self._subscribed = False
     
     def load_project_config(self, project_id):
-        """从settings.json加载项目特定的配置"""
+        """从配置服务加载项目特定的配置，项目设置变化后自动重新加载"""
+        self.project_id = project_id
+        if not self._subscribed:
+            config_service.subscribe(self._on_settings_changed)
+            self._subscribed = True
         try:
-            settings_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'backend', 'data', 'settings.json')
-            if os.path.exists(settings_path):
-                with open(settings_path, 'r', encoding='utf-8') as f:
-                    settings = json.load(f)
-                
-                # 查找匹配的项目配置
-                for project in settings.get('projects', []):
-                    if str(project.get('id')) == str(project_id):
-                        self.screen_width = int(project.get('resolutionWidth', DEFAULT_SCREEN_WIDTH))
-                        self.screen_height = int(project.get('resolutionHeight', DEFAULT_SCREEN_HEIGHT))
-                        logger.info(f"已加载项目 {project_id} 的屏幕分辨率配置: {self.screen_width}x{self.screen_height}")
-                        return
-                
-                logger.warning(f"未找到项目 {project_id} 的配置，使用默认配置")
-            else:
-                logger.warning(f"配置文件 {settings_path} 不存在，使用默认配置")
+            project = config_service.get_project(project_id)
+            if project is not None:
+                self.screen_width = int(project.get('resolutionWidth', DEFAULT_SCREEN_WIDTH))
+                self.screen_height = int(project.get('resolutionHeight', DEFAULT_SCREEN_HEIGHT))
+                logger.info(f"已加载项目 {project_id} 的屏幕分辨率配置: {self.screen_width}x{self.screen_height}")
+                return
+            
+            logger.warning(f"未找到项目 {project_id} 的配置，使用默认配置")
         except Exception as e:
             logger.error(f"加载项目配置时出错: {str(e)}，使用默认配置")
     
+    def _on_settings_changed(self, settings):
+        """设置变化时重新加载当前项目的分辨率"""
+        if self.project_id:
+            self.load_project_config(self.project_id)
+    
     def convert_touch_to_screen(self, touch_x, touch_y):
         """将触摸屏坐标转换为屏幕坐标"""
         screen_x = round(touch_x / MAX_X * self.screen_width, 1)